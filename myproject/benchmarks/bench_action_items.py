@@ -0,0 +1,131 @@
+"""
+Throughput of action-item extraction (``speech.utils.action_items``).
+
+Compares, per keyword-set size, the old ``pretty_table`` loop (split on
+``". "``, lowercase every sentence, ``any(keyword in sentence)``) with the
+table's ``flag_sentences`` and with the compiled single-pass matcher over
+plain text and over memory-mapped word store files, for a batch of
+synthetic meetings. No database is needed.
+
+Before timing, the old loop and ``flag_sentences`` must flag the same
+sentences of ``EDGE_CASES``, texts where the two agree by design (no
+keywords inside other words, sentences ending in ``". "``).
+
+    python -m benchmarks.bench_action_items --meetings 200 --words 20000 --keywords 7 100 1000
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks.harness import Timer, setup_django, synthetic_words
+
+EDGE_CASES = (
+    "",
+    "   ",
+    "Nothing to do here.",
+    "Revenue grew 3.5 percent. No changes this week",
+    "All good! Really? Yes. Thanks everyone.",
+    "Grüße an alle. Bis bald",
+    "Please send the report. Thanks",
+    "URGENT: call the client. Then lunch. The deadline moved",
+    "We should email Ana. Submit it by Friday",
+)
+
+
+def legacy_extract(transcription, keywords):
+    """The original ``save_transcription_as_table`` matching loop, without the table."""
+    flagged = 0
+    sentences = transcription.split(". ")
+    for sentence in sentences:
+        flagged += any(keyword in sentence.lower() for keyword in keywords)
+    return len(sentences), flagged
+
+
+def legacy_flagged(transcription, keywords):
+    """The sentences the original loop flags, without their final period."""
+    return [
+        sentence.strip().rstrip(".") for sentence in transcription.split(". ")
+        if any(keyword in sentence.lower() for keyword in keywords)
+    ]
+
+
+def check_edge_cases(keywords):
+    from speech.utils.action_items import KeywordMatcher, flag_sentences
+
+    matcher = KeywordMatcher(keywords)
+    for text in EDGE_CASES:
+        flagged = [sentence.rstrip(".") for sentence, is_item in flag_sentences(text, matcher) if is_item]
+        assert flagged == legacy_flagged(text, keywords), (text, flagged, legacy_flagged(text, keywords))
+
+
+def keyword_set(size):
+    from speech.utils.action_items import DEFAULT_ACTION_KEYWORDS
+
+    extra = [f"project{i}" for i in range(max(0, size - len(DEFAULT_ACTION_KEYWORDS)))]
+    return list(DEFAULT_ACTION_KEYWORDS)[:size] + extra
+
+
+def build_meetings(directory, meetings, words):
+    from speech.wordstore import WordStoreWriter, write_columns
+
+    paths, transcripts = [], []
+    for i in range(meetings):
+        writer = WordStoreWriter()
+        stream = writer.tap(synthetic_words(words, seed=i))
+        transcripts.append(" ".join(w["punctuated_word"] for w in stream))
+        path = os.path.join(directory, f"{i}.words")
+        write_columns(path, writer.columns())
+        paths.append(path)
+    return paths, transcripts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--meetings', type=int, default=200)
+    parser.add_argument('--words', type=int, default=20000, help="Words per meeting")
+    parser.add_argument('--keywords', type=int, nargs='+', default=[7, 100, 1000])
+    parser.add_argument('--legacy-max-keywords', type=int, default=100,
+                        help="Skip the legacy loop above this many keywords (it is O(sentences x keywords)).")
+    args = parser.parse_args()
+
+    setup_django()
+    from speech.utils.action_items import (
+        KeywordMatcher, extract_from_text, extract_from_words, flag_sentences, split_sentences,
+    )
+    from speech.wordstore import WordTimings
+
+    total_words = args.meetings * args.words
+    with tempfile.TemporaryDirectory() as directory:
+        paths, transcripts = build_meetings(directory, args.meetings, args.words)
+        sentences = sum(len(split_sentences(t)) for t in transcripts)
+        for size in args.keywords:
+            keywords = keyword_set(size)
+            check_edge_cases(keywords)
+            modes = {
+                "table": lambda: sum(flagged for t in transcripts for _, flagged in flag_sentences(t, matcher)),
+                "text": lambda: sum(len(extract_from_text(t, matcher)) for t in transcripts),
+                "words": lambda: sum(len(extract_from_words(WordTimings(p), matcher)) for p in paths),
+            }
+            if size <= args.legacy_max_keywords:
+                modes["legacy"] = lambda: sum(legacy_extract(t, keywords)[1] for t in transcripts)
+            for mode, run in modes.items():
+                with Timer() as timer:
+                    # Compiling is part of the cost of a new keyword set.
+                    matcher = KeywordMatcher(keywords)
+                    items = run()
+                print(json.dumps({
+                    "mode": mode,
+                    "keywords": size,
+                    "meetings": args.meetings,
+                    "words": total_words,
+                    "sentences": sentences,
+                    "action_items": items,
+                    "seconds": round(timer.elapsed, 3),
+                    "meetings_per_s": round(args.meetings / timer.elapsed, 1),
+                    "words_per_s": round(total_words / timer.elapsed),
+                }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Requests per second for the in-request transcribe path at a given number of
+in-flight requests, async view vs. the equivalent sync view.
+
+Requests are driven through Django's ASGI handler in-process (no server or
+network), with ``LocalBackend`` standing in for Deepgram at ``--latency``
+seconds per call. Under ASGI a sync view runs on the single thread-sensitive
+executor, so it serialises; the async view overlaps the backend waits.
+
+    python -m benchmarks.bench_async --inflight 100 1000 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import setup_django, test_database
+
+urlpatterns = []
+
+
+def transcribe_sync(request):
+    """The pre-async transcribe path: every step blocks the worker thread."""
+    from django.http import JsonResponse
+
+    from speech.backends import get_backend, response_transcript, response_words
+    from speech.models import Meeting
+    from speech.pipeline import persist_words, transcription_options
+    from speech.trello import create_trello_task
+    from speech.views import _save_upload
+
+    audio_file = request.FILES["file"]
+    MIMETYPE, options = transcription_options()
+    workspace, file_path = _save_upload(audio_file)
+    res = get_backend().transcribe(file_path, MIMETYPE, options)
+    trello_response = create_trello_task(f"Transcription: {audio_file.name}", response_transcript(res))
+    meeting = Meeting.objects.create(userid=1, title="Project started")
+    turns = persist_words(meeting, response_words(res))
+    return JsonResponse({"meeting_id": meeting.id, "turns": turns, "trello_response": trello_response})
+
+
+def _install_urls():
+    from django.urls import include, path
+    from django.views.decorators.csrf import csrf_exempt
+
+    urlpatterns[:] = [
+        path("bench/transcribe-sync/", csrf_exempt(transcribe_sync)),
+        path("api/", include("speech.urls")),
+    ]
+
+
+async def _fire(url, inflight, payload):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    latencies = []
+
+    async def one(i):
+        start = time.perf_counter()
+        response = await client.post(url, {"file": SimpleUploadedFile(f"bench{i}.mp3", payload)})
+        latencies.append(time.perf_counter() - start)
+        return response.status_code
+
+    start = time.perf_counter()
+    codes = await asyncio.gather(*(one(i) for i in range(inflight)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": inflight,
+        "errors": sum(code != 200 for code in codes),
+        "seconds": round(elapsed, 3),
+        "req_per_s": round(inflight / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--inflight', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--latency', type=float, default=0.2, help="LocalBackend seconds per call")
+    parser.add_argument('--sync-max', type=int, default=100,
+                        help="Skip the sync view above this many in-flight requests (it serialises).")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+
+    from speech import backends, cache
+
+    logging.disable(logging.WARNING)
+    _install_urls()
+    backends.set_backend(backends.LocalBackend(latency=args.latency, realtime_factor=0))
+    cache.set_cache(None)
+    payload = os.urandom(16000)
+
+    with test_database(), tempfile.TemporaryDirectory() as scratch, \
+            override_settings(ROOT_URLCONF=__name__, TRANSCRIPTION_CACHE_BACKEND='', SCRATCH_ROOT=scratch):
+        for inflight in args.inflight:
+            for mode, url in (("async", "/api/transcribe/"), ("sync", "/bench/transcribe-sync/")):
+                if mode == "sync" and inflight > args.sync_max:
+                    continue
+                row = {"mode": mode, "inflight": inflight, **asyncio.run(_fire(url, inflight, payload))}
+                print(json.dumps(row))
+                sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
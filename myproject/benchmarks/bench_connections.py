@@ -0,0 +1,157 @@
+"""
+Connection churn and latency of the read API under concurrent load, per
+database connection mode.
+
+Each mode runs in its own process, because ``DATABASES`` is fixed once
+settings are loaded:
+
+    per-request   DB_CONN_MAX_AGE=0 (the old behaviour: connect on every request)
+    persistent    DB_CONN_MAX_AGE=60 with health checks
+    pool          DB_POOL=psycopg (Django's psycopg 3 pool)
+    pgbouncer     DB_POOL=pgbouncer (point HOST/PORT at a PgBouncer first)
+
+Requests go through Django's WSGI handler in-process from ``--concurrency``
+threads, so connections are opened and closed exactly as under a threaded
+WSGI server (``request_started``/``request_finished`` included). The mix is
+transcript pages, search, JSON export and action items over synthetic
+meetings in a throwaway test database. ``connects`` counts new database
+connections: for the pool it is the connections the pool opened, for the
+other modes every ``connection_created``.
+
+    python -m benchmarks.bench_connections --modes per-request persistent pool --requests 5000 --concurrency 16
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import setup_django, synthetic_words, test_database
+
+MODES = {
+    "per-request": {"DB_POOL": "", "DB_CONN_MAX_AGE": "0"},
+    "persistent": {"DB_POOL": "", "DB_CONN_MAX_AGE": "60"},
+    "pool": {"DB_POOL": "psycopg"},
+    "pgbouncer": {"DB_POOL": "pgbouncer", "DB_CONN_MAX_AGE": "60"},
+}
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def populate(meetings, words):
+    from speech.models import Meeting
+    from speech.pipeline import iter_speaker_turns, persist_turns
+
+    ids = []
+    for i in range(meetings):
+        meeting = Meeting.objects.create(userid=i % 5, title=f"bench {i}")
+        persist_turns(meeting, iter_speaker_turns(synthetic_words(words, seed=i)))
+        ids.append(meeting.id)
+    return ids
+
+
+def request_paths(meeting_ids):
+    for meeting_id in itertools.cycle(meeting_ids):
+        yield f"/api/meetings/{meeting_id}/transcript/", "limit=50"
+        yield "/api/search/", "q=budget&limit=10"
+        yield f"/api/meetings/{meeting_id}/export/json/", ""
+        yield f"/api/meetings/{meeting_id}/action-items/", ""
+
+
+def run_mode(mode, requests, concurrency, meetings, words):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from django.test import RequestFactory, override_settings
+
+    created = []
+    connection_created.connect(lambda **kwargs: created.append(kwargs['connection'].alias), weak=False)
+    handler = WSGIHandler()
+    factory = RequestFactory()
+
+    def call(path, query):
+        environ = factory.get(path, QUERY_STRING=query).environ
+        status = []
+        start = time.perf_counter()
+        body = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+        try:
+            for _ in body:
+                pass
+        finally:
+            body.close()  # sends request_finished, which closes or keeps the connection
+        return time.perf_counter() - start, status[0].startswith("200")
+
+    with test_database(), tempfile.TemporaryDirectory() as cache_dir, \
+            override_settings(ALLOWED_HOSTS=["testserver"], EXPORT_CACHE_DIR=cache_dir):
+        paths = request_paths(populate(meetings, words))
+        lock = threading.Lock()
+
+        def next_path():
+            with lock:
+                return next(paths)
+
+        before = len(created)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(lambda _: call(*next_path()), range(requests)))
+        elapsed = time.perf_counter() - start
+        connects = len(created) - before
+        db_pool = getattr(connections['default'], 'pool', None)
+        if db_pool is not None:
+            connects = db_pool.get_stats().get('connections_num', connects)
+
+    latencies = sorted(seconds for seconds, _ in results)
+    return {
+        "mode": mode,
+        "vendor": connections['default'].vendor,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(not ok for _, ok in results),
+        "req_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "connects": connects,
+        "connects_per_request": round(connects / requests, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=["per-request", "persistent", "pool"])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--meetings', type=int, default=20)
+    parser.add_argument('--words', type=int, default=5000, help="Words per meeting")
+    parser.add_argument('--child', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        setup_django()
+        logging.disable(logging.WARNING)
+        print(json.dumps(run_mode(args.child, args.requests, args.concurrency, args.meetings, args.words)))
+        return
+
+    for mode in args.modes:
+        command = [sys.executable, "-m", "benchmarks.bench_connections", "--child", mode,
+                   "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+                   "--meetings", str(args.meetings), "--words", str(args.words)]
+        result = subprocess.run(command, env={**os.environ, **MODES[mode]}, capture_output=True, text=True)
+        if result.returncode:
+            print(json.dumps({"mode": mode, "error": result.stderr.strip().splitlines()[-1:]}))
+        else:
+            print(result.stdout.strip())
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
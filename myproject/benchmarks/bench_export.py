@@ -0,0 +1,82 @@
+"""
+Time and peak Python memory of transcript exports (``speech.exports``).
+
+For each meeting size and format, measures a rendering export,
+which streams from the database while filling the cache, and a repeat
+export served from the cached file. The old way of producing a table, one
+``PrettyTable`` built in memory and written with ``get_string()``, is
+measured alongside for comparison.
+
+    python -m benchmarks.bench_export --words 100000 1000000
+"""
+import argparse
+import json
+import tempfile
+import tracemalloc
+
+from benchmarks.harness import Timer, setup_django, synthetic_words, test_database
+
+
+def measure(produce):
+    """
+    Seconds and output bytes of draining ``produce()``, then its peak traced
+    memory from a second run (tracing would slow the timed one down several times).
+    """
+    with Timer() as timer:
+        size = sum(len(chunk) for chunk in produce())
+    tracemalloc.start()
+    for _ in produce():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(timer.elapsed, 3), "peak_mb": round(peak / 1024 ** 2, 2), "bytes": size}
+
+
+def prettytable_export(meeting_id):
+    from prettytable import PrettyTable
+
+    from speech.models import MeetingTranscription
+
+    table = PrettyTable()
+    table.field_names = ["Seq", "Speaker", "Start", "End", "Text"]
+    for row in MeetingTranscription.objects.filter(meeting_id=meeting_id).order_by('seq') \
+            .values_list('seq', 'speaker', 'start_ms', 'end_ms', 'text'):
+        table.add_row(row)
+    yield table.get_string()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--words', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--formats', nargs='+', default=['srt', 'vtt', 'json', 'csv', 'table'])
+    parser.add_argument('--prettytable-max', type=int, default=1000000, help="Skip the PrettyTable baseline above this")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings
+
+    from speech.exports import cached_export, stream_export
+    from speech.models import Meeting
+    from speech.pipeline import iter_speaker_turns, persist_turns
+
+    with test_database(), tempfile.TemporaryDirectory() as cache_dir, override_settings(EXPORT_CACHE_DIR=cache_dir):
+        for n in args.words:
+            meeting = Meeting.objects.create(userid=1, title=f"bench {n}")
+            turns = persist_turns(meeting, iter_speaker_turns(synthetic_words(n)))
+            meeting.refresh_from_db()
+            version = meeting.transcript_version
+            for fmt in args.formats:
+                cold = measure(lambda: stream_export(meeting.id, fmt, version))
+
+                def cached():
+                    with open(cached_export(meeting.id, fmt, version), 'rb') as f:
+                        yield from iter(lambda: f.read(64 * 1024), b'')
+                print(json.dumps({"words": n, "turns": turns, "format": fmt, "mode": "render", **cold}))
+                print(json.dumps({"words": n, "turns": turns, "format": fmt, "mode": "cached", **measure(cached)}))
+            if n <= args.prettytable_max:
+                row = measure(lambda: prettytable_export(meeting.id))
+                print(json.dumps({"words": n, "turns": turns, "format": "table", "mode": "prettytable", **row}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+End-to-end load test of the upload path: ``POST /api/upload_audio/``,
+through the transcription job queue, to the persisted transcript, at
+controlled concurrency against an offline backend. Replaces
+``test_upload.py``, which posted one file to a running server and printed
+the reply.
+
+Every request uploads a distinct synthetic recording
+(``harness.synthetic_wav``), so the transcription cache never
+short-circuits it. ``--concurrency`` uploads are kept in flight through
+Django's ASGI handler in-process, and ``--workers`` threads drain the queue
+with ``run_pending_jobs`` as ``run_transcription_workers`` does. The backend is
+
+    fake    FakeBackend: a synthetic Deepgram response of --words words and
+            --speakers speakers after --latency seconds
+    local   LocalBackend: words and speakers derived from the audio itself
+
+A request's latency runs from the start of its upload to its job
+succeeding; ``upload_p50_ms`` is the time to the 202 alone. Each
+concurrency level runs in its own process, so ``peak_rss_mb`` is that
+level's own. ``queries_per_request`` counts every statement of the run
+(upload, claim, transcription, persistence, Trello outbox) per request.
+
+    python -m benchmarks.bench_load --concurrency 1 8 32 --requests 200 --output load.json
+    python -m benchmarks.bench_load --concurrency 1 8 32 --requests 200 --baseline load.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.harness import (
+    QueryCounter, add_report_arguments, finish_report, peak_rss_mb, percentiles, setup_django,
+    synthetic_words, synthetic_wav, test_database,
+)
+
+KEYS = ("backend", "concurrency", "workers", "requests", "seconds_audio", "words", "speakers")
+METRICS = {
+    "req_per_s": "higher",
+    "p50_ms": "lower",
+    "p95_ms": "lower",
+    "p99_ms": "lower",
+    "peak_rss_mb": "lower",
+    "queries_per_request": "lower",
+}
+
+
+def make_backend(args):
+    from speech.backends import FakeBackend, LocalBackend
+
+    if args.backend == "local":
+        return LocalBackend(latency=args.latency, realtime_factor=0, speakers=args.speakers)
+    return FakeBackend(words=list(synthetic_words(args.words, speakers=args.speakers)), delay=args.latency)
+
+
+async def upload_all(paths, concurrency):
+    """Post every file with at most ``concurrency`` in flight; returns {job_id: started} and upload latencies."""
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    limit = asyncio.Semaphore(concurrency)
+    started = {}
+    latencies = []
+
+    async def one(path):
+        async with limit:
+            wall, start = time.time(), time.perf_counter()
+            with open(path, 'rb') as f:
+                response = await client.post("/api/upload_audio/", {"file": f})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code == 202:
+                started[response.json()["job_id"]] = wall
+
+    await asyncio.gather(*(one(path) for path in paths))
+    return started, latencies
+
+
+def drain(stop):
+    """Run queued jobs until ``stop`` is set and the queue is empty."""
+    from django.db import connection
+
+    from speech.jobs import run_pending_jobs
+
+    try:
+        while True:
+            stopping = stop.is_set()
+            if run_pending_jobs():
+                continue
+            if stopping:
+                return
+            time.sleep(0.01)
+    finally:
+        connection.close()
+
+
+def write_recordings(directory, args):
+    """Write the run's recordings up front, so generating them is neither timed nor held in memory."""
+    paths = []
+    for i in range(args.requests):
+        paths.append(os.path.join(directory, f"load{i}.wav"))
+        with open(paths[-1], 'wb') as f:
+            f.write(synthetic_wav(args.seconds, args.speakers, seed=i))
+    return paths
+
+
+def run_level(args, concurrency):
+    from django.test import override_settings
+
+    from speech import backends, cache
+    from speech.models import TranscriptionJob
+
+    backends.set_backend(make_backend(args))
+    with tempfile.TemporaryDirectory() as scratch, test_database(sqlite_dir=scratch), override_settings(
+            ALLOWED_HOSTS=["testserver"], SCRATCH_ROOT=os.path.join(scratch, "jobs"),
+            TRANSCRIPTION_CACHE_DIR=os.path.join(scratch, "cache"),
+            WORD_STORE_DIR=os.path.join(scratch, "words"),
+            TRANSCRIPTION_MAX_CONCURRENT_JOBS=args.workers):
+        paths = write_recordings(scratch, args)
+        cache.set_cache(None)
+        stop = threading.Event()
+        workers = [threading.Thread(target=drain, args=(stop,)) for _ in range(args.workers)]
+        with QueryCounter() as queries:
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            try:
+                started, upload_latencies = asyncio.run(upload_all(paths, concurrency))
+            finally:
+                stop.set()
+                for worker in workers:
+                    worker.join()
+            elapsed = time.perf_counter() - start
+
+        done = TranscriptionJob.objects.filter(pk__in=started, status=TranscriptionJob.SUCCEEDED)
+        latencies = [updated.timestamp() - started[pk] for pk, updated in done.values_list('pk', 'updatedat')]
+
+    p50, p95, p99 = percentiles(latencies, 0.5, 0.95, 0.99)
+    return {
+        "backend": args.backend,
+        "concurrency": concurrency,
+        "workers": args.workers,
+        "requests": args.requests,
+        "seconds_audio": args.seconds,
+        "words": args.words if args.backend == "fake" else None,
+        "speakers": args.speakers,
+        "errors": args.requests - len(latencies),
+        "seconds": round(elapsed, 3),
+        "req_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(p50 * 1000, 1) if latencies else None,
+        "p95_ms": round(p95 * 1000, 1) if latencies else None,
+        "p99_ms": round(p99 * 1000, 1) if latencies else None,
+        "upload_p50_ms": round(statistics.median(upload_latencies) * 1000, 1) if upload_latencies else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "queries_per_request": round(queries.count / args.requests, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help="Uploads in flight")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4, help="Worker threads draining the job queue")
+    parser.add_argument('--backend', choices=["fake", "local"], default="fake")
+    parser.add_argument('--seconds', type=float, default=30.0, help="Length of each synthetic recording")
+    parser.add_argument('--words', type=int, default=2000, help="Words per fake backend response")
+    parser.add_argument('--speakers', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.05, help="Backend seconds per call")
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    add_report_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        setup_django()
+        logging.disable(logging.WARNING)
+        print(json.dumps(run_level(args, args.child)))
+        return
+
+    rows = []
+    for concurrency in args.concurrency:
+        command = [sys.executable, "-m", "benchmarks.bench_load", "--child", str(concurrency),
+                   "--requests", str(args.requests), "--workers", str(args.workers), "--backend", args.backend,
+                   "--seconds", str(args.seconds), "--words", str(args.words), "--speakers", str(args.speakers),
+                   "--latency", str(args.latency)]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode:
+            print(json.dumps({"concurrency": concurrency, "error": result.stderr.strip().splitlines()[-1:]}))
+            continue
+        rows.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        print(json.dumps(rows[-1]))
+        sys.stdout.flush()
+    sys.exit(finish_report("bench_load", rows, args, KEYS, METRICS))
+
+
+if __name__ == '__main__':
+    main()
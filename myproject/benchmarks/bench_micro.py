@@ -0,0 +1,108 @@
+"""
+Micro-benchmarks of ``speech.pipeline.create_transcript`` (saved response
+file to persisted turns, word store and .txt transcript) and
+``speech.utils.pretty_table.save_transcription_as_table``.
+
+Each case runs ``--repeat`` times on the same synthetic response; the report
+has the best and median wall time, queries per run and the peak traced
+memory of one extra, untimed run. Use ``--output`` and ``--baseline`` as with
+``bench_load``.
+
+    python -m benchmarks.bench_micro --words 10000 100000 --repeat 5 --output micro.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import tracemalloc
+
+from benchmarks.harness import (
+    QueryCounter, Timer, add_report_arguments, finish_report, setup_django, synthetic_response, test_database,
+)
+
+KEYS = ("case", "words", "speakers")
+METRICS = {"best_s": "lower", "median_s": "lower", "queries": "lower", "peak_mb": "lower"}
+
+
+def measure(case, words, speakers, repeat, run):
+    """Time ``run()`` ``repeat`` times, then trace one more run for its peak memory."""
+    times = []
+    for _ in range(repeat):
+        with QueryCounter() as queries, Timer() as timer:
+            run()
+        times.append(timer.elapsed)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(times)
+    return {
+        "case": case,
+        "words": words,
+        "speakers": speakers,
+        "repeat": repeat,
+        "best_s": round(best, 4),
+        "median_s": round(statistics.median(times), 4),
+        "words_per_s": round(words / best),
+        "queries": queries.count,
+        "peak_mb": round(peak / 1024 ** 2, 2),
+    }
+
+
+def bench_create_transcript(directory, n, speakers, repeat):
+    from speech.models import Meeting
+    from speech.pipeline import create_transcript
+    from speech.utils.streaming_json import save_response
+
+    response_path = save_response(synthetic_response(n, speakers), os.path.join(directory, f"response{n}.json"))
+    transcript_path = os.path.join(directory, f"transcript{n}.txt")
+
+    def run():
+        meeting = Meeting.objects.create(userid=1, title=f"bench {n}")
+        create_transcript(response_path, transcript_path, meeting)
+    return measure("create_transcript", n, speakers, repeat, run)
+
+
+def bench_save_table(directory, n, speakers, repeat):
+    from speech.backends import response_transcript
+    from speech.utils.pretty_table import save_transcription_as_table
+
+    transcript = response_transcript(synthetic_response(n, speakers))
+    cwd = os.getcwd()
+    os.chdir(directory)  # it writes under ./transcriptions/
+    try:
+        return measure("save_transcription_as_table", n, speakers, repeat,
+                       lambda: save_transcription_as_table(transcript, f"table{n}.txt"))
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--words', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--speakers', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cases', nargs='+', choices=["create_transcript", "save_transcription_as_table"],
+                        default=["create_transcript", "save_transcription_as_table"])
+    add_report_arguments(parser)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings
+
+    cases = {"create_transcript": bench_create_transcript, "save_transcription_as_table": bench_save_table}
+    rows = []
+    with tempfile.TemporaryDirectory() as directory, test_database(), \
+            override_settings(WORD_STORE_DIR=os.path.join(directory, "words")):
+        for n in args.words:
+            for case in args.cases:
+                rows.append(cases[case](directory, n, args.speakers, args.repeat))
+                print(json.dumps(rows[-1]))
+                sys.stdout.flush()
+    sys.exit(finish_report("bench_micro", rows, args, KEYS, METRICS))
+
+
+if __name__ == '__main__':
+    main()
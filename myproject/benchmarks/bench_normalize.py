@@ -0,0 +1,73 @@
+"""
+Bytes sent to the transcription backend, and the cost of getting there,
+with and without ``speech.normalize``.
+
+For each input format and length, a synthetic recording is normalised
+(downmix to mono and resample to ``AUDIO_TARGET_RATE``, plus silence
+trimming with ``--trim``). Each row gives the bytes before and after, the
+normalising time and its speed as a multiple of real time, and the
+time to upload both sizes over a ``--uplink-mbps`` link, which is what the
+backend call waits on before it can start transcribing.
+
+    python -m benchmarks.bench_normalize --seconds 60 600 3600 --formats 48000x2 44100x2 16000x1
+"""
+import argparse
+import json
+import os
+import tempfile
+import tracemalloc
+
+from benchmarks.harness import Timer, setup_django, synthetic_wav
+
+
+def discard(audio, path):
+    if audio.path != path:
+        os.remove(audio.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, nargs='+', default=[60, 600])
+    parser.add_argument('--formats', nargs='+', default=["48000x2", "44100x2", "16000x1"],
+                        help="Input sample rate x channels")
+    parser.add_argument('--trim', action='store_true', help="Also trim leading/trailing silence")
+    parser.add_argument('--uplink-mbps', type=float, default=20.0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings
+
+    from speech.normalize import normalize_audio
+
+    with tempfile.TemporaryDirectory() as directory, override_settings(AUDIO_TRIM_SILENCE=int(args.trim)):
+        for seconds in args.seconds:
+            for fmt in args.formats:
+                rate, channels = (int(v) for v in fmt.split('x'))
+                path = os.path.join(directory, f"in-{fmt}-{seconds}.wav")
+                with open(path, 'wb') as f:
+                    f.write(synthetic_wav(seconds, sample_rate=rate, channels=channels))
+                with Timer() as timer:
+                    audio = normalize_audio(path, 'wav', directory)
+                discard(audio, path)
+                tracemalloc.start()  # a second, untimed run: tracing slows it down
+                discard(normalize_audio(path, 'wav', directory), path)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                size = os.path.getsize(path)
+                print(json.dumps({
+                    "seconds": seconds,
+                    "format": fmt,
+                    "bytes_in": size,
+                    "bytes_out": audio.size,
+                    "shrink": round(size / audio.size, 2),
+                    "normalize_s": round(timer.elapsed, 3),
+                    "x_realtime": round(seconds / timer.elapsed) if timer.elapsed else None,
+                    "peak_mb": round(peak / 1024 ** 2, 2),
+                    "upload_s_before": round(size * 8 / (args.uplink_mbps * 1e6), 2),
+                    "upload_s_after": round(audio.size * 8 / (args.uplink_mbps * 1e6), 2),
+                }))
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
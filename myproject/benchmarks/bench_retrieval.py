@@ -0,0 +1,87 @@
+"""
+Build and query latency of the per-meeting BM25 index in ``speech.retrieval``.
+
+Turns are generated in memory (no database) from the harness vocabulary plus
+a long tail of rarer terms, so the postings have a realistic mix of very
+common and very selective terms. Reports full build time, the cost of one
+incremental refresh-sized append (including a merge when the segment limit
+is hit), index size, and p50/p99 query latency.
+
+    python -m benchmarks.bench_retrieval --turns 1000000
+"""
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.harness import WORDS, Timer, setup_django
+
+RARE = [f"topic{i}" for i in range(50000)]
+
+
+def synthetic_turns(n, first_id=1, mean_words=14, seed=0):
+    rng = random.Random(seed)
+    for row_id in range(first_id, first_id + n):
+        length = max(1, int(rng.expovariate(1 / mean_words)))
+        words = [WORDS[rng.randrange(len(WORDS))] for _ in range(length)]
+        for _ in range(1 + length // 8):
+            words.insert(rng.randrange(len(words) + 1), RARE[int(rng.paretovariate(1.1)) % len(RARE)])
+        yield row_id, " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--append', type=int, default=1000, help="Rows per incremental append")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=8)
+    args = parser.parse_args()
+
+    setup_django()
+    from speech.retrieval import MeetingIndex
+
+    rng = random.Random(1)
+    for n in args.turns:
+        with tempfile.TemporaryDirectory() as directory:
+            index = MeetingIndex(0, directory)
+            rows = list(synthetic_turns(n))
+            with Timer() as build:
+                index.add(rows)
+            del rows
+
+            appends = []
+            next_id = n + 1
+            for _ in range(10):
+                with Timer() as timer:
+                    index.add(synthetic_turns(args.append, first_id=next_id, seed=next_id))
+                appends.append(timer.elapsed)
+                next_id += args.append
+
+            latencies = []
+            for _ in range(args.queries):
+                query = " ".join(rng.choice(WORDS + RARE[:200]) for _ in range(rng.randint(2, 8)))
+                start = time.perf_counter()
+                index.search(query, args.top_k)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+
+            with Timer() as load:
+                MeetingIndex(0, directory)
+
+        print(json.dumps({
+            "turns": n,
+            "documents": len(index),
+            "index_mb": round(index.nbytes / 1024 ** 2, 1),
+            "build_s": round(build.elapsed, 2),
+            "append_ms_p50": round(statistics.median(appends) * 1000, 1),
+            "append_ms_max": round(max(appends) * 1000, 1),
+            "load_s": round(load.elapsed, 3),
+            "query_ms_p50": round(statistics.median(latencies) * 1000, 2),
+            "query_ms_p99": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Ingest throughput and query latency of the full-text search index
+(``speech.search``) over a synthetic corpus, against a plain ``icontains``
+scan of ``MeetingTranscription.text``.
+
+Rows are spread over meetings of ``--turns-per-meeting`` turns belonging to
+``--users`` users and created over the last year, and are inserted with
+``bulk_create`` so the index is maintained the way ingestion maintains it
+(triggers on SQLite, the generated column on PostgreSQL). Query mixes cover
+a selective term, a common term, a phrase and the common term filtered by
+user, date and speaker.
+
+    python -m benchmarks.bench_search --rows 1000000
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+import time
+
+from benchmarks.bench_retrieval import RARE, synthetic_turns
+from benchmarks.harness import Timer, setup_django, test_database
+
+
+def populate(rows, turns_per_meeting, users, batch_size=5000, seed=0):
+    from django.db import transaction
+    from django.utils import timezone
+
+    from speech.models import Meeting, MeetingTranscription
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    meetings = Meeting.objects.bulk_create([
+        Meeting(userid=rng.randrange(users), title=f"Meeting {i}")
+        for i in range(-(-rows // turns_per_meeting))
+    ])
+    # createdat is auto_now_add; spread the meetings over a year afterwards.
+    for meeting in meetings:
+        meeting.createdat = now - datetime.timedelta(days=rng.randrange(365))
+    Meeting.objects.bulk_update(meetings, ['createdat'], batch_size=batch_size)
+
+    batch = []
+    with Timer() as timer, transaction.atomic():
+        for i, (_, text) in enumerate(synthetic_turns(rows)):
+            batch.append(MeetingTranscription(
+                meeting_id=meetings[i // turns_per_meeting].id, seq=i % turns_per_meeting,
+                speaker=rng.randrange(4), text=text,
+            ))
+            if len(batch) >= batch_size:
+                MeetingTranscription.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            MeetingTranscription.objects.bulk_create(batch)
+    return timer.elapsed
+
+
+def _percentiles(latencies):
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+
+def measure(run, runs):
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        count = run(i)
+        latencies.append(time.perf_counter() - start)
+    return {"runs": runs, "last_count": count, **_percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--turns-per-meeting', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--baseline-runs', type=int, default=5, help="icontains scans per query kind (slow)")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.utils import timezone
+
+    from speech.models import MeetingTranscription
+    from speech.search import search_transcripts
+
+    rng = random.Random(1)
+    since = (timezone.now() - datetime.timedelta(days=30)).date()
+    for rows in args.rows:
+        with test_database():
+            seconds = populate(rows, args.turns_per_meeting, args.users)
+            print(json.dumps({
+                "rows": rows, "vendor": connection.vendor, "insert_seconds": round(seconds, 2),
+                "rows_per_s": round(rows / seconds),
+            }))
+            kinds = {
+                "rare": lambda i: search_transcripts(RARE[rng.randrange(1, 200)]),
+                "common": lambda i: search_transcripts("budget"),
+                "phrase": lambda i: search_transcripts('"the client"'),
+                "filtered": lambda i: search_transcripts(
+                    "budget", user_id=rng.randrange(args.users), date_from=since, speaker=rng.randrange(4)),
+            }
+            baseline = {
+                "rare": lambda i: MeetingTranscription.objects.filter(text__icontains=RARE[rng.randrange(1, 200)])[:20],
+                "common": lambda i: MeetingTranscription.objects.filter(text__icontains="budget")[:20],
+            }
+            for kind, run in kinds.items():
+                row = {"rows": rows, "mode": "search", "query": kind,
+                       **measure(lambda i: len(run(i)), args.queries)}
+                print(json.dumps(row))
+            for kind, run in baseline.items():
+                row = {"rows": rows, "mode": "icontains", "query": kind,
+                       **measure(lambda i: len(list(run(i))), args.baseline_runs)}
+                print(json.dumps(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Speaker analytics (``speech.analytics``): what they add to storing a
+transcript, and a user's report from the precomputed ``MeetingStats`` rows
+against recomputing it from every transcript in the range.
+
+Stores ``--meetings`` synthetic meetings through ``persist_words`` (which
+computes their stats), then times, per mode:
+
+    compute     update_meeting_stats of every meeting (the ingest-time cost)
+    rollup      aggregate_stats with ``group`` (one query per report)
+    words       meeting_stats of every meeting, from its word store
+    turns       the same from its MeetingTranscription rows
+
+    python -m benchmarks.bench_stats --meetings 200 --words 5000
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks.harness import QueryCounter, Timer, setup_django, synthetic_words, test_database
+
+
+def store_meetings(meetings, words, speakers):
+    from speech.models import Meeting
+    from speech.pipeline import persist_words
+
+    stored = []
+    for i in range(meetings):
+        meeting = Meeting.objects.create(userid=1, title=f"bench {i}")
+        persist_words(meeting, synthetic_words(words, speakers, seed=i))
+        stored.append(meeting)
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--meetings', type=int, default=200)
+    parser.add_argument('--words', type=int, default=5000, help="Words per meeting")
+    parser.add_argument('--speakers', type=int, default=4)
+    parser.add_argument('--group', default='speaker', choices=['speaker', 'meeting', 'day', 'week', 'month'])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings
+
+    from speech.analytics import aggregate_stats, meeting_stats, turn_stats, update_meeting_stats
+
+    with tempfile.TemporaryDirectory() as directory, test_database(), \
+            override_settings(WORD_STORE_DIR=os.path.join(directory, "words")):
+        meetings = store_meetings(args.meetings, args.words, args.speakers)
+        modes = {
+            "compute": lambda: [update_meeting_stats(m) for m in meetings],
+            "rollup": lambda: aggregate_stats(user_id=1, group=args.group),
+            "words": lambda: [meeting_stats(m) for m in meetings],
+            "turns": lambda: [turn_stats(m) for m in meetings],
+        }
+        for mode, run in modes.items():
+            with QueryCounter() as queries, Timer() as timer:
+                run()
+            print(json.dumps({
+                "mode": mode,
+                "meetings": args.meetings,
+                "words": args.meetings * args.words,
+                "group": args.group,
+                "seconds": round(timer.elapsed, 4),
+                "ms_per_meeting": round(timer.elapsed * 1000 / args.meetings, 3),
+                "queries": queries.count,
+            }))
+
+
+if __name__ == '__main__':
+    main()
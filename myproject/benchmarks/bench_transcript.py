@@ -0,0 +1,60 @@
+"""
+Queries per meeting and wall time for persisting synthetic transcripts.
+
+Compares the bulk ``speech.pipeline.persist_turns`` path with the old
+per-turn ``Meeting.objects.get`` + ``create`` loop (legacy runs are limited
+to ``--legacy-max`` words because they are slow by design).
+"""
+import argparse
+import json
+
+from benchmarks.harness import Timer, setup_django, synthetic_words, test_database
+
+
+def legacy_persist(meeting_id, turns):
+    from speech.models import Meeting, MeetingTranscription
+
+    for turn in turns:
+        MeetingTranscription.objects.create(speaker=turn.speaker, meeting=Meeting.objects.get(id=meeting_id), text=turn.text)
+
+
+def run(sizes, batch_size, legacy_max):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from speech.models import Meeting
+    from speech.pipeline import iter_speaker_turns, persist_turns
+
+    results = []
+    for n in sizes:
+        words = list(synthetic_words(n))
+        meeting = Meeting.objects.create(userid=1, title=f"bench {n}")
+        with CaptureQueriesContext(connection) as queries, Timer() as timer:
+            turns = persist_turns(meeting, iter_speaker_turns(words), batch_size)
+        row = {"words": n, "turns": turns, "queries": len(queries), "seconds": round(timer.elapsed, 3)}
+
+        if n <= legacy_max:
+            meeting = Meeting.objects.create(userid=1, title=f"legacy {n}")
+            with CaptureQueriesContext(connection) as queries, Timer() as timer:
+                legacy_persist(meeting.id, iter_speaker_turns(words))
+            row["legacy_queries"] = len(queries)
+            row["legacy_seconds"] = round(timer.elapsed, 3)
+        results.append(row)
+        print(json.dumps(row))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 50_000, 100_000, 500_000])
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--legacy-max', type=int, default=50_000)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run(args.sizes, args.batch_size, args.legacy_max)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+Shared helpers for the benchmark scripts in this package.
+
+Benchmarks run against a throwaway test database created on the configured
+backend (the same way ``manage.py test`` does), so they never touch real data.
+Run them from the project directory, e.g.::
+
+    python -m benchmarks.bench_transcript --sizes 10000 100000 500000
+
+``bench_load`` and ``bench_micro`` write a JSON report with ``--output``;
+pass an earlier report as ``--baseline`` to compare against it. Metrics
+that got worse by more than ``--tolerance`` are listed under
+``regressions``, and the run exits non-zero.
+"""
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+import wave
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import django
+import numpy as np
+
+WORDS = (
+    "the project deadline is next week and we need to send the report "
+    "please call the client about the budget review meeting on friday "
+    "i think the design looks good but the numbers are off"
+).split()
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database(sqlite_dir=None):
+    """
+    Create the test database for the duration of the block. SQLite test
+    databases live in memory, where concurrent writers fail with "table is
+    locked" instead of waiting; pass ``sqlite_dir`` to put it in a file there,
+    with transactions taking the write lock up front so they queue for it.
+    """
+    from django.conf import settings
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    db = settings.DATABASES['default']
+    if sqlite_dir and db['ENGINE'].endswith('sqlite3'):
+        db.setdefault('TEST', {})['NAME'] = os.path.join(sqlite_dir, 'test.sqlite3')
+        db.setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    setup_test_environment()
+    old_config = runner.setup_databases()
+    try:
+        yield
+    finally:
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+
+
+def synthetic_words(n, speakers=3, mean_turn=12, seed=0):
+    """
+    Yield ``n`` Deepgram-shaped word structs with ``speakers`` speakers taking
+    turns of roughly ``mean_turn`` words, at about 2.5 words per second.
+    """
+    rng = random.Random(seed)
+    speaker = 0
+    left_in_turn = max(1, int(rng.expovariate(1 / mean_turn)))
+    t = 0.0
+    for i in range(n):
+        if left_in_turn == 0:
+            speaker = (speaker + rng.randrange(1, speakers)) % speakers if speakers > 1 else 0
+            left_in_turn = max(1, int(rng.expovariate(1 / mean_turn)))
+            t += 0.5
+        word = WORDS[i % len(WORDS)]
+        duration = 0.15 + rng.random() * 0.3
+        left_in_turn -= 1
+        yield {
+            "word": word,
+            "punctuated_word": word + ("." if left_in_turn == 0 else ""),
+            "start": round(t, 3),
+            "end": round(t + duration, 3),
+            "confidence": round(0.6 + rng.random() * 0.4, 3),
+            "speaker": speaker,
+        }
+        t += duration + 0.05
+
+
+def synthetic_response(n, speakers=3, mean_turn=12, seed=0):
+    words = list(synthetic_words(n, speakers, mean_turn, seed))
+    transcript = " ".join(w["punctuated_word"] for w in words)
+    return {"results": {"channels": [{"alternatives": [{"transcript": transcript, "words": words}]}]}}
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def synthetic_wav(seconds, speakers=3, mean_turn=4.0, sample_rate=16000, seed=0, channels=1):
+    """
+    Return the bytes of a 16-bit PCM WAV of ``seconds`` seconds: voiced
+    stretches of roughly ``mean_turn`` seconds, one tone per speaker with
+    some noise, separated by short pauses. ``LocalBackend`` turns each
+    voiced stretch into a speaker turn.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    signal = np.zeros(total, dtype=np.float32)
+    pos = 0
+    speaker = 0
+    while pos < total:
+        pos += int(rng.uniform(0.3, 0.8) * sample_rate)
+        length = min(total - pos, int(max(0.5, rng.exponential(mean_turn)) * sample_rate))
+        if length <= 0:
+            break
+        t = np.arange(length, dtype=np.float32) / sample_rate
+        signal[pos:pos + length] = 0.3 * np.sin(2 * np.pi * (140 + 60 * speaker) * t)
+        pos += length
+        if speakers > 1:
+            speaker = (speaker + int(rng.integers(1, speakers))) % speakers
+    signal += rng.normal(0, 0.003, total).astype(np.float32)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(np.repeat((np.clip(signal, -1, 1) * 32767).astype('<i2'), channels).tobytes())
+    return buffer.getvalue()
+
+
+class QueryCounter:
+    """
+    Count SQL statements on every connection, in every thread, while the
+    block runs (``CaptureQueriesContext`` only sees the current thread's).
+    """
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._wrapped = []
+
+    def _wrapper(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _install(self, connection, **kwargs):
+        connection.execute_wrappers.append(self._wrapper)
+        self._wrapped.append(connection)
+
+    def __enter__(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        for connection in connections.all(initialized_only=True):
+            self._install(connection)
+        connection_created.connect(self._install)
+        return self
+
+    def __exit__(self, *exc):
+        from django.db.backends.signals import connection_created
+
+        connection_created.disconnect(self._install)
+        for connection in self._wrapped:
+            if self._wrapper in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self._wrapper)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 ** 2 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentiles(values, *qs):
+    ordered = sorted(values)
+    if not ordered:
+        return [None] * len(qs)
+    return [ordered[min(len(ordered) - 1, int(len(ordered) * q))] for q in qs]
+
+
+def add_report_arguments(parser):
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    parser.add_argument('--baseline', help="Compare against a report written earlier with --output")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="Relative change in the worse direction that counts as a regression")
+
+
+def compare(rows, baseline_rows, keys, metrics, tolerance):
+    """
+    Annotate each row with the matching baseline row's values (matched on
+    ``keys``). ``metrics`` maps a metric name to ``'higher'`` or ``'lower'``,
+    whichever is better. Returns the number of regressions.
+    """
+    previous = {tuple(row.get(k) for k in keys): row for row in baseline_rows}
+    regressions = 0
+    for row in rows:
+        base = previous.get(tuple(row.get(k) for k in keys))
+        if base is None:
+            continue
+        row["baseline"] = {}
+        row["regressions"] = []
+        for name, better in metrics.items():
+            old, new = base.get(name), row.get(name)
+            if old is None or new is None:
+                continue
+            row["baseline"][name] = old
+            change = (new - old) / old if old else 0.0
+            if (change < -tolerance) if better == 'higher' else (change > tolerance):
+                row["regressions"].append(name)
+        regressions += len(row["regressions"])
+    return regressions
+
+
+def finish_report(name, rows, args, keys, metrics):
+    """
+    Compare ``rows`` with ``--baseline``, write ``--output`` and return the
+    exit status: 1 if anything regressed past ``--tolerance``.
+    """
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(rows, json.load(f)["results"], keys, metrics, args.tolerance)
+    report = {
+        "benchmark": name,
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "arguments": {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'child')},
+        "baseline": args.baseline,
+        "regressions": regressions,
+        "results": rows,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    for row in rows:
+        if row.get("regressions"):
+            print(json.dumps({"regressed": {k: row[k] for k in keys}, "metrics": row["regressions"]}), file=sys.stderr)
+    return 1 if regressions else 0
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'speech.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,18 @@ PASSWORD=os.environ.get('PASSWORD')
 HOST=os.environ.get('HOST')
 PORT=os.environ.get('PORT')
 
+# Connection reuse. DB_POOL='psycopg' uses Django's built-in pool (psycopg 3 with psycopg[pool]; the
+# better choice under ASGI); 'pgbouncer' keeps persistent connections to a transaction-mode PgBouncer;
+# '' keeps each connection for DB_CONN_MAX_AGE seconds (0 = reconnect on every request)
+DB_POOL = os.environ.get('DB_POOL', '')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))  # seconds; ignored with DB_POOL='psycopg'
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 2))  # per process
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))  # per process
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+# Streaming read replica for transcript reads and search (speech.routers); unset = primary only
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST', '')
+DB_REPLICA_PORT = os.environ.get('DB_REPLICA_PORT', PORT)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -92,8 +105,130 @@ DATABASES = {
         'PASSWORD': PASSWORD,
         'HOST': HOST,
         'PORT': PORT,
+        'CONN_MAX_AGE': 0 if DB_POOL == 'psycopg' else DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': DB_POOL != 'psycopg',
+        'OPTIONS': {},
     }
 }
+if DB_POOL == 'psycopg':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': DB_POOL_MIN_SIZE,
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': DB_POOL_TIMEOUT,
+    }
+elif DB_POOL == 'pgbouncer':
+    # Server-side cursors (QuerySet.iterator()) don't survive transaction pooling.
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'HOST': DB_REPLICA_HOST,
+        'PORT': DB_REPLICA_PORT,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['speech.routers.TranscriptReadRouter']
+
+
+# Transcription jobs
+# Backend used by the workers; 'speech.backends.LocalBackend' runs offline for load tests.
+TRANSCRIPTION_BACKEND = os.environ.get('TRANSCRIPTION_BACKEND', 'speech.backends.DeepgramBackend')
+LOCAL_BACKEND_LATENCY = float(os.environ.get('LOCAL_BACKEND_LATENCY', 0.2))  # seconds per call
+LOCAL_BACKEND_REALTIME_FACTOR = float(os.environ.get('LOCAL_BACKEND_REALTIME_FACTOR', 0.0))  # seconds per audio second
+TRANSCRIPTION_MAX_CONCURRENT_JOBS = int(os.environ.get('TRANSCRIPTION_MAX_CONCURRENT_JOBS', 4))
+TRANSCRIPTION_JOB_TIMEOUT = int(os.environ.get('TRANSCRIPTION_JOB_TIMEOUT', 1800))  # seconds
+TRANSCRIPTION_JOB_MAX_ATTEMPTS = int(os.environ.get('TRANSCRIPTION_JOB_MAX_ATTEMPTS', 3))
+TRANSCRIPTION_RETRY_BACKOFF = int(os.environ.get('TRANSCRIPTION_RETRY_BACKOFF', 30))  # seconds, doubled per attempt
+TRANSCRIPTION_RETRY_BACKOFF_MAX = int(os.environ.get('TRANSCRIPTION_RETRY_BACKOFF_MAX', 900))
+# Speaker turns written per bulk_create when persisting a transcript
+TRANSCRIPT_BATCH_SIZE = int(os.environ.get('TRANSCRIPT_BATCH_SIZE', 1000))
+# Turns per page of the transcript read API (default and cap)
+TRANSCRIPT_PAGE_SIZE = int(os.environ.get('TRANSCRIPT_PAGE_SIZE', 200))
+TRANSCRIPT_MAX_PAGE_SIZE = int(os.environ.get('TRANSCRIPT_MAX_PAGE_SIZE', 1000))
+# Per-meeting word timing files (speech.wordstore)
+WORD_STORE_DIR = os.environ.get('WORD_STORE_DIR', str(BASE_DIR / 'wordstore'))
+WORD_PAGE_SIZE = int(os.environ.get('WORD_PAGE_SIZE', 1000))  # max words per words/ response
+# Full-text search (speech.search): results per page and words per snippet
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', 100))
+SEARCH_SNIPPET_WORDS = int(os.environ.get('SEARCH_SNIPPET_WORDS', 16))
+# Action-item extraction: default keywords (comma-separated; empty = built-in list) and the
+# pause that ends a sentence when there is no punctuation
+ACTION_KEYWORDS = [k.strip() for k in os.environ.get('ACTION_KEYWORDS', '').split(',') if k.strip()]
+ACTION_SENTENCE_GAP_MS = int(os.environ.get('ACTION_SENTENCE_GAP_MS', 1500))
+# Speaker analytics (speech.analytics): a turn that starts before the previous speaker's last word
+# ends, or within this many ms of it while their sentence is unfinished, counts as an interruption
+INTERRUPTION_GAP_MS = int(os.environ.get('INTERRUPTION_GAP_MS', 200))
+# Rendered transcript exports (speech.exports), cached per meeting, format and transcript version
+EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', str(BASE_DIR / 'cache' / 'exports'))
+EXPORT_TABLE_WIDTH = int(os.environ.get('EXPORT_TABLE_WIDTH', 100))  # text column wraps at this width
+# Stage metrics (speech.metrics, served on /metrics): fraction of requests run under cProfile,
+# and where their .prof files go; worker processes serve metrics from METRICS_PORT + n (0 = off)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+# Per-job scratch directories and how long they are kept
+SCRATCH_ROOT = os.environ.get('SCRATCH_ROOT', str(BASE_DIR / 'scratch'))
+SCRATCH_TTL = int(os.environ.get('SCRATCH_TTL', 24 * 3600))  # seconds
+SCRATCH_CLEANUP_INTERVAL = int(os.environ.get('SCRATCH_CLEANUP_INTERVAL', 600))  # seconds
+# Transcription response cache: 'speech.cache.FileSystemCache', 'speech.cache.DatabaseCache' or '' to disable
+TRANSCRIPTION_CACHE_BACKEND = os.environ.get('TRANSCRIPTION_CACHE_BACKEND', 'speech.cache.FileSystemCache')
+TRANSCRIPTION_CACHE_DIR = os.environ.get('TRANSCRIPTION_CACHE_DIR', str(BASE_DIR / 'cache' / 'transcriptions'))
+TRANSCRIPTION_CACHE_TTL = int(os.environ.get('TRANSCRIPTION_CACHE_TTL', 30 * 24 * 3600))  # seconds since last use, 0 = never expire
+TRANSCRIPTION_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+TRANSCRIPTION_CACHE_EVICT_INTERVAL = int(os.environ.get('TRANSCRIPTION_CACHE_EVICT_INTERVAL', 300))  # seconds between full scans
+# Content-addressed audio store for chunked uploads; also the hashing leaf size
+UPLOAD_ROOT = os.environ.get('UPLOAD_ROOT', str(BASE_DIR / 'uploads'))
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+# Long WAV recordings are split at silences and the chunks transcribed in parallel
+SPLIT_MIN_SECONDS = int(os.environ.get('SPLIT_MIN_SECONDS', 900))
+SPLIT_CHUNK_SECONDS = int(os.environ.get('SPLIT_CHUNK_SECONDS', 600))
+SPLIT_SEARCH_SECONDS = int(os.environ.get('SPLIT_SEARCH_SECONDS', 30))
+SPLIT_OVERLAP_SECONDS = int(os.environ.get('SPLIT_OVERLAP_SECONDS', 4))
+SPLIT_MAX_WORKERS = int(os.environ.get('SPLIT_MAX_WORKERS', 6))
+SPLIT_CHUNK_ATTEMPTS = int(os.environ.get('SPLIT_CHUNK_ATTEMPTS', 3))  # at least 1
+SPLIT_CHUNK_RETRY_BACKOFF = float(os.environ.get('SPLIT_CHUNK_RETRY_BACKOFF', 1))  # seconds, doubled per retry
+# PCM WAV is downmixed to mono and resampled to at most this rate before transcription (0 = send as uploaded)
+AUDIO_TARGET_RATE = int(os.environ.get('AUDIO_TARGET_RATE', 16000))
+# Trim leading/trailing audio quieter than AUDIO_SILENCE_DB dBFS, keeping AUDIO_TRIM_PADDING seconds (1 = on)
+AUDIO_TRIM_SILENCE = int(os.environ.get('AUDIO_TRIM_SILENCE', 0))
+AUDIO_SILENCE_DB = float(os.environ.get('AUDIO_SILENCE_DB', -45))
+AUDIO_TRIM_PADDING = float(os.environ.get('AUDIO_TRIM_PADDING', 0.25))  # seconds
+# manage.py ingest_recordings: where the resumable per-source journals are kept
+INGEST_JOURNAL_DIR = os.environ.get('INGEST_JOURNAL_DIR', str(BASE_DIR / 'ingest'))
+INGEST_RETRY_BACKOFF = float(os.environ.get('INGEST_RETRY_BACKOFF', 2))  # seconds, doubled per retry
+
+# Trello card dispatcher (manage.py run_trello_dispatcher)
+TRELLO_API_URL = os.environ.get('TRELLO_API_URL', 'https://api.trello.com/1')
+TRELLO_RATE_PER_SECOND = float(os.environ.get('TRELLO_RATE_PER_SECOND', 10))  # Trello allows 100 req / 10 s per token
+TRELLO_BURST = int(os.environ.get('TRELLO_BURST', 10))
+TRELLO_TIMEOUT = float(os.environ.get('TRELLO_TIMEOUT', 10))  # seconds
+TRELLO_POOL_SIZE = int(os.environ.get('TRELLO_POOL_SIZE', 10))
+TRELLO_MAX_ATTEMPTS = int(os.environ.get('TRELLO_MAX_ATTEMPTS', 5))
+TRELLO_LEASE_SECONDS = int(os.environ.get('TRELLO_LEASE_SECONDS', 60))  # claim on rows being sent, renewed while they are
+
+# ask-gpt: language model ('speech.llm.EchoLLM' answers offline) and transcript retrieval
+ASK_LLM_BACKEND = os.environ.get('ASK_LLM_BACKEND', 'speech.llm.OpenAIChatLLM')
+ASK_LLM_MODEL = os.environ.get('ASK_LLM_MODEL', 'gpt-4o-mini')
+ASK_LLM_TEMPERATURE = float(os.environ.get('ASK_LLM_TEMPERATURE', 0.7))
+ASK_LLM_MAX_TOKENS = int(os.environ.get('ASK_LLM_MAX_TOKENS', 512))  # per streamed answer
+ASK_LLM_CACHE_SIZE = int(os.environ.get('ASK_LLM_CACHE_SIZE', 1000))  # answers kept per process, 0 = no cache
+ASK_LLM_CACHE_TTL = int(os.environ.get('ASK_LLM_CACHE_TTL', 3600))  # seconds, 0 = never expire
+ASK_LLM_CACHE_SIMILARITY = float(os.environ.get('ASK_LLM_CACHE_SIMILARITY', 0.9))  # Jaccard, 1 = exact only
+RETRIEVAL_INDEX_DIR = os.environ.get('RETRIEVAL_INDEX_DIR', str(BASE_DIR / 'cache' / 'retrieval'))
+RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', 8))
+RETRIEVAL_CHUNK_WORDS = int(os.environ.get('RETRIEVAL_CHUNK_WORDS', 120))  # longer turns are split
+RETRIEVAL_HASH_BITS = int(os.environ.get('RETRIEVAL_HASH_BITS', 20))  # term hash buckets = 2 ** bits
+RETRIEVAL_MAX_SEGMENTS = int(os.environ.get('RETRIEVAL_MAX_SEGMENTS', 8))  # merged into one above this
+RETRIEVAL_CACHED_INDEXES = int(os.environ.get('RETRIEVAL_CACHED_INDEXES', 32))  # per process
+
+# Live transcription WebSocket (ws://.../api/live/, served by myproject/asgi.py)
+LIVE_MAX_CONNECTIONS = int(os.environ.get('LIVE_MAX_CONNECTIONS', 100))  # per process
+LIVE_MAX_FRAME_BYTES = int(os.environ.get('LIVE_MAX_FRAME_BYTES', 64 * 1024))
+LIVE_MAX_BUFFER_BYTES = int(os.environ.get('LIVE_MAX_BUFFER_BYTES', 1024 * 1024))  # audio waiting for the backend
+LIVE_MAX_PENDING_EVENTS = int(os.environ.get('LIVE_MAX_PENDING_EVENTS', 64))  # results waiting for the client
+LIVE_PERSIST_BATCH = int(os.environ.get('LIVE_PERSIST_BATCH', 50))  # final segments per bulk insert
+LIVE_PERSIST_INTERVAL = float(os.environ.get('LIVE_PERSIST_INTERVAL', 2.0))  # seconds
 
 
 # Password validation
@@ -18,6 +18,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.http import HttpResponse
 
+from speech.views import metrics
+
 # Create a simple homepage view
 def home(request):
     return HttpResponse("Django API is running!")
@@ -25,5 +27,6 @@ def home(request):
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("speech.urls")),  # Your API
+    path("metrics", metrics),  # Prometheus scrape target
     path("", home),  # Add this line for homepage
 ]
\ No newline at end of file
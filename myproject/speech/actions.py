@@ -0,0 +1,98 @@
+"""
+Action items of stored meetings.
+
+Uses the meeting's word store when it has one (sentence boundaries from
+punctuation, speaker changes and pauses; exact timestamps) and falls back to
+the ``MeetingTranscription`` turns otherwise. Keywords are per user
+(``CustomUser.action_keywords``, matched to ``Meeting.userid``), falling
+back to ``settings.ACTION_KEYWORDS`` and then the built-in list. For a batch
+of meetings the keyword sets are loaded in one query and each distinct set
+is compiled once.
+"""
+from django.conf import settings
+
+from speech.models import CustomUser, Meeting, MeetingTranscription
+from speech.trello import enqueue_cards
+from speech.utils.action_items import (
+    DEFAULT_ACTION_KEYWORDS, extract_from_text, extract_from_words, get_matcher,
+)
+from speech.wordstore import open_words
+
+
+def default_keywords():
+    return settings.ACTION_KEYWORDS or DEFAULT_ACTION_KEYWORDS
+
+
+def user_keywords(user_ids):
+    """Map each user id to its keyword list (users without one get the defaults)."""
+    keywords = dict.fromkeys(user_ids, default_keywords())
+    for user_id, words in CustomUser.objects.filter(id__in=keywords).values_list('id', 'action_keywords'):
+        if words:
+            keywords[user_id] = words
+    return keywords
+
+
+def meeting_action_items(meeting, keywords=None):
+    """``ActionItem``s of one meeting, in transcript order."""
+    if keywords is None:
+        keywords = user_keywords([meeting.userid])[meeting.userid]
+    matcher = get_matcher(keywords)
+    words = open_words(meeting)
+    if words is not None:
+        return extract_from_words(words, matcher, settings.ACTION_SENTENCE_GAP_MS)
+
+    items = []
+    turns = MeetingTranscription.objects.filter(meeting=meeting).order_by('seq') \
+        .values_list('seq', 'speaker', 'start_ms', 'text')
+    for seq, speaker, start_ms, text in turns.iterator(chunk_size=settings.TRANSCRIPT_BATCH_SIZE):
+        items.extend(extract_from_text(text, matcher, speaker, start_ms, seq))
+    return items
+
+
+def iter_action_items(meetings):
+    """Yield ``(meeting, items)`` for every meeting in a queryset or list."""
+    meetings = list(meetings)
+    keywords = user_keywords({meeting.userid for meeting in meetings})
+    for meeting in meetings:
+        yield meeting, meeting_action_items(meeting, keywords[meeting.userid])
+
+
+def action_items_for(user_id=None, since=None, until=None, meeting_ids=None):
+    """Meetings to extract in batch, filtered like the search API."""
+    meetings = Meeting.objects.order_by('id')
+    if user_id is not None:
+        meetings = meetings.filter(userid=user_id)
+    if since is not None:
+        meetings = meetings.filter(createdat__date__gte=since)
+    if until is not None:
+        meetings = meetings.filter(createdat__date__lte=until)
+    if meeting_ids:
+        meetings = meetings.filter(id__in=meeting_ids)
+    return iter_action_items(meetings)
+
+
+def enqueue_action_items(meeting, keywords=None):
+    """
+    Queue a meeting's action items for Trello under ``actions:meeting:<id>``,
+    so the dispatcher sends them as one checklist card. Returns the outbox rows.
+    """
+    cards = [(item.sentence, card_description(item)) for item in meeting_action_items(meeting, keywords)]
+    return enqueue_cards(cards, group_key=f"actions:meeting:{meeting.id}")
+
+
+def card_description(item):
+    """``Speaker 1 at 2:05``, or just ``Speaker 1`` for an item from a turn without timings."""
+    if item.start_ms is None:
+        return f"Speaker {item.speaker}"
+    return f"Speaker {item.speaker} at {item.start_ms // 60000}:{item.start_ms // 1000 % 60:02d}"
+
+
+def item_dict(item):
+    return {
+        "sentence": item.sentence,
+        "speaker": item.speaker,
+        "start_ms": item.start_ms,
+        "end_ms": item.end_ms,
+        "keywords": list(item.keywords),
+        "seq": item.turn,
+    }
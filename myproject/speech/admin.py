@@ -1,8 +1,10 @@
 from django.contrib import admin
 # Register your models here.
-from .models import Meeting, MeetingTranscription, CustomUser
+from .models import Meeting, MeetingTranscription, CustomUser, TranscriptionJob, TrelloOutbox
 
 admin.site.register(Meeting)
 admin.site.register(MeetingTranscription)
 admin.site.register(CustomUser)
+admin.site.register(TranscriptionJob)
 
+admin.site.register(TrelloOutbox)
@@ -0,0 +1,198 @@
+"""
+Per-speaker meeting analytics: talk time, turns, words, words per minute,
+longest turn and interruptions.
+
+They are computed once, when a meeting's words are stored
+(``pipeline.persist_words`` and the live session's close), and kept as one
+``MeetingStats`` row per speaker. Reports across many meetings
+(``aggregate_stats``) then sum those rows in the database and never read a
+transcript. ``manage.py compute_meeting_stats`` fills them in for meetings
+stored before this existed.
+
+The computation is vectorised over the word store columns
+(``speech.wordstore``): a turn is a run of words with the same speaker and
+turn number, its length runs from its first word's start to the latest
+end among its words. A turn interrupts the previous one when the speaker
+changes and it starts before the previous turn ended, or within
+``settings.INTERRUPTION_GAP_MS`` of it while that turn's last word does not
+end a sentence. Meetings without a word store use their
+``MeetingTranscription`` rows as the turns instead.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DateField, F, Max, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from speech.models import Meeting, MeetingStats, MeetingTranscription
+from speech.wordstore import open_words
+
+SENTENCE_END = np.frombuffer(b'.?!', dtype=np.uint8)
+
+FIELDS = ('talk_ms', 'turns', 'words', 'longest_turn_ms', 'interruptions', 'interrupted')
+
+# ?group= of the aggregate API: output key and the expression rows are grouped on
+GROUPS = {
+    'speaker': ('speaker', F('speaker')),
+    'meeting': ('meeting_id', F('meeting_id')),
+    'day': ('period', TruncDay('meeting__createdat', output_field=DateField())),
+    'week': ('period', TruncWeek('meeting__createdat', output_field=DateField())),
+    'month': ('period', TruncMonth('meeting__createdat', output_field=DateField())),
+}
+
+
+def speaker_stats(start_ms, end_ms, speaker, turn, sentence_end, word_counts=None, gap_ms=None):
+    """
+    Per-speaker stats of a meeting from parallel per-word arrays in time
+    order (``sentence_end``: the word ends a sentence). ``word_counts``
+    weighs each entry when the entries are whole turns rather than words.
+    Returns ``{speaker: {field: value}}`` for every speaker with words.
+    """
+    n = len(start_ms)
+    if not n:
+        return {}
+    gap_ms = settings.INTERRUPTION_GAP_MS if gap_ms is None else gap_ms
+    start_ms = np.asarray(start_ms, dtype=np.int64)
+    end_ms = np.asarray(end_ms, dtype=np.int64)
+    speaker = np.asarray(speaker, dtype=np.int64)
+    turn = np.asarray(turn, dtype=np.int64)
+
+    change = np.flatnonzero((np.diff(speaker) != 0) | (np.diff(turn) != 0)) + 1
+    first = np.concatenate(([0], change))
+    last = np.concatenate((change - 1, [n - 1]))
+    who = speaker[first]
+    turn_start = start_ms[first]
+    turn_end = np.maximum.reduceat(end_ms, first)
+    length = np.maximum(turn_end - turn_start, 0)
+
+    size = int(speaker.max()) + 1
+    longest = np.zeros(size, dtype=np.int64)
+    np.maximum.at(longest, who, length)
+    words = np.bincount(speaker, weights=word_counts, minlength=size)
+
+    # Turn i + 1 against turn i.
+    gap = turn_start[1:] - turn_end[:-1]
+    cut = (who[1:] != who[:-1]) & ((gap < 0) | ((gap <= gap_ms) & ~np.asarray(sentence_end)[last[:-1]]))
+
+    columns = {
+        'talk_ms': np.bincount(who, weights=length, minlength=size),
+        'turns': np.bincount(who, minlength=size),
+        'words': words,
+        'longest_turn_ms': longest,
+        'interruptions': np.bincount(who[1:][cut], minlength=size),
+        'interrupted': np.bincount(who[:-1][cut], minlength=size),
+    }
+    return {
+        int(s): {name: int(round(values[s])) for name, values in columns.items()}
+        for s in np.flatnonzero(np.bincount(who, minlength=size))
+    }
+
+
+def sentence_ends(text, text_offsets):
+    """Whether each word of a word store's text column ends in ``.``, ``?`` or ``!``."""
+    ends = np.asarray(text_offsets[1:], dtype=np.int64)
+    nonempty = ends > np.asarray(text_offsets[:-1], dtype=np.int64)
+    last = np.asarray(text)[np.maximum(ends - 1, 0)] if len(text) else np.zeros(len(ends), dtype=np.uint8)
+    return nonempty & np.isin(last, SENTENCE_END)
+
+
+def word_stats(columns, gap_ms=None):
+    """``speaker_stats`` of a word store's columns."""
+    return speaker_stats(
+        columns['start_ms'], columns['end_ms'], columns['speaker'], columns['turn'],
+        sentence_ends(columns['text'], columns['text_offsets']), gap_ms=gap_ms,
+    )
+
+
+def turn_stats(meeting, gap_ms=None):
+    """``speaker_stats`` of a meeting's ``MeetingTranscription`` turns (no word timings)."""
+    rows = MeetingTranscription.objects.filter(meeting=meeting).order_by('seq') \
+        .values_list('seq', 'speaker', 'start_ms', 'end_ms', 'text')
+    seq, speaker, start_ms, end_ms, counts, ends = [], [], [], [], [], []
+    for row_seq, row_speaker, row_start, row_end, text in rows.iterator(chunk_size=settings.TRANSCRIPT_BATCH_SIZE):
+        text = text.rstrip()
+        seq.append(row_seq)
+        speaker.append(row_speaker)
+        start_ms.append(row_start or 0)
+        end_ms.append(row_end or row_start or 0)
+        counts.append(len(text.split()))
+        ends.append(text[-1:] in ('.', '?', '!'))
+    return speaker_stats(start_ms, end_ms, speaker, seq, np.array(ends, dtype=bool),
+                         np.array(counts, dtype=np.float64), gap_ms)
+
+
+def meeting_stats(meeting, gap_ms=None):
+    """Compute (without saving) the per-speaker stats of a stored meeting."""
+    words = open_words(meeting)
+    if words is not None:
+        return word_stats(words.columns(), gap_ms)
+    return turn_stats(meeting, gap_ms)
+
+
+def update_meeting_stats(meeting, gap_ms=None):
+    """Recompute and replace a meeting's ``MeetingStats`` rows. Returns them."""
+    rows = [MeetingStats(meeting=meeting, speaker=speaker, **values)
+            for speaker, values in meeting_stats(meeting, gap_ms).items()]
+    with transaction.atomic():
+        MeetingStats.objects.filter(meeting=meeting).delete()
+        MeetingStats.objects.bulk_create(rows)
+    return rows
+
+
+def stats_meetings(user_id=None, since=None, until=None, meeting_ids=None):
+    """Meetings in a user's date range (``until`` inclusive), as ``action_items_for`` selects them."""
+    meetings = Meeting.objects.order_by('id')
+    if user_id is not None:
+        meetings = meetings.filter(userid=user_id)
+    if since is not None:
+        meetings = meetings.filter(createdat__date__gte=since)
+    if until is not None:
+        meetings = meetings.filter(createdat__date__lte=until)
+    if meeting_ids:
+        meetings = meetings.filter(id__in=meeting_ids)
+    return meetings
+
+
+def rates(row):
+    """Add the derived fields to a dict of summed stats: words per minute and mean turn length."""
+    talk_ms = row.get('talk_ms') or 0
+    row['wpm'] = round(row['words'] * 60000 / talk_ms, 1) if talk_ms else None
+    row['mean_turn_ms'] = talk_ms // row['turns'] if row.get('turns') else None
+    return row
+
+
+def stats_dict(stats, total_talk_ms=None):
+    """One ``MeetingStats`` row as returned by the API."""
+    row = rates({"speaker": stats.speaker, **{name: getattr(stats, name) for name in FIELDS}})
+    if total_talk_ms is not None:
+        row["talk_share"] = round(stats.talk_ms / total_talk_ms, 4) if total_talk_ms else None
+    return row
+
+
+def aggregate_stats(user_id=None, since=None, until=None, meeting_ids=None, group=None):
+    """
+    Sum the ``MeetingStats`` of the selected meetings: overall totals and,
+    with ``group``, one row per ``speaker``, ``meeting``, ``day``, ``week``
+    or ``month`` (of the meeting date). Speaker numbers are per meeting
+    diarization labels, so grouping by speaker across meetings only means
+    something when the recordings label speakers consistently.
+    """
+    stats = MeetingStats.objects.filter(meeting__in=stats_meetings(user_id, since, until, meeting_ids).values('id'))
+    sums = {name: Sum(name) for name in FIELDS if name != 'longest_turn_ms'}
+    sums['longest_turn_ms'] = Max('longest_turn_ms')
+    sums['meetings'] = Count('meeting', distinct=True)
+
+    totals = stats.aggregate(**sums)
+    totals = rates({name: value or 0 for name, value in totals.items()})
+    result = {"totals": totals}
+    if group is not None:
+        key, expression = GROUPS[group]
+        rows = stats.annotate(key=expression).order_by('key').values('key').annotate(**sums)
+        result["groups"] = []
+        for row in rows:
+            row[key] = row.pop('key')
+            if hasattr(row[key], 'isoformat'):
+                row[key] = row[key].isoformat()
+            row["talk_share"] = round(row['talk_ms'] / totals['talk_ms'], 4) if totals['talk_ms'] else None
+            result["groups"].append(rates(row))
+    return result
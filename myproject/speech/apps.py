@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, post_save
 
 
 class SpeechConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'speech'
+
+    def ready(self):
+        from speech.models import MeetingTranscription
+        from speech.pipeline import transcript_row_saved
+        from speech.search import ensure_sqlite_triggers
+
+        post_migrate.connect(ensure_sqlite_triggers, sender=self)
+        # Only saves: a post_delete receiver would stop Meeting deletes from fast-deleting their turns.
+        post_save.connect(transcript_row_saved, sender=MeetingTranscription)
@@ -0,0 +1,434 @@
+"""
+Transcription backends.
+
+The pipeline never talks to Deepgram directly; it asks ``get_backend()`` for
+the backend named by ``settings.TRANSCRIPTION_BACKEND`` (built once per
+process and reused by every job) and calls it through the
+``TranscriptionBackend`` protocol. Every backend returns Deepgram-shaped
+response dicts; use ``response_words`` / ``response_transcript`` to read them.
+
+Backends that support live transcription also implement ``open_stream``,
+which returns a session with ``send(bytes)``, ``finish()`` and an async
+``messages()`` iterator of Deepgram-shaped live results (``is_final`` plus
+``channel.alternatives[0].words``). Results wait in a ``ResultQueue`` of at
+most ``LIVE_MAX_PENDING_EVENTS``, with the same policy as the events waiting
+for the client: interim results are dropped first, final results never are,
+and ``send`` waits for room, so a consumer that falls behind holds back the
+audio instead of the queue growing.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Protocol, runtime_checkable
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from deepgram import Deepgram
+from django.conf import settings
+from django.utils.module_loading import import_string
+from dotenv import load_dotenv
+
+from speech.utils.audio import is_pcm_wav, wav_duration, window_rms
+
+load_dotenv()
+
+#Deepgram API Key
+DEEPGRAM_API_KEY = os.environ.get('DEEPGRAM_API_KEY')
+
+
+def response_alternative(res):
+    return res.get("results", {}).get("channels", [{}])[0].get("alternatives", [{}])[0]
+
+
+def response_words(res):
+    return response_alternative(res).get("words", [])
+
+
+def response_transcript(res, default="No transcription available"):
+    return response_alternative(res).get("transcript", default)
+
+
+def make_response(words):
+    """Build a minimal Deepgram-shaped response around a list of word structs."""
+    transcript = " ".join(w.get("punctuated_word") or w["word"] for w in words)
+    return {"results": {"channels": [{"alternatives": [{"transcript": transcript, "words": words}]}]}}
+
+
+@runtime_checkable
+class TranscriptionBackend(Protocol):
+    def transcribe(self, file_path, mimetype, options):
+        """Transcribe one file and return a Deepgram-shaped response."""
+
+    async def transcribe_async(self, file_path, mimetype, options):
+        """Async variant of ``transcribe``."""
+
+    def transcribe_batch(self, items, options):
+        """Transcribe ``(file_path, mimetype)`` pairs; returns responses in order."""
+
+    async def atranscribe_batch(self, items, options):
+        """Async variant of ``transcribe_batch``."""
+
+    async def open_stream(self, options):
+        """Open a live transcription session."""
+
+
+class BaseBackend:
+    """
+    Defaults for the async and batch calls in terms of ``transcribe``:
+    async runs it in a thread, batch fans out on a bounded thread pool and
+    the async batch runs that pool from a thread.
+    """
+    batch_workers = 4
+
+    def transcribe(self, file_path, mimetype, options):
+        raise NotImplementedError
+
+    async def transcribe_async(self, file_path, mimetype, options):
+        return await asyncio.to_thread(self.transcribe, file_path, mimetype, options)
+
+    def transcribe_batch(self, items, options):
+        with ThreadPoolExecutor(max_workers=self.batch_workers) as pool:
+            return list(pool.map(lambda item: self.transcribe(item[0], item[1], options), items))
+
+    async def atranscribe_batch(self, items, options):
+        return await asyncio.to_thread(self.transcribe_batch, items, options)
+
+    async def open_stream(self, options):
+        raise NotImplementedError(f"{type(self).__name__} does not support live transcription")
+
+
+def live_message(words, is_final, start=0.0, duration=0.0):
+    """Build a minimal Deepgram-shaped live result around a list of word structs."""
+    transcript = " ".join(w.get("punctuated_word") or w["word"] for w in words)
+    return {
+        "is_final": is_final,
+        "start": start,
+        "duration": duration,
+        "channel": {"alternatives": [{"transcript": transcript, "words": words}]},
+    }
+
+
+class ResultQueue:
+    """
+    Live results waiting for ``messages()``. ``put_nowait`` (safe to call from
+    a callback) keeps at most ``maxsize``: when full, a new interim result is
+    dropped and a final one replaces the oldest queued interim. Finals only
+    pile up past ``maxsize`` from audio already sent, because ``wait_for_room``
+    holds back the next frame until the consumer catches up.
+    """
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or settings.LIVE_MAX_PENDING_EVENTS
+        self.items = deque()
+        self.dropped_interim = 0
+        self.readable = asyncio.Event()
+        self.room = asyncio.Event()
+        self.room.set()
+
+    def __len__(self):
+        return len(self.items)
+
+    def put_nowait(self, message):
+        """Queue a result, or None to end ``messages()``."""
+        if message is not None and len(self.items) >= self.maxsize:
+            if not message.get("is_final"):
+                self.dropped_interim += 1
+                return
+            for i, queued in enumerate(self.items):
+                if queued is not None and not queued.get("is_final"):
+                    del self.items[i]
+                    self.dropped_interim += 1
+                    break
+        self.items.append(message)
+        self._changed()
+
+    async def get(self):
+        while not self.items:
+            await self.readable.wait()
+        message = self.items.popleft()
+        self._changed()
+        return message
+
+    async def wait_for_room(self):
+        while len(self.items) >= self.maxsize:
+            await self.room.wait()
+
+    def _changed(self):
+        for event, on in ((self.readable, bool(self.items)), (self.room, len(self.items) < self.maxsize)):
+            if on:
+                event.set()
+            else:
+                event.clear()
+
+    async def messages(self):
+        while True:
+            message = await self.get()
+            if message is None:
+                return
+            yield message
+
+
+class DeepgramLiveStream:
+    """Adapts the SDK's callback-based live socket to ``messages()``."""
+    def __init__(self, socket):
+        self.socket = socket
+        self.queue = ResultQueue()
+        socket.register_handler(socket.event.TRANSCRIPT_RECEIVED, self._received)
+        socket.register_handler(socket.event.CLOSE, lambda _: self.queue.put_nowait(None))
+
+    @property
+    def dropped_interim(self):
+        return self.queue.dropped_interim
+
+    def _received(self, message):
+        # Metadata and other non-transcript frames arrive on the same handler.
+        if isinstance(message, dict) and "channel" in message:
+            self.queue.put_nowait(message)
+
+    async def send(self, data):
+        await self.queue.wait_for_room()
+        self.socket.send(data)
+
+    async def finish(self):
+        await self.socket.finish()
+
+    def messages(self):
+        return self.queue.messages()
+
+
+class LocalLiveStream:
+    """
+    Offline live session: an interim result every ``interim_seconds`` of
+    audio received and a final one every ``final_seconds``, with words drawn
+    from a seed per utterance and the speaker rotating between finals.
+    """
+    interim_seconds = 0.5
+    final_seconds = 2.0
+
+    def __init__(self, options, speakers=3, seed=0):
+        channels = int(options.get("channels", 1))
+        self.bytes_per_second = int(options.get("sample_rate", 16000)) * 2 * channels
+        self.speakers = speakers
+        self.seed = seed
+        self.queue = ResultQueue()
+        self.received = 0
+        self.final_at = 0.0  # seconds of audio covered by final results
+        self.interim_at = 0.0
+        self.utterance = 0
+        self.speaker = 0
+
+    def _words(self, start, end):
+        rng = np.random.default_rng((self.seed, self.utterance))
+        count = max(1, int((end - start) * 2.5))
+        step = (end - start) / count
+        return [{
+            "word": word,
+            "punctuated_word": word,
+            "start": round(start + i * step, 3),
+            "end": round(start + (i + 0.8) * step, 3),
+            "confidence": round(float(rng.uniform(0.7, 1.0)), 3),
+            "speaker": self.speaker,
+        } for i, word in enumerate(LOCAL_VOCABULARY[int(j)] for j in rng.integers(len(LOCAL_VOCABULARY), size=count))]
+
+    def _emit(self, end, is_final):
+        words = self._words(self.final_at, end)
+        if is_final:
+            words[-1]["punctuated_word"] += "."
+        self.queue.put_nowait(live_message(words, is_final, self.final_at, end - self.final_at))
+        if is_final:
+            self.final_at = self.interim_at = end
+            self.utterance += 1
+            if self.speakers > 1:
+                self.speaker = (self.speaker + 1) % self.speakers
+
+    @property
+    def dropped_interim(self):
+        return self.queue.dropped_interim
+
+    async def send(self, data):
+        await self.queue.wait_for_room()
+        self.received += len(data)
+        heard = self.received / self.bytes_per_second
+        while heard - self.final_at >= self.final_seconds:
+            self._emit(self.final_at + self.final_seconds, True)
+        if heard - self.interim_at >= self.interim_seconds:
+            self.interim_at = heard
+            self._emit(heard, False)
+
+    async def finish(self):
+        heard = self.received / self.bytes_per_second
+        if heard > self.final_at:
+            self._emit(heard, True)
+        self.queue.put_nowait(None)
+
+    def messages(self):
+        return self.queue.messages()
+
+
+class DeepgramBackend(BaseBackend):
+    def __init__(self, api_key=None):
+        self.client = Deepgram(api_key or DEEPGRAM_API_KEY)
+
+    def transcribe(self, file_path, mimetype, options):
+        with open(file_path, "rb") as f:
+            source = {"buffer": f, "mimetype": 'audio/' + mimetype}
+            return self.client.transcription.sync_prerecorded(source, options)
+
+    async def transcribe_async(self, file_path, mimetype, options):
+        with open(file_path, "rb") as f:
+            source = {"buffer": f, "mimetype": 'audio/' + mimetype}
+            return await self.client.transcription.prerecorded(source, options)
+
+    async def open_stream(self, options):
+        return DeepgramLiveStream(await self.client.transcription.live(options))
+
+    async def atranscribe_batch(self, items, options):
+        return await asyncio.gather(*(self.transcribe_async(path, mimetype, options) for path, mimetype in items))
+
+    def transcribe_batch(self, items, options):
+        # async_to_sync rather than asyncio.run: called under sync_to_async it
+        # runs the batch on the caller's loop instead of failing or starting a
+        # second one. Code already on a loop awaits ``atranscribe_batch``.
+        return async_to_sync(self.atranscribe_batch)(items, options)
+
+
+class FakeBackend(BaseBackend):
+    """
+    Returns a canned Deepgram-shaped response without touching the network.
+    Set ``fail_times`` to make the first N calls raise, to exercise retries.
+    """
+    def __init__(self, words=None, delay=0, fail_times=0):
+        self.words = words if words is not None else [
+            {"word": "hello", "punctuated_word": "Hello.", "start": 0.0, "end": 0.4, "confidence": 0.99, "speaker": 0},
+            {"word": "hi", "punctuated_word": "Hi.", "start": 0.6, "end": 0.9, "confidence": 0.98, "speaker": 1},
+        ]
+        self.delay = delay
+        self.fail_times = fail_times
+        self.calls = 0
+
+    def transcribe(self, file_path, mimetype, options):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise RuntimeError("FakeBackend: simulated failure")
+        if self.delay:
+            time.sleep(self.delay)
+        return make_response(self.words)
+
+
+LOCAL_VOCABULARY = (
+    "we should send the report to the client before the deadline and call "
+    "about the budget then schedule a meeting to review the design and the "
+    "numbers for next quarter i will email the team an update today"
+).split()
+
+
+class LocalBackend(BaseBackend):
+    """
+    Deterministic offline stand-in for Deepgram, for load tests and benchmarks.
+
+    If ``<file>.json`` exists next to the audio it is returned as the fixture
+    response. Otherwise PCM WAV input is split into voiced stretches by
+    energy, each stretch becomes a speaker turn of ~2.5 words per second
+    with real timestamps, and the words and speakers are drawn from a seed
+    derived from the audio bytes. Other formats get a word stream sized from
+    the file length. Each call sleeps ``latency + realtime_factor * duration``.
+    """
+    def __init__(self, latency=None, realtime_factor=None, speakers=3):
+        self.latency = settings.LOCAL_BACKEND_LATENCY if latency is None else latency
+        self.realtime_factor = settings.LOCAL_BACKEND_REALTIME_FACTOR if realtime_factor is None else realtime_factor
+        self.speakers = speakers
+
+    def _seed(self, file_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            digest.update(f.read(1024 * 1024))
+        digest.update(str(os.path.getsize(file_path)).encode())
+        return int.from_bytes(digest.digest()[:8], 'little')
+
+    def _voiced_spans(self, file_path, window=0.02):
+        rms = window_rms(file_path, window)
+        if not len(rms):
+            return []
+        voiced = rms > max(1e-3, float(np.median(rms)) * 0.5)
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], voiced.astype(np.int8), [0]])))
+        return [(start * window, end * window) for start, end in zip(edges[::2], edges[1::2]) if end - start >= 5]
+
+    def words_for(self, file_path):
+        rng = np.random.default_rng(self._seed(file_path))
+        if is_pcm_wav(file_path):
+            duration = wav_duration(file_path)
+            spans = self._voiced_spans(file_path)
+        else:
+            duration = os.path.getsize(file_path) / 16000  # ~128 kbps
+            spans = [(0.0, duration)]
+
+        words = []
+        speaker = 0
+        for start, end in spans:
+            count = max(1, int((end - start) * 2.5))
+            step = (end - start) / count
+            for i in range(count):
+                word = LOCAL_VOCABULARY[int(rng.integers(len(LOCAL_VOCABULARY)))]
+                last = i == count - 1
+                words.append({
+                    "word": word,
+                    "punctuated_word": word + ("." if last else ""),
+                    "start": round(start + i * step, 3),
+                    "end": round(start + (i + 0.8) * step, 3),
+                    "confidence": round(float(rng.uniform(0.7, 1.0)), 3),
+                    "speaker": speaker,
+                })
+            if self.speakers > 1:
+                speaker = (speaker + int(rng.integers(1, self.speakers))) % self.speakers
+        return words, duration
+
+    def _fixture(self, file_path):
+        fixture = file_path + '.json'
+        if os.path.exists(fixture):
+            with open(fixture) as f:
+                return json.load(f)
+        return None
+
+    def _delay(self, duration):
+        return self.latency + self.realtime_factor * duration
+
+    def transcribe(self, file_path, mimetype, options):
+        fixture = self._fixture(file_path)
+        if fixture is not None:
+            time.sleep(self.latency)
+            return fixture
+        words, duration = self.words_for(file_path)
+        time.sleep(self._delay(duration))
+        return make_response(words)
+
+    async def transcribe_async(self, file_path, mimetype, options):
+        fixture = self._fixture(file_path)
+        if fixture is not None:
+            await asyncio.sleep(self.latency)
+            return fixture
+        words, duration = await asyncio.to_thread(self.words_for, file_path)
+        await asyncio.sleep(self._delay(duration))
+        return make_response(words)
+
+    async def open_stream(self, options):
+        return LocalLiveStream(options, speakers=self.speakers)
+
+
+_backend = None
+
+
+def get_backend():
+    """Return the configured backend, built once per process."""
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.TRANSCRIPTION_BACKEND)()
+    return _backend
+
+
+def set_backend(backend):
+    """Override the process backend (e.g. with a ``FakeBackend`` in tests)."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,310 @@
+"""
+Content-addressed cache of transcription responses.
+
+Entries are keyed by the content hash of the audio (``speech.utils.hashing``)
+combined with a canonical hash of the transcription ``options``, so
+re-uploading the same recording with the same options never reaches the
+transcription backend again. The
+storage backend is chosen with ``settings.TRANSCRIPTION_CACHE_BACKEND``
+(``FileSystemCache`` or ``DatabaseCache``; empty disables caching). Both evict
+expired entries and then least recently used ones until the total size fits
+``TRANSCRIPTION_CACHE_MAX_BYTES``. ``TRANSCRIPTION_CACHE_TTL`` is an idle
+timeout in both: an entry expires that long after it was last written or
+read, so entries that keep being hit stay.
+
+Eviction scans every entry, so a write does not run it each time: a
+process keeps the total the last scan found plus the bytes it has written
+since, and scans again once that passes the cap or
+``TRANSCRIPTION_CACHE_EVICT_INTERVAL`` seconds have gone by. Writes from
+other processes are only seen by the next scan.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from speech.metrics import registry, stage
+from speech.models import TranscriptionCacheEntry
+from speech.utils.streaming_json import open_response, save_response
+
+
+def options_hash(options):
+    canonical = json.dumps(options, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def cache_key(audio_hash, options):
+    return hashlib.sha256(f"{audio_hash}:{options_hash(options)}".encode('ascii')).hexdigest()
+
+
+class CacheStats:
+    """Per-process hit/miss/eviction counters."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def incr(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class BaseCache:
+    def __init__(self, ttl=None, max_bytes=None, evict_interval=None):
+        self.ttl = settings.TRANSCRIPTION_CACHE_TTL if ttl is None else ttl
+        self.max_bytes = settings.TRANSCRIPTION_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.evict_interval = settings.TRANSCRIPTION_CACHE_EVICT_INTERVAL if evict_interval is None else evict_interval
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._evicted_at = None
+        # Size the last eviction scan left, plus what this process has written since.
+        self._total_bytes = 0
+
+    def get(self, key):
+        with stage('deserialize'):
+            value = self._get(key)
+        self.stats.incr('hits' if value is not None else 'misses')
+        return value
+
+    def open(self, key):
+        """
+        The entry as an open text file for ``speech.utils.streaming_json``, so
+        a caller can stream its words instead of decoding it whole; None on a miss.
+        """
+        with stage('deserialize'):
+            f = self._open(key)
+        self.stats.incr('hits' if f is not None else 'misses')
+        return f
+
+    def set(self, key, value):
+        with stage('serialize') as s:
+            size = self._set(key, value) or 0
+            s.add_bytes(size)
+        with self._lock:
+            self._total_bytes += size
+            due = (self._evicted_at is None or time.monotonic() - self._evicted_at >= self.evict_interval
+                   or (self.max_bytes and self._total_bytes > self.max_bytes))
+            if due:
+                self._evicted_at = time.monotonic()
+        if due:
+            self.stats.incr('evictions', self.evict())
+
+    def contains(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def evict(self):
+        """Drop expired entries, then LRU entries over the size cap. Returns the count."""
+        removed, total = self._evict()
+        with self._lock:
+            self._total_bytes = total
+        return removed
+
+    def _evict(self):
+        """``evict``; returns the count removed and the total size left."""
+        raise NotImplementedError
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _open(self, key):
+        # Backends that cannot stream an entry serve the decoded value from memory.
+        value = self._get(key)
+        return None if value is None else io.StringIO(json.dumps(value))
+
+    def _set(self, key, value):
+        """Store ``value``; returns its size in bytes."""
+        raise NotImplementedError
+
+
+class FileSystemCache(BaseCache):
+    """
+    One gzip'd JSON file per entry under ``TRANSCRIPTION_CACHE_DIR``. A file's
+    mtime is refreshed on every hit and serves as its LRU timestamp. Several
+    workers may evict at once, so a file can vanish under any of them.
+    """
+    SUFFIX = '.json.gz'
+
+    def __init__(self, root=None, **kwargs):
+        super().__init__(**kwargs)
+        self.root = root or settings.TRANSCRIPTION_CACHE_DIR
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + self.SUFFIX)
+
+    def _expired(self, mtime, now):
+        return bool(self.ttl) and now - mtime > self.ttl
+
+    def contains(self, key):
+        try:
+            return not self._expired(os.stat(self._path(key)).st_mtime, time.time())
+        except FileNotFoundError:
+            return False
+
+    def _get(self, key):
+        f = self._open(key)
+        if f is None:
+            return None
+        try:
+            with f:
+                return json.load(f)
+        except (ValueError, OSError, EOFError):
+            return None
+
+    def _open(self, key):
+        path = self._path(key)
+        if not self.contains(key):
+            return None
+        try:
+            f = open_response(path)
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted since; the open file still reads
+        return f
+
+    def _set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp{self.SUFFIX}"
+        save_response(value, tmp_path)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    @staticmethod
+    def _remove(path):
+        """Remove an entry file; False if another process got there first."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _evict(self):
+        if not os.path.isdir(self.root):
+            return 0, 0
+        now = time.time()
+        removed = 0
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(self.SUFFIX) or '.tmp' in name:
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if self._expired(st.st_mtime, now):
+                    removed += self._remove(path)
+                else:
+                    entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if self.max_bytes and total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total -= size
+        return removed, total
+
+
+class DatabaseCache(BaseCache):
+    """Entries stored as ``TranscriptionCacheEntry`` rows; ``last_used_at`` is the LRU and TTL timestamp."""
+
+    def _live(self):
+        entries = TranscriptionCacheEntry.objects.all()
+        if self.ttl:
+            entries = entries.filter(last_used_at__gte=timezone.now() - timedelta(seconds=self.ttl))
+        return entries
+
+    def contains(self, key):
+        return self._live().filter(key=key).exists()
+
+    def _get(self, key):
+        entry = self._live().filter(key=key).only('response').first()
+        if entry is None:
+            return None
+        TranscriptionCacheEntry.objects.filter(key=key).update(last_used_at=timezone.now(), hits=F('hits') + 1)
+        return entry.response
+
+    def _set(self, key, value):
+        size = len(json.dumps(value, separators=(',', ':')))
+        TranscriptionCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={"response": value, "size": size, "createdat": timezone.now(), "last_used_at": timezone.now()},
+        )
+        return size
+
+    def delete(self, key):
+        TranscriptionCacheEntry.objects.filter(key=key).delete()
+
+    def _evict(self):
+        removed = 0
+        if self.ttl:
+            removed += TranscriptionCacheEntry.objects.filter(
+                last_used_at__lt=timezone.now() - timedelta(seconds=self.ttl),
+            ).delete()[0]
+        total = TranscriptionCacheEntry.objects.aggregate(total=Sum('size'))['total'] or 0
+        if self.max_bytes and total > self.max_bytes:
+            doomed = []
+            for pk, size in TranscriptionCacheEntry.objects.order_by('last_used_at').values_list('pk', 'size').iterator():
+                if total <= self.max_bytes:
+                    break
+                doomed.append(pk)
+                total -= size
+            removed += TranscriptionCacheEntry.objects.filter(pk__in=doomed).delete()[0]
+        return removed, total
+
+
+_cache = None
+
+
+def get_cache():
+    """Return the configured cache (built once per process), or None if disabled."""
+    global _cache
+    if _cache is None and settings.TRANSCRIPTION_CACHE_BACKEND:
+        _cache = import_string(settings.TRANSCRIPTION_CACHE_BACKEND)()
+    return _cache
+
+
+def set_cache(cache):
+    """Override the process cache (e.g. with a ``FileSystemCache`` on a temp dir)."""
+    global _cache
+    _cache = cache
+
+
+def _collect_stats():
+    stats = _cache.stats.as_dict() if _cache is not None else {}
+    for name in ('hits', 'misses', 'evictions'):
+        yield (f'speech_transcription_cache_{name}_total', 'counter',
+               f"Transcription cache {name} in this process.", stats.get(name))
+
+
+registry.add_collector(_collect_stats)
@@ -0,0 +1,206 @@
+"""
+Transcript exports: SRT, WebVTT, JSON, CSV and a plain-text table.
+
+Every format is a generator over the meeting's ``MeetingTranscription`` rows
+in ``seq`` order, read with a server-side iterator, so an export is written
+out as it is rendered and never held in memory whole. The table is sized
+from one aggregate query up front (text wraps at ``EXPORT_TABLE_WIDTH``)
+instead of by measuring every row first the way ``PrettyTable`` does.
+
+Rendered exports are cached as files under
+``EXPORT_CACHE_DIR/<meeting id>/<version>.<format>``, where the version is
+``Meeting.transcript_version``; every write to the transcript bumps it
+(``speech.pipeline.touch_transcript``), so a stale export is never served.
+The first request for a version renders and tees into a temporary file that
+replaces the cached one once complete; older versions are deleted then.
+"""
+import csv
+import json
+import os
+import textwrap
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import router
+from django.db.models import Max
+from django.db.models.functions import Length
+
+from speech.models import Meeting, MeetingTranscription
+
+Format = namedtuple('Format', 'content_type extension render')
+
+COLUMNS = ('seq', 'speaker', 'start_ms', 'end_ms', 'text')
+
+EXPORT_CHUNK_CHARS = 64 * 1024
+
+
+def transcript_version(meeting_id):
+    """
+    The meeting's ``transcript_version`` (None if there is no such meeting),
+    read from the same database as its rows so the two agree when reads go
+    to a replica.
+    """
+    meetings = Meeting.objects.using(router.db_for_read(MeetingTranscription))
+    return meetings.filter(id=meeting_id).values_list('transcript_version', flat=True).first()
+
+
+def iter_rows(meeting_id):
+    """``(seq, speaker, start_ms, end_ms, text)`` of every turn, in order."""
+    rows = MeetingTranscription.objects.filter(meeting_id=meeting_id).order_by('seq').values_list(*COLUMNS)
+    return rows.iterator(chunk_size=settings.TRANSCRIPT_BATCH_SIZE)
+
+
+def timestamp(ms, separator='.'):
+    """``HH:MM:SS.mmm`` (``separator`` is ``,`` for SRT)."""
+    ms = max(0, ms or 0)
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+def _cues(meeting_id):
+    """Rows with timing filled in: turns stored without it start where the previous one ended."""
+    last_end = 0
+    for seq, speaker, start_ms, end_ms, text in iter_rows(meeting_id):
+        start_ms = last_end if start_ms is None else start_ms
+        end_ms = max(start_ms, end_ms if end_ms is not None else start_ms)
+        last_end = end_ms
+        yield seq, speaker, start_ms, end_ms, text
+
+
+def render_srt(meeting_id):
+    for i, (_, speaker, start_ms, end_ms, text) in enumerate(_cues(meeting_id), 1):
+        yield (f"{i}\n{timestamp(start_ms, ',')} --> {timestamp(end_ms, ',')}\n"
+               f"Speaker {speaker}: {text}\n\n")
+
+
+def render_vtt(meeting_id):
+    yield "WEBVTT\n\n"
+    for seq, speaker, start_ms, end_ms, text in _cues(meeting_id):
+        # A cue can't contain a blank line or "-->"; turns are single-line already.
+        text = text.replace("-->", "->")
+        yield f"{seq}\n{timestamp(start_ms)} --> {timestamp(end_ms)}\n<v Speaker {speaker}>{text}\n\n"
+
+
+def render_json(meeting_id):
+    yield f'{{"meeting_id": {meeting_id}, "turns": ['
+    separator = ""
+    for row in iter_rows(meeting_id):
+        yield separator + json.dumps(dict(zip(COLUMNS, row)))
+        separator = ", "
+    yield "]}\n"
+
+
+class _Line:
+    """Write target for ``csv.writer`` that hands back the formatted line."""
+    def write(self, value):
+        return value
+
+
+def render_csv(meeting_id):
+    writer = csv.writer(_Line())
+    yield writer.writerow(COLUMNS)
+    for row in iter_rows(meeting_id):
+        yield writer.writerow(row)
+
+
+def render_table(meeting_id):
+    stats = MeetingTranscription.objects.filter(meeting_id=meeting_id).aggregate(
+        seq=Max('seq'), speaker=Max('speaker'), text=Max(Length('text')),
+    )
+    headers = ("Seq", "Speaker", "Start", "End", "Text")
+    widths = [
+        max(len(headers[0]), len(str(stats['seq'] or 0))),
+        max(len(headers[1]), len(str(stats['speaker'] or 0))),
+        len(timestamp(0)),
+        len(timestamp(0)),
+        max(len(headers[4]), min(stats['text'] or 0, settings.EXPORT_TABLE_WIDTH)),
+    ]
+    border = "+" + "+".join("-" * (w + 2) for w in widths) + "+\n"
+
+    def line(cells):
+        return "| " + " | ".join(cell.ljust(w) for cell, w in zip(cells, widths)) + " |\n"
+
+    yield border + line(headers) + border
+    for seq, speaker, start_ms, end_ms, text in iter_rows(meeting_id):
+        wrapped = textwrap.wrap(text, widths[4]) or [""]
+        start = timestamp(start_ms) if start_ms is not None else ""
+        end = timestamp(end_ms) if end_ms is not None else ""
+        yield line((str(seq), str(speaker), start, end, wrapped[0])) + "".join(
+            line(("", "", "", "", more)) for more in wrapped[1:]
+        )
+    yield border
+
+
+FORMATS = {
+    'srt': Format('application/x-subrip; charset=utf-8', 'srt', render_srt),
+    'vtt': Format('text/vtt; charset=utf-8', 'vtt', render_vtt),
+    'json': Format('application/json', 'json', render_json),
+    'csv': Format('text/csv; charset=utf-8', 'csv', render_csv),
+    'table': Format('text/plain; charset=utf-8', 'txt', render_table),
+}
+
+
+def export_path(meeting_id, fmt, version):
+    return os.path.join(settings.EXPORT_CACHE_DIR, str(meeting_id), f"{version}.{FORMATS[fmt].extension}")
+
+
+def cached_export(meeting_id, fmt, version):
+    """Path of the cached export for this version, or None."""
+    path = export_path(meeting_id, fmt, version)
+    return path if os.path.exists(path) else None
+
+
+def _prune(meeting_id, fmt, version):
+    """Delete the meeting's cached exports of ``fmt`` for other versions."""
+    directory = os.path.dirname(export_path(meeting_id, fmt, version))
+    suffix = "." + FORMATS[fmt].extension
+    for name in os.listdir(directory):
+        if name.endswith(suffix) and name != f"{version}{suffix}":
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def stream_export(meeting_id, fmt, version, current_version=None):
+    """
+    Yield the export as UTF-8 chunks while writing it to the cache.
+
+    ``current_version(meeting_id)`` is called once rendering is done; the
+    file is only kept if the transcript is still at ``version`` (it may have
+    changed while the rows were being read). A consumer that stops early
+    leaves nothing behind.
+    """
+    path = export_path(meeting_id, fmt, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    complete = False
+    try:
+        with open(tmp_path, 'wb') as f:
+            # Rows render to a few dozen bytes each; hand them on in larger pieces.
+            pending, size = [], 0
+            for chunk in FORMATS[fmt].render(meeting_id):
+                pending.append(chunk)
+                size += len(chunk)
+                if size >= EXPORT_CHUNK_CHARS:
+                    data = "".join(pending).encode('utf-8')
+                    pending, size = [], 0
+                    f.write(data)
+                    yield data
+            if pending:
+                data = "".join(pending).encode('utf-8')
+                f.write(data)
+                yield data
+        complete = current_version is None or current_version(meeting_id) == version
+        if complete:
+            os.replace(tmp_path, path)
+            _prune(meeting_id, fmt, version)
+    finally:
+        if not complete:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
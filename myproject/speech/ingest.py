@@ -0,0 +1,395 @@
+"""
+Bulk ingestion of recording archives (``manage.py ingest_recordings``).
+
+Recordings come from a directory tree (every file with an audio extension)
+or a manifest: a CSV with a ``path`` column and optional ``title``, ``user``
+and ``date`` columns, or a plain list of paths, one per line. Relative
+paths are resolved against the manifest's directory.
+
+A bounded thread pool hashes and transcribes files through the same path as
+the job workers (``speech.pipeline.transcribe_file``: transcription cache,
+normalisation, splitting). Only ``2 * workers`` files are in flight at a
+time, however large the archive. A file whose content hash was already
+ingested, in this run or an earlier one (``Meeting.audio_hash``), is
+recorded as a duplicate and not transcribed again. A copy of a file still
+being transcribed waits for it: if that fails, the copy is transcribed
+itself, and otherwise it is journaled only once the original's meeting
+has committed. Failed transcriptions are retried with exponential backoff
+(``INGEST_RETRY_BACKOFF``). Transcripts are
+persisted from the main thread in batches: one transaction per batch,
+with the meetings ``bulk_create``d together.
+
+Progress is checkpointed to an append-only JSON-lines journal after each
+batch commits. A restarted run skips every file the journal records as
+done or duplicate, provided its size and mtime are unchanged, and reuses
+the recorded hashes of the rest. Failed files are tried again. If the
+process dies between a commit and its journal write, the ``audio_hash``
+check still catches the meetings that were saved.
+"""
+import csv
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_date, parse_datetime
+
+from speech.actions import enqueue_action_items
+from speech.backends import response_transcript, response_words
+from speech.cache import cache_key
+from speech.models import Meeting
+from speech.pipeline import persist_words, transcribe_file, transcription_options
+from speech.trello import enqueue_card
+from speech.utils.audio import read_header
+from speech.utils.hashing import hash_file
+from speech.wordstore import word_store_dir
+
+AUDIO_EXTENSIONS = frozenset({
+    '.wav', '.mp3', '.m4a', '.mp4', '.aac', '.flac', '.ogg', '.opus', '.oga', '.webm', '.amr', '.aif', '.aiff',
+})
+
+Recording = namedtuple('Recording', 'path title userid recorded_at')
+
+# status: 'transcribed', 'duplicate' or 'failed'
+Result = namedtuple('Result', 'recording stat hash status response meeting_id error')
+
+DONE = frozenset({'done', 'duplicate'})
+
+
+def _parse_when(value):
+    if not value:
+        return None
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        when = day and datetime(day.year, day.month, day.day)
+    if when is not None and when.tzinfo is None:
+        when = when.replace(tzinfo=dt_timezone.utc)
+    return when
+
+
+def iter_directory(root, userid, extensions=AUDIO_EXTENSIONS):
+    """Recordings under ``root`` in path order, titled after their file names."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in extensions:
+                yield Recording(os.path.join(dirpath, name), os.path.splitext(name)[0], userid, None)
+
+
+def iter_manifest(path, userid):
+    """Recordings listed in a CSV manifest (with a ``path`` column) or a plain list of paths."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='', encoding='utf-8') as f:
+        first = f.readline()
+        f.seek(0)
+        if 'path' in next(csv.reader([first]), []):
+            rows = csv.DictReader(f)
+        else:
+            rows = ({"path": line.strip()} for line in f if line.strip() and not line.startswith('#'))
+        for row in rows:
+            file_path = os.path.join(base, row["path"])
+            yield Recording(
+                file_path,
+                row.get("title") or os.path.splitext(os.path.basename(file_path))[0],
+                int(row["user"]) if row.get("user") else userid,
+                _parse_when(row.get("date")),
+            )
+
+
+def iter_recordings(source, userid):
+    if os.path.isdir(source):
+        return iter_directory(source, userid)
+    return iter_manifest(source, userid)
+
+
+def journal_path(source):
+    """Default journal for a source: one file per absolute source path under ``INGEST_JOURNAL_DIR``."""
+    source = os.path.abspath(source).rstrip(os.sep)
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(settings.INGEST_JOURNAL_DIR, f"{os.path.basename(source) or 'root'}-{digest}.jsonl")
+
+
+class Journal:
+    """
+    Append-only JSON lines, one per finished file: path, size, mtime, hash,
+    status and meeting id. The last line for a path wins.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    self.entries[entry["path"]] = entry
+
+    def _entry(self, path, stat):
+        entry = self.entries.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry
+        return None
+
+    def finished(self, path, stat):
+        entry = self._entry(path, stat)
+        return entry is not None and entry["status"] in DONE
+
+    def known_hash(self, path, stat):
+        entry = self._entry(path, stat)
+        return entry.get("hash") if entry else None
+
+    def write(self, entries):
+        if not entries:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+                self.entries[entry["path"]] = entry
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class Progress:
+    """Counts for the run and the files/min rate and ETA derived from them."""
+    def __init__(self, total):
+        self.total = total
+        self.skipped = 0
+        self.ingested = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.start = time.monotonic()
+
+    @property
+    def processed(self):
+        return self.ingested + self.duplicates + self.failed
+
+    def rate(self):
+        elapsed = time.monotonic() - self.start
+        return self.processed / elapsed * 60 if elapsed else 0.0
+
+    def eta(self):
+        remaining = self.total - self.skipped - self.processed
+        rate = self.rate()
+        return timedelta(seconds=round(remaining / rate * 60)) if rate else None
+
+    def line(self):
+        eta = self.eta()
+        return (f"{self.skipped + self.processed}/{self.total} files: {self.ingested} ingested, "
+                f"{self.duplicates} duplicate, {self.failed} failed, {self.skipped} already done; "
+                f"{self.rate():.1f} files/min, ETA {eta if eta is not None else '?'}")
+
+
+class Ingest:
+    """
+    One ingestion run. ``report`` is called with the ``Progress`` every
+    ``report_every`` seconds and once at the end.
+    """
+    def __init__(self, journal, workers=4, batch_size=50, attempts=3, trello=False,
+                 report=None, report_every=10.0, retry_backoff=None):
+        self.journal = journal
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.attempts = max(1, attempts)
+        self.retry_backoff = settings.INGEST_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self.trello = trello
+        self.report = report or (lambda progress: None)
+        self.report_every = report_every
+        self._lock = threading.Lock()
+        # content hash -> meeting id (None while the file is being transcribed)
+        self._seen = dict(Meeting.objects.exclude(audio_hash='').values_list('audio_hash', 'id'))
+        # content hash -> Event set once its transcription has succeeded or failed
+        self._transcribing = {}
+
+    def _claim(self, digest):
+        """
+        ``(True, None)`` if the caller is to transcribe ``digest``, otherwise
+        ``(False, meeting id)``; the id is None while the original's batch
+        has not committed. A copy of a file still being transcribed waits
+        for the outcome, and takes over the hash if that failed.
+        """
+        while True:
+            with self._lock:
+                if digest not in self._seen:
+                    self._seen[digest] = None
+                    self._transcribing[digest] = threading.Event()
+                    return True, None
+                settled = self._transcribing.get(digest)
+                if settled is None:
+                    return False, self._seen[digest]
+            settled.wait()
+
+    def _settle(self, digest, failed):
+        with self._lock:
+            if failed:
+                del self._seen[digest]  # let another copy of the same audio try
+            self._transcribing.pop(digest).set()
+
+    def _transcribe(self, recording, stat, known_hash):
+        digest = known_hash or hash_file(recording.path)
+        claimed, meeting_id = self._claim(digest)
+        if not claimed:
+            return Result(recording, stat, digest, 'duplicate', None, meeting_id, '')
+
+        try:
+            mimetype, options = transcription_options(read_header(recording.path), recording.path)
+            key = cache_key(digest, options)
+            error = None
+            for attempt in range(self.attempts):
+                if attempt:
+                    time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                try:
+                    res = transcribe_file(recording.path, mimetype, options, key)
+                except Exception as e:
+                    error = e
+                    continue
+                self._settle(digest, failed=False)
+                return Result(recording, stat, digest, 'transcribed', res, None, '')
+        except BaseException:
+            self._settle(digest, failed=True)
+            raise
+        self._settle(digest, failed=True)
+        return Result(recording, stat, digest, 'failed', None, None, f"{type(error).__name__}: {error}")
+
+    def _failed(self, recording, error, stat=None):
+        return Result(recording, stat, None, 'failed', None, None, error)
+
+    def persist(self, results):
+        """
+        Save a batch of results in one transaction, then checkpoint them in
+        the journal. If the transaction fails, the word stores it wrote are
+        removed and the batch's hashes released, so nothing refers to the
+        rolled-back meetings. Returns the duplicates whose original has not
+        committed yet, to be persisted with a later batch.
+        """
+        transcribed = [r for r in results if r.status == 'transcribed']
+        meetings = [
+            Meeting(userid=r.recording.userid, title=r.recording.title[:255], audio_hash=r.hash)
+            for r in transcribed
+        ]
+        try:
+            with transaction.atomic():
+                Meeting.objects.bulk_create(meetings)
+                # createdat is auto_now_add; date the meetings by their recordings instead.
+                for meeting, r in zip(meetings, transcribed):
+                    meeting.createdat = (r.recording.recorded_at
+                                         or datetime.fromtimestamp(r.stat.st_mtime, dt_timezone.utc))
+                Meeting.objects.bulk_update(meetings, ['createdat'])
+                for meeting, r in zip(meetings, transcribed):
+                    persist_words(meeting, response_words(r.response))
+                    if self.trello:
+                        enqueue_card(f"Transcription: {os.path.basename(r.recording.path)}",
+                                     response_transcript(r.response), group_key=f"meeting:{meeting.id}")
+                        enqueue_action_items(meeting)
+        except BaseException:
+            self._discard(transcribed, meetings)
+            raise
+
+        saved = {r.recording.path: meeting.id for meeting, r in zip(meetings, transcribed)}
+        with self._lock:
+            for meeting, r in zip(meetings, transcribed):
+                self._seen[r.hash] = meeting.id
+
+        entries = []
+        waiting = []
+        for r in results:
+            if r.status == 'duplicate' and r.meeting_id is None:
+                with self._lock:
+                    meeting_id = self._seen.get(r.hash)
+                if meeting_id is None:
+                    waiting.append(r)
+                    continue
+                r = r._replace(meeting_id=meeting_id)
+            entry = {
+                "path": r.recording.path,
+                "size": r.stat.st_size if r.stat else None,
+                "mtime": r.stat.st_mtime if r.stat else None,
+                "hash": r.hash,
+                "status": 'done' if r.status == 'transcribed' else r.status,
+                "meeting_id": saved.get(r.recording.path, r.meeting_id),
+            }
+            if r.error:
+                entry["error"] = r.error
+            entries.append(entry)
+        self.journal.write(entries)
+        return waiting
+
+    def _discard(self, transcribed, meetings):
+        """Undo the file and in-memory side effects of a batch whose transaction rolled back."""
+        for meeting in meetings:
+            # The ids of rolled-back rows belong to no saved meeting, so neither do these stores.
+            if meeting.pk is not None:
+                shutil.rmtree(word_store_dir(meeting.pk), ignore_errors=True)
+        with self._lock:
+            for r in transcribed:
+                self._seen.pop(r.hash, None)
+
+    def run(self, recordings):
+        """Ingest ``recordings``; returns the ``Progress``. Raises KeyboardInterrupt after saving finished work."""
+        recordings = list(recordings)
+        progress = Progress(len(recordings))
+        pending = iter(recordings)
+        in_flight = {}
+        batch = []
+        last_report = time.monotonic()
+
+        def collect(futures):
+            for future in futures:
+                in_flight.pop(future)
+                if future.cancelled():
+                    continue
+                result = future.result()
+                batch.append(result)
+                progress.ingested += result.status == 'transcribed'
+                progress.duplicates += result.status == 'duplicate'
+                progress.failed += result.status == 'failed'
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            try:
+                while True:
+                    while len(in_flight) < 2 * self.workers:
+                        recording = next(pending, None)
+                        if recording is None:
+                            break
+                        try:
+                            stat = os.stat(recording.path)
+                        except OSError as e:
+                            batch.append(self._failed(recording, f"{type(e).__name__}: {e}"))
+                            progress.failed += 1
+                            continue
+                        if self.journal.finished(recording.path, stat):
+                            progress.skipped += 1
+                            continue
+                        future = pool.submit(self._transcribe, recording, stat,
+                                             self.journal.known_hash(recording.path, stat))
+                        in_flight[future] = recording
+                    if not in_flight:
+                        break
+                    done, _ = wait(in_flight, timeout=self.report_every, return_when=FIRST_COMPLETED)
+                    collect(done)
+                    if len(batch) >= self.batch_size:
+                        batch = self.persist(batch)
+                    if time.monotonic() - last_report >= self.report_every:
+                        self.report(progress)
+                        last_report = time.monotonic()
+            except KeyboardInterrupt:
+                # Drop what has not started, keep what finishes, and save it before giving up.
+                for future in in_flight:
+                    future.cancel()
+                collect(wait(in_flight).done)
+                self.persist(batch)
+                self.report(progress)
+                raise
+        self.persist(batch)
+        self.report(progress)
+        return progress
@@ -0,0 +1,211 @@
+"""
+DB-backed transcription job queue.
+
+``upload_audio`` only enqueues a ``TranscriptionJob``; worker processes started
+with ``manage.py run_transcription_workers`` claim queued jobs, run them through
+``speech.pipeline.run_transcription`` and record the outcome. Failed jobs are
+retried with exponential backoff until ``max_attempts`` is reached, unless
+they raise ``PermanentJobError``.
+"""
+import signal
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from speech.models import JobClaimLock, TranscriptionJob
+from speech.uploads import cleanup_partial_uploads
+from speech.workspace import cleanup_workspaces
+
+
+class JobTimeout(Exception):
+    pass
+
+
+class PermanentJobError(Exception):
+    """A job failure no retry can fix; ``run_job`` fails the job at once."""
+
+
+def enqueue_job(file_path, file_name, mimetype, options, workspace='', cache_key=''):
+    return TranscriptionJob.objects.create(
+        file_path=file_path,
+        file_name=file_name,
+        mimetype=mimetype,
+        workspace=workspace,
+        cache_key=cache_key,
+        options=options,
+        max_attempts=settings.TRANSCRIPTION_JOB_MAX_ATTEMPTS,
+    )
+
+
+async def aenqueue_job(file_path, file_name, mimetype, options, workspace='', cache_key=''):
+    return await TranscriptionJob.objects.acreate(
+        file_path=file_path,
+        file_name=file_name,
+        mimetype=mimetype,
+        workspace=workspace,
+        cache_key=cache_key,
+        options=options,
+        max_attempts=settings.TRANSCRIPTION_JOB_MAX_ATTEMPTS,
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2*base, 4*base, ... capped at the max delay."""
+    delay = settings.TRANSCRIPTION_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+    return min(delay, settings.TRANSCRIPTION_RETRY_BACKOFF_MAX)
+
+
+def requeue_stale_jobs():
+    """Put back jobs whose worker died mid-run (locked for twice the timeout)."""
+    cutoff = timezone.now() - timedelta(seconds=2 * settings.TRANSCRIPTION_JOB_TIMEOUT)
+    return TranscriptionJob.objects.filter(
+        status=TranscriptionJob.RUNNING, locked_at__lt=cutoff,
+    ).update(status=TranscriptionJob.QUEUED, locked_at=None, run_after=timezone.now())
+
+
+def _lock_claims(now):
+    """
+    Write the ``JobClaimLock`` row. Until the surrounding transaction ends
+    every other claimer blocks here (a row lock, or SQLite's write lock),
+    so the RUNNING count and the claim cannot interleave across workers.
+    """
+    if not JobClaimLock.objects.filter(pk=1).update(claimed_at=now):
+        JobClaimLock.objects.get_or_create(pk=1)
+        JobClaimLock.objects.filter(pk=1).update(claimed_at=now)
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest runnable job to RUNNING and return it, or
+    return None when nothing is runnable or the concurrency limit is reached.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        _lock_claims(now)
+        running = TranscriptionJob.objects.filter(status=TranscriptionJob.RUNNING).count()
+        if running >= settings.TRANSCRIPTION_MAX_CONCURRENT_JOBS:
+            return None
+
+        queued = TranscriptionJob.objects.filter(
+            status=TranscriptionJob.QUEUED, run_after__lte=now,
+        ).order_by('run_after', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            queued = queued.select_for_update(skip_locked=True)
+        job = queued.first()
+        if job is None:
+            return None
+
+        # The status guard makes the claim safe on backends without row locks.
+        claimed = TranscriptionJob.objects.filter(pk=job.pk, status=TranscriptionJob.QUEUED).update(
+            status=TranscriptionJob.RUNNING, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if not claimed:
+            return None
+
+    job.refresh_from_db()
+    return job
+
+
+@contextmanager
+def time_limit(seconds):
+    """
+    Raise ``JobTimeout`` if the block runs longer than ``seconds``. Enforced
+    with SIGALRM, so it only applies on the main thread of a Unix process,
+    which is where workers run jobs.
+    """
+    if not seconds or not hasattr(signal, 'SIGALRM') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def _raise(signum, frame):
+        raise JobTimeout(f"Job exceeded {seconds}s timeout")
+
+    previous = signal.signal(signal.SIGALRM, _raise)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+@contextmanager
+def time_limit_paused():
+    """
+    Hold off a ``time_limit`` alarm for the block, so a ``JobTimeout`` never
+    lands in the middle of it (e.g. a job's final database writes), then
+    re-arm it with the time that was left. A limit that ran out meanwhile
+    is not re-armed: the block was the job's last step and it has finished.
+    """
+    if not hasattr(signal, 'SIGALRM') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    remaining, _ = signal.setitimer(signal.ITIMER_REAL, 0)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        left = remaining - (time.monotonic() - start)
+        if remaining and left > 0:
+            signal.setitimer(signal.ITIMER_REAL, left)
+
+
+def run_job(job):
+    """Run a claimed job and record success, a scheduled retry, or failure."""
+    from speech.pipeline import run_transcription
+
+    try:
+        with time_limit(settings.TRANSCRIPTION_JOB_TIMEOUT):
+            result = run_transcription(job)
+    except Exception as e:
+        job.error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+        job.locked_at = None
+        if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+            job.status = TranscriptionJob.FAILED
+        else:
+            job.status = TranscriptionJob.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        job.save(update_fields=['status', 'error', 'locked_at', 'run_after', 'updatedat'])
+        return job
+
+    job.status = TranscriptionJob.SUCCEEDED
+    job.result = result
+    job.error = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'result', 'error', 'locked_at', 'updatedat'])
+    return job
+
+
+def run_pending_jobs(limit=None):
+    """Drain runnable jobs in the current process. Returns the number run."""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+def work(poll_interval=1.0, stop_event=None):
+    """Worker loop: claim and run jobs until ``stop_event`` is set."""
+    last_cleanup = None
+    while stop_event is None or not stop_event.is_set():
+        if last_cleanup is None or time.monotonic() - last_cleanup >= settings.SCRATCH_CLEANUP_INTERVAL:
+            cleanup_workspaces()
+            cleanup_partial_uploads()
+            last_cleanup = time.monotonic()
+        requeue_stale_jobs()
+        job = claim_next_job()
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
@@ -0,0 +1,371 @@
+"""
+Live transcription over WebSocket (``ws://.../api/live/``).
+
+This is a plain ASGI WebSocket application mounted next to Django in
+``myproject/asgi.py``. The client opens the socket (optionally with
+``?meeting_id=``, ``encoding``, ``sample_rate`` and ``channels``), sends
+binary audio frames and finally a ``{"type": "stop"}`` text frame. The
+server replies with JSON text frames::
+
+    {"type": "meeting", "meeting_id": 12}
+    {"type": "interim", "segments": [{"speaker": 0, "text": "...", "start": 1.2, "end": 2.9}]}
+    {"type": "final", "segments": [...]}
+    {"type": "closed", "segments": 37, "dropped_interim": 0}
+
+Audio goes to the transcription backend's live session
+(``backend.open_stream``). Final segments are written to
+``MeetingTranscription`` in micro-batches of ``LIVE_PERSIST_BATCH`` rows or
+every ``LIVE_PERSIST_INTERVAL`` seconds, whichever comes first; their words
+go to the meeting's word store (``speech.wordstore``) when the session ends.
+
+Memory per connection is bounded: frames over ``LIVE_MAX_FRAME_BYTES``
+close the socket (1009), and at most ``LIVE_MAX_BUFFER_BYTES`` of audio is
+held waiting for the backend; beyond that the server stops reading from
+the socket, so the client is slowed down by TCP flow control instead of
+the server buffering. At most ``LIVE_MAX_PENDING_EVENTS`` results wait to be
+sent to a slow client; interim results are dropped first, final results
+never are. ``LIVE_MAX_CONNECTIONS`` caps sessions per process (1013). A
+malformed ``meeting_id``, ``sample_rate`` or ``channels`` closes the socket
+before it is accepted (4400).
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from speech.analytics import update_meeting_stats
+from speech.backends import get_backend
+from speech.models import Meeting, MeetingTranscription
+from speech.pipeline import next_seq, seconds_to_ms, touch_transcript
+from speech.wordstore import WordStoreWriter, store_words
+
+LIVE_PATH = '/api/live/'
+
+CLOSE_NORMAL = 1000
+CLOSE_POLICY = 1008
+CLOSE_TOO_BIG = 1009
+CLOSE_ERROR = 1011
+CLOSE_TRY_AGAIN = 1013
+CLOSE_BAD_REQUEST = 4400  # application-defined: invalid query parameters
+
+_active = 0
+
+
+def _db(func):
+    """Run ``func`` on the ORM thread with fresh connections, like Django's request cycle."""
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+def message_words(message):
+    alternatives = message.get("channel", {}).get("alternatives") or [{}]
+    return alternatives[0].get("words", [])
+
+
+def message_segments(message):
+    """Group the words of a live result into consecutive same-speaker segments."""
+    segments = []
+    for word in message_words(message):
+        speaker = word.get("speaker", 0)
+        text = word.get("punctuated_word") or word["word"]
+        if segments and segments[-1]["speaker"] == speaker:
+            segments[-1]["text"] += " " + text
+            segments[-1]["end"] = word["end"]
+        else:
+            segments.append({"speaker": speaker, "text": text, "start": word["start"], "end": word["end"]})
+    return segments
+
+
+def insert_segments(meeting, segments):
+    """Append final segments as turns, numbered after the meeting's last one; returns the first seq."""
+    with transaction.atomic():
+        seq = next_seq(meeting)
+        MeetingTranscription.objects.bulk_create([
+            MeetingTranscription(
+                meeting=meeting, seq=seq + i, speaker=s["speaker"], text=s["text"],
+                start_ms=seconds_to_ms(s["start"]), end_ms=seconds_to_ms(s["end"]),
+            ) for i, s in enumerate(segments)
+        ])
+        touch_transcript(meeting.pk)
+    return seq
+
+
+class FrameBuffer:
+    """FIFO of audio frames bounded by total bytes; ``put`` waits while full."""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.size = 0
+        self.closed = False
+        self.cond = asyncio.Condition()
+
+    async def put(self, frame):
+        async with self.cond:
+            await self.cond.wait_for(lambda: not self.frames or self.size + len(frame) <= self.max_bytes)
+            self.frames.append(frame)
+            self.size += len(frame)
+            self.cond.notify_all()
+
+    async def get(self):
+        """Next frame, or None once closed and drained."""
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.frames or self.closed)
+            if not self.frames:
+                return None
+            frame = self.frames.popleft()
+            self.size -= len(frame)
+            self.cond.notify_all()
+            return frame
+
+    async def close(self):
+        async with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class SegmentWriter:
+    """
+    Micro-batches final segments into ``MeetingTranscription`` rows and
+    collects their words for the word store, written by ``close``.
+    """
+    def __init__(self, meeting, batch_size=None, interval=None):
+        self.meeting = meeting
+        self.batch_size = batch_size or settings.LIVE_PERSIST_BATCH
+        self.interval = settings.LIVE_PERSIST_INTERVAL if interval is None else interval
+        self.pending = []
+        self.written = 0
+        self.seqs = []  # seq of each turn written; another writer may number turns in between
+        self.added = 0
+        self.words = WordStoreWriter()
+        self.last_flush = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def add(self, segments, words=()):
+        # Segments split words at speaker changes, the same way add_turns numbers turns.
+        self.words.add_turns(words, first_turn=self.added)
+        self.added += len(segments)
+        self.pending.extend(segments)
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            rows, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+            if rows:
+                seq = await _db(insert_segments)(self.meeting, rows)
+                self.seqs.extend(range(seq, seq + len(rows)))
+                self.written += len(rows)
+
+    async def close(self):
+        await self.flush()
+        if self.seqs:
+            await _db(store_words)(self.meeting, self.words, turn_seqs=self.seqs)
+            await _db(update_meeting_stats)(self.meeting)
+
+    async def run_timer(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.pending and time.monotonic() - self.last_flush >= self.interval:
+                await self.flush()
+
+
+class LiveSession:
+    def __init__(self, scope, receive, send, backend=None):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.backend = backend or get_backend()
+        self.query = {k: v[-1] for k, v in parse_qs(scope.get('query_string', b'').decode()).items()}
+        self.buffer = FrameBuffer(settings.LIVE_MAX_BUFFER_BYTES)
+        self.outbound = asyncio.Queue(maxsize=settings.LIVE_MAX_PENDING_EVENTS)
+        self.connected = True
+        self.close_code = CLOSE_NORMAL
+        self.dropped_interim = 0
+
+    def _query_int(self, name, default):
+        """A positive integer query parameter, or None if it is malformed."""
+        value = self.query.get(name)
+        if not value:
+            return default
+        return int(value) if value.isdigit() and int(value) > 0 else None
+
+    def stream_options(self):
+        """Options for the backend's live session, or None if the query is malformed."""
+        sample_rate = self._query_int('sample_rate', 16000)
+        channels = self._query_int('channels', 1)
+        if sample_rate is None or channels is None:
+            return None
+        return {
+            "punctuate": True,
+            "diarize": True,
+            "interim_results": True,
+            "model": 'general',
+            "tier": 'nova',
+            "encoding": self.query.get('encoding', 'linear16'),
+            "sample_rate": sample_rate,
+            "channels": channels,
+        }
+
+    async def _meeting(self):
+        meeting_id = self.query.get('meeting_id')
+        if meeting_id:
+            return await Meeting.objects.filter(id=int(meeting_id)).afirst()
+        return await Meeting.objects.acreate(userid=1, title="Live meeting")
+
+    async def _send_json(self, data):
+        if not self.connected:
+            return
+        try:
+            await self.send({"type": "websocket.send", "text": json.dumps(data)})
+        except OSError:
+            self.connected = False
+
+    async def read_client(self):
+        """Move client frames into the buffer; stops reading while the buffer is full."""
+        try:
+            while True:
+                event = await self.receive()
+                if event["type"] == "websocket.disconnect":
+                    self.connected = False
+                    return
+                if event.get("bytes"):
+                    if len(event["bytes"]) > settings.LIVE_MAX_FRAME_BYTES:
+                        self.close_code = CLOSE_TOO_BIG
+                        return
+                    await self.buffer.put(event["bytes"])
+                elif event.get("text"):
+                    try:
+                        control = json.loads(event["text"])
+                    except ValueError:
+                        control = None
+                    if not isinstance(control, dict):
+                        self.close_code = CLOSE_POLICY
+                        return
+                    if control.get("type") == "stop":
+                        return
+        finally:
+            await self.buffer.close()
+
+    async def pump_audio(self, stream):
+        while True:
+            frame = await self.buffer.get()
+            if frame is None:
+                break
+            await stream.send(frame)
+        await stream.finish()
+
+    async def handle_results(self, stream, writer):
+        async for message in stream.messages():
+            segments = message_segments(message)
+            if not segments:
+                continue
+            if message.get("is_final"):
+                await writer.add(segments, message_words(message))
+                await self.outbound.put({"type": "final", "segments": segments})
+            else:
+                try:
+                    self.outbound.put_nowait({"type": "interim", "segments": segments})
+                except asyncio.QueueFull:
+                    self.dropped_interim += 1
+
+    async def write_client(self):
+        while True:
+            event = await self.outbound.get()
+            if event is None:
+                return
+            await self._send_json(event)
+
+    async def _stop_sender(self, sender):
+        """
+        Queue the end marker so the sender drains the events already queued
+        and returns. A sender that has died is not waited on: nothing would
+        make room in a full queue.
+        """
+        marker = asyncio.create_task(self.outbound.put(None))
+        try:
+            await asyncio.wait({marker, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if marker.done():
+                await asyncio.wait({sender})
+        finally:
+            for task in (marker, sender):
+                task.cancel()
+            await asyncio.gather(marker, sender, return_exceptions=True)
+
+    async def run(self):
+        global _active
+        event = await self.receive()
+        if event["type"] != "websocket.connect":
+            return
+        if _active >= settings.LIVE_MAX_CONNECTIONS:
+            await self.send({"type": "websocket.close", "code": CLOSE_TRY_AGAIN})
+            return
+
+        _active += 1
+        try:
+            options = self.stream_options()
+            if options is None or self._query_int('meeting_id', 0) is None:
+                await self.send({"type": "websocket.close", "code": CLOSE_BAD_REQUEST})
+                return
+            meeting = await self._meeting()
+            if meeting is None:
+                await self.send({"type": "websocket.close", "code": CLOSE_POLICY})
+                return
+            try:
+                stream = await self.backend.open_stream(options)
+            except Exception:
+                await self.send({"type": "websocket.close", "code": CLOSE_ERROR})
+                return
+
+            await self.send({"type": "websocket.accept"})
+            await self._send_json({"type": "meeting", "meeting_id": meeting.id})
+
+            writer = SegmentWriter(meeting)
+            timer = asyncio.create_task(writer.run_timer())
+            sender = asyncio.create_task(self.write_client())
+            workers = [
+                asyncio.create_task(self.read_client()),
+                asyncio.create_task(self.pump_audio(stream)),
+                asyncio.create_task(self.handle_results(stream, writer)),
+            ]
+            try:
+                await asyncio.gather(*workers)
+            except Exception:
+                self.close_code = CLOSE_ERROR
+            finally:
+                # No task outlives the session, whichever way it ends.
+                for task in (*workers, timer):
+                    task.cancel()
+                await asyncio.gather(*workers, timer, return_exceptions=True)
+                try:
+                    await writer.close()
+                finally:
+                    await self._stop_sender(sender)
+
+            await self._send_json({
+                "type": "closed", "segments": writer.written,
+                "dropped_interim": self.dropped_interim + getattr(stream, 'dropped_interim', 0),
+            })
+            if self.connected:
+                await self.send({"type": "websocket.close", "code": self.close_code})
+        finally:
+            _active -= 1
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI entry point for WebSocket connections."""
+    if scope["path"] != LIVE_PATH:
+        await receive()
+        await send({"type": "websocket.close", "code": CLOSE_POLICY})
+        return
+    await LiveSession(scope, receive, send).run()
@@ -0,0 +1,340 @@
+"""
+Language models behind ``ask-gpt/``.
+
+Views ask ``get_llm()`` for the model named by ``settings.ASK_LLM_BACKEND``
+(built once per process, so the client and chains are reused) and call
+``agenerate(question, context)``. ``context`` is a list of transcript
+excerpts, possibly empty. ``astream(question, context, max_tokens, outcome)``
+yields the answer token by token instead and, when it ends, sets
+``outcome["finish_reason"]`` to ``"stop"`` or, if ``max_tokens`` cut the
+answer short, ``"length"`` (OpenAI's names; a model that does not say leaves
+it unset). Closing the generator aborts the upstream call. ``EchoLLM`` answers from the excerpts without any network
+calls (streaming one word per ``token_delay`` seconds), for benchmarks and
+local development.
+
+Unless ``ASK_LLM_CACHE_SIZE`` is 0 the model is wrapped in ``CachedLLM``,
+which answers repeated questions from an in-process LRU keyed on the
+normalised question, the exact context, the model and the temperature.
+A question whose word set overlaps a cached one by at least
+``ASK_LLM_CACHE_SIMILARITY`` (Jaccard) under the same context counts as a
+near-duplicate hit. Concurrent identical misses on the same event loop
+share one upstream call.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from dotenv import load_dotenv
+
+from speech.cache import CacheStats
+from speech.metrics import registry
+
+load_dotenv()
+
+QUESTION_TEMPLATE = "Answer the following question: {question}"
+
+CONTEXT_TEMPLATE = (
+    "Answer the question using only the meeting transcript excerpts below. "
+    "If they do not contain the answer, say so.\n\n"
+    "Transcript excerpts:\n{context}\n\n"
+    "Question: {question}"
+)
+
+
+def format_context(context):
+    return "\n".join(context)
+
+
+class OpenAIChatLLM:
+    def __init__(self, model=None, temperature=None):
+        from langchain.chains import LLMChain
+        from langchain.chat_models import ChatOpenAI
+        from langchain.prompts import PromptTemplate
+
+        self.model = model or settings.ASK_LLM_MODEL
+        self.temperature = settings.ASK_LLM_TEMPERATURE if temperature is None else temperature
+
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        if not openai_api_key:
+            raise ImproperlyConfigured("OpenAI API key not configured.")
+
+        self.chat_model = ChatOpenAI(
+            openai_api_key=openai_api_key,
+            model=self.model,
+            temperature=self.temperature,
+        )
+        self.prompt = PromptTemplate(input_variables=["question"], template=QUESTION_TEMPLATE)
+        self.context_prompt = PromptTemplate(input_variables=["context", "question"], template=CONTEXT_TEMPLATE)
+        self.chain = LLMChain(llm=self.chat_model, prompt=self.prompt)
+        self.context_chain = LLMChain(llm=self.chat_model, prompt=self.context_prompt)
+
+    async def agenerate(self, question, context=()):
+        if context:
+            return await self.context_chain.arun(question=question, context=format_context(context))
+        return await self.chain.arun(question=question)
+
+    async def astream(self, question, context=(), max_tokens=None, outcome=None):
+        if context:
+            prompt = self.context_prompt.format(question=question, context=format_context(context))
+        else:
+            prompt = self.prompt.format(question=question)
+        kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+        async for chunk in self.chat_model.astream(prompt, **kwargs):
+            reason = (getattr(chunk, 'response_metadata', None) or {}).get('finish_reason')
+            if reason and outcome is not None:
+                outcome["finish_reason"] = reason
+            if chunk.content:
+                yield chunk.content
+
+
+TOKEN_RE = re.compile(r"\S+\s*")  # how cached and echoed answers are counted against max_tokens
+
+
+class EchoLLM:
+    """Offline stand-in: answers with the excerpts it was given."""
+    def __init__(self, model=None, temperature=None, token_delay=0.02):
+        self.model = model or 'echo'
+        self.temperature = 0.0 if temperature is None else temperature
+        self.token_delay = token_delay
+        self.calls = 0
+
+    def _answer(self, question, context):
+        if not context:
+            return f"No transcript context for: {question}"
+        return f"Based on {len(context)} excerpt(s):\n{format_context(context)}"
+
+    async def agenerate(self, question, context=()):
+        self.calls += 1
+        return self._answer(question, context)
+
+    async def astream(self, question, context=(), max_tokens=None, outcome=None):
+        self.calls += 1
+        outcome = {} if outcome is None else outcome
+        for i, token in enumerate(TOKEN_RE.findall(self._answer(question, context))):
+            if max_tokens and i >= max_tokens:
+                outcome["finish_reason"] = "length"
+                return
+            await asyncio.sleep(self.token_delay)
+            yield token
+        outcome["finish_reason"] = "stop"
+
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def normalise_question(question):
+    return " ".join(WORD_RE.findall(question.lower()))
+
+
+class ResponseCacheStats(CacheStats):
+    def __init__(self):
+        super().__init__()
+        self.near_hits = 0
+        self.expired = 0
+
+    def as_dict(self):
+        return {**super().as_dict(), "near_hits": self.near_hits, "expired": self.expired}
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU of answers with a TTL. Entries are grouped by scope
+    (model, temperature, context digest); within a scope a word-level
+    inverted index finds near-duplicate questions without scanning.
+    """
+    def __init__(self, max_entries=None, ttl=None, similarity=None):
+        self.max_entries = settings.ASK_LLM_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl = settings.ASK_LLM_CACHE_TTL if ttl is None else ttl
+        self.similarity = settings.ASK_LLM_CACHE_SIMILARITY if similarity is None else similarity
+        self.stats = ResponseCacheStats()
+        self._entries = OrderedDict()  # (scope, normalised question) -> (answer, words, stored_at)
+        self._words = {}  # scope -> word -> set of normalised questions
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def scope(model, temperature, context):
+        digest = hashlib.sha256("\x00".join(context).encode('utf-8')).hexdigest()
+        return f"{model}:{temperature}:{digest}"
+
+    def _remove(self, key):
+        scope, question = key
+        self._entries.pop(key, None)
+        index = self._words.get(scope, {})
+        for word in question.split():
+            keys = index.get(word)
+            if keys is not None:
+                keys.discard(question)
+                if not keys:
+                    del index[word]
+        if not index:
+            self._words.pop(scope, None)
+
+    def _fresh(self, key, now):
+        answer, _, stored_at = self._entries[key]
+        if self.ttl and now - stored_at > self.ttl:
+            self._remove(key)
+            self.stats.incr('expired')
+            return None
+        self._entries.move_to_end(key)
+        return answer
+
+    def _nearest(self, scope, question):
+        words = set(question.split())
+        index = self._words.get(scope)
+        if not words or not index or self.similarity >= 1:
+            return None
+        shared = {}
+        for word in words:
+            for candidate in index.get(word, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        best, best_score = None, self.similarity
+        for candidate, overlap in shared.items():
+            score = overlap / len(words | self._entries[(scope, candidate)][1])
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def get(self, scope, question):
+        question = normalise_question(question)
+        now = time.monotonic()
+        with self._lock:
+            key = (scope, question)
+            answer = self._fresh(key, now) if key in self._entries else None
+            if answer is None:
+                near = self._nearest(scope, question)
+                answer = self._fresh((scope, near), now) if near is not None else None
+                if answer is not None:
+                    self.stats.incr('near_hits')
+        self.stats.incr('hits' if answer is not None else 'misses')
+        return answer
+
+    def set(self, scope, question, answer):
+        question = normalise_question(question)
+        key = (scope, question)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (answer, frozenset(question.split()), time.monotonic())
+            index = self._words.setdefault(scope, {})
+            for word in question.split():
+                index.setdefault(word, set()).add(question)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        if evicted:
+            self.stats.incr('evictions', evicted)
+
+
+class CachedLLM:
+    """Wraps a model with a ``ResponseCache``; same ``agenerate`` interface."""
+    def __init__(self, llm, cache=None):
+        self.llm = llm
+        self.cache = cache if cache is not None else ResponseCache()
+        # A future belongs to the loop that created it, so misses are only
+        # shared between callers on the same loop: event loop -> key -> future.
+        self._inflight = weakref.WeakKeyDictionary()
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    async def agenerate(self, question, context=()):
+        scope = self.cache.scope(self.llm.model, self.llm.temperature, context)
+        answer = self.cache.get(scope, question)
+        if answer is not None:
+            return answer
+
+        key = (scope, normalise_question(question))
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        pending = inflight.get(key)
+        if pending is None:
+            pending = inflight[key] = asyncio.ensure_future(self.llm.agenerate(question, context))
+            pending.add_done_callback(lambda task: self._finished(inflight, key, scope, question, task))
+        # A client that goes away does not cancel the call other requests are waiting on.
+        return await asyncio.shield(pending)
+
+    async def astream(self, question, context=(), max_tokens=None, outcome=None):
+        """
+        Stream a cached answer in one piece (cut to ``max_tokens`` words), or
+        the model's tokens (caching complete answers).
+        """
+        outcome = {} if outcome is None else outcome
+        scope = self.cache.scope(self.llm.model, self.llm.temperature, context)
+        answer = self.cache.get(scope, question)
+        if answer is not None:
+            tokens = TOKEN_RE.findall(answer)
+            if max_tokens and len(tokens) > max_tokens:
+                answer = "".join(tokens[:max_tokens])
+                outcome["finish_reason"] = "length"
+            else:
+                outcome["finish_reason"] = "stop"
+            yield answer
+            return
+
+        tokens = []
+        completed = False
+        stream = self.llm.astream(question, context, max_tokens, outcome)
+        try:
+            async for token in stream:
+                if max_tokens and len(tokens) >= max_tokens:
+                    outcome["finish_reason"] = "length"  # the model went past the budget
+                    break
+                tokens.append(token)
+                yield token
+            else:
+                completed = True
+        finally:
+            await stream.aclose()
+        # An answer cut short by the budget is not the model's full answer.
+        if completed and outcome.get("finish_reason") != "length":
+            self.cache.set(scope, question, "".join(tokens))
+
+    def _finished(self, inflight, key, scope, question, task):
+        inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.cache.set(scope, question, task.result())
+
+
+def build_llm():
+    llm = import_string(settings.ASK_LLM_BACKEND)()
+    if settings.ASK_LLM_CACHE_SIZE > 0:
+        llm = CachedLLM(llm)
+    return llm
+
+
+_llm = None
+
+
+def get_llm():
+    """Return the configured language model, built once per process."""
+    global _llm
+    if _llm is None:
+        _llm = build_llm()
+    return _llm
+
+
+def set_llm(llm):
+    """Override the process language model (e.g. with an ``EchoLLM``)."""
+    global _llm
+    _llm = llm
+
+
+def _collect_stats():
+    cache = getattr(_llm, 'cache', None)
+    stats = cache.stats.as_dict() if cache is not None else {}
+    for name in ('hits', 'near_hits', 'misses', 'expired'):
+        yield (f'speech_llm_cache_{name}_total', 'counter',
+               f"ask-gpt answer cache {name.replace('_', ' ')} in this process.", stats.get(name))
+
+
+registry.add_collector(_collect_stats)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from speech.uploads import cleanup_partial_uploads
+from speech.workspace import cleanup_workspaces
+
+
+class Command(BaseCommand):
+    help = "Remove expired per-job scratch directories and abandoned chunked uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None, help="Seconds (default: SCRATCH_TTL).")
+
+    def handle(self, *args, **options):
+        removed = cleanup_workspaces(max_age=options['max_age'])
+        abandoned = cleanup_partial_uploads(max_age=options['max_age'])
+        self.stdout.write(f"Removed {removed} scratch directories and {abandoned} abandoned uploads")
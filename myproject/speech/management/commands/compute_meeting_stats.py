@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from speech.analytics import stats_meetings, update_meeting_stats
+
+
+class Command(BaseCommand):
+    help = ("Compute the per-speaker analytics (MeetingStats) of stored meetings, e.g. those stored "
+            "before analytics existed. New transcripts get theirs when they are stored.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=None, help="Only this user's meetings.")
+        parser.add_argument('--since', type=parse_date, default=None, help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--until', type=parse_date, default=None, help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--meeting', type=int, action='append', dest='meetings', help="Repeatable.")
+        parser.add_argument('--missing', action='store_true', help="Skip meetings that already have stats.")
+
+    def handle(self, *args, **options):
+        meetings = stats_meetings(options['user'], options['since'], options['until'], options['meetings'])
+        if options['missing']:
+            meetings = meetings.filter(stats__isnull=True)
+        count = rows = 0
+        start = time.perf_counter()
+        for meeting in meetings.iterator():
+            rows += len(update_meeting_stats(meeting))
+            count += 1
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f"{count} meetings, {rows} speaker rows in {elapsed:.2f}s "
+                          f"({count / elapsed if elapsed else 0:.1f} meetings/s)")
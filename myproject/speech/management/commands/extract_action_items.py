@@ -0,0 +1,40 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from speech.actions import action_items_for, item_dict
+
+
+class Command(BaseCommand):
+    help = "Extract action items from stored meetings as JSON lines (one meeting per line)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=None, help="Only this user's meetings.")
+        parser.add_argument('--since', type=parse_date, default=None, help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--until', type=parse_date, default=None, help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--meeting', type=int, action='append', dest='meetings', help="Repeatable.")
+        parser.add_argument('--output', default='-', help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        out = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8')
+        meetings = items = 0
+        start = time.perf_counter()
+        try:
+            for meeting, found in action_items_for(options['user'], options['since'], options['until'],
+                                                   options['meetings']):
+                out.write(json.dumps({
+                    "meeting_id": meeting.id,
+                    "user": meeting.userid,
+                    "action_items": [item_dict(item) for item in found],
+                }) + "\n")
+                meetings += 1
+                items += len(found)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f"{meetings} meetings, {items} action items in {elapsed:.2f}s "
+                          f"({meetings / elapsed if elapsed else 0:.1f} meetings/s)")
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from speech.ingest import Ingest, Journal, iter_recordings, journal_path
+
+
+class Command(BaseCommand):
+    help = ("Transcribe and store a directory or manifest of recordings in bulk. "
+            "Interrupted runs resume from their journal.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="Directory to walk, or a manifest (CSV with a 'path' column, or one path per line).")
+        parser.add_argument('--workers', type=int, default=4, help="Files transcribed concurrently.")
+        parser.add_argument('--batch-size', type=int, default=50, help="Files persisted per transaction.")
+        parser.add_argument('--attempts', type=int, default=3, help="Transcription attempts per file.")
+        parser.add_argument('--user', type=int, default=1, help="Owner of the meetings (a manifest 'user' column wins).")
+        parser.add_argument('--journal', default=None, help="Journal file (default: one per source under INGEST_JOURNAL_DIR).")
+        parser.add_argument('--trello', action='store_true', help="Queue a Trello card per meeting.")
+        parser.add_argument('--progress-interval', type=float, default=10.0, help="Seconds between progress lines.")
+
+    def handle(self, *args, **options):
+        try:
+            recordings = list(iter_recordings(options['source'], options['user']))
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"Cannot read {options['source']}: {e}")
+
+        journal = Journal(options['journal'] or journal_path(options['source']))
+        self.stderr.write(f"{len(recordings)} recordings; journal {journal.path}")
+        ingest = Ingest(journal, workers=options['workers'], batch_size=options['batch_size'],
+                        attempts=options['attempts'], trello=options['trello'],
+                        report=lambda progress: self.stderr.write(progress.line()),
+                        report_every=options['progress_interval'])
+        try:
+            progress = ingest.run(recordings)
+        except KeyboardInterrupt:
+            raise CommandError("Interrupted; finished files are in the journal, run the same command again to resume.")
+        if progress.failed:
+            self.stderr.write(f"{progress.failed} files failed; run the same command again to retry them "
+                              f"(errors are in {journal.path}).")
@@ -0,0 +1,56 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from speech import jobs
+from speech.metrics import serve_metrics
+
+
+def _worker(stop_event, poll_interval, metrics_port):
+    # Each forked worker must open its own DB connection.
+    connections.close_all()
+    if metrics_port:
+        serve_metrics(metrics_port)
+    try:
+        jobs.work(poll_interval=poll_interval, stop_event=stop_event)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Start a pool of worker processes that run queued transcription jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.TRANSCRIPTION_MAX_CONCURRENT_JOBS,
+            help="Number of worker processes (default: TRANSCRIPTION_MAX_CONCURRENT_JOBS).",
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--metrics-port', type=int, default=settings.METRICS_PORT,
+                            help="Worker n serves /metrics on this port + n (default: METRICS_PORT; 0 = off).")
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        stop_event = multiprocessing.Event()
+        connections.close_all()
+
+        port = options['metrics_port']
+        processes = [
+            multiprocessing.Process(target=_worker, args=(stop_event, options['poll_interval'], port and port + i),
+                                    daemon=True)
+            for i in range(concurrency)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {concurrency} transcription workers")
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stop_event.set()
+            for process in processes:
+                process.join()
+        self.stdout.write("Transcription workers stopped")
@@ -0,0 +1,40 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from speech.metrics import serve_metrics
+from speech.trello import get_dispatcher
+
+
+class Command(BaseCommand):
+    help = "Send queued Trello cards from the outbox, coalescing cards that share a group."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--once', action='store_true', help="Drain the due rows once and exit.")
+        parser.add_argument('--stats-interval', type=float, default=60.0,
+                            help="Seconds between call latency reports.")
+        parser.add_argument('--metrics-port', type=int, default=settings.METRICS_PORT,
+                            help="Serve /metrics on this port (default: METRICS_PORT; 0 = off).")
+
+    def handle(self, *args, **options):
+        dispatcher = get_dispatcher()
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+        last_report = time.monotonic()
+        try:
+            while True:
+                sent = dispatcher.dispatch_pending(limit=options['batch_size'])
+                if options['once']:
+                    break
+                if time.monotonic() - last_report >= options['stats_interval']:
+                    self.stdout.write(json.dumps(dispatcher.stats.as_dict()))
+                    last_report = time.monotonic()
+                if sent == 0:
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(json.dumps(dispatcher.stats.as_dict()))
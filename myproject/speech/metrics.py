@@ -0,0 +1,391 @@
+"""
+Per-stage tracing and Prometheus metrics.
+
+Pipeline code wraps each stage in ``with stage('<name>') as s:``:
+
+    upload_spool  multipart parsing of an upload (bytes received)
+    save          writing the upload to its workspace (bytes written)
+    normalize     downmixing, resampling and trimming a PCM WAV (input bytes)
+    transcribe    the backend call, whole file or split (audio bytes)
+    serialize     writing a response to the transcription cache (bytes on disk)
+    deserialize   reading one back
+    segment       grouping words into speaker turns
+    persist       bulk inserts and the word store, excluding ``segment``
+    analytics     recomputing a meeting's per-speaker stats
+    trello        one Trello API call (description bytes)
+    llm           one ask-gpt answer, streamed or not (answer bytes)
+
+A stage records its latency in a histogram, adds ``s.add_bytes(n)`` to a
+byte counter, counts the SQL queries run on the current thread while it is
+open (not for stages inside coroutines) and counts exceptions that escape
+it by class. Stages of the current
+request are also collected as a trace and returned in a ``Server-Timing``
+header by ``MetricsMiddleware``, which times every request per route too.
+
+Everything lives in one per-process registry with no dependencies,
+rendered in the Prometheus text format by the ``/metrics`` view; worker
+processes serve theirs with ``serve_metrics(port)``. With
+``PROFILE_SAMPLE_RATE`` above zero the middleware runs that fraction of
+requests under cProfile and writes a ``.prof`` file per request to
+``PROFILE_DIR`` (``python -m pstats`` or snakeviz read them).
+"""
+import asyncio
+import bisect
+import contextvars
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers a cache hit through a long Deepgram call.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = (f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[i] += 1
+            counts[-1] += value
+
+    def count(self, *labels):
+        counts = self._values.get(labels)
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        bounds = self.buckets + (float('inf'),)
+        for labels, counts in items:
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                yield (f"{self.name}_bucket",
+                       _labels(self.labelnames + ('le',), labels + (_number(bound),)), cumulative)
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), counts[-1]
+            yield f"{self.name}_count", _labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collect):
+        """
+        ``collect()`` returns ``(name, kind, help, value)`` tuples, read at
+        scrape time (for stats that are kept elsewhere, e.g. cache hits).
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in metric.samples())
+        for collect in self._collectors:
+            for name, kind, help, value in collect():
+                if value is None:
+                    continue
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    'speech_stage_seconds', "Time spent in a pipeline stage.", ['stage']))
+stage_bytes = registry.register(Counter(
+    'speech_stage_bytes_total', "Bytes handled by a pipeline stage.", ['stage']))
+stage_queries = registry.register(Counter(
+    'speech_stage_db_queries_total', "SQL queries run inside a pipeline stage.", ['stage']))
+stage_errors = registry.register(Counter(
+    'speech_stage_errors_total', "Exceptions raised out of a pipeline stage.", ['stage', 'error']))
+request_seconds = registry.register(Histogram(
+    'speech_http_request_seconds', "Time to produce a response (not to stream its body).",
+    ['route', 'method', 'status']))
+profiled_requests = registry.register(Counter(
+    'speech_profiled_requests_total', "Requests run under cProfile.", ['route']))
+
+# Stages recorded during the current request, for the Server-Timing header.
+_trace = contextvars.ContextVar('speech_trace', default=None)
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.bytes = 0
+        self.queries = 0
+        self.excluded = 0.0
+        self.elapsed = 0.0
+
+    def add_bytes(self, n):
+        self.bytes += n
+
+    def exclude(self, seconds):
+        """Don't count ``seconds`` spent in a nested stage (e.g. a generator it drives)."""
+        self.excluded += seconds
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@contextmanager
+def stage(name, nbytes=0):
+    """Time, count and trace one pipeline stage; see the module docstring."""
+    current = Stage(name)
+    current.add_bytes(nbytes)
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            # Stages in coroutines interleave on the event loop thread, which never runs queries itself.
+            if not _in_event_loop():
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(current._count_query))
+            yield current
+    except BaseException as e:
+        stage_errors.inc(name, type(e).__name__)
+        raise
+    finally:
+        current.elapsed = max(0.0, time.perf_counter() - start - current.excluded)
+        stage_seconds.observe(current.elapsed, name)
+        if current.bytes:
+            stage_bytes.inc(name, amount=current.bytes)
+        if current.queries:
+            stage_queries.inc(name, amount=current.queries)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append(current)
+
+
+class TimedIterator:
+    """
+    Wraps an iterator and records the time spent producing its items as
+    stage ``name`` once it is exhausted or closed; ``elapsed`` holds the
+    total, for the consuming stage to ``exclude``.
+    """
+    def __init__(self, name, iterable):
+        self.name = name
+        self.iterator = iter(iterable)
+        self.elapsed = 0.0
+        self.recorded = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            item = next(self.iterator)
+        except StopIteration:
+            self.elapsed += time.perf_counter() - start
+            self.close()
+            raise
+        except BaseException as e:
+            self.elapsed += time.perf_counter() - start
+            stage_errors.inc(self.name, type(e).__name__)
+            raise
+        self.elapsed += time.perf_counter() - start
+        return item
+
+    def close(self):
+        if not self.recorded:
+            self.recorded = True
+            stage_seconds.observe(self.elapsed, self.name)
+            trace = _trace.get()
+            if trace is not None:
+                traced = Stage(self.name)
+                traced.elapsed = self.elapsed
+                trace.append(traced)
+
+
+def server_timing(trace):
+    """``Server-Timing`` value for a list of stages (repeated stages are summed)."""
+    totals = {}
+    for traced in trace:
+        totals[traced.name] = totals.get(traced.name, 0.0) + traced.elapsed
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+def _route(request):
+    # The URL pattern, not the path, so ids don't multiply the label values.
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match else 'unresolved'
+
+
+def _profile_path(request):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+    return os.path.join(settings.PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{slug}.prof")
+
+
+def _sampled(request):
+    if settings.DEBUG and request.headers.get('X-Profile') == '1':
+        return True
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+_async_profiling = threading.Lock()
+
+
+class MetricsMiddleware:
+    """
+    Times every request by route, method and status, returns the stage trace
+    in ``Server-Timing`` and profiles sampled requests (see
+    ``PROFILE_SAMPLE_RATE``; with DEBUG on, ``X-Profile: 1`` forces it).
+    An async view is profiled on the event loop thread, so other requests'
+    coroutines running meanwhile show up in its profile too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        trace = []
+        token = _trace.set(trace)
+        profiler = cProfile.Profile() if _sampled(request) else None
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            _trace.reset(token)
+        return self._finish(request, response, trace, profiler, start)
+
+    async def __acall__(self, request):
+        trace = []
+        token = _trace.set(trace)
+        # Only one profiler can be active on the event loop thread at a time.
+        profiler = None
+        if _sampled(request) and _async_profiling.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            response = await self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _async_profiling.release()
+            _trace.reset(token)
+        return self._finish(request, response, trace, profiler, start)
+
+    def _finish(self, request, response, trace, profiler, start):
+        route = _route(request)
+        request_seconds.observe(time.perf_counter() - start, route, request.method, response.status_code)
+        if trace:
+            response['Server-Timing'] = server_timing(trace)
+        if profiler is not None:
+            profiler.dump_stats(_profile_path(request))
+            profiled_requests.inc(route)
+        return response
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host='0.0.0.0'):
+    """Serve this process's metrics on ``port`` from a daemon thread (for workers, which have no HTTP)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name=f'metrics:{port}').start()
+    return server
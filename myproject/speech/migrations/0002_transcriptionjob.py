@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptionJob',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('file_path', models.CharField(max_length=1024)),
+                ('file_name', models.CharField(max_length=255)),
+                ('mimetype', models.CharField(max_length=64)),
+                ('options', models.JSONField(default=dict)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=3)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('createdat', models.DateTimeField(auto_now_add=True)),
+                ('updatedat', models.DateTimeField(auto_now=True)),
+                ('meeting', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='speech.meeting')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='speech_tran_status_ba4e0a_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='JobClaimLock',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0002_transcriptionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='workspace',
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+    ]
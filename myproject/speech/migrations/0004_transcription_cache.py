@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0003_transcriptionjob_workspace'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptionCacheEntry',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('response', models.JSONField()),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('createdat', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='cache_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
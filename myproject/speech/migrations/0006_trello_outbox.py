@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0005_chunked_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrelloOutbox',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('group_key', models.CharField(blank=True, max_length=255)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_by', models.CharField(blank=True, max_length=64)),
+                ('lease_until', models.DateTimeField(blank=True, null=True)),
+                ('card_id', models.CharField(blank=True, max_length=64)),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('createdat', models.DateTimeField(auto_now_add=True)),
+                ('sentat', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='speech_trel_status_888f86_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+import re
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """Number existing turns in id order per meeting and parse the old speaker labels."""
+    MeetingTranscription = apps.get_model('speech', 'MeetingTranscription')
+    digits = re.compile(r'\d+')
+    batch = []
+    meeting_id, seq = None, 0
+    rows = MeetingTranscription.objects.order_by('meeting_id', 'id').only('id', 'meeting_id', 'speaker')
+    for row in rows.iterator(chunk_size=2000):
+        if row.meeting_id != meeting_id:
+            meeting_id, seq = row.meeting_id, 0
+        match = digits.search(row.speaker or '')
+        row.seq = seq
+        row.speaker_num = min(int(match.group()), 32767) if match else 0
+        seq += 1
+        batch.append(row)
+        if len(batch) >= 2000:
+            MeetingTranscription.objects.bulk_update(batch, ['seq', 'speaker_num'])
+            batch = []
+    if batch:
+        MeetingTranscription.objects.bulk_update(batch, ['seq', 'speaker_num'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0006_trello_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meetingtranscription',
+            name='seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='meetingtranscription',
+            name='start_ms',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='meetingtranscription',
+            name='end_ms',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='meetingtranscription',
+            name='speaker_num',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='meetingtranscription',
+            name='speaker',
+        ),
+        migrations.RenameField(
+            model_name='meetingtranscription',
+            old_name='speaker_num',
+            new_name='speaker',
+        ),
+        # The backfill numbered each meeting's turns uniquely, before any word store refers to them.
+        migrations.AddConstraint(
+            model_name='meetingtranscription',
+            constraint=models.UniqueConstraint(fields=('meeting', 'seq'), name='transcript_meeting_seq_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='meetingtranscription',
+            index=models.Index(fields=['meeting', 'start_ms'], name='transcript_meeting_start'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0007_transcript_seq_timing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meeting',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='meeting',
+            name='words_path',
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    "ALTER TABLE speech_meetingtranscription ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', text)) STORED",
+    "CREATE INDEX speech_transcript_search ON speech_meetingtranscription USING GIN (search_vector)",
+)
+POSTGRES_REVERSE = (
+    "DROP INDEX IF EXISTS speech_transcript_search",
+    "ALTER TABLE speech_meetingtranscription DROP COLUMN IF EXISTS search_vector",
+)
+
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE speech_transcript_fts USING fts5("
+    "text, content='speech_meetingtranscription', content_rowid='id', tokenize='porter unicode61')",
+    """CREATE TRIGGER speech_transcript_fts_ai AFTER INSERT ON speech_meetingtranscription BEGIN
+        INSERT INTO speech_transcript_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER speech_transcript_fts_ad AFTER DELETE ON speech_meetingtranscription BEGIN
+        INSERT INTO speech_transcript_fts(speech_transcript_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER speech_transcript_fts_au AFTER UPDATE OF text ON speech_meetingtranscription BEGIN
+        INSERT INTO speech_transcript_fts(speech_transcript_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO speech_transcript_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    "INSERT INTO speech_transcript_fts(speech_transcript_fts) VALUES ('rebuild')",
+)
+SQLITE_REVERSE = (
+    "DROP TRIGGER IF EXISTS speech_transcript_fts_ai",
+    "DROP TRIGGER IF EXISTS speech_transcript_fts_ad",
+    "DROP TRIGGER IF EXISTS speech_transcript_fts_au",
+    "DROP TABLE IF EXISTS speech_transcript_fts",
+)
+
+
+def _run(statements):
+    """The search index is backend-specific SQL; other databases get no index."""
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0008_meeting_word_store'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0009_transcript_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='action_keywords',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0010_user_action_keywords'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meeting',
+            name='transcript_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0011_meeting_transcript_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meeting',
+            name='audio_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speech', '0012_meeting_audio_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeetingStats',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('speaker', models.PositiveSmallIntegerField()),
+                ('talk_ms', models.PositiveIntegerField(default=0)),
+                ('turns', models.PositiveIntegerField(default=0)),
+                ('words', models.PositiveIntegerField(default=0)),
+                ('longest_turn_ms', models.PositiveIntegerField(default=0)),
+                ('interruptions', models.PositiveIntegerField(default=0)),
+                ('interrupted', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='meeting',
+            index=models.Index(fields=['userid', 'createdat'], name='meeting_user_created'),
+        ),
+        migrations.AddField(
+            model_name='meetingstats',
+            name='meeting',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='speech.meeting'),
+        ),
+        migrations.AddConstraint(
+            model_name='meetingstats',
+            constraint=models.UniqueConstraint(fields=('meeting', 'speaker'), name='unique_meeting_speaker_stats'),
+        ),
+    ]
@@ -1,10 +1,24 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 class Meeting(models.Model):
     id = models.AutoField(primary_key=True)
     userid = models.IntegerField()
     createdat = models.DateTimeField(auto_now_add=True)
     updatedat = models.DateTimeField(auto_now=True)
     title = models.CharField(max_length=255)
+    # Word-level timings (speech.wordstore); empty until the transcript is stored.
+    words_path = models.CharField(max_length=1024, blank=True)
+    word_count = models.PositiveIntegerField(default=0)
+    # Bumped whenever the transcript's rows change; keys cached exports (speech.exports).
+    transcript_version = models.PositiveIntegerField(default=0)
+    # Content hash of the source recording (speech.utils.hashing), set by ingest_recordings to skip duplicates.
+    audio_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    class Meta:
+        # Per-user date ranges: search, action-item batches and the stats rollups.
+        indexes = [models.Index(fields=['userid', 'createdat'], name='meeting_user_created')]
 
     def __str__(self):
 
@@ -12,19 +26,174 @@ class Meeting(models.Model):
     
 class MeetingTranscription(models.Model):
     id = models.AutoField(primary_key=True)
-    speaker = models.CharField(max_length=255)
+    speaker = models.PositiveSmallIntegerField(default=0)
     meeting = models.ForeignKey(Meeting, on_delete=models.CASCADE)
+    # Position of the turn within the meeting; transcripts are read in seq order.
+    seq = models.PositiveIntegerField(default=0)
+    start_ms = models.IntegerField(null=True, blank=True)
+    end_ms = models.IntegerField(null=True, blank=True)
     text = models.TextField()
 
+    class Meta:
+        constraints = [
+            # Also the index behind keyset paging on (meeting, seq).
+            models.UniqueConstraint(fields=['meeting', 'seq'], name='transcript_meeting_seq_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['meeting', 'start_ms'], name='transcript_meeting_start'),
+        ]
+
     def __str__(self):
         return f"{self.speaker} - {self.meeting.title}"
 
+class MeetingStats(models.Model):
+    """Per-speaker rollup of one meeting (speech.analytics), recomputed whenever its words are stored."""
+    id = models.AutoField(primary_key=True)
+    meeting = models.ForeignKey(Meeting, related_name='stats', on_delete=models.CASCADE)
+    speaker = models.PositiveSmallIntegerField()
+    talk_ms = models.PositiveIntegerField(default=0)
+    turns = models.PositiveIntegerField(default=0)
+    words = models.PositiveIntegerField(default=0)
+    longest_turn_ms = models.PositiveIntegerField(default=0)
+    # Turns this speaker started by cutting in, and turns of theirs that were cut short.
+    interruptions = models.PositiveIntegerField(default=0)
+    interrupted = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['meeting', 'speaker'], name='unique_meeting_speaker_stats')]
+
+    def __str__(self):
+        return f"{self.speaker} - {self.meeting_id}"
+
 class CustomUser(models.Model):  # Change class name
     id = models.AutoField(primary_key=True)
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     code = models.CharField(max_length=10, unique=True)
+    # Words that flag a sentence as an action item; empty uses settings.ACTION_KEYWORDS.
+    action_keywords = models.JSONField(default=list, blank=True)
 
     def __str__(self):
         return self.email
+
+class TranscriptionJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    file_path = models.CharField(max_length=1024)
+    file_name = models.CharField(max_length=255)
+    mimetype = models.CharField(max_length=64)
+    workspace = models.CharField(max_length=1024, blank=True)
+    cache_key = models.CharField(max_length=64, blank=True)
+    options = models.JSONField(default=dict)
+    meeting = models.ForeignKey(Meeting, null=True, blank=True, on_delete=models.SET_NULL)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    createdat = models.DateTimeField(auto_now_add=True)
+    updatedat = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+class JobClaimLock(models.Model):
+    """Single row every ``claim_next_job`` writes first, so claims run one at a time."""
+    id = models.PositiveSmallIntegerField(primary_key=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+class TranscriptionCacheEntry(models.Model):
+    key = models.CharField(max_length=64, primary_key=True)
+    response = models.JSONField()
+    size = models.PositiveBigIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    createdat = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+class ChunkedUpload(models.Model):
+    UPLOADING = 'uploading'
+    COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (UPLOADING, 'Uploading'),
+        (COMPLETE, 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=UPLOADING)
+    content_hash = models.CharField(max_length=64, blank=True)
+    file_path = models.CharField(max_length=1024, blank=True)
+    job = models.ForeignKey(TranscriptionJob, null=True, blank=True, on_delete=models.SET_NULL)
+    createdat = models.DateTimeField(auto_now_add=True)
+    updatedat = models.DateTimeField(auto_now=True)
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+class ChunkedUploadPart(models.Model):
+    upload = models.ForeignKey(ChunkedUpload, related_name='parts', on_delete=models.CASCADE)
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    digest = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['upload', 'index'], name='unique_upload_part')]
+
+class TrelloOutbox(models.Model):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    group_key = models.CharField(max_length=255, blank=True)
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # The dispatcher sending a SENDING row, and until when its claim holds unless renewed.
+    claimed_by = models.CharField(max_length=64, blank=True)
+    lease_until = models.DateTimeField(null=True, blank=True)
+    card_id = models.CharField(max_length=64, blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    createdat = models.DateTimeField(auto_now_add=True)
+    sentat = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,142 @@
+"""
+Audio normalisation before transcription.
+
+The mimetype passed to the backend comes from the file header
+(``sniff_mimetype``), not from a fixed default. PCM WAV, the one format
+the stdlib can decode, is also rewritten before it is sent: downmixed to
+mono and resampled to ``settings.AUDIO_TARGET_RATE`` (never up) as 16-bit
+PCM, in one streaming pass with bounded memory. A 48 kHz stereo recording
+shrinks six-fold, and every later step (splitting, chunk uploads, the
+backend's own decoding) handles that much less. Other formats, float and
+ADPCM WAV included, are sent unchanged.
+
+With ``AUDIO_TRIM_SILENCE`` on, leading and trailing audio quieter than
+``AUDIO_SILENCE_DB`` is cut as well. Word timestamps in the response are
+then shifted back by the trimmed lead (``shift_words``) so they still refer
+to the uploaded recording.
+"""
+import mimetypes
+import os
+import tempfile
+import wave
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+from speech.backends import make_response, response_words
+from speech.metrics import stage
+from speech.utils.audio import Resampler, iter_mono_blocks, read_header, sniff_format, window_rms
+
+DEFAULT_MIMETYPE = 'mpeg'
+
+Audio = namedtuple('Audio', 'path mimetype offset size')
+
+
+def sniff_mimetype(header, filename=''):
+    """The backend mimetype for a file: from its header, else its name, else mpeg."""
+    fmt = sniff_format(header)
+    if fmt is not None:
+        return fmt.mimetype
+    guessed, _ = mimetypes.guess_type(filename)
+    if guessed and guessed.startswith('audio/'):
+        return guessed.split('/', 1)[1]
+    return DEFAULT_MIMETYPE
+
+
+def _pcm_params(path):
+    """``wave`` params for a PCM WAV the stdlib can read, else None."""
+    fmt = sniff_format(read_header(path))
+    if fmt is None or fmt.container != 'wav' or fmt.codec != 'pcm':
+        return None
+    try:
+        with wave.open(path, 'rb') as w:
+            return w.getparams()
+    except (wave.Error, EOFError):
+        return None
+
+
+def voiced_bounds(path, framerate, window_seconds=0.02):
+    """First and last frame louder than ``AUDIO_SILENCE_DB``, padded by ``AUDIO_TRIM_PADDING``."""
+    rms = window_rms(path, window_seconds)
+    loud = np.flatnonzero(rms > 10 ** (settings.AUDIO_SILENCE_DB / 20))
+    if not len(loud):
+        return 0, None
+    pad = settings.AUDIO_TRIM_PADDING
+    start = max(0.0, loud[0] * window_seconds - pad)
+    end = (loud[-1] + 1) * window_seconds + pad
+    return int(start * framerate), int(end * framerate)
+
+
+def normalize_wav(path, out_path, rate, start_frame=0, end_frame=None, block_frames=65536):
+    """Write frames ``start_frame:end_frame`` of a PCM WAV to ``out_path`` as 16-bit mono at ``rate``."""
+    with wave.open(path, 'rb') as w:
+        framerate = w.getframerate()
+    resampler = Resampler(framerate, rate)
+    with wave.open(out_path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+
+        def write(samples):
+            out.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+
+        for _, block in iter_mono_blocks(path, block_frames, start_frame, end_frame):
+            write(resampler.process(block))
+        write(resampler.flush())
+    return out_path
+
+
+def normalize_audio(file_path, mimetype, out_dir):
+    """
+    Normalise ``file_path`` into ``out_dir`` if it is PCM WAV that would
+    change. Returns an ``Audio`` describing what to send: the new file (or
+    the original), its mimetype, the seconds trimmed from the start and the size.
+    """
+    size = os.path.getsize(file_path)
+    params = _pcm_params(file_path) if settings.AUDIO_TARGET_RATE else None
+    if params is None:
+        return Audio(file_path, mimetype, 0.0, size)
+
+    rate = min(settings.AUDIO_TARGET_RATE, params.framerate)
+    start, end = voiced_bounds(file_path, params.framerate) if settings.AUDIO_TRIM_SILENCE else (0, None)
+    end = params.nframes if end is None else min(end, params.nframes)
+    if (params.nchannels, params.sampwidth, params.framerate) == (1, 2, rate) and (start, end) == (0, params.nframes):
+        return Audio(file_path, 'wav', 0.0, size)
+
+    with stage('normalize', size):
+        fd, out_path = tempfile.mkstemp(suffix='.wav', dir=out_dir)
+        os.close(fd)
+        try:
+            normalize_wav(file_path, out_path, rate, start, end)
+        except BaseException:
+            os.remove(out_path)
+            raise
+    return Audio(out_path, 'wav', start / params.framerate, os.path.getsize(out_path))
+
+
+@contextmanager
+def normalized_audio(file_path, mimetype, scratch_dir=None):
+    """``normalize_audio`` into ``scratch_dir`` (default ``SCRATCH_ROOT``), removing the copy afterwards."""
+    scratch_dir = scratch_dir or settings.SCRATCH_ROOT
+    os.makedirs(scratch_dir, exist_ok=True)
+    audio = normalize_audio(file_path, mimetype, scratch_dir)
+    try:
+        yield audio
+    finally:
+        if audio.path != file_path:
+            os.remove(audio.path)
+
+
+def shift_words(res, offset):
+    """Move a response's word timestamps ``offset`` seconds later (undoing a trimmed lead)."""
+    if not offset:
+        return res
+    words = []
+    for word in response_words(res):
+        word = dict(word)
+        word["start"] = round(word["start"] + offset, 3)
+        word["end"] = round(word["end"] + offset, 3)
+        words.append(word)
+    return make_response(words)
@@ -0,0 +1,287 @@
+import os
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from speech.actions import enqueue_action_items
+from speech.analytics import update_meeting_stats
+from speech.backends import get_backend
+from speech.cache import get_cache
+from speech.splitting import transcribe_audio
+from speech.metrics import TimedIterator, stage
+from speech.jobs import PermanentJobError, time_limit_paused
+from speech.models import Meeting, MeetingStats, MeetingTranscription, TrelloOutbox
+from speech.normalize import normalized_audio, shift_words, sniff_mimetype
+from speech.trello import enqueue_card
+from speech.wordstore import WordStoreWriter, discard_stale_stores, store_words
+from speech.utils.streaming_json import iter_words, open_response, read_transcript, save_response
+
+TAG = 'SPEAKER '
+
+Turn = namedtuple('Turn', 'speaker text start_ms end_ms')
+
+
+def seconds_to_ms(seconds):
+    return None if seconds is None else int(round(seconds * 1000))
+
+
+def iter_speaker_turns(words):
+    """
+    Group a Deepgram ``words`` iterable into ``Turn``s in a single pass,
+    yielding each turn as soon as the speaker changes. A turn spans from the
+    start of its first word to the end of its last, in milliseconds.
+    """
+    curr_speaker = None
+    curr_words = []
+    start = end = None
+    for word_struct in words:
+        word_speaker = word_struct.get("speaker", 0)
+        if word_speaker != curr_speaker and curr_words:
+            yield Turn(curr_speaker, ' '.join(curr_words), seconds_to_ms(start), seconds_to_ms(end))
+            curr_words = []
+        if not curr_words:
+            start = word_struct.get("start")
+        curr_speaker = word_speaker
+        end = word_struct.get("end", end)
+        curr_words.append(word_struct.get("punctuated_word") or word_struct["word"])
+    if curr_words:
+        yield Turn(curr_speaker, ' '.join(curr_words), seconds_to_ms(start), seconds_to_ms(end))
+
+
+def next_seq(meeting):
+    """
+    The ``seq`` the meeting's next turn gets (turns may be appended later,
+    e.g. live). Call it inside the transaction that inserts the turns: it
+    locks the meeting row, so concurrent writers to one meeting take turns
+    numbering, and ``(meeting, seq)`` is unique should a backend not lock.
+    """
+    # Read from the database the turns will be written to; a replica may not have the latest ones yet.
+    db = router.db_for_write(MeetingTranscription)
+    list(Meeting.objects.using(db).select_for_update().filter(pk=meeting.pk).values_list('pk'))
+    last = MeetingTranscription.objects.using(db).filter(meeting=meeting).aggregate(last=Max('seq'))['last']
+    return 0 if last is None else last + 1
+
+
+def touch_transcript(meeting_id):
+    """Mark a meeting's transcript as changed, so exports cached for the old version are not served."""
+    Meeting.objects.filter(pk=meeting_id).update(
+        transcript_version=F('transcript_version') + 1, updatedat=timezone.now(),
+    )
+
+
+def transcript_row_saved(sender, instance, raw=False, **kwargs):
+    """``post_save`` hook: turns edited one at a time (e.g. in the admin) change the transcript too."""
+    if not raw:
+        touch_transcript(instance.meeting_id)
+
+
+def persist_turns(meeting, turns, batch_size=None):
+    """
+    Write ``Turn``s for ``meeting`` with ``bulk_create`` in batches of
+    ``batch_size``, all inside one transaction, numbering them after any
+    turns the meeting already has. Returns the number of turns written.
+    """
+    batch_size = batch_size or settings.TRANSCRIPT_BATCH_SIZE
+    batch = []
+    count = 0
+    with transaction.atomic():
+        seq = next_seq(meeting)
+        for turn in turns:
+            batch.append(MeetingTranscription(
+                meeting=meeting, seq=seq, speaker=turn.speaker, text=turn.text,
+                start_ms=turn.start_ms, end_ms=turn.end_ms,
+            ))
+            seq += 1
+            if len(batch) >= batch_size:
+                MeetingTranscription.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            MeetingTranscription.objects.bulk_create(batch)
+            count += len(batch)
+        if count:
+            touch_transcript(meeting.pk)
+    return count
+
+
+def persist_words(meeting, words, transcript_file=None, batch_size=None):
+    """
+    Persist the speaker turns of a Deepgram ``words`` iterable and keep the
+    words themselves in the meeting's word store, in one pass over
+    ``words`` and one transaction. Optionally writes the .txt transcript too. Returns the number
+    of turns written.
+    """
+    with stage('persist') as s, transaction.atomic():
+        writer = WordStoreWriter()
+        first_seq = next_seq(meeting)
+        # Reading and grouping the words happens as persist_turns pulls turns; time it apart.
+        turns = TimedIterator('segment', iter_speaker_turns(writer.tap(words)))
+        try:
+            count = persist_turns(meeting, _write_lines(turns, transcript_file) if transcript_file else turns,
+                                  batch_size)
+        finally:
+            turns.close()
+            s.exclude(turns.elapsed)
+        store_words(meeting, writer, first_turn=first_seq)
+    with stage('analytics'):
+        update_meeting_stats(meeting)
+    return count
+
+
+def _write_lines(turns, f):
+    """Pass turns through unchanged while writing them to the .txt transcript."""
+    for turn in turns:
+        f.write(TAG + str(turn.speaker) + ': ' + turn.text + '\n')
+        yield turn
+
+
+def create_transcript(output_json, output_transcript, meetingId, batch_size=None):
+    meeting = meetingId if isinstance(meetingId, Meeting) else Meeting.objects.get(id=meetingId)
+    with open_response(output_json) as file, open(output_transcript, 'w') as f:
+        return persist_words(meeting, iter_words(file), f, batch_size)
+
+
+def transcription_options(header=b'', filename=''):
+    """The backend mimetype (sniffed from the file header) and options for a recording."""
+    mimetype = sniff_mimetype(header, filename)
+    options = {
+        "punctuate": True,
+        "diarize": True,
+        "model": 'general',
+        "tier": 'nova'
+    }
+    return mimetype, options
+
+
+def _transcribe(file_path, mimetype, options, scratch_dir=None):
+    if not file_path:
+        # Only cache hits are queued without their file; retrying cannot bring the entry back.
+        raise PermanentJobError("Cached transcription was evicted before the job ran; upload the file again")
+    with normalized_audio(file_path, mimetype, scratch_dir) as audio, stage('transcribe', audio.size):
+        res = transcribe_audio(get_backend(), audio.path, audio.mimetype, options, scratch_dir=scratch_dir)
+    return shift_words(res, audio.offset)
+
+
+def transcribe_file(file_path, mimetype, options, key='', scratch_dir=None):
+    """
+    Transcribe one recording: from the transcription cache under ``key`` if
+    it is there, otherwise normalised, split if long and sent to the
+    backend, with the response cached. Returns the Deepgram-shaped response.
+    """
+    cache = get_cache() if key else None
+    res = cache.get(key) if cache is not None else None
+    if res is not None:
+        return res
+    res = _transcribe(file_path, mimetype, options, scratch_dir)
+    if cache is not None:
+        cache.set(key, res)
+    return res
+
+
+@contextmanager
+def open_transcription(file_path, mimetype, options, key='', scratch_dir=None):
+    """
+    ``transcribe_file``, but yield the response as an open text file to read
+    with ``iter_words``, so persisting it does not hold the decoded response.
+    A cached response is streamed from the cache; a fresh one is cached,
+    saved to a scratch file and dropped before the file is opened.
+    """
+    cache = get_cache() if key else None
+    f = cache.open(key) if cache is not None else None
+    path = None
+    if f is None:
+        res = _transcribe(file_path, mimetype, options, scratch_dir)
+        if cache is not None:
+            cache.set(key, res)
+        scratch_dir = scratch_dir or settings.SCRATCH_ROOT
+        os.makedirs(scratch_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.json', dir=scratch_dir)
+        os.close(fd)
+        save_response(res, path)
+        del res
+        f = open_response(path)
+    try:
+        with f:
+            yield f
+    finally:
+        if path is not None:
+            os.remove(path)
+
+
+def clear_transcript(meeting):
+    """
+    Drop a meeting's turns and stats and detach its word store, so it can be
+    persisted again from scratch (the next ``store_words`` starts a new file;
+    the old one is removed once the transaction commits).
+    """
+    if MeetingTranscription.objects.filter(meeting=meeting).delete()[0]:
+        touch_transcript(meeting.pk)
+    MeetingStats.objects.filter(meeting=meeting).delete()
+    previous = meeting.words_path
+    meeting.words_path = ''
+    meeting.word_count = 0
+    meeting.save(update_fields=['words_path', 'word_count'])
+    transaction.on_commit(lambda: discard_stale_stores(meeting.pk, previous))
+
+
+def _job_result(meeting, transcription_text, outbox):
+    return {
+        "meeting_id": meeting.id,
+        "transcript": transcription_text,
+        "trello_outbox_id": outbox.id,
+    }
+
+
+def run_transcription(job):
+    """
+    Transcribe the job's audio file, create the meeting, persist the
+    transcript and queue the Trello cards (the transcript and one checklist
+    of action items) for the dispatcher. Returns the JSON-serialisable job result.
+
+    The transcript, its stats and the outbox row commit in one transaction,
+    with the job's time limit held off, so an attempt stores all of them or
+    none. A retry whose earlier attempt committed (and then lost its job
+    update) returns that attempt's result instead of persisting again. The
+    words are streamed from the response file (``open_transcription``).
+    """
+    if job.meeting_id is not None:
+        outbox = TrelloOutbox.objects.filter(group_key=f"meeting:{job.meeting_id}").order_by('id').first()
+        if outbox is not None:
+            return _job_result(job.meeting, outbox.description, outbox)
+
+    with open_transcription(job.file_path, job.mimetype, job.options, job.cache_key,
+                            job.workspace or None) as response:
+        transcription_text = read_transcript(response, default="No transcription available")
+        response.seek(0)
+        return _persist_job(job, iter_words(response), transcription_text)
+
+
+def _persist_job(job, words, transcription_text):
+    """Store a job's meeting, transcript, cards and action items; see ``run_transcription``."""
+    # A retried job reuses the meeting from its earlier attempt.
+    meeting = job.meeting or Meeting.objects.create(userid=1, title="Project started")
+    if job.meeting_id is None:
+        job.meeting = meeting
+        job.save(update_fields=["meeting"])
+
+    with time_limit_paused(), transaction.atomic():
+        # Left by an attempt from before persistence and the outbox row were committed together.
+        if MeetingTranscription.objects.filter(meeting=meeting).exists():
+            clear_transcript(meeting)
+        if job.workspace:
+            with open(os.path.join(job.workspace, "transcript.txt"), 'w') as f:
+                persist_words(meeting, words, f)
+        else:
+            persist_words(meeting, words)
+
+        #Queue Trello Task with transcription details
+        task_name = f"Transcription: {job.file_name}"
+        outbox = enqueue_card(task_name, transcription_text, group_key=f"meeting:{meeting.id}")
+        enqueue_action_items(meeting)
+
+    return _job_result(meeting, transcription_text, outbox)
@@ -0,0 +1,362 @@
+"""
+Per-meeting BM25 retrieval over ``MeetingTranscription`` rows.
+
+Each speaker turn is a document; turns longer than
+``settings.RETRIEVAL_CHUNK_WORDS`` words are split into several. Terms are
+hashed into ``2 ** RETRIEVAL_HASH_BITS`` buckets, so there is no vocabulary
+to store or keep in sync, and postings live in flat NumPy arrays:
+
+    terms     sorted unique term hashes in the segment (uint32)
+    ptr       postings of terms[i] are docs/tfs[ptr[i]:ptr[i + 1]] (int64)
+    docs      segment-local document numbers (int32)
+    tfs       term frequency in that document (uint16)
+    doc_len   tokens per document (uint32)
+    row_ids   MeetingTranscription id of each document (int64)
+    word_start  first word of the document within the row text (uint32)
+
+An index is a list of immutable segments built for one
+``Meeting.transcript_version``; every write to the transcript bumps it, so
+an edited or deleted turn is never served from an old index. When the
+version changes, ``refresh()`` rebuilds the index, reading the rows in
+batches of ``TRANSCRIPT_BATCH_SIZE`` and appending each as a segment; once
+there are more than ``RETRIEVAL_MAX_SEGMENTS`` they are merged into one.
+Segments are saved as ``.npz`` files under ``RETRIEVAL_INDEX_DIR/<meeting id>/``
+next to a ``meta.json`` naming them with the version and hash width they
+were built with, and the most recently used indexes are kept in memory per
+process.
+"""
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+
+from speech.models import Meeting, MeetingTranscription
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by do for from had has have i if in is it its me my no not of on or so "
+    "that the their them then there they this to uh um was we were what when which who will with you your".split()
+)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TERM_CACHE_SIZE = 1 << 16  # most recent tokens whose crc32 is memoised
+
+
+@lru_cache(maxsize=TERM_CACHE_SIZE)
+def _token_crc(token):
+    return zlib.crc32(token.encode())
+
+
+def term_id(token):
+    """Stable hash bucket of a token (stable across processes, unlike ``hash``)."""
+    return _token_crc(token) & ((1 << settings.RETRIEVAL_HASH_BITS) - 1)
+
+
+def tokenize(text):
+    return [term_id(token) for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def iter_documents(rows, chunk_words=None):
+    """Yield ``(row_id, word_start, text)`` documents from ``(row_id, text)`` rows."""
+    chunk_words = chunk_words or settings.RETRIEVAL_CHUNK_WORDS
+    for row_id, text in rows:
+        words = text.split()
+        if len(words) <= chunk_words:
+            yield row_id, 0, text
+            continue
+        for start in range(0, len(words), chunk_words):
+            yield row_id, start, " ".join(words[start:start + chunk_words])
+
+
+class Segment:
+    FIELDS = ('terms', 'ptr', 'docs', 'tfs', 'doc_len', 'row_ids', 'word_start')
+
+    def __init__(self, terms, ptr, docs, tfs, doc_len, row_ids, word_start):
+        self.terms = terms
+        self.ptr = ptr
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.row_ids = row_ids
+        self.word_start = word_start
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.FIELDS)
+
+    @classmethod
+    def build(cls, documents):
+        """Build a segment from ``(row_id, word_start, text)`` documents."""
+        row_ids, word_start, lengths, flat = [], [], [], []
+        for row_id, start, text in documents:
+            terms = tokenize(text)
+            row_ids.append(row_id)
+            word_start.append(start)
+            lengths.append(len(terms))
+            flat.extend(terms)
+
+        doc_len = np.asarray(lengths, dtype=np.uint32)
+        terms = np.asarray(flat, dtype=np.uint64)
+        docs = np.repeat(np.arange(len(doc_len), dtype=np.uint64), doc_len)
+        # One sort over (term, doc) pairs gives both the grouping by term and the tf counts.
+        pairs, counts = np.unique((terms << np.uint64(32)) | docs, return_counts=True)
+        return cls._from_postings(
+            (pairs >> np.uint64(32)).astype(np.uint32),
+            (pairs & np.uint64(0xFFFFFFFF)).astype(np.int32),
+            np.minimum(counts, 0xFFFF).astype(np.uint16),
+            doc_len,
+            np.asarray(row_ids, dtype=np.int64),
+            np.asarray(word_start, dtype=np.uint32),
+        )
+
+    @classmethod
+    def _from_postings(cls, term_per_posting, docs, tfs, doc_len, row_ids, word_start):
+        terms, first = np.unique(term_per_posting, return_index=True)
+        ptr = np.append(first, len(term_per_posting)).astype(np.int64)
+        return cls(terms, ptr, docs, tfs, doc_len, row_ids, word_start)
+
+    @classmethod
+    def merge(cls, segments):
+        """Merge segments (in row order) into one."""
+        term_per_posting, docs, offset = [], [], 0
+        for segment in segments:
+            term_per_posting.append(np.repeat(segment.terms, np.diff(segment.ptr)))
+            docs.append(segment.docs + offset)
+            offset += len(segment)
+        term_per_posting = np.concatenate(term_per_posting)
+        # Stable sort keeps docs ascending within each term.
+        order = np.argsort(term_per_posting, kind='stable')
+        return cls._from_postings(
+            term_per_posting[order],
+            np.concatenate(docs)[order],
+            np.concatenate([s.tfs for s in segments])[order],
+            np.concatenate([s.doc_len for s in segments]),
+            np.concatenate([s.row_ids for s in segments]),
+            np.concatenate([s.word_start for s in segments]),
+        )
+
+    def postings(self, term):
+        i = np.searchsorted(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return None
+        return self.docs[self.ptr[i]:self.ptr[i + 1]], self.tfs[self.ptr[i]:self.ptr[i + 1]]
+
+    def save(self, path):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, **{name: getattr(self, name) for name in self.FIELDS})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in cls.FIELDS})
+
+
+class MeetingIndex:
+    def __init__(self, meeting_id, directory=None):
+        self.meeting_id = meeting_id
+        self.directory = directory
+        self.segments = []
+        self.segment_files = []
+        self.last_row_id = 0
+        self.version = None
+        self.hash_bits = settings.RETRIEVAL_HASH_BITS
+        self.lock = threading.Lock()
+        if directory is not None:
+            self._load()
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    @property
+    def nbytes(self):
+        return sum(segment.nbytes for segment in self.segments)
+
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _load(self):
+        meta = self._read_meta()
+        if meta is None or meta.get('hash_bits') != settings.RETRIEVAL_HASH_BITS:
+            return  # nothing usable on disk; the next refresh rebuilds it
+        try:
+            segments = [Segment.load(os.path.join(self.directory, name)) for name in meta['segments']]
+        except (FileNotFoundError, ValueError):
+            return  # replaced by another process's rebuild meanwhile
+        self.segments = segments
+        self.segment_files = list(meta['segments'])
+        self.last_row_id = meta['last_row_id']
+        self.version = meta['version']
+        self.hash_bits = meta['hash_bits']
+
+    def _save(self, obsolete=()):
+        meta = {
+            "version": self.version, "hash_bits": self.hash_bits,
+            "last_row_id": self.last_row_id, "segments": self.segment_files,
+        }
+        tmp = self._meta_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path())
+        for name in obsolete:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def add(self, rows):
+        """Index ``(row_id, text)`` rows with ids above ``last_row_id``, in id order. Returns the row count."""
+        obsolete, count = self._append(rows)
+        if count and self.directory is not None:
+            self._save(obsolete)
+        return count
+
+    def _append(self, rows):
+        """Add ``rows`` as a segment without writing ``meta.json``. Returns ``(obsolete files, row count)``."""
+        rows = [(row_id, text) for row_id, text in rows if row_id > self.last_row_id]
+        if not rows:
+            return [], 0
+        segment = Segment.build(iter_documents(rows))
+        self.segments.append(segment)
+        self.last_row_id = rows[-1][0]
+
+        obsolete = []
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"v{self.version}-seg-{rows[0][0]}-{self.last_row_id}.npz"
+            segment.save(os.path.join(self.directory, name))
+            self.segment_files.append(name)
+
+        if len(self.segments) > settings.RETRIEVAL_MAX_SEGMENTS:
+            self.segments = [Segment.merge(self.segments)]
+            if self.directory is not None:
+                obsolete, name = self.segment_files, f"v{self.version}-merged-{self.last_row_id}.npz"
+                self.segments[0].save(os.path.join(self.directory, name))
+                self.segment_files = [name]
+        return obsolete, len(rows)
+
+    def rebuild(self, version):
+        """Index every row of the meeting afresh as of transcript ``version``. Returns the row count."""
+        obsolete = list(self.segment_files)
+        self.segments, self.segment_files, self.last_row_id = [], [], 0
+        self.version, self.hash_bits = version, settings.RETRIEVAL_HASH_BITS
+        batch_size = settings.TRANSCRIPT_BATCH_SIZE
+        rows = MeetingTranscription.objects.filter(
+            meeting_id=self.meeting_id,
+        ).order_by('id').values_list('id', 'text').iterator(chunk_size=batch_size)
+        count = 0
+        while batch := list(islice(rows, batch_size)):
+            merged, added = self._append(batch)
+            obsolete += [name for name in merged if name not in obsolete]
+            count += added
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._save([name for name in obsolete if name not in self.segment_files])
+        return count
+
+    def refresh(self):
+        """Rebuild the index if the meeting's transcript changed since it was built. Returns the row count."""
+        with self.lock:
+            # Read before the rows: a write racing the rebuild bumps it again and the next refresh redoes it.
+            version = Meeting.objects.filter(pk=self.meeting_id).values_list('transcript_version', flat=True).first()
+            current = (version, settings.RETRIEVAL_HASH_BITS)
+            if self.directory is not None and (self.version, self.hash_bits) != current:
+                self._load()  # another process may have rebuilt it already
+            if (self.version, self.hash_bits) == current:
+                return 0
+            return self.rebuild(version)
+
+    def search(self, query, k=None):
+        """Return the top ``k`` documents as ``(row_id, word_start, score)``, best first."""
+        k = k or settings.RETRIEVAL_TOP_K
+        total = len(self)
+        terms = set(tokenize(query))
+        if not total or not terms:
+            return []
+
+        offsets = np.cumsum([0] + [len(segment) for segment in self.segments])
+        avg_len = max(1.0, sum(float(s.doc_len.sum()) for s in self.segments) / total)
+        scores = np.zeros(total, dtype=np.float32)
+        for term in terms:
+            hits = [(i, segment.postings(term)) for i, segment in enumerate(self.segments)]
+            hits = [(i, p) for i, p in hits if p is not None]
+            df = sum(len(docs) for _, (docs, _) in hits)
+            if not df:
+                continue
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for i, (docs, tfs) in hits:
+                tf = tfs.astype(np.float32)
+                dl = self.segments[i].doc_len[docs].astype(np.float32)
+                scores[docs + offsets[i]] += idf * tf * (BM25_K1 + 1) / (
+                    tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avg_len))
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        results = []
+        for d in top:
+            i = int(np.searchsorted(offsets, d, side='right')) - 1
+            local = d - offsets[i]
+            segment = self.segments[i]
+            results.append((int(segment.row_ids[local]), int(segment.word_start[local]), float(scores[d])))
+        return results
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(meeting_id):
+    """Return the meeting's index, loaded from disk at most once per process (LRU)."""
+    with _indexes_lock:
+        index = _indexes.pop(meeting_id, None)
+        if index is None:
+            index = MeetingIndex(meeting_id, os.path.join(settings.RETRIEVAL_INDEX_DIR, str(meeting_id)))
+        _indexes[meeting_id] = index
+        while len(_indexes) > settings.RETRIEVAL_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+
+def relevant_turns(meeting_id, question, k=None):
+    """
+    Bring the meeting's index up to date and return the turns most relevant
+    to ``question`` as dicts with ``id``, ``speaker``, ``score`` and ``text``.
+    """
+    index = get_index(meeting_id)
+    index.refresh()
+    hits = index.search(question, k)
+    rows = MeetingTranscription.objects.in_bulk([row_id for row_id, _, _ in hits])
+    chunk_words = settings.RETRIEVAL_CHUNK_WORDS
+    turns = []
+    for row_id, start, score in hits:
+        row = rows.get(row_id)
+        if row is None:
+            continue
+        words = row.text.split()
+        text = row.text if len(words) <= chunk_words else " ".join(words[start:start + chunk_words])
+        turns.append({"id": row_id, "speaker": row.speaker, "score": round(score, 4), "text": text})
+    return turns
@@ -0,0 +1,40 @@
+"""
+Database routing.
+
+With a ``replica`` database configured (``DB_REPLICA_HOST``), reads of
+transcript turns (the transcript and export APIs, search, retrieval and
+action items) go to the replica. Everything else, and every
+write, stays on the primary.
+
+A replica can lag the primary, so reads that must see the caller's own
+writes stay on the primary: anything inside a transaction on it (e.g.
+``persist_turns`` numbering new turns) and code that asks for the write
+database explicitly (``speech.pipeline.next_seq``).
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+REPLICA_MODELS = frozenset({('speech', 'meetingtranscription')})
+
+
+class TranscriptReadRouter:
+    def db_for_read(self, model, **hints):
+        if REPLICA_DB_ALIAS not in settings.DATABASES:
+            return None
+        if (model._meta.app_label, model._meta.model_name) not in REPLICA_MODELS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        aliases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
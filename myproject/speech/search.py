@@ -0,0 +1,267 @@
+"""
+Full-text search over every meeting's transcript.
+
+The inverted index lives in the database, next to the rows it indexes, so
+it is updated in the same transaction as every insert:
+
+- PostgreSQL: a stored generated ``tsvector`` column on
+  ``speech_meetingtranscription`` (``to_tsvector('english', text)``) with a
+  GIN index. Ranked with ``ts_rank_cd``; snippets from ``ts_headline``.
+- SQLite (local development): an external-content FTS5 table
+  ``speech_transcript_fts`` (porter stemming) kept in sync by triggers.
+  Ranked with ``bm25``; snippets from ``snippet``.
+
+- Anything else: no index. Every term is a case-insensitive substring
+  match (``icontains``) on the turn text, hits come unranked in turn order
+  and snippets are cut around the first match in Python. Slow on a large
+  table, but search keeps working instead of failing.
+
+The indexes are created by migration 0009. Django rebuilds SQLite tables for some
+schema changes, which drops their triggers, so ``ensure_sqlite_triggers``
+runs after every ``migrate`` and restores them (and the index) if needed.
+
+Queries use web-search syntax on both backends: words are ANDed,
+``"quoted phrases"`` match in order, ``or`` between terms and ``-word``
+excludes. Snippets are only computed for the rows on the returned page.
+"""
+import datetime
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils import timezone
+
+from speech.models import MeetingTranscription
+
+FTS_TABLE = 'speech_transcript_fts'
+
+SQLITE_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS speech_transcript_fts_ai AFTER INSERT ON speech_meetingtranscription BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS speech_transcript_fts_ad AFTER DELETE ON speech_meetingtranscription BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS speech_transcript_fts_au AFTER UPDATE OF text ON speech_meetingtranscription BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+)
+
+SearchHit = namedtuple('SearchHit', 'id meeting_id title createdat seq speaker start_ms score snippet')
+
+_TERM_RE = re.compile(r'-?"[^"]*"|\S+')
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts5_query(query):
+    """
+    Translate web-search syntax into an FTS5 MATCH expression, quoting every
+    term so user input can never be read as FTS5 syntax. Returns '' when
+    the query has no searchable terms.
+    """
+    parts = []
+    pending_or = False
+    for term in _TERM_RE.findall(query):
+        if term.lower() == 'or':
+            pending_or = bool(parts)
+            continue
+        negate = term.startswith('-')
+        words = _WORD_RE.findall(term)
+        if not words:
+            continue
+        phrase = '"' + " ".join(words) + '"'
+        if negate:
+            # FTS5 NOT is binary; a leading exclusion has nothing to subtract from.
+            if parts:
+                parts.append(f"NOT {phrase}")
+        elif pending_or:
+            parts[-1] = f"({parts[-1]} OR {phrase})"
+        else:
+            parts.append(phrase)
+        pending_or = False
+    return " ".join(parts)
+
+
+def web_search_q(query):
+    """
+    The same web-search syntax as ``fts5_query``, as a ``Q`` of substring
+    matches on the turn text. Returns None when the query has no searchable
+    terms, and the terms to highlight in snippets.
+    """
+    parts, terms = [], []
+    pending_or = False
+    for term in _TERM_RE.findall(query):
+        if term.lower() == 'or':
+            pending_or = bool(parts)
+            continue
+        negate = term.startswith('-')
+        words = _WORD_RE.findall(term)
+        if not words:
+            continue
+        match = Q(text__icontains=" ".join(words))
+        if negate:
+            if parts:
+                parts.append(~match)
+        else:
+            terms.extend(word.lower() for word in words)
+            if pending_or:
+                parts[-1] = parts[-1] | match
+            else:
+                parts.append(match)
+        pending_or = False
+    if not parts:
+        return None, terms
+    q = parts[0]
+    for part in parts[1:]:
+        q &= part
+    return q, terms
+
+
+def plain_snippet(text, terms, words):
+    """Up to ``words`` words of ``text`` around the first that contains a term, terms in brackets."""
+    tokens = text.split()
+    hits = [i for i, token in enumerate(tokens) if any(term in token.lower() for term in terms)]
+    start = max(0, min(hits[0] - words // 2, len(tokens) - words)) if hits else 0
+    window = [f"[{token}]" if i in hits else token for i, token in enumerate(tokens[start:start + words], start)]
+    return ("…" if start else "") + " ".join(window) + ("…" if start + words < len(tokens) else "")
+
+
+def _fallback_search(using, query, user_id, date_from, date_to, speaker, meeting_id, limit, offset):
+    q, terms = web_search_q(query)
+    if q is None:
+        return []
+    rows = MeetingTranscription.objects.using(using).filter(q)
+    if user_id is not None:
+        rows = rows.filter(meeting__userid=user_id)
+    if date_from is not None:
+        rows = rows.filter(meeting__createdat__gte=_as_datetime(date_from))
+    if date_to is not None:
+        rows = rows.filter(meeting__createdat__lt=_as_datetime(date_to))
+    if speaker is not None:
+        rows = rows.filter(speaker=speaker)
+    if meeting_id is not None:
+        rows = rows.filter(meeting_id=meeting_id)
+    rows = rows.order_by('id').values_list(
+        'id', 'meeting_id', 'meeting__title', 'meeting__createdat', 'seq', 'speaker', 'start_ms', 'text',
+    )[offset:offset + limit]
+    words = settings.SEARCH_SNIPPET_WORDS
+    return [SearchHit(*row[:7], 0.0, plain_snippet(row[7], terms, words)) for row in rows]
+
+
+def _as_datetime(value, connection=None):
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time.min)
+    if settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value if connection is None else connection.ops.adapt_datetimefield_value(value)
+
+
+def _filters(connection, user_id, date_from, date_to, speaker, meeting_id):
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append("m.userid = %s")
+        params.append(user_id)
+    if date_from is not None:
+        clauses.append("m.createdat >= %s")
+        params.append(_as_datetime(date_from, connection))
+    if date_to is not None:
+        clauses.append("m.createdat < %s")
+        params.append(_as_datetime(date_to, connection))
+    if speaker is not None:
+        clauses.append("t.speaker = %s")
+        params.append(speaker)
+    if meeting_id is not None:
+        clauses.append("t.meeting_id = %s")
+        params.append(meeting_id)
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+
+def _postgres_sql(where):
+    return f"""
+        WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+        hits AS (
+            SELECT t.id, t.meeting_id, m.title, m.createdat, t.seq, t.speaker, t.start_ms, t.text,
+                   ts_rank_cd(t.search_vector, q.query) AS rank
+            FROM speech_meetingtranscription t
+            JOIN speech_meeting m ON m.id = t.meeting_id, q
+            WHERE t.search_vector @@ q.query{where}
+            ORDER BY rank DESC, t.id
+            LIMIT %s OFFSET %s
+        )
+        SELECT hits.id, hits.meeting_id, hits.title, hits.createdat, hits.seq, hits.speaker, hits.start_ms, hits.rank,
+               ts_headline('english', hits.text, q.query, %s)
+        FROM hits, q
+        ORDER BY hits.rank DESC, hits.id
+    """
+
+
+def _sqlite_sql(where):
+    return f"""
+        SELECT t.id, t.meeting_id, m.title, m.createdat, t.seq, t.speaker, t.start_ms,
+               -bm25({FTS_TABLE}) AS score,
+               snippet({FTS_TABLE}, 0, '[', ']', '…', %s)
+        FROM {FTS_TABLE}
+        JOIN speech_meetingtranscription t ON t.id = {FTS_TABLE}.rowid
+        JOIN speech_meeting m ON m.id = t.meeting_id
+        WHERE {FTS_TABLE} MATCH %s{where}
+        ORDER BY bm25({FTS_TABLE}), t.id
+        LIMIT %s OFFSET %s
+    """
+
+
+def search_transcripts(query, user_id=None, date_from=None, date_to=None, speaker=None, meeting_id=None,
+                       limit=None, offset=0):
+    """
+    Return up to ``limit`` ``SearchHit``s for ``query``, best first. Dates
+    filter on the meeting's ``createdat`` (``date_from`` inclusive,
+    ``date_to`` exclusive).
+    """
+    limit = limit or settings.SEARCH_PAGE_SIZE
+    using = router.db_for_read(MeetingTranscription)
+    connection = connections[using]
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return _fallback_search(using, query, user_id, date_from, date_to, speaker, meeting_id, limit, offset)
+    where, params = _filters(connection, user_id, date_from, date_to, speaker, meeting_id)
+    words = settings.SEARCH_SNIPPET_WORDS
+
+    if connection.vendor == 'postgresql':
+        if not query.strip():
+            return []
+        sql = _postgres_sql(where)
+        headline = f"MaxWords={words},MinWords={max(1, words // 2)},MaxFragments=1,StartSel=[,StopSel=]"
+        params = [query, *params, limit, offset, headline]
+    else:
+        match = fts5_query(query)
+        if not match:
+            return []
+        sql = _sqlite_sql(where)
+        params = [words, match, *params, limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [SearchHit(*row) for row in cursor.fetchall()]
+
+
+def ensure_sqlite_triggers(using='default', **kwargs):
+    """
+    ``post_migrate`` hook: recreate the FTS triggers if a table rebuild
+    dropped them, and rebuild the index since rows may have changed since.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if FTS_TABLE not in tables:
+            return
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'speech_meetingtranscription'"
+        )
+        if cursor.fetchone()[0] == len(SQLITE_TRIGGERS):
+            return
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
@@ -0,0 +1,194 @@
+"""
+Parallel split-and-transcribe for long recordings.
+
+Recordings longer than ``settings.SPLIT_MIN_SECONDS`` are cut near every
+``SPLIT_CHUNK_SECONDS`` at the quietest point within ``SPLIT_SEARCH_SECONDS``;
+each chunk also runs ``SPLIT_OVERLAP_SECONDS`` past its cut. Chunks are
+transcribed concurrently on a pool of ``SPLIT_MAX_WORKERS`` threads, each
+retried on its own with exponential backoff, and the word streams are
+merged back into one Deepgram-shaped response: timestamps are re-based, duplicate words in the
+overlaps are dropped at the overlap midpoint, and chunk-local speaker labels
+are mapped onto global ones by matching the words both chunks heard (a
+speaker with no match gets a new label).
+
+Only PCM WAV can be cut with the stdlib; anything else (float or ADPCM
+WAV included) is transcribed in one call. Chunk responses are cached like
+whole-file ones, so retrying a job only re-sends the chunks that failed.
+"""
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from speech.backends import make_response, response_words
+from speech.cache import cache_key, get_cache
+from speech.utils.audio import is_pcm_wav, wav_duration, window_rms, write_wav_slice
+from speech.utils.hashing import hash_chunks
+
+WINDOW_SECONDS = 0.02
+
+
+def plan_cuts(rms, duration, chunk_seconds, search_seconds, window_seconds=WINDOW_SECONDS):
+    """Return cut timestamps (excluding 0 and the end) placed on the quietest windows."""
+    cuts = []
+    position = 0.0
+    while duration - position > chunk_seconds + search_seconds:
+        target = position + chunk_seconds
+        lo = max(int((target - search_seconds) / window_seconds), int(position / window_seconds) + 1)
+        hi = min(int((target + search_seconds) / window_seconds), len(rms))
+        if hi <= lo:
+            cut = target
+        else:
+            cut = (lo + int(np.argmin(rms[lo:hi]))) * window_seconds
+        cuts.append(cut)
+        position = cut
+    return cuts
+
+
+def chunk_spans(cuts, duration, overlap_seconds):
+    """``(start, end)`` for each chunk; every chunk but the last runs ``overlap_seconds`` past its cut."""
+    bounds = [0.0] + list(cuts) + [duration]
+    return [
+        (bounds[i], min(bounds[i + 1] + overlap_seconds, duration) if i + 1 < len(bounds) - 1 else duration)
+        for i in range(len(bounds) - 1)
+    ]
+
+
+def _map_speakers(prev_overlap, next_overlap, next_speakers, last_seen):
+    """
+    Map the next chunk's local speakers to global ids. Words both chunks
+    transcribed inside the overlap (same text, starts within 0.5s) vote for a
+    pairing; a local speaker with no votes has no evidence of being anyone
+    heard before and gets a new id.
+    """
+    votes = Counter()
+    for word in next_overlap:
+        text = word.get("word", "").lower()
+        best = None
+        for prev in prev_overlap:
+            if prev.get("word", "").lower() == text and abs(prev["start"] - word["start"]) < 0.5:
+                if best is None or abs(prev["start"] - word["start"]) < abs(best["start"] - word["start"]):
+                    best = prev
+        if best is not None:
+            votes[(word.get("speaker", 0), best.get("speaker", 0))] += 1
+
+    mapping = {}
+    used = set()
+    for (local, global_speaker), _ in votes.most_common():
+        if local not in mapping and global_speaker not in used:
+            mapping[local] = global_speaker
+            used.add(global_speaker)
+
+    next_id = max(last_seen, default=-1) + 1
+    for local in next_speakers:
+        if local not in mapping:
+            mapping[local] = next_id
+            next_id += 1
+    return mapping
+
+
+def merge_chunk_results(spans, results):
+    """Merge per-chunk responses (chunk-relative times) into one response."""
+    merged = []
+    last_seen = {}
+    prev_rebased = []
+    for i, ((start, end), res) in enumerate(zip(spans, results)):
+        rebased = []
+        for word in response_words(res):
+            word = dict(word)
+            word["start"] = round(word["start"] + start, 3)
+            word["end"] = round(word["end"] + start, 3)
+            rebased.append(word)
+
+        if i == 0:
+            mapping = {w.get("speaker", 0): w.get("speaker", 0) for w in rebased}
+        else:
+            overlap_start, overlap_end = start, spans[i - 1][1]
+            mapping = _map_speakers(
+                [w for w in prev_rebased if w["start"] >= overlap_start],
+                [w for w in rebased if w["start"] < overlap_end],
+                list(dict.fromkeys(w.get("speaker", 0) for w in rebased)),
+                last_seen,
+            )
+        for word in rebased:
+            if "speaker" in word:
+                word["speaker"] = mapping[word["speaker"]]
+                last_seen[word["speaker"]] = word["end"]
+
+        lower = (start + spans[i - 1][1]) / 2 if i > 0 else float('-inf')
+        upper = (spans[i + 1][0] + end) / 2 if i + 1 < len(spans) else float('inf')
+        merged.extend(w for w in rebased if lower <= w["start"] < upper)
+        prev_rebased = rebased
+
+    return make_response(merged)
+
+
+def _iter_file(path, block_size=1024 * 1024):
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+def _transcribe_chunk(backend, path, options):
+    # Chunks go through the transcription cache too, so a retried job only
+    # re-sends the chunks that failed last time.
+    cache = get_cache()
+    key = cache_key(hash_chunks(_iter_file(path)), options) if cache is not None else None
+    if key is not None:
+        res = cache.get(key)
+        if res is not None:
+            return res
+
+    attempts = max(settings.SPLIT_CHUNK_ATTEMPTS, 1)
+    for attempt in range(attempts):
+        if attempt:
+            # Back off before each retry so a rate-limited backend gets room to recover.
+            time.sleep(settings.SPLIT_CHUNK_RETRY_BACKOFF * 2 ** (attempt - 1))
+        try:
+            res = backend.transcribe(path, 'wav', options)
+        except Exception:
+            if attempt + 1 == attempts:
+                raise
+            continue
+        if key is not None:
+            cache.set(key, res)
+        return res
+
+
+def transcribe_audio(backend, file_path, mimetype, options, scratch_dir=None):
+    """
+    Transcribe ``file_path`` with ``backend``, splitting it into concurrent
+    chunks when it is a long PCM WAV. Returns a Deepgram-shaped response.
+    """
+    if not is_pcm_wav(file_path) or wav_duration(file_path) <= settings.SPLIT_MIN_SECONDS:
+        return backend.transcribe(file_path, mimetype, options)
+
+    duration = wav_duration(file_path)
+    cuts = plan_cuts(window_rms(file_path, WINDOW_SECONDS), duration,
+                     settings.SPLIT_CHUNK_SECONDS, settings.SPLIT_SEARCH_SECONDS)
+    spans = chunk_spans(cuts, duration, settings.SPLIT_OVERLAP_SECONDS)
+
+    scratch_dir = scratch_dir or settings.SCRATCH_ROOT
+    os.makedirs(scratch_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=scratch_dir) as tmp:
+        paths = [
+            write_wav_slice(file_path, start, end, os.path.join(tmp, f"chunk{i:04d}.wav"))
+            for i, (start, end) in enumerate(spans)
+        ]
+        pool = ThreadPoolExecutor(max_workers=settings.SPLIT_MAX_WORKERS)
+        try:
+            results = list(pool.map(lambda p: _transcribe_chunk(backend, p, options), paths))
+        except BaseException:
+            # A failed chunk or the job's JobTimeout: don't wait for the calls
+            # still in flight, and drop the chunks not started yet.
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+    return merge_chunk_results(spans, results)
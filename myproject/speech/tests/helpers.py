@@ -0,0 +1,106 @@
+"""
+Shared fixtures for the speech tests.
+
+``IsolatedTestCase`` points every on-disk store (scratch, caches, word
+store, uploads, indexes, journals) at a per-test temporary directory and
+resets the process-wide backend, cache and language model, so tests never
+touch the real directories or leak state into each other.
+"""
+import os
+import shutil
+import struct
+import tempfile
+import wave
+
+import numpy as np
+
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from speech import backends, cache, llm, retrieval
+
+DIR_SETTINGS = (
+    'SCRATCH_ROOT', 'TRANSCRIPTION_CACHE_DIR', 'WORD_STORE_DIR', 'EXPORT_CACHE_DIR', 'UPLOAD_ROOT',
+    'RETRIEVAL_INDEX_DIR', 'PROFILE_DIR', 'INGEST_JOURNAL_DIR',
+)
+
+
+def word(text, start, end, speaker=0, confidence=0.99):
+    """A Deepgram word struct; ``text`` is the punctuated form."""
+    return {
+        "word": text.lower().strip('.,?!'), "punctuated_word": text, "start": start, "end": end,
+        "confidence": confidence, "speaker": speaker,
+    }
+
+
+def conversation(turns, gap=0.2, word_seconds=0.3):
+    """Words for ``[(speaker, "Some text."), ...]``, one after another."""
+    words, t = [], 0.0
+    for speaker, text in turns:
+        for token in text.split():
+            words.append(word(token, round(t, 3), round(t + word_seconds, 3), speaker))
+            t += word_seconds
+        t += gap
+    return words
+
+
+def write_wav(path, samples, framerate=8000):
+    """Write float ``samples`` in [-1, 1] as a 16-bit mono PCM WAV."""
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(framerate)
+        w.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+    return path
+
+
+def write_float_wav(path, samples, framerate=8000, channels=1):
+    """Write float32 ``samples`` (interleaved) as an IEEE float WAV, which ``wave`` cannot read."""
+    data = np.asarray(samples, dtype='<f4').tobytes()
+    fmt = struct.pack('<HHIIHH', 3, channels, framerate, framerate * channels * 4, channels * 4, 32)
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', 4 + 8 + len(fmt) + 8 + len(data)) + b'WAVE')
+        f.write(b'fmt ' + struct.pack('<I', len(fmt)) + fmt)
+        f.write(b'data' + struct.pack('<I', len(data)) + data)
+    return path
+
+
+def speech_like(seconds, quiet=(), framerate=8000):
+    """A loud tone for ``seconds`` with silence over each ``(start, end)`` in ``quiet``."""
+    t = np.arange(int(seconds * framerate)) / framerate
+    samples = 0.5 * np.sin(2 * np.pi * 220 * t)
+    for start, end in quiet:
+        samples[int(start * framerate):int(end * framerate)] = 0
+    return samples
+
+
+class IsolatedMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp(prefix='speech-test-')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        overrides = override_settings(
+            TRANSCRIPTION_CACHE_BACKEND='speech.cache.FileSystemCache',
+            ALLOWED_HOSTS=['testserver'],
+            **{name: os.path.join(self.tmp, name.lower()) for name in DIR_SETTINGS},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for reset in (backends.set_backend, cache.set_cache, llm.set_llm):
+            reset(None)
+            self.addCleanup(reset, None)
+        retrieval._indexes.clear()
+        self.addCleanup(retrieval._indexes.clear)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+
+class IsolatedTestCase(IsolatedMixin, TestCase):
+    pass
+
+
+class IsolatedTransactionTestCase(IsolatedMixin, TransactionTestCase):
+    pass
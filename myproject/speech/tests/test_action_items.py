@@ -0,0 +1,132 @@
+import os
+import random
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from speech.actions import enqueue_action_items
+from speech.models import Meeting
+from speech.pipeline import Turn, persist_turns
+from speech.tests.helpers import IsolatedTestCase, conversation, word
+from speech.utils.action_items import (
+    KeywordMatcher, _sentence_at, extract_from_text, extract_from_words, flag_sentences, sentence_ends,
+    split_sentences,
+)
+from speech.utils.pretty_table import save_transcription_as_table
+from speech.wordstore import WordStoreWriter, store_words
+
+
+def columns(words):
+    writer = WordStoreWriter()
+    writer.add_turns(words)
+    return SimpleNamespace(**writer.columns())
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    def test_word_starts_case_and_spacing(self):
+        matcher = KeywordMatcher(["send", "Follow Up", "follow"])
+        self.assertEqual(matcher.keywords, ("follow", "follow up", "send"))
+        self.assertEqual(matcher.match("SENDING it now"), ("send",))
+        self.assertEqual(matcher.match("what a godsend"), ())
+        # The longest keyword wins, across any whitespace.
+        self.assertEqual(matcher.find("We will follow\n  up."), ([8], ["follow up"]))
+        self.assertEqual(matcher.match("Just follow."), ("follow",))
+
+    def test_empty_keyword_set(self):
+        matcher = KeywordMatcher(["", "  "])
+        self.assertIsNone(matcher.regex)
+        self.assertEqual(matcher.find("send it"), ([], []))
+        self.assertTrue(matcher.ruled_out("send it"))
+        self.assertEqual(flag_sentences("Send it. Now.", matcher), [("Send it.", False), ("Now.", False)])
+
+    def test_probes_only_rule_out_ascii_text(self):
+        matcher = KeywordMatcher(["follow up", "send"])
+        self.assertEqual(matcher.probes, ("follow", "send"))
+        self.assertTrue(matcher.ruled_out("Nothing to do."))
+        self.assertFalse(matcher.ruled_out("Followed by tea."))
+        self.assertFalse(matcher.ruled_out("Grüße, nothing to do."))
+        self.assertIsNone(KeywordMatcher([f"k{i}" for i in range(100)]).probes)
+        self.assertIsNone(KeywordMatcher(["grüße"]).probes)
+
+
+class SentenceTests(SimpleTestCase):
+    def test_split_sentences(self):
+        self.assertEqual(split_sentences("Growth was 3.5 percent! Really?  Yes... ok"),
+                         ["Growth was 3.5 percent!", "Really?", "Yes...", "ok"])
+        self.assertEqual(split_sentences("  "), [])
+        self.assertEqual(split_sentences("... then. .b"), ["...", "then.", ".b"])
+
+    def test_split_sentences_agrees_with_sentence_ends(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            text = "".join(rng.choice("ab3 .!?\n") for _ in range(rng.randrange(12)))
+            ends = sentence_ends(text)
+            expected = [s for s in (_sentence_at(text, ends, i) for i in range(len(ends))) if s]
+            self.assertEqual(split_sentences(text), expected, repr(text))
+
+    def test_flag_sentences_agrees_with_match(self):
+        matcher = KeywordMatcher(["send", "call"])
+        for text in ("Please send it. Thanks! Call me?", "Nothing here. Really", "Grüße. Send Grüße.", ""):
+            self.assertEqual(flag_sentences(text, matcher),
+                             [(s, bool(matcher.match(s))) for s in split_sentences(text)])
+
+
+class ExtractTests(SimpleTestCase):
+    matcher = KeywordMatcher(["send", "call"])
+
+    def test_from_text(self):
+        items = extract_from_text("Please send it. Thanks! Call and send me the notes", self.matcher, 1, 500, 3)
+        self.assertEqual([(i.sentence, i.keywords) for i in items],
+                         [("Please send it.", ("send",)), ("Call and send me the notes", ("call", "send"))])
+        self.assertEqual((items[0].speaker, items[0].start_ms, items[0].end_ms, items[0].turn), (1, 500, None, 3))
+
+    def test_from_words(self):
+        words = conversation([(0, "Good morning. I will send the report"), (1, "Grüße, call me")])
+        # A pause also ends a sentence.
+        words.append(word("Send", 20.0, 20.3, speaker=1))
+        words.append(word("it.", 20.3, 20.6, speaker=1))
+        items = extract_from_words(columns(words), self.matcher, gap_ms=1500)
+        self.assertEqual([(i.sentence, i.speaker, i.turn, i.keywords) for i in items], [
+            ("I will send the report", 0, 0, ("send",)),
+            ("Grüße, call me", 1, 1, ("call",)),
+            ("Send it.", 1, 1, ("send",)),
+        ])
+        self.assertEqual((items[-1].start_ms, items[-1].end_ms), (20000, 20600))
+
+    def test_from_words_without_matches(self):
+        self.assertEqual(extract_from_words(columns(conversation([(0, "Nothing here.")])), self.matcher), [])
+        self.assertEqual(extract_from_words(columns([]), self.matcher), [])
+
+
+class ActionItemTests(IsolatedTestCase):
+    def test_view_uses_word_store_then_turns(self):
+        stored = Meeting.objects.create(userid=1, title="words")
+        writer = WordStoreWriter()
+        writer.add_turns(conversation([(0, "Please call the client.")]))
+        store_words(stored, writer)
+        turns_only = Meeting.objects.create(userid=1, title="turns")
+        persist_turns(turns_only, [Turn(0, "Hello.", 0, 1000), Turn(1, "I will send it.", 1000, 2000)])
+
+        body = self.client.get(f"/api/meetings/{stored.id}/action-items/").json()
+        self.assertEqual([item["sentence"] for item in body["action_items"]], ["Please call the client."])
+        body = self.client.get(f"/api/meetings/{turns_only.id}/action-items/").json()
+        self.assertEqual([item["sentence"] for item in body["action_items"]], ["I will send it."])
+        body = self.client.get(f"/api/meetings/{turns_only.id}/action-items/", {"keywords": "hello"}).json()
+        self.assertEqual([item["sentence"] for item in body["action_items"]], ["Hello."])
+        self.assertEqual(self.client.get("/api/meetings/999999/action-items/").status_code, 404)
+
+    def test_cards_for_turns_without_timings(self):
+        meeting = Meeting.objects.create(userid=1, title="untimed")
+        persist_turns(meeting, [Turn(0, "Please call the client.", None, None), Turn(1, "Send it.", 65000, 66000)])
+        self.assertEqual([card.description for card in enqueue_action_items(meeting)],
+                         ["Speaker 0", "Speaker 1 at 1:05"])
+
+    def test_table(self):
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        self.addCleanup(os.chdir, cwd)
+        path = save_transcription_as_table("Please send it. Thanks", "t.txt")
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertIn("| Please send it. |      ✅     |", lines)
+        self.assertIn("| Thanks          |      ❌     |", lines)
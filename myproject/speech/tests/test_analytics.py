@@ -0,0 +1,98 @@
+import datetime
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from speech.analytics import aggregate_stats, turn_stats, update_meeting_stats, word_stats
+from speech.models import Meeting, MeetingStats
+from speech.pipeline import Turn, persist_turns, persist_words
+from speech.tests.helpers import IsolatedTestCase, word
+from speech.wordstore import WordStoreWriter
+
+# Speaker 1 answers after a finished sentence, then cuts speaker 0 off mid-sentence.
+WORDS = [
+    word("Hello", 0.0, 0.3), word("there.", 0.3, 0.6),
+    word("Hi.", 0.7, 1.0, speaker=1),
+    word("So", 1.1, 1.4), word("we", 1.4, 1.7),
+    word("Wait", 1.6, 1.9, speaker=1), word("now.", 1.9, 2.2, speaker=1),
+    word("Sorry", 2.3, 2.6),
+]
+
+
+def columns(words):
+    writer = WordStoreWriter()
+    writer.add_turns(words)
+    return writer.columns()
+
+
+class SpeakerStatsTests(SimpleTestCase):
+    def test_word_stats(self):
+        self.assertEqual(word_stats(columns(WORDS), gap_ms=500), {
+            0: {'talk_ms': 1500, 'turns': 3, 'words': 5, 'longest_turn_ms': 600,
+                'interruptions': 0, 'interrupted': 1},
+            1: {'talk_ms': 900, 'turns': 2, 'words': 3, 'longest_turn_ms': 600,
+                'interruptions': 1, 'interrupted': 0},
+        })
+
+    def test_quick_reply_to_an_unfinished_sentence_is_an_interruption(self):
+        words = [word("and", 0.0, 0.3), word("yes", 0.4, 0.7, speaker=1)]
+        self.assertEqual(word_stats(columns(words), gap_ms=200)[1]['interruptions'], 1)
+        self.assertEqual(word_stats(columns(words), gap_ms=50)[1]['interruptions'], 0)
+
+    def test_empty(self):
+        self.assertEqual(word_stats(columns([])), {})
+
+
+class MeetingStatsTests(IsolatedTestCase):
+    def test_stored_words_get_stats(self):
+        meeting = Meeting.objects.create(userid=1, title="m")
+        persist_words(meeting, WORDS)
+        stats = {s.speaker: s for s in meeting.stats.all()}
+        self.assertEqual((stats[0].talk_ms, stats[0].words, stats[1].turns), (1500, 5, 2))
+
+    def test_turns_stand_in_for_words(self):
+        meeting = Meeting.objects.create(userid=1, title="m")
+        persist_turns(meeting, [
+            Turn(0, "Hello there.", 0, 600), Turn(1, "Wait, one thing", 500, 1500), Turn(0, "Yes?", 5000, 5300),
+        ])
+        stats = turn_stats(meeting)
+        self.assertEqual(stats[1], {'talk_ms': 1000, 'turns': 1, 'words': 3, 'longest_turn_ms': 1000,
+                                    'interruptions': 1, 'interrupted': 0})
+        self.assertEqual(stats[0]['words'], 3)
+        self.assertEqual(len(update_meeting_stats(meeting)), 2)
+        self.assertEqual(MeetingStats.objects.filter(meeting=meeting).count(), 2)
+
+    def test_meeting_stats_view(self):
+        meeting = Meeting.objects.create(userid=1, title="m")
+        persist_words(meeting, WORDS)
+        body = self.client.get(f"/api/meetings/{meeting.id}/stats/").json()
+        self.assertEqual(body["talk_ms"], 2400)
+        self.assertEqual([s["talk_share"] for s in body["speakers"]], [0.625, 0.375])
+        self.assertEqual(body["speakers"][1]["wpm"], 200.0)
+        self.assertEqual(self.client.get("/api/meetings/999999/stats/").status_code, 404)
+
+
+class AggregateStatsTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = Meeting.objects.create(userid=1, title="today")
+        persist_words(self.today, WORDS)
+        self.older = Meeting.objects.create(userid=2, title="older")
+        persist_words(self.older, WORDS[:3])
+        Meeting.objects.filter(pk=self.older.pk).update(createdat=timezone.now() - datetime.timedelta(days=40))
+
+    def test_totals_and_groups(self):
+        result = aggregate_stats(group='speaker')
+        self.assertEqual((result["totals"]["meetings"], result["totals"]["talk_ms"]), (2, 3300))
+        self.assertEqual([(g["speaker"], g["talk_ms"]) for g in result["groups"]], [(0, 2100), (1, 1200)])
+        self.assertEqual(aggregate_stats(user_id=2)["totals"]["words"], 3)
+        by_meeting = aggregate_stats(group='meeting')["groups"]
+        self.assertEqual([g["meeting_id"] for g in by_meeting], sorted([self.today.id, self.older.id]))
+
+    def test_view(self):
+        today = timezone.localdate().isoformat()
+        body = self.client.get('/api/stats/', {"from": today, "to": today, "group": "day"}).json()
+        self.assertEqual(body["totals"]["meetings"], 1)
+        self.assertEqual([g["period"] for g in body["groups"]], [today])
+        self.assertEqual(self.client.get('/api/stats/', {"group": "year"}).status_code, 400)
+        self.assertEqual(self.client.get('/api/stats/', {"user": "x"}).status_code, 400)
@@ -0,0 +1,67 @@
+import json
+import os
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase
+
+from speech.backends import DeepgramBackend, FakeBackend, LocalBackend, make_response, response_words
+from speech.tests.helpers import IsolatedTestCase, speech_like, word, write_wav
+
+
+def deepgram_backend():
+    backend = DeepgramBackend.__new__(DeepgramBackend)  # no SDK client needed
+
+    async def transcribe_async(path, mimetype, options):
+        return make_response([word(os.path.basename(path), 0.0, 0.5)])
+
+    backend.transcribe_async = mock.AsyncMock(side_effect=transcribe_async)
+    return backend
+
+
+ITEMS = [('a.wav', 'wav'), ('b.mp3', 'mpeg'), ('c.wav', 'wav')]
+
+
+class DeepgramBatchTests(SimpleTestCase):
+    def names(self, results):
+        return [response_words(res)[0]["word"] for res in results]
+
+    def test_sync_batch(self):
+        backend = deepgram_backend()
+        self.assertEqual(self.names(backend.transcribe_batch(ITEMS, {})), ['a.wav', 'b.mp3', 'c.wav'])
+        self.assertEqual(backend.transcribe_async.await_count, 3)
+
+    async def test_async_batch_on_a_running_loop(self):
+        backend = deepgram_backend()
+        self.assertEqual(self.names(await backend.atranscribe_batch(ITEMS, {})), ['a.wav', 'b.mp3', 'c.wav'])
+
+    async def test_sync_batch_called_from_async_code(self):
+        backend = deepgram_backend()
+        results = await sync_to_async(backend.transcribe_batch)(ITEMS, {})
+        self.assertEqual(self.names(results), ['a.wav', 'b.mp3', 'c.wav'])
+
+
+class BaseBatchTests(IsolatedTestCase):
+    def test_fake_backend_batch(self):
+        backend = FakeBackend()
+        self.assertEqual(len(backend.transcribe_batch(ITEMS, {})), 3)
+        self.assertEqual(backend.calls, 3)
+
+    async def test_fake_backend_async_batch(self):
+        backend = FakeBackend()
+        self.assertEqual(len(await backend.atranscribe_batch(ITEMS, {})), 3)
+        self.assertEqual(backend.calls, 3)
+
+    def test_local_backend_fixture_and_wav(self):
+        fixture = make_response([word("Fixture.", 0.0, 0.5)])
+        path = self.write_file('a.mp3', b'\xff\xfb' + bytes(64))
+        with open(path + '.json', 'w') as f:
+            json.dump(fixture, f)
+        wav = write_wav(os.path.join(self.tmp, 'b.wav'), speech_like(4, quiet=[(1.5, 2.5)]))
+        backend = LocalBackend(latency=0, realtime_factor=0)
+        first, second = backend.transcribe_batch([(path, 'mpeg'), (wav, 'wav')], {})
+        self.assertEqual(first, fixture)
+        words = response_words(second)
+        self.assertTrue(words)
+        self.assertFalse([w for w in words if 1.5 <= w["start"] < 2.5])  # silence gets no words
+        self.assertEqual(backend.transcribe(wav, 'wav', {}), second)  # deterministic
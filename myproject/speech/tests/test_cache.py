@@ -0,0 +1,186 @@
+import os
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+
+from speech.backends import FakeBackend, make_response, response_words, set_backend
+from speech.cache import DatabaseCache, FileSystemCache, cache_key, set_cache
+from speech.jobs import run_pending_jobs
+from speech.models import MeetingTranscription, TranscriptionCacheEntry, TranscriptionJob
+from speech.tests.helpers import IsolatedTestCase, word
+from speech.utils.streaming_json import iter_words
+
+RESPONSE = make_response([word("Hello.", 0.0, 0.5)])
+
+
+class CacheKeyTests(IsolatedTestCase):
+    def test_options_order_does_not_matter(self):
+        self.assertEqual(cache_key('abc', {"a": 1, "b": 2}), cache_key('abc', {"b": 2, "a": 1}))
+        self.assertNotEqual(cache_key('abc', {"a": 1}), cache_key('abc', {"a": 2}))
+        self.assertNotEqual(cache_key('abc', {"a": 1}), cache_key('abd', {"a": 1}))
+
+
+class CacheBackendTests:
+    """Behaviour both backends share; ``age`` backdates an entry's last use."""
+    def make_cache(self, **kwargs):
+        raise NotImplementedError
+
+    def age(self, cache, key, seconds):
+        raise NotImplementedError
+
+    def test_round_trip_and_stats(self):
+        cache = self.make_cache()
+        self.assertIsNone(cache.get('k1'))
+        cache.set('k1', RESPONSE)
+        self.assertTrue(cache.contains('k1'))
+        self.assertEqual(cache.get('k1'), RESPONSE)
+        self.assertEqual(cache.stats.as_dict()["hits"], 1)
+        self.assertEqual(cache.stats.as_dict()["misses"], 1)
+        cache.delete('k1')
+        self.assertFalse(cache.contains('k1'))
+
+    def test_open_streams_the_entry(self):
+        cache = self.make_cache()
+        self.assertIsNone(cache.open('k1'))
+        cache.set('k1', RESPONSE)
+        with cache.open('k1') as f:
+            self.assertEqual(list(iter_words(f)), response_words(RESPONSE))
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 1))
+
+    def test_ttl_counts_from_last_use(self):
+        cache = self.make_cache(ttl=100)
+        cache.set('idle', RESPONSE)
+        cache.set('used', RESPONSE)
+        self.age(cache, 'idle', 200)
+        self.age(cache, 'used', 200)
+        self.assertIsNone(cache.get('idle'))
+        self.assertFalse(cache.contains('used'))
+
+        cache.set('used', RESPONSE)
+        self.age(cache, 'used', 60)
+        self.assertEqual(cache.get('used'), RESPONSE)  # a hit refreshes it
+        self.age(cache, 'used', 60)
+        self.assertTrue(cache.contains('used'))
+
+    def test_writes_scan_only_when_due(self):
+        cache = self.make_cache(evict_interval=3600)
+        with mock.patch.object(type(cache), '_evict', autospec=True, side_effect=lambda c: (0, 0)) as scan:
+            for i in range(3):
+                cache.set(f'k{i}', RESPONSE)
+            self.assertEqual(scan.call_count, 1)  # the first write, then within the interval and the cap
+            cache.max_bytes = 1
+            cache.set('big', RESPONSE)
+            self.assertEqual(scan.call_count, 2)
+
+    def test_evicts_expired_then_least_recently_used(self):
+        cache = self.make_cache(ttl=100, max_bytes=0)
+        for i in range(4):
+            cache.set(f'k{i}', RESPONSE)
+        for i, age in enumerate((500, 30, 20, 10)):
+            self.age(cache, f'k{i}', age)
+        self.assertEqual(cache.evict(), 1)
+        self.assertFalse(cache.contains('k0'))
+
+        size = self.entry_size(cache, 'k1')
+        cache.max_bytes = 2 * size
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual([cache.contains(f'k{i}') for i in range(1, 4)], [False, True, True])
+
+
+class FileSystemCacheTests(CacheBackendTests, IsolatedTestCase):
+    def make_cache(self, **kwargs):
+        return FileSystemCache(root=os.path.join(self.tmp, 'fs'), **kwargs)
+
+    def age(self, cache, key, seconds):
+        past = time.time() - seconds
+        os.utime(cache._path(key), (past, past))
+
+    def entry_size(self, cache, key):
+        return os.path.getsize(cache._path(key))
+
+    def test_entry_removed_by_another_worker_during_evict(self):
+        cache = self.make_cache(ttl=100)
+        cache.set('gone', RESPONSE)
+        self.age(cache, 'gone', 500)
+        cache.set('kept', RESPONSE)
+        with mock.patch('speech.cache.os.remove', side_effect=FileNotFoundError):
+            self.assertEqual(cache.evict(), 0)
+        cache.max_bytes = 1
+        with mock.patch('speech.cache.os.remove', side_effect=FileNotFoundError):
+            self.assertEqual(cache.evict(), 0)
+
+    def test_set_survives_concurrent_eviction(self):
+        cache = self.make_cache(ttl=100)
+        cache.set('old', RESPONSE)
+        self.age(cache, 'old', 500)
+        with mock.patch('speech.cache.os.remove', side_effect=FileNotFoundError):
+            cache.set('new', RESPONSE)
+        self.assertEqual(cache.get('new'), RESPONSE)
+
+
+class DatabaseCacheTests(CacheBackendTests, IsolatedTestCase):
+    def make_cache(self, **kwargs):
+        return DatabaseCache(**kwargs)
+
+    def age(self, cache, key, seconds):
+        TranscriptionCacheEntry.objects.filter(key=key).update(
+            last_used_at=timezone.now() - timedelta(seconds=seconds),
+            createdat=timezone.now() - timedelta(days=365),
+        )
+
+    def entry_size(self, cache, key):
+        return TranscriptionCacheEntry.objects.get(key=key).size
+
+
+class UploadCacheTests(IsolatedTestCase):
+    def test_cached_response_is_streamed_not_decoded(self):
+        set_backend(FakeBackend())
+        set_cache(FileSystemCache(root=os.path.join(self.tmp, 'fs')))
+        self.client.post('/api/upload_audio/', {"file": SimpleUploadedFile('a.mp3', b'\xff\xfb' + bytes(512))})
+        run_pending_jobs()
+        second = self.client.post('/api/upload_audio/', {"file": SimpleUploadedFile('b.mp3', b'\xff\xfb' + bytes(512))})
+        with mock.patch.object(FileSystemCache, '_get', side_effect=AssertionError("decoded whole")):
+            run_pending_jobs()
+        job = TranscriptionJob.objects.get(pk=second.json()["job_id"])
+        self.assertEqual(job.status, TranscriptionJob.SUCCEEDED)
+        self.assertEqual(MeetingTranscription.objects.filter(meeting=job.meeting).count(), 2)
+
+    def test_evicted_entry_fails_the_job_without_retries(self):
+        set_backend(FakeBackend())
+        cache = FileSystemCache(root=os.path.join(self.tmp, 'fs'))
+        set_cache(cache)
+        audio = b'\xff\xfb' + bytes(512)
+        self.client.post('/api/upload_audio/', {"file": SimpleUploadedFile('a.mp3', audio)})
+        run_pending_jobs()
+        second = self.client.post('/api/upload_audio/', {"file": SimpleUploadedFile('b.mp3', audio)}).json()
+        job = TranscriptionJob.objects.get(pk=second["job_id"])
+        cache.delete(job.cache_key)
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (TranscriptionJob.FAILED, 1))
+        self.assertIn("PermanentJobError", job.error)
+
+    def test_repeat_upload_is_served_from_cache(self):
+        backend = FakeBackend()
+        set_backend(backend)
+        set_cache(FileSystemCache(root=os.path.join(self.tmp, 'fs')))
+        audio = b'\xff\xfb' + bytes(512)
+
+        first = self.client.post('/api/upload_audio/', {"file": SimpleUploadedFile('a.mp3', audio)}).json()
+        run_pending_jobs()
+        second = self.client.post('/api/upload_audio/', {"file": SimpleUploadedFile('b.mp3', audio)}).json()
+        self.assertEqual(second["message"], "Transcription queued (cached)")
+        self.assertEqual(TranscriptionJob.objects.get(pk=second["job_id"]).file_path, '')
+        run_pending_jobs()
+
+        self.assertEqual(backend.calls, 1)
+        # The scratch copies of the fresh response were removed.
+        self.assertEqual([name for _, _, names in os.walk(settings.SCRATCH_ROOT) for name in names
+                          if name.endswith('.json')], [])
+        jobs = TranscriptionJob.objects.filter(pk__in=[first["job_id"], second["job_id"]])
+        self.assertEqual({job.status for job in jobs}, {TranscriptionJob.SUCCEEDED})
+        self.assertEqual({job.result["transcript"] for job in jobs}, {"Hello. Hi."})
@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+import os
+
+from django.test import SimpleTestCase, override_settings
+
+from speech.exports import export_path, stream_export, timestamp
+from speech.models import Meeting
+from speech.pipeline import Turn, persist_turns
+from speech.tests.helpers import IsolatedTestCase
+
+
+class TimestampTests(SimpleTestCase):
+    def test_timestamp(self):
+        self.assertEqual(timestamp(3723004), "01:02:03.004")
+        self.assertEqual(timestamp(1500, ','), "00:00:01,500")
+        self.assertEqual(timestamp(None), "00:00:00.000")
+
+
+@override_settings(EXPORT_TABLE_WIDTH=20)
+class ExportTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.meeting = Meeting.objects.create(userid=1, title="Planning")
+        persist_turns(self.meeting, [
+            Turn(0, "Good morning.", 0, 1500),
+            Turn(1, 'The budget, "roughly" ten --> twelve thousand, is fine by me.', 1500, 4000),
+            Turn(0, "Untimed.", None, None),
+        ])
+        self.meeting.refresh_from_db()
+
+    def export(self, fmt, **headers):
+        return self.client.get(f"/api/meetings/{self.meeting.id}/export/{fmt}/", headers=headers)
+
+    def body(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_srt_and_vtt(self):
+        srt = self.body(self.export('srt'))
+        self.assertTrue(srt.startswith("1\n00:00:00,000 --> 00:00:01,500\nSpeaker 0: Good morning.\n\n"))
+        # An untimed turn starts and ends where the previous one ended.
+        self.assertIn("3\n00:00:04,000 --> 00:00:04,000\nSpeaker 0: Untimed.\n\n", srt)
+        vtt = self.body(self.export('vtt'))
+        self.assertTrue(vtt.startswith("WEBVTT\n\n0\n00:00:00.000 --> 00:00:01.500\n<v Speaker 0>Good morning.\n"))
+        self.assertIn("ten -> twelve", vtt)
+
+    def test_json_and_csv(self):
+        body = json.loads(self.body(self.export('json')))
+        self.assertEqual(body["meeting_id"], self.meeting.id)
+        self.assertEqual(body["turns"][2], {"seq": 2, "speaker": 0, "start_ms": None, "end_ms": None,
+                                            "text": "Untimed."})
+        rows = list(csv.reader(io.StringIO(self.body(self.export('csv')))))
+        self.assertEqual(rows[0], ["seq", "speaker", "start_ms", "end_ms", "text"])
+        self.assertEqual(rows[2][4], 'The budget, "roughly" ten --> twelve thousand, is fine by me.')
+
+    def test_table_wraps_text(self):
+        lines = self.body(self.export('table')).splitlines()
+        self.assertEqual(len({len(line) for line in lines}), 1)
+        self.assertEqual(lines[1].split("|")[5].strip(), "Text")
+        self.assertIn("| 1   | 1       | 00:00:01.500 | 00:00:04.000 | The budget,          |", lines)
+
+    def test_cached_per_version_with_etag(self):
+        response = self.export('srt')
+        first = self.body(response)
+        etag = response["ETag"]
+        self.assertTrue(os.path.exists(export_path(self.meeting.id, 'srt', self.meeting.transcript_version)))
+        cached = self.export('srt')
+        self.assertEqual(b"".join(cached.streaming_content).decode(), first)
+        self.assertEqual(self.export('srt', If_None_Match=etag).status_code, 304)
+
+        persist_turns(self.meeting, [Turn(1, "One more thing.", 5000, 6000)])
+        self.meeting.refresh_from_db()
+        response = self.export('srt')
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("One more thing.", self.body(response))
+        # The previous version's file is pruned once the new one is complete.
+        self.assertEqual(os.listdir(os.path.dirname(export_path(self.meeting.id, 'srt', 0))),
+                         [f"{self.meeting.transcript_version}.srt"])
+
+    def test_stale_or_abandoned_render_is_not_cached(self):
+        version = self.meeting.transcript_version
+        chunks = list(stream_export(self.meeting.id, 'csv', version, current_version=lambda _: version + 1))
+        self.assertTrue(chunks)
+        stream = stream_export(self.meeting.id, 'json', version)
+        next(stream)
+        stream.close()
+        self.assertEqual(os.listdir(os.path.dirname(export_path(self.meeting.id, 'csv', version))), [])
+
+    def test_errors(self):
+        self.assertEqual(self.export('pdf').status_code, 400)
+        self.assertEqual(self.client.get("/api/meetings/999999/export/srt/").status_code, 404)
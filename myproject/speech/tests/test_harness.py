@@ -0,0 +1,59 @@
+import io
+import threading
+import wave
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from benchmarks.harness import QueryCounter, compare, percentiles, synthetic_response, synthetic_wav
+from speech.models import Meeting
+
+
+class CompareTests(SimpleTestCase):
+    metrics = {"rps": 'higher', "p95_ms": 'lower'}
+
+    def test_regressions_past_tolerance(self):
+        baseline = [{"mode": "a", "rps": 100, "p95_ms": 50}, {"mode": "b", "rps": 10, "p95_ms": 0}]
+        rows = [
+            {"mode": "a", "rps": 80, "p95_ms": 55},  # throughput fell 20%, latency rose 10%
+            {"mode": "b", "rps": 12, "p95_ms": 5},  # no baseline latency to compare with
+            {"mode": "c", "rps": 1, "p95_ms": 1},  # new mode
+        ]
+        self.assertEqual(compare(rows, baseline, ["mode"], self.metrics, 0.15), 1)
+        self.assertEqual(rows[0]["regressions"], ["rps"])
+        self.assertEqual(rows[0]["baseline"], {"rps": 100, "p95_ms": 50})
+        self.assertEqual(rows[1]["regressions"], [])
+        self.assertNotIn("baseline", rows[2])
+
+    def test_percentiles(self):
+        self.assertEqual(percentiles(range(100), 0.5, 0.99, 1.0), [50, 99, 99])
+        self.assertEqual(percentiles([], 0.5), [None])
+
+
+class SyntheticDataTests(SimpleTestCase):
+    def test_synthetic_wav(self):
+        with wave.open(io.BytesIO(synthetic_wav(2, sample_rate=8000, channels=2))) as w:
+            self.assertEqual((w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getnframes()),
+                             (2, 2, 8000, 16000))
+
+    def test_synthetic_response_is_reproducible(self):
+        first, second = synthetic_response(50, seed=3), synthetic_response(50, seed=3)
+        self.assertEqual(first, second)
+        words = first["results"]["channels"][0]["alternatives"][0]["words"]
+        self.assertEqual(len(words), 50)
+        self.assertEqual([w["start"] for w in words], sorted(w["start"] for w in words))
+
+
+class QueryCounterTests(TransactionTestCase):
+    def test_counts_queries_in_every_thread(self):
+        def query():
+            Meeting.objects.count()
+            connection.close()
+
+        with QueryCounter() as counter:
+            Meeting.objects.count()
+            thread = threading.Thread(target=query)
+            thread.start()
+            thread.join()
+        Meeting.objects.count()
+        self.assertEqual(counter.count, 2)
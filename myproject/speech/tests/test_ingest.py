@@ -0,0 +1,141 @@
+import io
+import os
+import threading
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from speech import ingest
+from speech.backends import FakeBackend, set_backend
+from speech.ingest import Ingest, Journal, Recording, Result, iter_recordings
+from speech.models import Meeting, MeetingTranscription
+from speech.pipeline import persist_words
+from speech.tests.helpers import IsolatedTestCase, speech_like, write_wav
+from speech.wordstore import open_words
+
+
+@override_settings(INGEST_RETRY_BACKOFF=0)
+class IngestTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = FakeBackend()
+        set_backend(self.backend)
+        self.source = os.path.join(self.tmp, 'archive')
+        os.makedirs(os.path.join(self.source, 'b'))
+        write_wav(os.path.join(self.source, 'one.wav'), speech_like(1))
+        write_wav(os.path.join(self.source, 'b', 'two.wav'), speech_like(2))
+        write_wav(os.path.join(self.source, 'b', 'copy.wav'), speech_like(1))  # same audio as one.wav
+        self.write_file('archive/notes.txt', b'not audio')
+        self.journal_path = os.path.join(self.tmp, 'journal.jsonl')
+
+    def ingest(self, **kwargs):
+        return Ingest(Journal(self.journal_path), workers=2, batch_size=2, **kwargs) \
+            .run(iter_recordings(self.source, 7))
+
+    def test_directory_run_dedupes_and_resumes(self):
+        progress = self.ingest()
+        self.assertEqual((progress.ingested, progress.duplicates, progress.failed), (2, 1, 0))
+        meetings = Meeting.objects.order_by('title')
+        # one.wav and copy.wav hold the same audio; whichever was hashed first is kept.
+        self.assertIn([m.title for m in meetings], (["copy", "two"], ["one", "two"]))
+        for meeting in meetings:
+            self.assertEqual(meeting.userid, 7)
+            self.assertEqual(len(open_words(meeting)), 2)
+        self.assertEqual(MeetingTranscription.objects.count(), 4)
+
+        entries = Journal(self.journal_path).entries
+        self.assertEqual(sorted(e["status"] for e in entries.values()), ['done', 'done', 'duplicate'])
+        calls = self.backend.calls
+        self.assertEqual(self.ingest().skipped, 3)
+        self.assertEqual(self.backend.calls, calls)
+        self.assertEqual(Meeting.objects.count(), 2)
+
+    def test_manifest(self):
+        manifest = self.write_file('archive/list.csv', b"path,title,user,date\none.wav,Kickoff,3,2024-05-01\n")
+        Ingest(Journal(self.journal_path)).run(iter_recordings(manifest, 7))
+        meeting = Meeting.objects.get()
+        self.assertEqual((meeting.title, meeting.userid, meeting.createdat.date().isoformat()),
+                         ("Kickoff", 3, "2024-05-01"))
+
+    def test_failed_files_are_retried_on_the_next_run(self):
+        self.backend.fail_times = 100
+        progress = self.ingest(attempts=2)
+        # A failed file releases its hash, so its copy is tried (and fails) itself.
+        self.assertEqual((progress.ingested, progress.duplicates, progress.failed), (0, 0, 3))
+        self.assertEqual(Meeting.objects.count(), 0)
+        self.backend.fail_times = 0
+        self.assertEqual(self.ingest().ingested, 2)
+
+    def test_retries_back_off(self):
+        self.backend.fail_times = 2
+        manifest = self.write_file('archive/list.txt', b"one.wav\n")
+        with mock.patch('speech.ingest.time.sleep') as sleep:
+            progress = Ingest(Journal(self.journal_path), attempts=3, retry_backoff=0.5) \
+                .run(iter_recordings(manifest, 7))
+        self.assertEqual(progress.ingested, 1)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+
+    def test_copy_of_a_file_in_flight_waits_for_its_commit(self):
+        run = Ingest(Journal(self.journal_path))
+        one, copy = (os.path.join(self.source, name) for name in ('one.wav', os.path.join('b', 'copy.wav')))
+        self.assertEqual(run._claim('h'), (True, None))
+        results = []
+        waiting = threading.Thread(target=lambda: results.append(
+            run._transcribe(Recording(copy, 'copy', 7, None), os.stat(copy), 'h')))
+        waiting.start()
+        waiting.join(0.2)
+        self.assertTrue(waiting.is_alive())  # nothing is recorded while the original transcribes
+
+        run._settle('h', failed=False)
+        waiting.join()
+        [duplicate] = results
+        self.assertEqual(run.persist([duplicate]), [duplicate])
+        self.assertEqual(Journal(self.journal_path).entries, {})
+
+        original = Result(Recording(one, 'one', 7, None), os.stat(one), 'h', 'transcribed',
+                          self.backend.transcribe(one, 'wav', {}), None, '')
+        self.assertEqual(run.persist([original, duplicate]), [])
+        entries = Journal(self.journal_path).entries
+        self.assertEqual(entries[copy]["status"], 'duplicate')
+        self.assertEqual(entries[copy]["meeting_id"], Meeting.objects.get().pk)
+
+    def test_copy_of_a_failed_file_is_transcribed(self):
+        run = Ingest(Journal(self.journal_path))
+        copy = os.path.join(self.source, 'b', 'copy.wav')
+        run._claim('h')
+        results = []
+        waiting = threading.Thread(target=lambda: results.append(
+            run._transcribe(Recording(copy, 'copy', 7, None), os.stat(copy), 'h')))
+        waiting.start()
+        run._settle('h', failed=True)
+        waiting.join()
+        self.assertEqual(results[0].status, 'transcribed')
+
+    def test_rolled_back_batch_leaves_no_stores_or_claims(self):
+        calls = []
+
+        def fail_second(meeting, words):
+            calls.append(meeting)
+            persist_words(meeting, words)
+            if len(calls) == 2:
+                raise RuntimeError("database went away")
+
+        run = Ingest(Journal(self.journal_path), workers=2, batch_size=10)
+        with mock.patch.object(ingest, 'persist_words', side_effect=fail_second):
+            with self.assertRaises(RuntimeError):
+                run.run(iter_recordings(self.source, 7))
+        self.assertEqual(Meeting.objects.count(), 0)
+        self.assertEqual(os.listdir(os.path.join(self.tmp, 'word_store_dir')), [])
+        self.assertEqual(run._seen, {})
+        self.assertEqual(Journal(self.journal_path).entries, {})
+
+        # The same run object can take the files again.
+        self.assertEqual(run.run(iter_recordings(self.source, 7)).ingested, 2)
+
+    def test_command(self):
+        err = io.StringIO()
+        call_command('ingest_recordings', self.source, '--journal', self.journal_path, '--workers', '1',
+                     stderr=err)
+        self.assertIn("3/3 files: 2 ingested, 1 duplicate, 0 failed", err.getvalue())
+        self.assertEqual(Meeting.objects.count(), 2)
@@ -0,0 +1,144 @@
+import threading
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings, skipUnlessDBFeature
+from django.utils import timezone
+
+from speech.backends import FakeBackend, set_backend
+from speech.jobs import claim_next_job, enqueue_job, requeue_stale_jobs, retry_delay, run_job, run_pending_jobs
+from speech.models import JobClaimLock, MeetingTranscription, TranscriptionJob, TrelloOutbox
+from speech.tests.helpers import IsolatedTestCase, IsolatedTransactionTestCase
+
+
+@override_settings(TRANSCRIPTION_RETRY_BACKOFF=30, TRANSCRIPTION_RETRY_BACKOFF_MAX=100)
+class RetryDelayTests(IsolatedTestCase):
+    def test_doubles_per_attempt_up_to_the_cap(self):
+        self.assertEqual([retry_delay(n) for n in range(5)], [30, 30, 60, 100, 100])
+
+
+class ClaimTests(IsolatedTestCase):
+    def enqueue(self, **fields):
+        job = enqueue_job(self.write_file('a.mp3', b'\xff\xfb' + bytes(64)), 'a.mp3', 'mpeg', {})
+        if fields:
+            TranscriptionJob.objects.filter(pk=job.pk).update(**fields)
+        return job
+
+    def test_claims_oldest_runnable_job(self):
+        first, second = self.enqueue(), self.enqueue()
+        claimed = claim_next_job()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, TranscriptionJob.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNotNone(claimed.locked_at)
+        self.assertEqual(claim_next_job().pk, second.pk)
+        self.assertIsNone(claim_next_job())
+
+    def test_skips_jobs_scheduled_for_later(self):
+        self.enqueue(run_after=timezone.now() + timedelta(minutes=5))
+        self.assertIsNone(claim_next_job())
+
+    @override_settings(TRANSCRIPTION_MAX_CONCURRENT_JOBS=1)
+    def test_respects_concurrency_limit(self):
+        self.enqueue(status=TranscriptionJob.RUNNING, locked_at=timezone.now())
+        self.enqueue()
+        self.assertIsNone(claim_next_job())
+
+    def test_claims_take_the_lock_row(self):
+        JobClaimLock.objects.all().delete()
+        self.enqueue()
+        claim_next_job()
+        self.assertIsNotNone(JobClaimLock.objects.get(pk=1).claimed_at)
+
+    @override_settings(TRANSCRIPTION_JOB_TIMEOUT=60)
+    def test_requeues_jobs_of_dead_workers(self):
+        stale = self.enqueue(status=TranscriptionJob.RUNNING, locked_at=timezone.now() - timedelta(minutes=5))
+        live = self.enqueue(status=TranscriptionJob.RUNNING, locked_at=timezone.now())
+        self.assertEqual(requeue_stale_jobs(), 1)
+        stale.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual(stale.status, TranscriptionJob.QUEUED)
+        self.assertEqual(live.status, TranscriptionJob.RUNNING)
+
+
+@override_settings(TRANSCRIPTION_MAX_CONCURRENT_JOBS=1)
+class ConcurrentClaimTests(IsolatedTransactionTestCase):
+    # The in-memory SQLite test database fails concurrent writers instead of queueing them.
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_workers_claiming_at_once_respect_the_limit(self):
+        for _ in range(6):
+            enqueue_job(self.write_file('a.mp3', b'\xff\xfb' + bytes(64)), 'a.mp3', 'mpeg', {})
+        barrier = threading.Barrier(6)
+        claimed = []
+
+        def claim():
+            barrier.wait()
+            try:
+                claimed.append(claim_next_job())
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len([job for job in claimed if job is not None]), 1)
+        self.assertEqual(TranscriptionJob.objects.filter(status=TranscriptionJob.RUNNING).count(), 1)
+
+
+@override_settings(TRANSCRIPTION_RETRY_BACKOFF=30, TRANSCRIPTION_JOB_MAX_ATTEMPTS=2)
+class RunJobTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = self.write_file('clip.mp3', b'\xff\xfb' + bytes(256))
+
+    def test_success_persists_meeting_and_queues_card(self):
+        set_backend(FakeBackend())
+        job = enqueue_job(self.path, 'clip.mp3', 'mpeg', {})
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, TranscriptionJob.SUCCEEDED)
+        self.assertEqual(job.result["meeting_id"], job.meeting_id)
+        self.assertEqual(job.result["transcript"], "Hello. Hi.")
+        self.assertEqual(MeetingTranscription.objects.filter(meeting=job.meeting).count(), 2)
+        self.assertEqual(TrelloOutbox.objects.get().group_key, f"meeting:{job.meeting_id}")
+
+    def test_failure_schedules_retry_with_backoff(self):
+        set_backend(FakeBackend(fail_times=1))
+        enqueue_job(self.path, 'clip.mp3', 'mpeg', {})
+        job = run_job(claim_next_job())
+        self.assertEqual(job.status, TranscriptionJob.QUEUED)
+        self.assertIn("simulated failure", job.error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+        self.assertIsNone(claim_next_job())  # not before its backoff
+
+        TranscriptionJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = run_job(claim_next_job())
+        self.assertEqual(job.status, TranscriptionJob.SUCCEEDED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_fails_after_max_attempts(self):
+        set_backend(FakeBackend(fail_times=5))
+        enqueue_job(self.path, 'clip.mp3', 'mpeg', {})
+        job = run_job(claim_next_job())
+        TranscriptionJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = run_job(claim_next_job())
+        self.assertEqual(job.status, TranscriptionJob.FAILED)
+        self.assertIsNone(claim_next_job())
+
+
+class UploadAudioTests(IsolatedTestCase):
+    def test_upload_only_enqueues(self):
+        response = self.client.post('/api/upload_audio/', {"file": SimpleUploadedFile('a.mp3', b'\xff\xfb' + bytes(64))})
+        self.assertEqual(response.status_code, 202)
+        job = TranscriptionJob.objects.get(pk=response.json()["job_id"])
+        self.assertEqual(job.status, TranscriptionJob.QUEUED)
+        self.assertEqual(response.json()["status_url"], f"/api/jobs/{job.id}/")
+
+        status = self.client.get(f"/api/jobs/{job.id}/").json()
+        self.assertEqual(status["status"], TranscriptionJob.QUEUED)
+
+    def test_upload_without_file(self):
+        self.assertEqual(self.client.post('/api/upload_audio/').status_code, 400)
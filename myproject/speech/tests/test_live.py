@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, override_settings
+
+from speech.backends import LocalBackend, ResultQueue, live_message
+from speech.live import (
+    CLOSE_BAD_REQUEST, CLOSE_ERROR, CLOSE_NORMAL, LiveSession, SegmentWriter, message_segments, message_words,
+)
+from speech.models import Meeting, MeetingTranscription
+from speech.pipeline import Turn, persist_turns
+from speech.tests.helpers import IsolatedTransactionTestCase, word
+from speech.wordstore import open_words
+
+SECOND = 16000 * 2  # linear16 mono at 16 kHz
+
+
+class ResultQueueTests(SimpleTestCase):
+    def test_interim_results_give_way_when_full(self):
+        async def run():
+            queue = ResultQueue(maxsize=2)
+            interim, final = live_message([], False), live_message([], True)
+            queue.put_nowait(interim)
+            queue.put_nowait(final)
+            queue.put_nowait(interim)  # dropped
+            queue.put_nowait(final)  # replaces the queued interim
+            self.assertEqual((len(queue), queue.dropped_interim), (2, 2))
+            waiting = asyncio.create_task(queue.wait_for_room())
+            await asyncio.sleep(0)
+            self.assertFalse(waiting.done())  # the next frame waits for the consumer
+            self.assertTrue((await queue.get())["is_final"])
+            await asyncio.wait_for(waiting, timeout=1)
+        asyncio.run(run())
+
+
+class BrokenStream:
+    """Sends one final result, then the connection to the backend fails."""
+    async def send(self, data):
+        pass
+
+    async def finish(self):
+        pass
+
+    async def messages(self):
+        yield live_message([word("Hello.", 0.0, 0.4)], True, 0.0, 0.4)
+        raise ConnectionError("backend went away")
+
+
+class BrokenBackend(LocalBackend):
+    async def open_stream(self, options):
+        return BrokenStream()
+
+
+@override_settings(LIVE_PERSIST_BATCH=2, LIVE_PERSIST_INTERVAL=0.05)
+class LiveSessionTests(IsolatedTransactionTestCase):
+    async def session(self, events, backend=None, query=b""):
+        inbound = asyncio.Queue()
+        for event in [{"type": "websocket.connect"}, *events]:
+            inbound.put_nowait(event)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        session = LiveSession({"query_string": query}, inbound.get, send, backend or LocalBackend(0, 0))
+        await asyncio.wait_for(session.run(), timeout=10)
+        # Nothing the session started is still running.
+        others = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        self.assertEqual([t for t in others if not t.done()], [])
+        return [json.loads(m["text"]) if "text" in m else m for m in sent]
+
+    def frames(self, seconds):
+        return [{"type": "websocket.receive", "bytes": bytes(SECOND // 2)} for _ in range(int(seconds * 2))]
+
+    async def test_session_persists_finals_and_closes(self):
+        sent = await self.session([*self.frames(6.5), {"type": "websocket.receive", "text": '{"type": "stop"}'}])
+        self.assertEqual(sent[0], {"type": "websocket.accept"})
+        meeting_id = sent[1]["meeting_id"]
+        finals = [m for m in sent if isinstance(m, dict) and m.get("type") == "final"]
+        closed = next(m for m in sent if m.get("type") == "closed")
+        self.assertEqual(len(finals), 4)  # every 2 s of audio, plus the rest at stop
+        self.assertEqual(closed["segments"], 4)
+        self.assertEqual(sent[-1], {"type": "websocket.close", "code": CLOSE_NORMAL})
+
+        rows = [row async for row in MeetingTranscription.objects.filter(meeting=meeting_id).order_by('seq')]
+        self.assertEqual([row.seq for row in rows], [0, 1, 2, 3])
+        meeting = await Meeting.objects.aget(pk=meeting_id)
+        self.assertEqual(len(open_words(meeting)), meeting.word_count)
+
+    async def test_backend_failure_cancels_the_session_tasks(self):
+        # The client never stops; the failed backend has to end the session.
+        sent = await self.session(self.frames(1), backend=BrokenBackend(0, 0))
+        self.assertEqual(sent[-1], {"type": "websocket.close", "code": CLOSE_ERROR})
+        self.assertEqual(next(m for m in sent if m.get("type") == "closed")["segments"], 1)
+
+    async def test_bad_control_frame_is_a_policy_close(self):
+        sent = await self.session([{"type": "websocket.receive", "text": "[1]"}])
+        self.assertEqual(sent[-1]["code"], 1008)
+
+    async def test_malformed_audio_parameters_are_rejected(self):
+        for query in (b"sample_rate=abc", b"channels=0", b"meeting_id=x"):
+            sent = await self.session([], query=query)
+            self.assertEqual(sent, [{"type": "websocket.close", "code": CLOSE_BAD_REQUEST}])
+
+    async def test_word_store_follows_turns_numbered_around_another_writer(self):
+        meeting = await Meeting.objects.acreate(userid=1, title="m")
+        writer = SegmentWriter(meeting, batch_size=1, interval=60)
+        first = live_message([word("Hello.", 0.0, 0.4)], True)
+        await writer.add(message_segments(first), message_words(first))
+        await sync_to_async(persist_turns)(meeting, [Turn(1, "From a job.", 0, 500)])
+        second = live_message([word("Again.", 1.0, 1.4)], True)
+        await writer.add(message_segments(second), message_words(second))
+        await writer.close()
+        await meeting.arefresh_from_db()
+        self.assertEqual(writer.seqs, [0, 2])
+        self.assertEqual(list(open_words(meeting).turn), [0, 2])
+
+    async def test_dead_sender_does_not_block_shutdown(self):
+        session = LiveSession({"query_string": b""}, None, None, LocalBackend(0, 0))
+        session.outbound = asyncio.Queue(maxsize=1)
+        session.outbound.put_nowait({"type": "interim"})
+
+        async def dead():
+            raise RuntimeError("send failed")
+
+        sender = asyncio.create_task(dead())
+        await asyncio.wait_for(session._stop_sender(sender), timeout=1)
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+
+from speech.llm import CachedLLM, EchoLLM, ResponseCache, normalise_question, set_llm
+from speech.models import Meeting
+from speech.pipeline import Turn, persist_turns
+from speech.tests.helpers import IsolatedTestCase
+
+
+class SlowLLM(EchoLLM):
+    def __init__(self, delay=0.1):
+        super().__init__(token_delay=0)
+        self.delay = delay
+
+    async def agenerate(self, question, context=()):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self._answer(question, context)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def test_exact_and_near_duplicate_hits(self):
+        cache = ResponseCache(max_entries=10, ttl=0, similarity=0.6)
+        scope = cache.scope('m', 0.0, ["ctx"])
+        cache.set(scope, "What is the budget for Q3?", "Ten")
+        self.assertEqual(cache.get(scope, "what is the BUDGET for q3"), "Ten")
+        self.assertEqual(cache.get(scope, "What is the budget for Q3 exactly?"), "Ten")
+        self.assertIsNone(cache.get(scope, "Who owns the design?"))
+        self.assertIsNone(cache.get(cache.scope('m', 0.0, ["other"]), "What is the budget for Q3?"))
+        stats = cache.stats.as_dict()
+        self.assertEqual((stats["hits"], stats["near_hits"], stats["misses"]), (2, 1, 2))
+
+    def test_lru_and_ttl(self):
+        cache = ResponseCache(max_entries=2, ttl=0, similarity=1)
+        for q in ("one", "two", "three"):
+            cache.set('s', q, q.upper())
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('s', "one"))
+        cache.ttl = 1e-9
+        self.assertIsNone(cache.get('s', "two"))
+        self.assertEqual(cache.stats.as_dict()["expired"], 1)
+
+    def test_normalise_question(self):
+        self.assertEqual(normalise_question("  What's  the PLAN?? "), "what's the plan")
+
+
+class CachedLLMTests(SimpleTestCase):
+    def cached(self, llm):
+        return CachedLLM(llm, ResponseCache(max_entries=10, ttl=0, similarity=1))
+
+    def test_concurrent_misses_share_one_call(self):
+        llm = SlowLLM()
+        cached = self.cached(llm)
+
+        async def ask():
+            return await asyncio.gather(*(cached.agenerate("Budget?", ["a"]) for _ in range(5)))
+
+        self.assertEqual(len(set(asyncio.run(ask()))), 1)
+        self.assertEqual(llm.calls, 1)
+        asyncio.run(cached.agenerate("Budget?", ["a"]))
+        self.assertEqual(llm.calls, 1)  # now a cache hit
+
+    def test_misses_on_different_loops_are_not_shared(self):
+        llm = SlowLLM(delay=0.2)
+        cached = self.cached(llm)
+        answers = []
+        started = threading.Event()
+
+        async def first():
+            started.set()
+            answers.append(await cached.agenerate("Budget?", ["a"]))
+
+        thread = threading.Thread(target=asyncio.run, args=(first(),))
+        thread.start()
+        started.wait()
+        # A second loop asks the same question while the first call is in flight.
+        answers.append(asyncio.run(cached.agenerate("Budget?", ["a"])))
+        thread.join()
+        self.assertEqual(len(answers), 2)
+        self.assertEqual(answers[0], answers[1])
+        self.assertEqual(llm.calls, 2)
+
+    def test_failed_call_is_not_cached(self):
+        class Failing(EchoLLM):
+            async def agenerate(self, question, context=()):
+                self.calls += 1
+                raise RuntimeError("upstream down")
+
+        llm = Failing()
+        cached = self.cached(llm)
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(cached.agenerate("Budget?"))
+        self.assertEqual(llm.calls, 2)
+
+
+class StreamTests(SimpleTestCase):
+    def collect(self, stream):
+        async def run():
+            return [token async for token in stream]
+        return asyncio.run(run())
+
+    def test_cache_hit_respects_max_tokens(self):
+        llm = EchoLLM(token_delay=0)
+        cached = CachedLLM(llm, ResponseCache(max_entries=10, ttl=0, similarity=1))
+        full = "".join(self.collect(cached.astream("Budget?", ["Speaker 1: ten thousand"])))
+        self.assertEqual(llm.calls, 1)
+
+        hit = self.collect(cached.astream("Budget?", ["Speaker 1: ten thousand"], max_tokens=3))
+        self.assertEqual(hit, ["Based on 1 "])
+        self.assertEqual(self.collect(cached.astream("Budget?", ["Speaker 1: ten thousand"])), [full])
+        self.assertEqual(llm.calls, 1)
+
+    def test_truncated_stream_is_not_cached(self):
+        llm = EchoLLM(token_delay=0)
+        cached = CachedLLM(llm, ResponseCache(max_entries=10, ttl=0, similarity=1))
+        self.assertEqual(len(self.collect(cached.astream("Budget?", ["a b c d"], max_tokens=2))), 2)
+        self.assertEqual(len(cached.cache), 0)
+
+    def test_answer_of_exactly_max_tokens_is_complete(self):
+        llm = EchoLLM(token_delay=0)
+        cached = CachedLLM(llm, ResponseCache(max_entries=10, ttl=0, similarity=1))
+        outcome = {}
+        self.assertEqual(len(self.collect(cached.astream("Budget?", ["a b"], max_tokens=6, outcome=outcome))), 6)
+        self.assertEqual(outcome, {"finish_reason": "stop"})
+        self.assertEqual(len(cached.cache), 1)
+        outcome = {}
+        self.collect(cached.astream("Budget?", ["a b"], max_tokens=5, outcome=outcome))  # a cut cache hit
+        self.assertEqual(outcome, {"finish_reason": "length"})
+
+    def test_closing_the_stream_stops_the_model(self):
+        llm = EchoLLM(token_delay=0.01)
+        produced = []
+
+        async def run():
+            stream = llm.astream("Budget?", ["one two three four five six"])
+            async for token in stream:
+                produced.append(token)
+                if len(produced) == 2:
+                    break
+            await stream.aclose()
+
+        asyncio.run(run())
+        self.assertEqual(len(produced), 2)
+
+
+class AskViewTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.llm = EchoLLM(token_delay=0)
+        set_llm(CachedLLM(self.llm, ResponseCache(max_entries=10, ttl=0, similarity=1)))
+        self.meeting = Meeting.objects.create(userid=1, title="Planning")
+        persist_turns(self.meeting, [
+            Turn(0, "Good morning.", 0, 1000), Turn(1, "The budget is ten thousand.", 1000, 3000),
+        ])
+
+    def ask(self, **data):
+        return self.client.post('/api/ask-gpt/', data, content_type='application/json')
+
+    def test_grounded_answer_is_cached(self):
+        first = self.ask(question="What is the budget?", meeting_id=self.meeting.id, top_k=1).json()
+        self.assertIn("Speaker 1: The budget is ten thousand.", first["answer"])
+        self.assertEqual(len(first["sources"]), 1)
+        second = self.ask(question="what is the budget", meeting_id=self.meeting.id, top_k=1).json()
+        self.assertEqual(second["answer"], first["answer"])
+        self.assertEqual(self.llm.calls, 1)
+
+    def test_errors(self):
+        self.assertEqual(self.ask().status_code, 400)
+        self.assertEqual(self.ask(question="x", meeting_id=999999).status_code, 404)
+        self.assertEqual(self.ask(question="x", meeting_id="abc").status_code, 400)
+        self.assertEqual(self.ask(question="x", meeting_id=[1]).status_code, 400)
+
+    async def test_streamed_answer(self):
+        data = {"question": "What is the budget?", "meeting_id": self.meeting.id, "top_k": 1,
+                "stream": True, "max_tokens": 4}
+        response = await self.async_client.post('/api/ask-gpt/', data, content_type='application/json')
+        self.assertEqual(response["Content-Type"], 'text/event-stream')
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        events = [block for block in body.split("\n\n") if block]
+        self.assertTrue(events[0].startswith("event: sources"))
+        self.assertEqual(len([e for e in events if e.startswith("data:")]), 4)
+        self.assertIn('"truncated": true', events[-1])
+
+    async def test_streamed_answer_ending_at_max_tokens_is_not_truncated(self):
+        data = {"question": "What is the budget?", "meeting_id": self.meeting.id, "top_k": 1,
+                "stream": True, "max_tokens": 11}  # the whole echoed answer
+        response = await self.async_client.post('/api/ask-gpt/', data, content_type='application/json')
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        events = [block for block in body.split("\n\n") if block]
+        self.assertEqual(len([e for e in events if e.startswith("data:")]), 11)
+        self.assertIn('"truncated": false', events[-1])
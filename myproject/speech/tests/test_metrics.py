@@ -0,0 +1,100 @@
+import os
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from speech.llm import CachedLLM, EchoLLM, ResponseCache, set_llm
+from speech.metrics import (
+    Counter, Histogram, Registry, TimedIterator, server_timing, stage, stage_bytes, stage_errors, stage_queries,
+    stage_seconds,
+)
+from speech.models import Meeting
+from speech.pipeline import Turn, persist_turns
+from speech.tests.helpers import IsolatedTestCase
+
+
+class RegistryTests(SimpleTestCase):
+    def test_prometheus_text_format(self):
+        registry = Registry()
+        requests = registry.register(Counter('requests_total', "Requests.", ['path']))
+        latency = registry.register(Histogram('latency_seconds', "Latency.", buckets=(0.1, 1)))
+        registry.add_collector(lambda: [('cache_hits', 'gauge', "Hits.", 3), ('unset', 'gauge', "Unset.", None)])
+        requests.inc('/a "b"\n')
+        requests.inc('/a "b"\n', amount=2)
+        latency.observe(0.05)
+        latency.observe(5.0)
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP requests_total Requests.',
+            '# TYPE requests_total counter',
+            'requests_total{path="/a \\"b\\"\\n"} 3',
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 1',
+            'latency_seconds_bucket{le="+Inf"} 2',
+            'latency_seconds_sum 5.05',
+            'latency_seconds_count 2',
+            '# HELP cache_hits Hits.',
+            '# TYPE cache_hits gauge',
+            'cache_hits 3',
+        ])
+
+
+class StageTests(IsolatedTestCase):
+    def test_stage_records_time_bytes_queries_and_errors(self):
+        before = (stage_seconds.count('test'), stage_bytes.value('test'), stage_queries.value('test'))
+        with stage('test', 10) as s:
+            s.add_bytes(5)
+            Meeting.objects.count()
+        self.assertEqual(s.queries, 1)
+        self.assertEqual((stage_seconds.count('test'), stage_bytes.value('test'), stage_queries.value('test')),
+                         (before[0] + 1, before[1] + 15, before[2] + 1))
+
+        errors = stage_errors.value('test', 'KeyError')
+        with self.assertRaises(KeyError), stage('test'):
+            raise KeyError('x')
+        self.assertEqual(stage_errors.value('test', 'KeyError'), errors + 1)
+
+    def test_timed_iterator_is_recorded_once(self):
+        before = stage_seconds.count('iterate')
+        items = TimedIterator('iterate', range(3))
+        self.assertEqual(list(items), [0, 1, 2])
+        items.close()
+        self.assertEqual(stage_seconds.count('iterate'), before + 1)
+
+    def test_server_timing_sums_repeated_stages(self):
+        class Traced:
+            def __init__(self, name, elapsed):
+                self.name, self.elapsed = name, elapsed
+
+        self.assertEqual(server_timing([Traced('a', 0.001), Traced('b', 0.5), Traced('a', 0.002)]),
+                         "a;dur=3.0, b;dur=500.0")
+
+
+class MetricsMiddlewareTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        set_llm(CachedLLM(EchoLLM(token_delay=0), ResponseCache(max_entries=10, ttl=0, similarity=1)))
+        self.meeting = Meeting.objects.create(userid=1, title="m")
+        persist_turns(self.meeting, [Turn(0, "The budget is ten.", 0, 1000)])
+
+    def ask(self):
+        return self.client.post('/api/ask-gpt/', {"question": "Budget?", "meeting_id": self.meeting.id},
+                                content_type='application/json')
+
+    def test_server_timing_and_request_metrics(self):
+        response = self.ask()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("llm;dur=", response["Server-Timing"])
+        scrape = self.client.get('/metrics')
+        self.assertTrue(scrape["Content-Type"].startswith('text/plain; version=0.0.4'))
+        body = scrape.content.decode()
+        self.assertIn('speech_stage_seconds_count{stage="llm"}', body)
+        self.assertIn('speech_http_request_seconds_count{route="api/ask-gpt/",method="POST",status="200"}', body)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_profiled(self):
+        self.ask()
+        profiles = os.listdir(settings.PROFILE_DIR)
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].endswith("-api_ask_gpt.prof"))
@@ -0,0 +1,78 @@
+import os
+import wave
+
+import numpy as np
+from django.test import override_settings
+
+from speech.backends import LocalBackend, make_response, response_words
+from speech.normalize import normalize_audio, normalized_audio, shift_words, sniff_mimetype
+from speech.tests.helpers import IsolatedTestCase, speech_like, word, write_float_wav, write_wav
+from speech.utils.audio import is_pcm_wav, read_header, sniff_format
+
+
+class SniffTests(IsolatedTestCase):
+    def test_formats(self):
+        pcm = write_wav(os.path.join(self.tmp, 'a.wav'), speech_like(0.1))
+        float_wav = write_float_wav(os.path.join(self.tmp, 'f.wav'), speech_like(0.1))
+        self.assertEqual(sniff_format(read_header(pcm)), ('wav', 'pcm', 'wav'))
+        self.assertEqual(sniff_format(read_header(float_wav)), ('wav', 'float', 'wav'))
+        self.assertTrue(is_pcm_wav(pcm))
+        self.assertFalse(is_pcm_wav(float_wav))
+        self.assertFalse(is_pcm_wav(self.write_file('x.mp3', b'ID3' + bytes(100))))
+        self.assertFalse(is_pcm_wav(self.write_file('empty.wav', b'')))
+
+    def test_sniff_mimetype(self):
+        self.assertEqual(sniff_mimetype(b'fLaC' + bytes(40), 'x.mp3'), 'flac')
+        self.assertEqual(sniff_mimetype(b'', 'memo.ogg'), 'ogg')
+        self.assertEqual(sniff_mimetype(b'', 'notes.txt'), 'mpeg')
+
+
+@override_settings(AUDIO_TARGET_RATE=8000, AUDIO_TRIM_SILENCE=0)
+class NormalizeTests(IsolatedTestCase):
+    def stereo(self, seconds, framerate):
+        path = os.path.join(self.tmp, 'stereo.wav')
+        mono = (np.clip(speech_like(seconds, framerate=framerate), -1, 1) * 32767).astype('<i2')
+        with wave.open(path, 'wb') as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(framerate)
+            w.writeframes(np.repeat(mono, 2).tobytes())
+        return path
+
+    def test_downmixes_and_resamples(self):
+        path = self.stereo(2, 16000)
+        audio = normalize_audio(path, 'wav', self.tmp)
+        self.assertNotEqual(audio.path, path)
+        self.assertEqual((audio.mimetype, audio.offset), ('wav', 0.0))
+        with wave.open(audio.path) as w:
+            self.assertEqual((w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getnframes()),
+                             (1, 2, 8000, 16000))
+        self.assertLess(audio.size, os.path.getsize(path) / 3)
+
+    def test_already_normal_or_undecodable_audio_is_sent_as_is(self):
+        pcm = write_wav(os.path.join(self.tmp, 'a.wav'), speech_like(1), framerate=8000)
+        float_wav = write_float_wav(os.path.join(self.tmp, 'f.wav'), speech_like(1, framerate=16000), 16000)
+        for path in (pcm, float_wav):
+            audio = normalize_audio(path, 'wav', self.tmp)
+            self.assertEqual((audio.path, audio.mimetype, audio.offset), (path, 'wav', 0.0))
+
+    @override_settings(AUDIO_TRIM_SILENCE=1, AUDIO_TRIM_PADDING=0.1)
+    def test_trims_silence_and_shifts_words_back(self):
+        path = write_wav(os.path.join(self.tmp, 'a.wav'), speech_like(3, quiet=[(0, 1), (2, 3)]))
+        with normalized_audio(path, 'wav', self.tmp) as audio:
+            self.assertAlmostEqual(audio.offset, 0.9, places=2)
+            with wave.open(audio.path) as w:
+                self.assertAlmostEqual(w.getnframes() / w.getframerate(), 1.2, places=1)
+            trimmed = audio.path
+        self.assertFalse(os.path.exists(trimmed))
+
+        res = shift_words(make_response([word("Hi.", 0.1, 0.4)]), audio.offset)
+        self.assertEqual([(w["start"], w["end"]) for w in response_words(res)], [(1.0, 1.3)])
+
+
+class LocalBackendTests(IsolatedTestCase):
+    def test_float_wav_is_not_decoded(self):
+        path = write_float_wav(os.path.join(self.tmp, 'f.wav'), speech_like(2))
+        words, duration = LocalBackend(0, 0).words_for(path)
+        self.assertTrue(words)
+        self.assertEqual(duration, os.path.getsize(path) / 16000)
@@ -0,0 +1,52 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from speech.models import Meeting, MeetingTranscription
+from speech.pipeline import Turn, iter_speaker_turns, persist_turns, persist_words
+from speech.tests.helpers import IsolatedTestCase, conversation, word
+
+
+class SpeakerTurnTests(IsolatedTestCase):
+    def test_groups_consecutive_words_by_speaker(self):
+        words = [word("Hi", 0.0, 0.2, 0), word("there.", 0.2, 0.5, 0), word("Hello.", 0.7, 1.0, 1),
+                 word("Bye.", 1.2, 1.4, 0)]
+        self.assertEqual(list(iter_speaker_turns(words)), [
+            Turn(0, "Hi there.", 0, 500), Turn(1, "Hello.", 700, 1000), Turn(0, "Bye.", 1200, 1400),
+        ])
+
+    def test_no_words(self):
+        self.assertEqual(list(iter_speaker_turns([])), [])
+
+
+class PersistTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.meeting = Meeting.objects.create(userid=1, title="m")
+
+    def test_bulk_creates_in_batches(self):
+        turns = [Turn(i % 2, f"turn {i}", i * 1000, i * 1000 + 500) for i in range(10)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(persist_turns(self.meeting, iter(turns), batch_size=3), 10)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "speech_meetingtranscription"')]
+        self.assertEqual(len(inserts), 4)
+        rows = list(MeetingTranscription.objects.filter(meeting=self.meeting).order_by('seq'))
+        self.assertEqual([r.seq for r in rows], list(range(10)))
+        self.assertEqual(rows[3].text, "turn 3")
+        self.assertEqual((rows[3].start_ms, rows[3].end_ms), (3000, 3500))
+
+    def test_appended_turns_number_after_existing(self):
+        persist_turns(self.meeting, [Turn(0, "a", 0, 1)])
+        persist_turns(self.meeting, [Turn(1, "b", 2, 3), Turn(0, "c", 4, 5)])
+        self.assertEqual(list(MeetingTranscription.objects.filter(meeting=self.meeting)
+                              .order_by('seq').values_list('seq', 'text')), [(0, "a"), (1, "b"), (2, "c")])
+
+    def test_persist_words_writes_turns_words_and_transcript(self):
+        path = f"{self.tmp}/transcript.txt"
+        with open(path, 'w') as f:
+            count = persist_words(self.meeting, conversation([(0, "Good morning."), (1, "Morning all.")]), f)
+        self.assertEqual(count, 2)
+        with open(path) as f:
+            self.assertEqual(f.read(), "SPEAKER 0: Good morning.\nSPEAKER 1: Morning all.\n")
+        self.meeting.refresh_from_db()
+        self.assertEqual(self.meeting.word_count, 4)
+        self.assertEqual(self.meeting.transcript_version, 1)
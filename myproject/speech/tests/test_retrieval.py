@@ -0,0 +1,102 @@
+import json
+import os
+import zlib
+
+from django.conf import settings
+from django.test import override_settings
+
+from speech import retrieval
+from speech.models import Meeting, MeetingTranscription
+from speech.pipeline import Turn, clear_transcript, persist_turns
+from speech.retrieval import MeetingIndex, TERM_CACHE_SIZE, _token_crc, get_index, relevant_turns, term_id
+from speech.tests.helpers import IsolatedTestCase
+
+TURNS = [
+    Turn(0, "Good morning, thanks for joining.", 0, 2000),
+    Turn(1, "The budget for the next quarter is too tight.", 2000, 5000),
+    Turn(0, "Let us review the design mockups instead.", 5000, 8000),
+    Turn(1, "Marketing wants more budget, a bigger budget.", 8000, 11000),
+]
+
+
+class TermIdTests(IsolatedTestCase):
+    def test_stable_crc_bucket(self):
+        self.assertEqual(term_id('budget'), zlib.crc32(b'budget') & ((1 << 20) - 1))
+        with override_settings(RETRIEVAL_HASH_BITS=8):
+            self.assertLess(term_id('budget'), 256)  # not stuck with the first width seen
+
+    def test_memo_is_bounded(self):
+        for i in range(TERM_CACHE_SIZE + 100):
+            term_id(f"token{i}")
+        info = _token_crc.cache_info()
+        self.assertEqual(info.maxsize, TERM_CACHE_SIZE)
+        self.assertLessEqual(info.currsize, TERM_CACHE_SIZE)
+
+
+class RetrievalTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.meeting = Meeting.objects.create(userid=1, title="Planning")
+        persist_turns(self.meeting, TURNS)
+
+    def test_ranks_turns_by_bm25(self):
+        turns = relevant_turns(self.meeting.id, "What about the budget?", k=2)
+        self.assertEqual([t["text"] for t in turns], [TURNS[3].text, TURNS[1].text])
+        self.assertGreater(turns[0]["score"], turns[1]["score"])
+        self.assertEqual(relevant_turns(self.meeting.id, "the and of"), [])  # stopwords only
+
+    def test_new_turns_are_indexed(self):
+        relevant_turns(self.meeting.id, "budget")
+        persist_turns(self.meeting, [Turn(0, "The mockups need a darker palette.", 11000, 13000)])
+        turns = relevant_turns(self.meeting.id, "palette")
+        self.assertEqual(turns[0]["text"], "The mockups need a darker palette.")
+        self.assertEqual(get_index(self.meeting.id).refresh(), 0)  # unchanged since
+
+    def test_edited_and_deleted_turns_are_not_served_stale(self):
+        relevant_turns(self.meeting.id, "budget")
+        row = MeetingTranscription.objects.get(meeting=self.meeting, text=TURNS[3].text)
+        row.text = "Marketing wants a bigger palette."
+        row.save()
+        self.assertEqual([t["text"] for t in relevant_turns(self.meeting.id, "palette")], [row.text])
+        self.assertNotIn(row.id, [t["id"] for t in relevant_turns(self.meeting.id, "budget")])
+
+        clear_transcript(self.meeting)
+        self.assertEqual(relevant_turns(self.meeting.id, "budget"), [])
+        self.assertEqual(len(get_index(self.meeting.id)), 0)
+
+    @override_settings(RETRIEVAL_MAX_SEGMENTS=2)
+    def test_segments_merge_without_changing_results(self):
+        before = relevant_turns(self.meeting.id, "budget design")
+        index = get_index(self.meeting.id)
+        with override_settings(TRANSCRIPT_BATCH_SIZE=1):
+            self.assertEqual(index.rebuild(index.version), len(TURNS))  # one segment per row, then merged
+        self.assertLessEqual(len(index.segments), 2)
+        self.assertEqual(sorted(os.listdir(index.directory)), sorted(index.segment_files + ['meta.json']))
+        self.assertEqual([t["id"] for t in relevant_turns(self.meeting.id, "budget design")],
+                         [t["id"] for t in before])
+
+    def test_index_is_reloaded_from_disk(self):
+        relevant_turns(self.meeting.id, "budget")
+        directory = get_index(self.meeting.id).directory
+        retrieval._indexes.clear()
+        index = MeetingIndex(self.meeting.id, directory)
+        self.assertEqual(len(index), len(TURNS))
+        self.assertEqual(index.refresh(), 0)
+
+    def test_index_built_with_another_hash_width_is_rebuilt(self):
+        relevant_turns(self.meeting.id, "budget")
+        directory = get_index(self.meeting.id).directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.assertEqual(json.load(f)["hash_bits"], settings.RETRIEVAL_HASH_BITS)
+        with override_settings(RETRIEVAL_HASH_BITS=8):
+            index = MeetingIndex(self.meeting.id, directory)
+            self.assertEqual(len(index), 0)  # not loaded with the wrong buckets
+            self.assertEqual(index.refresh(), len(TURNS))
+            self.assertEqual(index.search("budget", 1)[0][0],
+                             MeetingTranscription.objects.get(meeting=self.meeting, text=TURNS[3].text).id)
+
+    @override_settings(RETRIEVAL_CHUNK_WORDS=5)
+    def test_long_turns_are_chunked(self):
+        meeting = Meeting.objects.create(userid=1, title="Long")
+        persist_turns(meeting, [Turn(0, "one two three four five six seven eight nine budget eleven", 0, 9000)])
+        self.assertEqual(relevant_turns(meeting.id, "budget")[0]["text"], "six seven eight nine budget")
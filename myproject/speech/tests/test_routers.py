@@ -0,0 +1,39 @@
+from unittest import mock
+
+from django.conf import settings
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from speech.models import Meeting, MeetingTranscription
+from speech.routers import TranscriptReadRouter
+
+
+class TranscriptReadRouterTests(TransactionTestCase):
+    router = TranscriptReadRouter()
+
+    def with_replica(self):
+        patcher = mock.patch.dict(settings.DATABASES, {'replica': dict(settings.DATABASES['default'])})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_without_replica_everything_is_default(self):
+        self.assertIsNone(self.router.db_for_read(MeetingTranscription))
+
+    def test_transcript_reads_go_to_the_replica(self):
+        self.with_replica()
+        self.assertEqual(self.router.db_for_read(MeetingTranscription), 'replica')
+        self.assertIsNone(self.router.db_for_read(Meeting))
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        self.with_replica()
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(MeetingTranscription), 'default')
+
+    def test_relations_and_migrations(self):
+        meeting, other = Meeting(), Meeting()
+        meeting._state.db, other._state.db = 'default', 'replica'
+        self.assertTrue(self.router.allow_relation(meeting, other))
+        other._state.db = 'archive'
+        self.assertIsNone(self.router.allow_relation(meeting, other))
+        self.assertFalse(self.router.allow_migrate('replica', 'speech'))
+        self.assertTrue(self.router.allow_migrate('default', 'speech'))
@@ -0,0 +1,126 @@
+import os
+import time
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+
+from speech import pipeline
+from speech.backends import FakeBackend, set_backend
+from speech.jobs import JobTimeout, claim_next_job, enqueue_job, run_job, time_limit, time_limit_paused
+from speech.models import Meeting, MeetingStats, MeetingTranscription, TranscriptionJob, TrelloOutbox
+from speech.pipeline import Turn, persist_turns, run_transcription
+from speech.tests.helpers import IsolatedTestCase, conversation
+from speech.workspace import cleanup_workspaces, create_workspace
+from speech.wordstore import open_words
+
+WORDS = conversation([(0, "Shall we start?"), (1, "Yes, the budget first."), (0, "Fine.")])
+
+
+@override_settings(TRANSCRIPTION_RETRY_BACKOFF=0, TRANSCRIPTION_JOB_MAX_ATTEMPTS=3)
+class RetryIdempotencyTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = FakeBackend(words=WORDS)
+        set_backend(self.backend)
+        workspace = create_workspace()
+        path = os.path.join(workspace, 'clip.mp3')
+        with open(path, 'wb') as f:
+            f.write(b'\xff\xfb' + bytes(256))
+        self.job = enqueue_job(path, 'clip.mp3', 'mpeg', {}, workspace=workspace)
+
+    def run_until_done(self):
+        for _ in range(3):
+            TranscriptionJob.objects.filter(pk=self.job.pk).update(run_after=timezone.now())
+            job = claim_next_job()
+            if job is None:
+                break
+            job = run_job(job)
+            if job.status != TranscriptionJob.QUEUED:
+                return job
+        self.fail("job did not finish")
+
+    def assert_stored_once(self, meeting):
+        self.assertEqual(list(MeetingTranscription.objects.filter(meeting=meeting).order_by('seq')
+                              .values_list('seq', 'speaker')), [(0, 0), (1, 1), (2, 0)])
+        meeting.refresh_from_db()
+        self.assertEqual(meeting.word_count, len(WORDS))
+        self.assertEqual(len(open_words(meeting)), len(WORDS))
+        stats = {s.speaker: s for s in MeetingStats.objects.filter(meeting=meeting)}
+        self.assertEqual((stats[0].turns, stats[0].words, stats[1].turns, stats[1].words), (2, 4, 1, 4))
+        self.assertEqual(TrelloOutbox.objects.filter(group_key=f"meeting:{meeting.id}").count(), 1)
+
+    def test_outbox_failure_rolls_back_and_retry_stores_once(self):
+        real, calls = pipeline.enqueue_card, []
+
+        def fail_once(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError("outbox down")
+            return real(*args, **kwargs)
+
+        with mock.patch.object(pipeline, 'enqueue_card', side_effect=fail_once) as card:
+            job = self.run_until_done()
+        self.assertEqual(card.call_count, 2)
+        self.assertEqual(job.status, TranscriptionJob.SUCCEEDED)
+        self.assertEqual(job.attempts, 2)
+        self.assert_stored_once(job.meeting)
+
+    def test_stats_failure_rolls_back_turns(self):
+        with mock.patch.object(pipeline, 'update_meeting_stats', side_effect=RuntimeError("boom")):
+            job = run_job(claim_next_job())
+        self.assertEqual(job.status, TranscriptionJob.QUEUED)
+        self.assertFalse(MeetingTranscription.objects.filter(meeting=job.meeting_id).exists())
+        self.assertFalse(TrelloOutbox.objects.exists())
+
+        job = self.run_until_done()
+        self.assertEqual(job.status, TranscriptionJob.SUCCEEDED)
+        self.assert_stored_once(job.meeting)
+
+    def test_retry_after_commit_returns_stored_result(self):
+        job = claim_next_job()
+        first = run_transcription(job)
+        # The worker died before recording success; the job runs again.
+        job.refresh_from_db()
+        self.assertEqual(run_transcription(job), first)
+        self.assertEqual(self.backend.calls, 1)
+        self.assert_stored_once(job.meeting)
+
+    def test_turns_left_by_an_earlier_attempt_are_replaced(self):
+        meeting = Meeting.objects.create(userid=1, title="left over")
+        persist_turns(meeting, [Turn(0, "Shall we start?", 0, 900)])
+        TranscriptionJob.objects.filter(pk=self.job.pk).update(meeting=meeting)
+        job = self.run_until_done()
+        self.assert_stored_once(job.meeting)
+
+
+class TimeLimitTests(IsolatedTestCase):
+    def test_paused_block_is_not_interrupted(self):
+        with time_limit(0.05):
+            with time_limit_paused():
+                time.sleep(0.15)
+
+    def test_limit_rearmed_after_paused_block(self):
+        with self.assertRaises(JobTimeout):
+            with time_limit(0.2):
+                with time_limit_paused():
+                    time.sleep(0.05)
+                time.sleep(1)
+
+
+class WorkspaceTests(IsolatedTestCase):
+    def test_each_upload_gets_its_own_directory(self):
+        first, second = create_workspace(), create_workspace()
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.isdir(first) and os.path.isdir(second))
+
+    def test_cleanup_keeps_active_and_recent_workspaces(self):
+        active, old, recent = create_workspace(), create_workspace(), create_workspace()
+        enqueue_job('', 'a.mp3', 'mpeg', {}, workspace=active)
+        past = time.time() - 3600
+        for path in (active, old):
+            os.utime(path, (past, past))
+        self.assertEqual(cleanup_workspaces(max_age=600), 1)
+        self.assertTrue(os.path.isdir(active))
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.isdir(recent))
@@ -0,0 +1,114 @@
+import datetime
+from unittest import mock
+
+from django.db import connection, connections
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from speech.models import Meeting, MeetingTranscription
+from speech.pipeline import Turn, persist_turns
+from speech.search import ensure_sqlite_triggers, fts5_query, plain_snippet, search_transcripts
+from speech.tests.helpers import IsolatedTestCase
+
+
+class Fts5QueryTests(SimpleTestCase):
+    def test_web_search_syntax(self):
+        self.assertEqual(fts5_query('budget review'), '"budget" "review"')
+        self.assertEqual(fts5_query('"next quarter" hiring'), '"next quarter" "hiring"')
+        self.assertEqual(fts5_query('budget or hiring'), '("budget" OR "hiring")')
+        self.assertEqual(fts5_query('budget -hiring'), '"budget" NOT "hiring"')
+
+    def test_user_input_is_never_fts5_syntax(self):
+        self.assertEqual(fts5_query('NEAR(a b) AND c*'), '"NEAR a" "b" "AND" "c"')
+        self.assertEqual(fts5_query('-leading or'), '')
+        self.assertEqual(fts5_query('*** ""'), '')
+
+
+@override_settings(SEARCH_PAGE_SIZE=2, SEARCH_MAX_PAGE_SIZE=3)
+class SearchTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.planning = Meeting.objects.create(userid=1, title="Planning")
+        persist_turns(self.planning, [
+            Turn(0, "Good morning, everyone.", 0, 1000),
+            Turn(1, "The budget for next quarter is ten thousand.", 1000, 3000),
+            Turn(0, "Budgets are tight, so hiring waits.", 3000, 5000),
+        ])
+        self.retro = Meeting.objects.create(userid=2, title="Retro")
+        persist_turns(self.retro, [Turn(1, "We went over budget on hosting.", 0, 2000)])
+        Meeting.objects.filter(pk=self.retro.pk).update(createdat=timezone.now() - datetime.timedelta(days=10))
+
+    def search(self, **params):
+        return self.client.get('/api/search/', params)
+
+    def test_ranked_hits_with_snippets(self):
+        hits = search_transcripts('budget', limit=10)
+        self.assertEqual(len(hits), 3)  # porter stemming matches "Budgets"
+        self.assertEqual({hit.meeting_id for hit in hits}, {self.planning.id, self.retro.id})
+        self.assertEqual(hits, sorted(hits, key=lambda hit: -hit.score))
+        self.assertTrue(all('[' in hit.snippet for hit in hits))
+
+    def test_phrases_or_and_exclusion(self):
+        self.assertEqual([hit.seq for hit in search_transcripts('"next quarter"')], [1])
+        self.assertEqual(len(search_transcripts('hosting or hiring', limit=10)), 2)
+        self.assertEqual([hit.meeting_id for hit in search_transcripts('budget -hiring -quarter')], [self.retro.id])
+
+    def test_filters(self):
+        self.assertEqual({h.meeting_id for h in search_transcripts('budget', user_id=2)}, {self.retro.id})
+        self.assertEqual([h.seq for h in search_transcripts('budget', speaker=0, limit=10)], [2])
+        self.assertEqual(len(search_transcripts('budget', meeting_id=self.planning.id, limit=10)), 2)
+        today = timezone.localdate()
+        self.assertEqual({h.meeting_id for h in search_transcripts('budget', date_from=today, limit=10)},
+                         {self.planning.id})
+
+    def test_index_follows_updates_and_deletes(self):
+        turn = MeetingTranscription.objects.get(meeting=self.retro)
+        turn.text = "Hosting costs were fine."
+        turn.save()
+        self.assertEqual(len(search_transcripts('budget', limit=10)), 2)
+        self.assertEqual([h.id for h in search_transcripts('hosting')], [turn.id])
+        self.retro.delete()
+        self.assertEqual(search_transcripts('hosting'), [])
+
+    def test_triggers_are_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER speech_transcript_fts_ai")
+        ensure_sqlite_triggers()
+        persist_turns(self.retro, [Turn(0, "Roadmap next.", 3000, 4000)])
+        self.assertEqual(len(search_transcripts('roadmap')), 1)
+
+    def test_other_databases_fall_back_to_substring_matches(self):
+        with mock.patch.object(connections['default'], 'vendor', 'mysql'):
+            hits = search_transcripts('budget', limit=10)
+            self.assertEqual([hit.seq for hit in hits], [1, 2, 0])  # unranked, in turn order
+            self.assertEqual(hits[0].snippet, "The [budget] for next quarter is ten thousand.")
+            self.assertEqual([hit.seq for hit in search_transcripts('"next quarter"')], [1])
+            self.assertEqual(len(search_transcripts('hosting or hiring', limit=10)), 2)
+            self.assertEqual([h.meeting_id for h in search_transcripts('budget -hiring -quarter')], [self.retro.id])
+            self.assertEqual([h.seq for h in search_transcripts('budget', speaker=0, user_id=1)], [2])
+            self.assertEqual(search_transcripts('budget', date_from=timezone.localdate(), offset=1, limit=1)[0].seq, 2)
+            self.assertEqual(search_transcripts('***'), [])
+            self.assertEqual(self.search(q='budget').status_code, 200)
+
+    def test_plain_snippet_window(self):
+        text = " ".join(f"w{i}" for i in range(20)) + " budget end"
+        self.assertEqual(plain_snippet(text, ['budget'], 4), "…w18 w19 [budget] end")
+        self.assertEqual(plain_snippet("no match here", ['budget'], 2), "no match…")
+
+    def test_view_pages_and_validates(self):
+        first = self.search(q='budget').json()
+        self.assertEqual(len(first["results"]), 2)
+        self.assertEqual(first["next_offset"], 2)
+        second = self.search(q='budget', offset=2).json()
+        self.assertEqual(len(second["results"]), 1)
+        self.assertIsNone(second["next_offset"])
+        self.assertEqual(len(self.search(q='budget', limit=50).json()["results"]), 3)
+
+        today = timezone.localdate().isoformat()
+        body = self.search(q='budget', to=today, **{'from': today}).json()
+        self.assertEqual({r["meeting_title"] for r in body["results"]}, {"Planning"})
+
+        self.assertEqual(self.search().status_code, 400)
+        self.assertEqual(self.search(q='budget', speaker='x').status_code, 400)
+        self.assertEqual(self.search(q='budget', to='yesterday').status_code, 400)
+        self.assertEqual(self.search(q='***').json()["results"], [])
@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from speech.backends import BaseBackend, FakeBackend, make_response, response_words
+from speech.cache import FileSystemCache, set_cache
+from speech.jobs import JobTimeout, time_limit
+from speech.splitting import chunk_spans, merge_chunk_results, plan_cuts, transcribe_audio
+from speech.tests.helpers import IsolatedTestCase, speech_like, word, write_float_wav, write_wav
+from speech.utils.audio import wav_duration
+
+
+class ChunkBackend(BaseBackend):
+    """One word every half second of whatever chunk it is sent, in chunk-local time."""
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.calls = 0
+        self.durations = []
+        self.lock = threading.Lock()
+
+    def transcribe(self, file_path, mimetype, options):
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.fail_times:
+                raise RuntimeError("chunk failed")
+        duration = wav_duration(file_path)
+        with self.lock:
+            self.durations.append(round(duration, 2))
+        return make_response([word(f"w{i}", i * 0.5, i * 0.5 + 0.3) for i in range(int(duration * 2))])
+
+
+class PlanTests(SimpleTestCase):
+    def test_cuts_land_on_the_quietest_window(self):
+        rms = np.ones(600)  # 12 s of 20 ms windows
+        rms[170:180] = 0  # quiet at 3.4 s
+        rms[395:405] = 0  # quiet at 7.9 s
+        self.assertEqual(plan_cuts(rms, 12.0, 4, 1), [3.4, 7.9])
+
+    def test_no_quiet_window_in_reach_cuts_at_the_target(self):
+        self.assertEqual(plan_cuts(np.ones(0), 12.0, 4, 1), [4.0, 8.0])
+
+    def test_spans_overlap_except_the_last(self):
+        self.assertEqual(chunk_spans([3.4, 7.9], 12.0, 1), [(0.0, 4.4), (3.4, 8.9), (7.9, 12.0)])
+        self.assertEqual(chunk_spans([], 3.0, 1), [(0.0, 3.0)])
+
+
+class MergeTests(SimpleTestCase):
+    def test_overlap_is_deduplicated_at_its_midpoint(self):
+        spans = [(0.0, 5.0), (4.0, 10.0)]
+        first = make_response([word("Hello", 0.0, 0.3, 0), word("budget", 4.2, 4.4, 1), word("today", 4.7, 4.9, 1)])
+        second = make_response([word("budget", 0.2, 0.4, 0), word("today", 0.7, 0.9, 0), word("Thanks", 2.0, 2.3, 1)])
+        words = response_words(merge_chunk_results(spans, [first, second]))
+        self.assertEqual([(w["word"], w["start"]) for w in words],
+                         [("hello", 0.0), ("budget", 4.2), ("today", 4.7), ("thanks", 6.0)])
+        # Local speaker 0 of the second chunk heard the same words as global speaker 1;
+        # its speaker 1 said nothing in the overlap, so it is a new speaker.
+        self.assertEqual([w["speaker"] for w in words], [0, 1, 1, 2])
+
+    def test_unmatched_speaker_gets_a_new_id(self):
+        spans = [(0.0, 5.0), (4.0, 10.0)]
+        first = make_response([word("a", 0.0, 0.3, 0), word("b", 1.0, 1.3, 1), word("c", 4.2, 4.4, 0)])
+        second = make_response([word("c", 0.2, 0.4, 0), word("d", 2.0, 2.3, 1)])
+        words = response_words(merge_chunk_results(spans, [first, second]))
+        # Nothing ties the second chunk's speaker 1 to global speaker 1, so it is not merged into them.
+        self.assertEqual([w["speaker"] for w in words], [0, 1, 0, 2])
+
+
+@override_settings(SPLIT_MIN_SECONDS=5, SPLIT_CHUNK_SECONDS=4, SPLIT_SEARCH_SECONDS=1,
+                   SPLIT_OVERLAP_SECONDS=1, SPLIT_MAX_WORKERS=3, SPLIT_CHUNK_ATTEMPTS=2, SPLIT_CHUNK_RETRY_BACKOFF=0)
+class TranscribeAudioTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = write_wav(os.path.join(self.tmp, 'long.wav'), speech_like(12, quiet=[(3.4, 3.6), (7.9, 8.1)]))
+
+    def assert_covers_recording(self, res):
+        starts = [w["start"] for w in response_words(res)]
+        self.assertEqual(starts, sorted(set(starts)))
+        self.assertEqual(starts[0], 0.0)
+        self.assertTrue(all(b - a < 1.0 for a, b in zip(starts, starts[1:])))  # nothing lost at a cut
+        self.assertGreaterEqual(starts[-1], 11.0)
+
+    def test_long_wav_is_cut_at_the_pauses_and_merged(self):
+        backend = ChunkBackend()
+        res = transcribe_audio(backend, self.path, 'wav', {})
+        self.assertEqual(backend.calls, 3)
+        self.assertEqual(sorted(backend.durations), [4.1, 4.4, 5.5])
+        self.assert_covers_recording(res)
+
+    def test_failed_chunk_is_retried_on_its_own(self):
+        backend = ChunkBackend(fail_times=1)
+        self.assert_covers_recording(transcribe_audio(backend, self.path, 'wav', {}))
+        self.assertEqual(backend.calls, 4)
+
+    @override_settings(SPLIT_CHUNK_ATTEMPTS=3, SPLIT_CHUNK_RETRY_BACKOFF=0.5, SPLIT_MAX_WORKERS=1)
+    def test_chunk_retries_back_off(self):
+        backend = ChunkBackend(fail_times=2)
+        with mock.patch('speech.splitting.time.sleep') as sleep:
+            self.assert_covers_recording(transcribe_audio(backend, self.path, 'wav', {}))
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+
+    @override_settings(SPLIT_CHUNK_ATTEMPTS=0)
+    def test_at_least_one_attempt(self):
+        with self.assertRaisesMessage(RuntimeError, "chunk failed"):
+            transcribe_audio(ChunkBackend(fail_times=1), self.path, 'wav', {})
+        self.assert_covers_recording(transcribe_audio(ChunkBackend(), self.path, 'wav', {}))
+
+    def test_job_timeout_does_not_wait_for_chunks_in_flight(self):
+        class SlowBackend(ChunkBackend):
+            def transcribe(self, file_path, mimetype, options):
+                time.sleep(2)
+                return super().transcribe(file_path, mimetype, options)
+
+        started = time.monotonic()
+        with self.assertRaises(JobTimeout), time_limit(0.2):
+            transcribe_audio(SlowBackend(), self.path, 'wav', {})
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_chunks_are_cached(self):
+        set_cache(FileSystemCache(root=os.path.join(self.tmp, 'fs')))
+        first = transcribe_audio(ChunkBackend(), self.path, 'wav', {})
+        backend = ChunkBackend()
+        self.assertEqual(transcribe_audio(backend, self.path, 'wav', {}), first)
+        self.assertEqual(backend.calls, 0)
+
+    def test_short_or_non_wav_is_sent_whole(self):
+        short = write_wav(os.path.join(self.tmp, 'short.wav'), speech_like(3))
+        mp3 = self.write_file('long.mp3', b'\xff\xfb' + bytes(4096))
+        for path, mimetype in ((short, 'wav'), (mp3, 'mpeg')):
+            backend = FakeBackend()
+            transcribe_audio(backend, path, mimetype, {})
+            self.assertEqual(backend.calls, 1)
+
+    def test_float_wav_is_sent_whole(self):
+        path = write_float_wav(os.path.join(self.tmp, 'float.wav'), speech_like(12))
+        backend = FakeBackend()
+        transcribe_audio(backend, path, 'wav', {})
+        self.assertEqual(backend.calls, 1)
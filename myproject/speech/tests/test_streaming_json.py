@@ -0,0 +1,78 @@
+import io
+import json
+
+from django.test import SimpleTestCase
+
+from speech.backends import make_response, response_transcript
+from speech.utils.streaming_json import iter_words, open_response, read_transcript, save_response
+from speech.tests.helpers import word
+
+WORDS = [
+    word("Grüße,", 0.0, 0.4, 0), word("naïve", 0.4, 0.8, 1), word("café…", 0.8, 1.2, 1),
+    word("日本語", 1.2, 1.6, 0), word('"quoted\\"', 1.6, 2.0, 0), word("🎙️", 2.0, 2.4, 2),
+]
+
+
+def document(words, **extra):
+    res = make_response(words)
+    res["metadata"] = {"note": "x" * 5000 + 'é"\\' + "ü" * 3000, "list": [1, 2.5e3, None, True, {"a": []}]}
+    res["results"]["channels"][0]["alternatives"][0].update(extra)
+    return res
+
+
+class IterWordsTests(SimpleTestCase):
+    def test_matches_json_load_for_any_chunk_size(self):
+        raw = json.dumps(document(WORDS), ensure_ascii=False).encode('utf-8')
+        for chunk_size in (1, 2, 3, 7, 1001, 65536):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(iter_words(io.BytesIO(raw), chunk_size=chunk_size)), WORDS)
+
+    def test_multibyte_character_split_across_reads(self):
+        raw = json.dumps(document(WORDS), ensure_ascii=False).encode('utf-8')
+        # Put a read boundary inside every multi-byte character of the document.
+        for i, byte in enumerate(raw):
+            if byte >= 0xC0:
+                with self.subTest(offset=i):
+                    self.assertEqual(list(iter_words(io.BytesIO(raw), chunk_size=i + 1)), WORDS)
+                if i > 200:
+                    break
+
+    def test_text_input(self):
+        text = json.dumps(document(WORDS), indent=2)
+        self.assertEqual(list(iter_words(io.StringIO(text), chunk_size=5)), WORDS)
+
+    def test_other_channels_and_alternatives(self):
+        res = document(WORDS)
+        res["results"]["channels"].append({"alternatives": [{"words": WORDS[:2]}, {"words": WORDS[2:3]}]})
+        raw = json.dumps(res)
+        self.assertEqual(list(iter_words(io.StringIO(raw), channel=1, alternative=1)), WORDS[2:3])
+        self.assertEqual(len(list(iter_words(io.StringIO(raw), channel=None, alternative=None))), 9)
+
+    def test_no_words(self):
+        self.assertEqual(list(iter_words(io.StringIO(json.dumps(make_response([]))))), [])
+
+    def test_truncated_document(self):
+        raw = json.dumps(document(WORDS)).encode('utf-8')
+        with self.assertRaises(ValueError):
+            list(iter_words(io.BytesIO(raw[:len(raw) // 2]), chunk_size=64))
+
+    def test_syntax_error_stops_reading(self):
+        res = document(WORDS)
+        res["results"]["channels"][0]["alternatives"][0]["words"].extend([word("x", 3.0, 3.1)] * 2000)
+        raw = json.dumps(res).replace('"start": 3.0', '"start": 3.0.', 1).encode('utf-8')
+        f = io.BytesIO(raw)
+        with self.assertRaises(ValueError):
+            list(iter_words(f, chunk_size=256))
+        self.assertLess(f.tell(), len(raw) // 4)
+
+    def test_read_transcript(self):
+        raw = json.dumps(document(WORDS))
+        self.assertEqual(read_transcript(io.StringIO(raw), chunk_size=7), response_transcript(make_response(WORDS)))
+        self.assertEqual(read_transcript(io.StringIO('{"results": {}}'), default="none"), "none")
+
+    def test_gzip_round_trip(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            path = save_response(document(WORDS), f"{directory}/res.json.gz")
+            with open_response(path) as f:
+                self.assertEqual(list(iter_words(f, chunk_size=10)), WORDS)
@@ -0,0 +1,57 @@
+import os
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+
+from speech.backends import FakeBackend, set_backend
+from speech.cache import FileSystemCache, set_cache
+from speech.models import MeetingTranscription, TrelloOutbox
+from speech.tests.helpers import IsolatedTestCase, speech_like, write_wav
+from speech.tests.test_splitting import ChunkBackend
+
+CLIP = b'\xff\xfb' + bytes(512)
+
+
+class TranscribeNowTests(IsolatedTestCase):
+    def post(self, name='clip.mp3', data=CLIP):
+        return self.client.post('/api/transcribe/', {"file": SimpleUploadedFile(name, data)})
+
+    def assert_scratch_empty(self):
+        scratch = os.path.join(self.tmp, 'scratch_root')
+        self.assertEqual(os.listdir(scratch) if os.path.isdir(scratch) else [], [])
+
+    def test_stores_transcript_and_queues_card(self):
+        set_backend(FakeBackend())
+        body = self.post().json()
+        self.assertEqual(body["transcript"], "Hello. Hi.")
+        self.assertEqual(body["turns"], 2)
+        self.assertEqual(MeetingTranscription.objects.filter(meeting=body["meeting_id"]).count(), 2)
+        self.assertEqual(TrelloOutbox.objects.get(pk=body["trello_outbox_id"]).group_key,
+                         f"meeting:{body['meeting_id']}")
+        self.assert_scratch_empty()
+
+    def test_repeat_clip_is_served_from_cache(self):
+        backend = FakeBackend()
+        set_backend(backend)
+        set_cache(FileSystemCache(root=os.path.join(self.tmp, 'fs')))
+        first, second = self.post().json(), self.post('again.mp3').json()
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(first["transcript"], second["transcript"])
+
+    @override_settings(SPLIT_MIN_SECONDS=5, SPLIT_CHUNK_SECONDS=4, SPLIT_SEARCH_SECONDS=1, SPLIT_OVERLAP_SECONDS=1)
+    def test_long_clip_is_split(self):
+        backend = ChunkBackend()
+        set_backend(backend)
+        path = write_wav(os.path.join(self.tmp, 'long.wav'), speech_like(12, quiet=[(3.4, 3.6), (7.9, 8.1)]))
+        with open(path, 'rb') as f:
+            response = self.post('long.wav', f.read())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(backend.calls, 3)
+        self.assert_scratch_empty()
+
+    def test_failure_removes_the_upload(self):
+        set_backend(FakeBackend(fail_times=1))
+        response = self.post()
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("simulated failure", response.json()["error"])
+        self.assert_scratch_empty()
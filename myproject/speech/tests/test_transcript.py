@@ -0,0 +1,92 @@
+import threading
+
+from django.db import IntegrityError, connection, transaction
+from django.test import override_settings, skipUnlessDBFeature
+
+from speech.models import Meeting, MeetingTranscription
+from speech.pipeline import Turn, next_seq, persist_turns
+from speech.tests.helpers import IsolatedTestCase, IsolatedTransactionTestCase
+
+
+def turns(count, start=0):
+    return [Turn(i % 2, f"Turn {i}.", i * 1000, i * 1000 + 900) for i in range(start, start + count)]
+
+
+@override_settings(TRANSCRIPT_PAGE_SIZE=10, TRANSCRIPT_MAX_PAGE_SIZE=20)
+class TranscriptPagingTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.meeting = Meeting.objects.create(userid=1, title="Standup")
+        persist_turns(self.meeting, turns(25))
+
+    def page(self, **params):
+        return self.client.get(f"/api/meetings/{self.meeting.id}/transcript/", params)
+
+    def test_pages_follow_next_after(self):
+        seen, after = [], None
+        while True:
+            body = self.page(**({"after": after} if after is not None else {})).json()
+            seen.extend(turn["seq"] for turn in body["turns"])
+            after = body["next_after"]
+            if after is None:
+                break
+        self.assertEqual(seen, list(range(25)))
+
+    def test_limit_is_capped(self):
+        self.assertEqual(len(self.page(limit=500).json()["turns"]), 20)
+        self.assertEqual(len(self.page(limit=0).json()["turns"]), 1)
+
+    def test_time_range(self):
+        body = self.page(start_ms=3950, end_ms=6000).json()
+        self.assertEqual([turn["seq"] for turn in body["turns"]], [4, 5, 6])
+        self.assertEqual(body["turns"][0]["text"], "Turn 4.")
+
+    def test_errors(self):
+        self.assertEqual(self.page(after="x").status_code, 400)
+        self.assertEqual(self.client.get("/api/meetings/999999/transcript/").status_code, 404)
+
+
+class TurnNumberingTests(IsolatedTestCase):
+    def test_appends_continue_the_numbering(self):
+        meeting = Meeting.objects.create(userid=1, title="m")
+        persist_turns(meeting, turns(3))
+        persist_turns(meeting, turns(2, start=3))
+        self.assertEqual(list(MeetingTranscription.objects.filter(meeting=meeting).order_by('seq')
+                              .values_list('seq', 'text')),
+                         [(i, f"Turn {i}.") for i in range(5)])
+        with transaction.atomic():
+            self.assertEqual(next_seq(meeting), 5)
+
+    def test_seq_is_unique_per_meeting(self):
+        meeting, other = Meeting.objects.create(userid=1, title="a"), Meeting.objects.create(userid=1, title="b")
+        MeetingTranscription.objects.create(meeting=meeting, seq=0, text="a")
+        MeetingTranscription.objects.create(meeting=other, seq=0, text="b")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MeetingTranscription.objects.create(meeting=meeting, seq=0, text="c")
+
+
+class ConcurrentAppendTests(IsolatedTransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_writers_take_turns(self):
+        meeting = Meeting.objects.create(userid=1, title="m")
+        errors = []
+
+        def append(start):
+            try:
+                persist_turns(meeting, turns(20, start=start), batch_size=5)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=append, args=(start,)) for start in (0, 100)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        rows = list(MeetingTranscription.objects.filter(meeting=meeting).order_by('seq').values_list('seq', 'text'))
+        self.assertEqual([seq for seq, _ in rows], list(range(40)))
+        # Each writer's turns are contiguous: one held the lock until it committed.
+        firsts = {rows[0][1], rows[20][1]}
+        self.assertEqual(firsts, {"Turn 0.", "Turn 100."})
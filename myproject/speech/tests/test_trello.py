@@ -0,0 +1,166 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.test import override_settings
+from django.utils import timezone
+
+from speech.backends import FakeBackend, set_backend
+from speech.jobs import claim_next_job, enqueue_job, run_job
+from speech.models import TranscriptionJob, TrelloOutbox
+from speech.tests.helpers import IsolatedTestCase, conversation
+from speech.trello import TokenBucket, TrelloDispatcher, coalesce, enqueue_card, enqueue_cards
+
+
+class StubTrello(ThreadingHTTPServer):
+    """Records each ``POST /cards`` and answers the queued statuses first, then 200."""
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.cards = []
+        self.statuses = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        with self.server.lock:
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+            if status == 200:
+                self.server.cards.append(params)
+                body = json.dumps({"id": f"card{len(self.server.cards)}"}).encode()
+            else:
+                body = b'{}'
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '30')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TokenBucketTests(IsolatedTestCase):
+    def test_rejects_non_positive_rate(self):
+        for rate in (0, -1):
+            with self.assertRaises(ValueError):
+                TokenBucket(rate, 1)
+
+    def test_paces_calls_after_the_burst(self):
+        bucket = TokenBucket(50, 2)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.035)
+
+    def test_pause_holds_tokens(self):
+        bucket = TokenBucket(1000, 5)
+        bucket.pause(0.05)
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.045)
+
+
+@override_settings(TRELLO_POOL_SIZE=2, TRELLO_MAX_ATTEMPTS=2)
+class DispatcherTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = StubTrello()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.dispatcher = TrelloDispatcher(base_url=self.server.url, bucket=TokenBucket(1000, 10))
+
+    def test_action_items_are_coalesced_into_one_card(self):
+        transcript = enqueue_card("Transcription: a.mp3", "Hello.", group_key="meeting:1")
+        items = enqueue_cards([("Send the report.", "Speaker 0 at 0:01"), ("Call Bob.", "")],
+                              group_key="actions:meeting:1")
+        self.assertEqual(self.dispatcher.dispatch_pending(), 2)
+
+        names = sorted(card["name"] for card in self.server.cards)
+        self.assertEqual(names, ["Transcription: a.mp3", "actions:meeting:1: 2 action items"])
+        checklist = next(c["desc"] for c in self.server.cards if c["name"].startswith("actions"))
+        self.assertEqual(checklist, "- [ ] Send the report.\n  Speaker 0 at 0:01\n- [ ] Call Bob.")
+        rows = TrelloOutbox.objects.filter(pk__in=[transcript.pk] + [r.pk for r in items])
+        self.assertEqual({row.status for row in rows}, {TrelloOutbox.SENT})
+        self.assertEqual(len({row.card_id for row in rows}), 2)
+        self.assertEqual(self.dispatcher.stats.as_dict()["calls"], 2)
+
+    def test_rate_limited_rows_wait_without_using_an_attempt(self):
+        row = enqueue_card("Card", "")
+        self.server.statuses = [429]
+        self.assertEqual(self.dispatcher.dispatch_pending(), 0)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (TrelloOutbox.PENDING, 0))
+        self.assertGreater(self.dispatcher.bucket.paused_until, time.monotonic() + 20)
+        self.assertEqual(self.dispatcher.stats.as_dict()["rate_limited"], 1)
+
+    def test_errors_are_retried_then_failed(self):
+        row = enqueue_card("Card", "")
+        self.server.statuses = [500, 500]
+        for _ in range(2):
+            TrelloOutbox.objects.filter(pk=row.pk).update(next_attempt_at=row.createdat)
+            self.dispatcher.dispatch_pending()
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (TrelloOutbox.FAILED, 2))
+        self.assertEqual(self.server.cards, [])
+
+    def test_a_group_is_claimed_whole(self):
+        enqueue_cards([("One.", ""), ("Two.", ""), ("Three.", "")], group_key="actions:meeting:1")
+        enqueue_card("Later", "")
+        self.assertEqual(self.dispatcher.dispatch_pending(limit=1), 1)
+        self.assertEqual([card["name"] for card in self.server.cards], ["actions:meeting:1: 3 action items"])
+        self.assertEqual(TrelloOutbox.objects.get(name="Later").status, TrelloOutbox.PENDING)
+
+    @override_settings(TRELLO_LEASE_SECONDS=0.3)
+    def test_card_is_not_posted_once_its_lease_is_lost(self):
+        row = enqueue_card("Card", "")
+        real_renew = TrelloDispatcher._renew
+
+        def taken_over(dispatcher, group):
+            TrelloOutbox.objects.filter(pk=row.pk).update(claimed_by="other")
+            return real_renew(dispatcher, group)
+
+        slow_bucket = mock.Mock(acquire=lambda: time.sleep(0.3))
+        with mock.patch.object(self.dispatcher, 'bucket', slow_bucket), \
+                mock.patch.object(TrelloDispatcher, '_renew', autospec=True, side_effect=taken_over):
+            self.assertEqual(self.dispatcher.dispatch_pending(), 0)
+        self.assertEqual(self.server.cards, [])
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.claimed_by), (TrelloOutbox.SENDING, "other"))
+
+    def test_rows_of_a_dead_dispatcher_are_sent_once_the_lease_expires(self):
+        row = enqueue_card("Card", "")
+        TrelloOutbox.objects.filter(pk=row.pk).update(
+            status=TrelloOutbox.SENDING, claimed_by="dead", lease_until=timezone.now() + timedelta(minutes=1),
+        )
+        self.assertEqual(self.dispatcher.dispatch_pending(), 0)
+        TrelloOutbox.objects.filter(pk=row.pk).update(lease_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.dispatcher.dispatch_pending(), 1)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.claimed_by, row.lease_until), (TrelloOutbox.SENT, "", None))
+
+
+class ActionItemCardTests(IsolatedTestCase):
+    def test_job_queues_its_action_items(self):
+        set_backend(FakeBackend(words=conversation([
+            (0, "Welcome everyone."), (1, "I will send the report tomorrow."), (0, "Please call the client."),
+        ])))
+        enqueue_job(self.write_file('a.mp3', b'\xff\xfb' + bytes(256)), 'a.mp3', 'mpeg', {})
+        self.assertEqual(run_job(claim_next_job()).status, TranscriptionJob.SUCCEEDED)
+        rows = list(TrelloOutbox.objects.filter(group_key__startswith='actions:').order_by('id'))
+        self.assertEqual([row.name for row in rows], ["I will send the report tomorrow.", "Please call the client."])
+        name, _ = coalesce(rows)
+        self.assertTrue(name.endswith(": 2 action items"))
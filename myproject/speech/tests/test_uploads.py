@@ -0,0 +1,143 @@
+import io
+import os
+import threading
+import time
+from unittest import mock
+
+from django.db import connection
+from django.test import Client, override_settings, skipUnlessDBFeature
+
+from speech import views
+from speech.models import ChunkedUpload, TranscriptionJob
+from speech.tests.helpers import IsolatedTestCase, IsolatedTransactionTestCase
+from speech.uploads import UploadError, partial_path, write_part
+from speech.utils.hashing import hash_file
+
+DATA = b'\xff\xfb' + bytes(range(256)) * 4  # 1026 bytes
+
+
+class ChunkedUploadMixin:
+    def init(self, data=DATA, name='talk.mp3', client=None):
+        response = (client or self.client).post('/api/uploads/', {"file_name": name, "size": len(data)},
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, upload, offset, data, client=None):
+        return (client or self.client).put(f"{upload['upload_url']}?offset={offset}", data,
+                                           content_type='application/octet-stream')
+
+    def send_all(self, upload, data=DATA):
+        size = upload["chunk_size"]
+        for offset in reversed(range(0, len(data), size)):
+            self.assertEqual(self.put(upload, offset, data[offset:offset + size]).status_code, 200)
+
+    def finalize(self, upload, client=None):
+        return (client or self.client).post(f"{upload['upload_url']}finalize/")
+
+
+@override_settings(UPLOAD_CHUNK_SIZE=256)
+class ChunkedUploadTests(ChunkedUploadMixin, IsolatedTestCase):
+    def test_parts_in_any_order_then_finalize(self):
+        upload = self.init()
+        self.assertEqual(upload["chunk_count"], 5)
+        self.put(upload, 512, DATA[512:768])
+        self.put(upload, 0, DATA[:256])
+        status = self.client.get(upload["upload_url"]).json()
+        self.assertEqual((status["received"], status["missing"]), ([0, 2], [1, 3, 4]))
+        self.assertEqual(self.finalize(upload).status_code, 409)
+
+        self.send_all(upload)
+        response = self.finalize(upload)
+        self.assertEqual(response.status_code, 202)
+        stored = ChunkedUpload.objects.get(pk=upload["upload_id"])
+        with open(stored.file_path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        # The hash combined from the part digests matches hashing the whole file.
+        self.assertEqual(stored.content_hash, hash_file(stored.file_path))
+        self.assertEqual(TranscriptionJob.objects.get(pk=response.json()["job_id"]).file_path, stored.file_path)
+
+    def test_resent_part_overwrites(self):
+        upload = self.init()
+        self.put(upload, 0, bytes(256))
+        self.send_all(upload)
+        self.finalize(upload)
+        with open(ChunkedUpload.objects.get(pk=upload["upload_id"]).file_path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+
+    def test_rejects_bad_parts(self):
+        upload = self.init()
+        self.assertEqual(self.put(upload, 100, DATA[100:356]).status_code, 400)
+        self.assertEqual(self.put(upload, 0, DATA[:100]).status_code, 400)
+        self.assertEqual(self.put(upload, 2048, DATA[:256]).status_code, 400)
+        self.send_all(upload)
+        self.finalize(upload)
+        self.assertEqual(self.put(upload, 0, DATA[:256]).status_code, 409)
+
+    def test_same_content_shares_one_file(self):
+        first, second = self.init(), self.init(name='copy.mp3')
+        for upload in (first, second):
+            self.send_all(upload)
+            self.finalize(upload)
+        a, b = ChunkedUpload.objects.filter(pk__in=[first["upload_id"], second["upload_id"]])
+        self.assertEqual(a.file_path, b.file_path)
+        self.assertFalse(os.path.exists(partial_path(b)))
+
+    def test_part_racing_finalize_is_refused(self):
+        upload = self.init()
+        self.send_all(upload)
+        stale = ChunkedUpload.objects.get(pk=upload["upload_id"])  # read before the finalize below
+        self.finalize(upload)
+        with self.assertRaises(UploadError) as raised:
+            write_part(stale, 0, io.BytesIO(DATA[:256]), 256)
+        self.assertEqual(raised.exception.status, 409)
+        with open(ChunkedUpload.objects.get(pk=upload["upload_id"]).file_path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+
+    def test_finalize_after_the_partial_was_dropped(self):
+        upload = self.init()
+        self.send_all(upload)
+        os.remove(partial_path(ChunkedUpload.objects.get(pk=upload["upload_id"])))
+        self.assertEqual(self.finalize(upload).status_code, 410)
+
+    def test_finalize_twice_queues_one_job(self):
+        upload = self.init()
+        self.send_all(upload)
+        first, second = self.finalize(upload).json(), self.finalize(upload).json()
+        self.assertEqual(first["job_id"], second["job_id"])
+        self.assertEqual(TranscriptionJob.objects.count(), 1)
+
+
+@override_settings(UPLOAD_CHUNK_SIZE=256)
+class ConcurrentFinalizeTests(ChunkedUploadMixin, IsolatedTransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_finalize_queues_one_job(self):
+        upload = self.init()
+        self.send_all(upload)
+        self.finalize(upload)  # complete the upload; both requests below race to queue it
+        ChunkedUpload.objects.filter(pk=upload["upload_id"]).update(job=None)
+        TranscriptionJob.objects.all().delete()
+
+        real = views.enqueue_job
+
+        def slow_enqueue(*args, **kwargs):
+            time.sleep(0.2)  # widen the window between the check and the insert
+            return real(*args, **kwargs)
+
+        results = []
+
+        def finalize():
+            try:
+                results.append(self.finalize(upload, client=Client()).json()["job_id"])
+            finally:
+                connection.close()
+
+        with mock.patch.object(views, 'enqueue_job', side_effect=slow_enqueue):
+            threads = [threading.Thread(target=finalize) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(TranscriptionJob.objects.count(), 1)
@@ -0,0 +1,110 @@
+import os
+from unittest import mock
+
+from django.db import transaction
+
+from speech.models import Meeting
+from speech.tests.helpers import IsolatedTestCase, conversation, word
+from speech.wordstore import WordStoreWriter, WordTimings, open_words, store_words, write_columns
+
+WORDS = conversation([(0, "Shall we start?"), (1, "Yes, the budget first.")])
+
+
+def writer_for(words, first_turn=None):
+    writer = WordStoreWriter()
+    writer.add_turns(words, first_turn)
+    return writer
+
+
+class WordStoreTests(IsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.meeting = Meeting.objects.create(userid=1, title="m")
+
+    def test_round_trip_and_lookups(self):
+        self.assertEqual(store_words(self.meeting, writer_for(WORDS)), 7)
+        words = open_words(self.meeting)
+        self.assertEqual(len(words), 7)
+        self.assertEqual(words.word(3), {"index": 3, "text": "Yes,", "start_ms": 1100, "end_ms": 1400,
+                                         "confidence": 0.99, "speaker": 1, "turn": 1})
+        self.assertEqual(words.word_at(1200), 3)
+        self.assertIsNone(words.word_at(1000))  # the pause between turns
+        self.assertEqual(words.seek(1000), 3)
+        self.assertEqual(words.range(1150, 1750), (3, 6))
+
+    def test_unicode_and_low_confidence(self):
+        store_words(self.meeting, writer_for([word("Grüße", 0, 0.5, confidence=0.4), word("日本", 0.5, 1.0)]))
+        words = open_words(self.meeting)
+        self.assertEqual([words.text_of(i) for i in range(2)], ["Grüße", "日本"])
+        self.assertEqual(words.low_confidence(0.5).tolist(), [0])
+
+    def test_append_keeps_time_order(self):
+        store_words(self.meeting, writer_for([word("late", 5.0, 5.5)]))
+        store_words(self.meeting, writer_for([word("early", 1.0, 1.5)], first_turn=1))
+        words = open_words(self.meeting)
+        self.assertEqual([words.word(i)["text"] for i in range(2)], ["early", "late"])
+        self.assertEqual(self.meeting.word_count, 2)
+
+    def test_stale_meeting_object_appends_instead_of_overwriting(self):
+        # Two writers loaded the meeting before either had stored words.
+        first, second = Meeting.objects.get(pk=self.meeting.pk), Meeting.objects.get(pk=self.meeting.pk)
+        store_words(first, writer_for(WORDS[:3]))
+        store_words(second, writer_for(WORDS[3:], first_turn=1))
+        self.meeting.refresh_from_db()
+        self.assertEqual(self.meeting.word_count, 7)
+        self.assertEqual(len(open_words(self.meeting)), 7)
+
+    def test_superseded_store_is_removed_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_words(self.meeting, writer_for(WORDS[:3]))
+        first = self.meeting.words_path
+        with self.captureOnCommitCallbacks(execute=True):
+            store_words(self.meeting, writer_for(WORDS[3:], first_turn=1))
+        self.assertNotEqual(self.meeting.words_path, first)
+        self.assertEqual(os.listdir(os.path.dirname(first)), [os.path.basename(self.meeting.words_path)])
+        self.assertEqual(len(open_words(self.meeting)), 7)
+
+    def test_rollback_leaves_the_committed_store_alone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_words(self.meeting, writer_for(WORDS))
+        committed = self.meeting.words_path
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                store_words(self.meeting, writer_for([word("more", 9.0, 9.5)], first_turn=2))
+                self.assertEqual(len(open_words(self.meeting)), 8)  # later code in the transaction sees it
+                raise RuntimeError("rolled back")
+        self.assertEqual(callbacks, [])
+        self.meeting.refresh_from_db()
+        self.assertEqual(self.meeting.words_path, committed)
+        self.assertEqual(len(open_words(self.meeting)), 7)
+
+        # The next committed write clears what the rolled-back one left behind.
+        with self.captureOnCommitCallbacks(execute=True):
+            store_words(self.meeting, writer_for([word("more", 9.0, 9.5)], first_turn=2))
+        self.assertEqual(os.listdir(os.path.dirname(committed)), [os.path.basename(self.meeting.words_path)])
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        store_words(self.meeting, writer_for(WORDS))
+        directory = os.path.dirname(self.meeting.words_path)
+        with mock.patch('speech.wordstore.os.replace', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                write_columns(self.meeting.words_path, WordTimings(self.meeting.words_path).columns())
+        self.assertEqual(os.listdir(directory), [os.path.basename(self.meeting.words_path)])
+        self.assertEqual(len(open_words(self.meeting)), 7)
+
+    def test_concurrent_writes_use_separate_temporary_files(self):
+        store_words(self.meeting, writer_for(WORDS))
+        path = self.meeting.words_path
+        columns = WordTimings(path).columns()
+        temporaries = []
+        real_replace = os.replace
+
+        def record(src, dst):
+            temporaries.append(src)
+            return real_replace(src, dst)
+
+        with mock.patch('speech.wordstore.os.replace', side_effect=record):
+            write_columns(path, columns)
+            write_columns(path, columns)
+        self.assertEqual(len(set(temporaries)), 2)
+        self.assertTrue(all(os.path.dirname(tmp) == os.path.dirname(path) for tmp in temporaries))
@@ -0,0 +1,348 @@
+"""
+Trello integration.
+
+Request handlers and jobs never call Trello inline; they add rows to the
+``TrelloOutbox`` table with ``enqueue_card``. ``manage.py run_trello_dispatcher``
+drains the outbox through one ``TrelloDispatcher`` per process, which keeps a
+pooled ``requests.Session``, paces calls with a token bucket, backs off on
+429 responses (honouring ``Retry-After``), coalesces pending rows that share
+a ``group_key`` (a meeting's action items) into a single card with a
+checklist-style description, and records per-call latency. Rows being sent
+are held by a renewed lease, so a second dispatcher never posts them too. Point ``settings.TRELLO_API_URL`` at a local stub
+server to exercise it offline.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from speech.metrics import registry, stage
+from speech.models import TrelloOutbox
+
+load_dotenv()
+
+#Trello API Credentials
+TRELLO_API_KEY = os.environ.get('TRELLO_API_KEY')
+TRELLO_TOKEN = os.environ.get('TRELLO_TOKEN')
+TRELLO_LIST_ID = os.environ.get('TRELLO_LIST_ID')
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Trello rate limit hit; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second with bursts of up to ``capacity``."""
+    def __init__(self, rate, capacity):
+        if rate <= 0:
+            raise ValueError(f"TokenBucket rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for ``seconds`` (e.g. after a 429)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class CallStats:
+    """Per-process call counters and a window of recent latencies."""
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.latencies_ms = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    def record(self, latency_ms, ok=True, rate_limited=False):
+        with self._lock:
+            self.calls += 1
+            self.latencies_ms.append(latency_ms)
+            self.errors += not ok
+            self.rate_limited += rate_limited
+
+    def as_dict(self):
+        with self._lock:
+            ordered = sorted(self.latencies_ms)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else None
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "p50_ms": pick(0.5),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+        }
+
+
+def _retry_after(response, default=10.0):
+    value = response.headers.get('Retry-After')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class TrelloDispatcher:
+    def __init__(self, base_url=None, session=None, bucket=None):
+        self.base_url = (base_url or settings.TRELLO_API_URL).rstrip('/')
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.TRELLO_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.bucket = bucket or TokenBucket(settings.TRELLO_RATE_PER_SECOND, settings.TRELLO_BURST)
+        self.stats = CallStats()
+        # Marks the outbox rows this dispatcher has claimed.
+        self.owner = f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def post_card(self, name, description, before_post=None):
+        """
+        Create one card and return ``(card, latency_ms)``. Raises
+        ``RateLimited`` on 429 and ``requests`` errors otherwise. If
+        ``before_post`` returns False once a token is acquired, the card is
+        not sent and ``LeaseLost`` is raised.
+        """
+        self.bucket.acquire()
+        if before_post is not None and not before_post():
+            raise LeaseLost("Outbox rows were claimed by another dispatcher")
+        params = {
+            "key": TRELLO_API_KEY,
+            "token": TRELLO_TOKEN,
+            "idList": TRELLO_LIST_ID,
+            "name": name,
+            "desc": description
+        }
+        start = time.perf_counter()
+        with stage('trello', len(description.encode('utf-8'))):
+            try:
+                response = self.session.post(f"{self.base_url}/cards", params=params, timeout=settings.TRELLO_TIMEOUT)
+            except requests.exceptions.RequestException:
+                self.stats.record((time.perf_counter() - start) * 1000, ok=False)
+                raise
+            latency_ms = (time.perf_counter() - start) * 1000
+
+            if response.status_code == 429:
+                retry_after = _retry_after(response)
+                self.bucket.pause(retry_after)
+                self.stats.record(latency_ms, ok=False, rate_limited=True)
+                raise RateLimited(retry_after)
+            self.stats.record(latency_ms, ok=response.ok)
+            response.raise_for_status()
+        return response.json(), round(latency_ms)
+
+    def dispatch_pending(self, limit=100):
+        """
+        Send due outbox rows, one card per ``group_key`` (rows without a key
+        get their own card). Returns the number of cards created.
+
+        Rows are claimed by moving them to SENDING under this dispatcher's
+        ``owner`` with a lease of ``TRELLO_LEASE_SECONDS``, renewed while
+        their cards are in flight; a card whose lease was lost is not sent.
+        Rows left SENDING by a dispatcher that died go back to PENDING once
+        their lease runs out.
+        """
+        groups = self._claim(limit)
+        if not groups:
+            return 0
+
+        # HTTP calls share the pooled session across threads; the outbox rows
+        # are only updated from this thread.
+        lost = set()
+        pool = ThreadPoolExecutor(max_workers=settings.TRELLO_POOL_SIZE)
+        try:
+            futures = {pool.submit(self._send, group, i, lost): i for i, group in enumerate(groups)}
+            waiting = set(futures)
+            while waiting:
+                _, waiting = wait(waiting, timeout=settings.TRELLO_LEASE_SECONDS / 3)
+                for future in waiting:
+                    i = futures[future]
+                    if not self._renew(groups[i]):
+                        lost.add(i)
+        finally:
+            pool.shutdown()
+
+        sent = 0
+        for group, future in zip(groups, futures):
+            result, error = future.result()
+            if isinstance(error, LeaseLost):
+                continue
+            if isinstance(error, RateLimited):
+                _reschedule(group, error.retry_after, str(error), count_attempt=False)
+            elif error is not None:
+                _reschedule(group, min(2 ** (group[0].attempts + 1), 600), f"Trello API request failed: {error}")
+            else:
+                card, latency_ms = result
+                _claimed(group, self.owner).update(
+                    status=TrelloOutbox.SENT, card_id=card.get("id", ""), latency_ms=latency_ms,
+                    sentat=timezone.now(), error='', claimed_by='', lease_until=None,
+                )
+                sent += 1
+        return sent
+
+    def _claim(self, limit):
+        """Claim whole groups for the first ``limit`` due rows; returns the groups."""
+        now = timezone.now()
+        TrelloOutbox.objects.filter(status=TrelloOutbox.SENDING, lease_until__lt=now).update(
+            status=TrelloOutbox.PENDING, claimed_by='', lease_until=None,
+        )
+        lease_until = now + timedelta(seconds=settings.TRELLO_LEASE_SECONDS)
+        with transaction.atomic():
+            due = TrelloOutbox.objects.filter(status=TrelloOutbox.PENDING, next_attempt_at__lte=now).order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+            picked = list(due.values_list('pk', 'group_key')[:limit])
+            # A group is claimed whole even past ``limit``, so it is never split over two cards.
+            claim = Q(pk__in=[pk for pk, key in picked if not key])
+            keys = {key for _, key in picked if key}
+            if keys:
+                claim |= Q(group_key__in=keys, next_attempt_at__lte=now)
+            # The status guard keeps two dispatchers from claiming one row on backends without row locks.
+            TrelloOutbox.objects.filter(claim, status=TrelloOutbox.PENDING).update(
+                status=TrelloOutbox.SENDING, claimed_by=self.owner, lease_until=lease_until,
+            )
+        rows = TrelloOutbox.objects.filter(
+            status=TrelloOutbox.SENDING, claimed_by=self.owner, lease_until=lease_until,
+        ).order_by('id')
+
+        groups = {}
+        for row in rows:
+            groups.setdefault(row.group_key or f"row:{row.pk}", []).append(row)
+        return list(groups.values())
+
+    def _renew(self, group):
+        """Extend the lease on ``group``; False if another dispatcher has taken any of it."""
+        renewed = _claimed(group, self.owner).update(
+            lease_until=timezone.now() + timedelta(seconds=settings.TRELLO_LEASE_SECONDS),
+        )
+        return renewed == len(group)
+
+    def _send(self, group, index, lost):
+        try:
+            # Checked once a token is in hand, right before the POST: waiting
+            # for the bucket or a 429 pause can outlast a lease we failed to renew.
+            return self.post_card(*coalesce(group), before_post=lambda: index not in lost), None
+        except (requests.exceptions.RequestException, RateLimited, LeaseLost) as e:
+            return None, e
+
+
+def _claimed(group, owner):
+    return TrelloOutbox.objects.filter(pk__in=[row.pk for row in group], status=TrelloOutbox.SENDING, claimed_by=owner)
+
+
+def _reschedule(group, delay, error, count_attempt=True):
+    for row in group:
+        row.error = error
+        if count_attempt:
+            row.attempts += 1
+        row.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        row.status = TrelloOutbox.FAILED if row.attempts >= settings.TRELLO_MAX_ATTEMPTS else TrelloOutbox.PENDING
+        row.claimed_by = ''
+        row.lease_until = None
+        row.save(update_fields=['error', 'attempts', 'next_attempt_at', 'status', 'claimed_by', 'lease_until'])
+
+
+def coalesce(rows):
+    """
+    Card name and description for a group of outbox rows. Only action items
+    (``enqueue_action_items``) share a ``group_key``; they become one card
+    with a checklist description.
+    """
+    if len(rows) == 1:
+        return rows[0].name, rows[0].description
+    name = f"{rows[0].group_key}: {len(rows)} action items"
+    description = "\n".join(
+        f"- [ ] {row.name}" + (f"\n  {row.description}" if row.description else "") for row in rows
+    )
+    return name, description
+
+
+def enqueue_card(name, description, group_key=''):
+    """Queue a card for the dispatcher; returns the outbox row."""
+    return TrelloOutbox.objects.create(name=name[:255], description=description, group_key=group_key)
+
+
+def enqueue_cards(cards, group_key):
+    """Queue ``(name, description)`` pairs under one ``group_key``; the dispatcher sends them as one card."""
+    return TrelloOutbox.objects.bulk_create([
+        TrelloOutbox(name=name[:255], description=description, group_key=group_key) for name, description in cards
+    ])
+
+
+async def aenqueue_card(name, description, group_key=''):
+    return await TrelloOutbox.objects.acreate(name=name[:255], description=description, group_key=group_key)
+
+
+_dispatcher = None
+
+
+def get_dispatcher():
+    """Return the process-wide dispatcher (one pooled session per process)."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = TrelloDispatcher()
+    return _dispatcher
+
+
+def _collect_stats():
+    stats = _dispatcher.stats.as_dict() if _dispatcher is not None else {}
+    yield 'speech_trello_calls_total', 'counter', "Trello API calls from this process.", stats.get('calls')
+    yield 'speech_trello_errors_total', 'counter', "Failed Trello API calls.", stats.get('errors')
+    yield 'speech_trello_rate_limited_total', 'counter', "Trello calls answered 429.", stats.get('rate_limited')
+
+
+registry.add_collector(_collect_stats)
+
+
+def create_trello_task(task_name, task_description):
+    """Function to create a new task in Trello."""
+    if not all([TRELLO_API_KEY, TRELLO_TOKEN, TRELLO_LIST_ID]):
+        return {"error": "Trello API credentials are missing"}
+
+    try:
+        card, _ = get_dispatcher().post_card(task_name, task_description)
+        return card
+    except (requests.exceptions.RequestException, RateLimited) as e:
+        return {"error": f"Trello API request failed: {str(e)}"}
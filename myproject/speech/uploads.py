@@ -0,0 +1,178 @@
+"""
+Chunked, resumable uploads into a content-addressed audio store.
+
+A client creates an upload with the file name and total size, then PUTs
+``chunk_size``-byte parts at their byte offsets (any order, retries are
+idempotent) and finally asks to finalize it. Parts are written with
+``os.pwrite`` straight into a single pre-sized partial file while they are
+hashed, so no part is buffered whole and no copy is ever made: finalizing
+only combines the stored part digests and renames the partial file to
+``UPLOAD_ROOT/<hash[:2]>/<hash>``. Part writes share a ``flock`` on the
+partial file that finalizing takes exclusively, so a part racing a
+finalize either lands before it or is refused with 409.
+"""
+import fcntl
+import hashlib
+import os
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from speech.models import ChunkedUpload, ChunkedUploadPart
+from speech.utils.hashing import tree_hash
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def partial_path(upload):
+    return os.path.join(settings.UPLOAD_ROOT, 'partial', str(upload.id))
+
+
+def content_path(content_hash):
+    return os.path.join(settings.UPLOAD_ROOT, content_hash[:2], content_hash)
+
+
+def create_upload(file_name, size):
+    if size <= 0:
+        raise UploadError("'size' must be a positive number of bytes")
+    upload = ChunkedUpload.objects.create(
+        file_name=os.path.basename(file_name), size=size, chunk_size=settings.UPLOAD_CHUNK_SIZE,
+    )
+    path = partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.truncate(size)
+    return upload
+
+
+def write_part(upload, offset, stream, length):
+    """
+    Stream ``length`` bytes from ``stream`` into the part starting at
+    ``offset``. Re-sending a part overwrites it. Returns the part.
+    """
+    if upload.status != ChunkedUpload.UPLOADING:
+        raise UploadError("Upload is already finalized", status=409)
+    if offset % upload.chunk_size or offset >= upload.size:
+        raise UploadError(f"'offset' must be a multiple of {upload.chunk_size} below {upload.size}")
+    expected = min(upload.chunk_size, upload.size - offset)
+    if length != expected:
+        raise UploadError(f"Part at offset {offset} must be exactly {expected} bytes, got {length}")
+
+    # Each part is exactly one hashing leaf, so its digest is computed here
+    # and the bytes are never needed again.
+    hasher = hashlib.sha256()
+    try:
+        with _locked_partial(upload, os.O_WRONLY, fcntl.LOCK_SH) as fd:
+            position = offset
+            remaining = length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    raise UploadError("Request body ended before Content-Length bytes were read")
+                os.pwrite(fd, data, position)
+                hasher.update(data)
+                position += len(data)
+                remaining -= len(data)
+
+            # Recorded under the file lock too, so finalizing sees every part it waited for.
+            part, _ = ChunkedUploadPart.objects.update_or_create(
+                upload=upload, index=offset // upload.chunk_size,
+                defaults={"size": length, "digest": hasher.hexdigest()},
+            )
+            ChunkedUpload.objects.filter(pk=upload.pk).update(updatedat=timezone.now())
+    except FileNotFoundError:
+        raise UploadError("Upload is already finalized", status=409) from None
+    return part
+
+
+@contextmanager
+def _locked_partial(upload, flags, operation):
+    """
+    Open the upload's partial file and ``flock`` it with ``operation``.
+    Parts are written under a shared lock and finalizing takes it
+    exclusively, so the file is never renamed with a write in flight.
+    Raises FileNotFoundError once the file is gone or was renamed away
+    (finalized, or dropped as stale) while the lock was awaited.
+    """
+    path = partial_path(upload)
+    fd = os.open(path, flags)
+    try:
+        fcntl.flock(fd, operation)
+        if not os.path.samestat(os.stat(path), os.fstat(fd)):
+            raise FileNotFoundError(path)
+        yield fd
+    finally:
+        os.close(fd)
+
+
+def received_parts(upload):
+    return list(upload.parts.order_by('index').values_list('index', flat=True))
+
+
+def finalize_upload(upload):
+    """
+    Check every part arrived, derive the content hash from the part digests
+    and move the file to its content-addressed path. Returns the upload.
+    """
+    try:
+        with _locked_partial(upload, os.O_RDONLY, fcntl.LOCK_EX):
+            return _finalize_locked(upload)
+    except FileNotFoundError:
+        # Another finalize got there first, or the upload was dropped as stale.
+        upload = ChunkedUpload.objects.filter(pk=upload.pk).first()
+        if upload is not None and upload.status == ChunkedUpload.COMPLETE:
+            return upload
+        raise UploadError("Upload expired; create it again", status=410) from None
+
+
+def _finalize_locked(upload):
+    with transaction.atomic():
+        upload = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status == ChunkedUpload.COMPLETE:
+            return upload
+
+        digests = list(upload.parts.order_by('index').values_list('index', 'digest'))
+        missing = sorted(set(range(upload.chunk_count)) - {index for index, _ in digests})
+        if missing:
+            raise UploadError(f"Missing parts: {missing[:20]}", status=409)
+
+        content_hash = tree_hash(bytes.fromhex(digest) for _, digest in digests)
+        path = content_path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            # Same audio already stored; keep the existing file.
+            os.remove(partial_path(upload))
+        else:
+            os.replace(partial_path(upload), path)
+
+        upload.content_hash = content_hash
+        upload.file_path = path
+        upload.status = ChunkedUpload.COMPLETE
+        upload.save(update_fields=['content_hash', 'file_path', 'status', 'updatedat'])
+    return upload
+
+
+def cleanup_partial_uploads(max_age=None):
+    """Drop unfinished uploads untouched for ``max_age`` seconds (default SCRATCH_TTL)."""
+    max_age = settings.SCRATCH_TTL if max_age is None else max_age
+    stale = ChunkedUpload.objects.filter(
+        status=ChunkedUpload.UPLOADING, updatedat__lt=timezone.now() - timedelta(seconds=max_age),
+    )
+    removed = 0
+    for upload in stale:
+        try:
+            os.remove(partial_path(upload))
+        except FileNotFoundError:
+            pass
+        upload.delete()
+        removed += 1
+    return removed
@@ -1,11 +1,23 @@
 from django.urls import path
 from .views import UserCreateView, upload_audio
-from .views import upload_audio, create_trello_task,ask_question  # Import your views
+from .views import upload_audio, create_trello_task,ask_question, job_status, upload_init, upload_chunk, upload_finalize, transcribe_now, meeting_transcript, meeting_words, meeting_actions, meeting_export, meeting_stats, search, speaker_stats  # Import your views
 
 urlpatterns = [
     path("upload_audio/", upload_audio),
+    path("transcribe/", transcribe_now, name="transcribe_now"),
+    path("jobs/<int:job_id>/", job_status, name="job_status"),
+    path("uploads/", upload_init, name="upload_init"),
+    path("uploads/<uuid:upload_id>/", upload_chunk, name="upload_chunk"),
+    path("uploads/<uuid:upload_id>/finalize/", upload_finalize, name="upload_finalize"),
+    path("meetings/<int:meeting_id>/transcript/", meeting_transcript, name="meeting_transcript"),
+    path("meetings/<int:meeting_id>/words/", meeting_words, name="meeting_words"),
+    path("meetings/<int:meeting_id>/action-items/", meeting_actions, name="meeting_actions"),
+    path("meetings/<int:meeting_id>/export/<str:fmt>/", meeting_export, name="meeting_export"),
+    path("meetings/<int:meeting_id>/stats/", meeting_stats, name="meeting_stats"),
     path('api/create-task/', create_trello_task, name='create_task'), 
     path('ask-gpt/', ask_question, name='ask_question'),
+    path('search/', search, name='search'),
+    path('stats/', speaker_stats, name='speaker_stats'),
     path("users/", UserCreateView.as_view(), name="user-create"),  # Keep it simple
 ]
 
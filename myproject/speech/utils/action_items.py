@@ -0,0 +1,232 @@
+"""
+Action-item extraction.
+
+A sentence is an action item when it mentions one of a set of keywords.
+Keywords are matched at word starts and case-insensitively, so "send"
+also matches "sending" but not "godsend", and multi-word keywords such as
+"follow up" match across any whitespace. Every keyword set compiles to one
+regular expression (``KeywordMatcher``) shaped as a trie of the keywords,
+so at each word start the regex engine follows one branch per character
+instead of trying every keyword in turn, the way an Aho–Corasick automaton
+would. The regex runs once over the whole transcript, so the cost grows
+with the transcript length and hardly at all with the number of keywords.
+
+Sentences come from word-level data where there is any (``speech.wordstore``
+columns): a sentence ends at a word ending in ``.``, ``?`` or ``!``, at a
+speaker change, or at a pause longer than ``gap_ms``. The boundaries are
+computed with NumPy over the columns. Plain text is split on sentence
+punctuation instead.
+
+The plain-text table only needs a yes/no per sentence (``flag_sentences``),
+so it skips the offsets and ``ActionItem``s and runs one regex search per
+sentence, which stops at the first keyword. For small ASCII keyword sets
+the whole text is first checked with plain substring tests for each
+keyword's first word; a transcript that mentions none skips the regex.
+"""
+import re
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_ACTION_KEYWORDS = ("email", "send", "call", "meeting", "urgent", "submit", "deadline")
+
+DEFAULT_GAP_MS = 1500
+
+ActionItem = namedtuple('ActionItem', 'sentence speaker start_ms end_ms keywords turn')
+
+# Above this many keywords one regex search beats a substring test per keyword.
+PROBE_MAX_KEYWORDS = 16
+
+# Punctuation only ends a sentence when followed by whitespace or the end (so "3.5" stays whole).
+_SENTENCE_END_RE = re.compile(r'[.!?]+(?=\s|$)')
+# The same sentences as ``sentence_ends``, matched whole: runs of anything but a sentence end, then the end.
+_SENTENCE_RE = re.compile(r'(?:[^.!?]+|[.!?]+(?!\s|$))+[.!?]*|[.!?]+')
+_SENTENCE_END = np.frombuffer(b'.?!', dtype=np.uint8)
+
+
+def _normalise(keyword):
+    return " ".join(keyword.lower().split())
+
+
+def _trie_pattern(node):
+    branches = [
+        (r"\s+" if char == " " else re.escape(char)) + _trie_pattern(child)
+        for char, child in sorted(node.items()) if char
+    ]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    # Optional (and greedy) past the end of a keyword, so the longest keyword wins.
+    return f"(?:{body})?" if "" in node else body
+
+
+class KeywordMatcher:
+    def __init__(self, keywords):
+        self.keywords = tuple(sorted({_normalise(k) for k in keywords if k and k.strip()}))
+        trie = {}
+        for keyword in self.keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        self.regex = None
+        if self.keywords:
+            # The lookahead rejects word starts that cannot begin any keyword before entering the trie.
+            first = "".join(sorted({re.escape(k[0]) for k in self.keywords}))
+            self.regex = re.compile(rf"(?<!\w)(?=[{first}]){_trie_pattern(trie)}", re.IGNORECASE)
+        # str.lower() and re.IGNORECASE agree on ASCII, so the probes are only used for ASCII keywords and text.
+        self.probes = None
+        if len(self.keywords) <= PROBE_MAX_KEYWORDS and all(k.isascii() for k in self.keywords):
+            self.probes = tuple(sorted({k.split()[0] for k in self.keywords}))
+
+    def ruled_out(self, text):
+        """True when substring tests alone show ``text`` mentions no keyword."""
+        if self.regex is None:
+            return True
+        if self.probes is None or not text.isascii():
+            return False
+        lowered = text.lower()
+        return not any(probe in lowered for probe in self.probes)
+
+    def find(self, text):
+        """``(char_offsets, keywords)`` lists of every match in ``text``."""
+        if self.regex is None:
+            return [], []
+        matches = [(m.start(), m.group()) for m in self.regex.finditer(text)]
+        # Matched text differs from its keyword only in case and spacing; normalise each variant once.
+        canonical = {}
+        for _, found in matches:
+            if found not in canonical:
+                canonical[found] = _normalise(found)
+        return [offset for offset, _ in matches], [canonical[found] for _, found in matches]
+
+    def match(self, text):
+        """Sorted keywords found in ``text``."""
+        return tuple(sorted(set(self.find(text)[1])))
+
+
+@lru_cache(maxsize=256)
+def _matcher(keywords):
+    return KeywordMatcher(keywords)
+
+
+def get_matcher(keywords=None):
+    """Compiled matcher for ``keywords`` (default list if None), cached per distinct set."""
+    keywords = DEFAULT_ACTION_KEYWORDS if keywords is None else keywords
+    return _matcher(tuple(sorted({_normalise(k) for k in keywords if k and k.strip()})))
+
+
+def sentence_ends(text):
+    """Character offsets just past the end of every sentence of plain text."""
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(text)]
+    if text[ends[-1] if ends else 0:].strip():
+        ends.append(len(text))
+    return ends
+
+
+def _sentence_at(text, ends, i):
+    return text[ends[i - 1] if i else 0:ends[i]].strip()
+
+
+def split_sentences(text):
+    """Split plain text into sentences on ``.``, ``?`` and ``!``."""
+    return [sentence for sentence in map(str.strip, _SENTENCE_RE.findall(text)) if sentence]
+
+
+def flag_sentences(text, matcher):
+    """``(sentence, is_action_item)`` for every sentence of plain text."""
+    sentences = split_sentences(text)
+    if matcher.ruled_out(text):
+        return [(sentence, False) for sentence in sentences]
+    search = matcher.regex.search
+    return [(sentence, search(sentence) is not None) for sentence in sentences]
+
+
+def sentence_starts(words, gap_ms=DEFAULT_GAP_MS):
+    """Index of the first word of every sentence in word store columns."""
+    n = len(words.start_ms)
+    if not n:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.asarray(words.text_offsets, dtype=np.int64)
+    text = np.asarray(words.text)
+    # The last byte of an empty word is taken from its predecessor, which is harmless.
+    last_bytes = text[np.maximum(offsets[1:] - 1, 0)] if len(text) else np.zeros(n, dtype=np.uint8)
+    boundary = np.isin(last_bytes[:-1], _SENTENCE_END)
+    boundary |= words.speaker[1:] != words.speaker[:-1]
+    boundary |= (words.start_ms[1:].astype(np.int64) - words.end_ms[:-1]) > gap_ms
+    return np.concatenate([[0], np.flatnonzero(boundary) + 1])
+
+
+def _joined_text(words):
+    """
+    The words joined by single spaces, decoded once, and the character
+    offset of each word in it.
+    """
+    offsets = np.asarray(words.text_offsets, dtype=np.int64)
+    text = np.asarray(words.text)
+    n = len(offsets) - 1
+    lengths = np.diff(offsets)
+    buf = np.full(len(text) + n, ord(' '), dtype=np.uint8)
+    buf[np.arange(len(text)) + np.repeat(np.arange(n), lengths)] = text
+    byte_starts = offsets[:-1] + np.arange(n)
+    continuation = (buf & 0xC0) == 0x80
+    if continuation.any():
+        # Character offset = byte offset minus UTF-8 continuation bytes before it.
+        before = np.concatenate([[0], np.cumsum(continuation)])
+        char_starts = byte_starts - before[byte_starts]
+    else:
+        char_starts = byte_starts
+    return buf.tobytes().decode('utf-8'), char_starts
+
+
+def extract_from_words(words, matcher, gap_ms=DEFAULT_GAP_MS):
+    """
+    Action items in word store columns (a ``WordTimings`` or anything with
+    the same arrays), in transcript order.
+    """
+    n = len(words.start_ms)
+    if not n or matcher.regex is None:
+        return []
+    text, char_starts = _joined_text(words)
+    offsets, keywords = matcher.find(text)
+    if not offsets:
+        return []
+
+    starts = sentence_starts(words, gap_ms)
+    word_index = np.searchsorted(char_starts, offsets, side='right') - 1
+    sentence_index = np.searchsorted(starts, word_index, side='right') - 1
+    found = {}
+    for sentence, keyword in zip(sentence_index.tolist(), keywords):
+        found.setdefault(sentence, set()).add(keyword)
+
+    # Gather the per-sentence columns with one fancy index each rather than per item.
+    matched = np.fromiter(found, dtype=np.int64, count=len(found))
+    first = starts[matched]
+    last = np.append(starts, n)[matched + 1]
+    text_start = char_starts[first].tolist()
+    # Every word is followed by a space; the sentinel drops the last one's.
+    text_end = np.append(char_starts, len(text))[last].tolist()
+    return [
+        ActionItem(text[a:b - 1], speaker, start_ms, end_ms, tuple(sorted(k)), turn)
+        for a, b, speaker, start_ms, end_ms, turn, k in zip(
+            text_start, text_end, words.speaker[first].tolist(), words.start_ms[first].tolist(),
+            words.end_ms[last - 1].tolist(), words.turn[first].tolist(), found.values(),
+        )
+    ]
+
+
+def extract_from_text(text, matcher, speaker=None, start_ms=None, turn=None):
+    """Action items in plain text (e.g. one transcript turn)."""
+    offsets, keywords = matcher.find(text)
+    if not offsets:
+        return []
+    ends = sentence_ends(text)
+    found = {}
+    for offset, keyword in zip(offsets, keywords):
+        found.setdefault(bisect_right(ends, offset), set()).add(keyword)
+    return [
+        ActionItem(_sentence_at(text, ends, i), speaker, start_ms, None, tuple(sorted(keywords)), turn)
+        for i, keywords in found.items()
+    ]
@@ -0,0 +1,224 @@
+"""
+Small PCM/WAV helpers built on the stdlib ``wave`` module and NumPy.
+
+Only uncompressed PCM WAV can be inspected, cut or resampled here; other
+containers are only identified (``sniff_format``) and are passed through to
+the transcription backend untouched.
+"""
+import struct
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+HEADER_BYTES = 4096
+
+AudioFormat = namedtuple('AudioFormat', 'container codec mimetype')
+
+_WAV_CODECS = {0x0001: 'pcm', 0x0002: 'adpcm', 0x0003: 'float', 0x0006: 'alaw', 0x0007: 'mulaw',
+               0x0011: 'ima_adpcm', 0x0055: 'mp3'}
+_OGG_CODECS = ((b'OpusHead', 'opus'), (b'\x01vorbis', 'vorbis'), (b'\x7fFLAC', 'flac'), (b'Speex', 'speex'))
+_MKV_CODECS = ((b'A_OPUS', 'opus'), (b'A_VORBIS', 'vorbis'), (b'A_AAC', 'aac'), (b'A_PCM', 'pcm'))
+
+
+def _wav_codec(header):
+    pos = 12
+    while pos + 8 <= len(header):
+        chunk_id, size = header[pos:pos + 4], struct.unpack_from('<I', header, pos + 4)[0]
+        if chunk_id == b'fmt ' and pos + 10 <= len(header):
+            tag = struct.unpack_from('<H', header, pos + 8)[0]
+            if tag == 0xFFFE and pos + 34 <= len(header):  # WAVE_FORMAT_EXTENSIBLE: the subformat GUID starts with the tag
+                tag = struct.unpack_from('<H', header, pos + 32)[0]
+            return _WAV_CODECS.get(tag, f'0x{tag:04x}')
+        pos += 8 + size + (size & 1)
+    return None
+
+
+def sniff_format(header):
+    """
+    Identify the container and codec from the first bytes of a file
+    (``HEADER_BYTES`` is plenty). ``mimetype`` is the ``audio/`` subtype the
+    backends expect. Returns None when the header is not recognised.
+    """
+    if header[:4] in (b'RIFF', b'RF64') and header[8:12] == b'WAVE':
+        return AudioFormat('wav', _wav_codec(header), 'wav')
+    if header[:4] == b'fLaC':
+        return AudioFormat('flac', 'flac', 'flac')
+    if header[:4] == b'OggS':
+        codec = next((name for magic, name in _OGG_CODECS if magic in header), None)
+        return AudioFormat('ogg', codec, 'ogg')
+    if header[:4] == b'\x1a\x45\xdf\xa3':
+        codec = next((name for magic, name in _MKV_CODECS if magic in header), None)
+        return AudioFormat('webm' if b'webm' in header else 'matroska', codec, 'webm')
+    if header[4:8] == b'ftyp':
+        return AudioFormat('mp4', None, 'mp4')
+    if header[:4] == b'FORM' and header[8:12] in (b'AIFF', b'AIFC'):
+        return AudioFormat('aiff', 'pcm' if header[8:12] == b'AIFF' else None, 'aiff')
+    if header[:6] == b'#!AMR\n':
+        return AudioFormat('amr', 'amr', 'amr')
+    if header[:3] == b'ID3':
+        return AudioFormat('mp3', 'mp3', 'mpeg')
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        layer = (header[1] >> 1) & 0x3
+        if layer == 0:  # ADTS frames have the same sync word with layer 00
+            return AudioFormat('aac', 'aac', 'aac')
+        return AudioFormat('mp3', 'mp3' if layer == 1 else f'mp{4 - layer}', 'mpeg')
+    return None
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        return f.read(HEADER_BYTES)
+
+
+def is_pcm_wav(path):
+    """
+    True for a WAV the ``wave`` module can read. Float, ADPCM and other
+    non-PCM WAVs (and RF64) are not, however ``sniff_format`` labels them.
+    """
+    try:
+        with wave.open(path, 'rb'):
+            return True
+    except (wave.Error, EOFError):
+        return False
+
+
+def wav_duration(path):
+    with wave.open(path, 'rb') as w:
+        return w.getnframes() / w.getframerate()
+
+
+def pcm_to_float(raw, sampwidth, nchannels):
+    """Decode interleaved little-endian PCM bytes to float32 in [-1, 1], shape (frames, channels)."""
+    if sampwidth == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        ints = (b[:, 0].astype(np.int32) | (b[:, 1].astype(np.int32) << 8) | (b[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608.0
+    elif sampwidth == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        dtype = _DTYPES[sampwidth]
+        samples = np.frombuffer(raw, dtype='<' + np.dtype(dtype).str[1:]).astype(np.float32) / float(2 ** (8 * sampwidth - 1))
+    return samples.reshape(-1, nchannels)
+
+
+def iter_mono_blocks(path, block_frames=65536, start_frame=0, end_frame=None):
+    """Yield ``(framerate, block)`` with each block a float32 mono array."""
+    with wave.open(path, 'rb') as w:
+        sampwidth, nchannels, framerate = w.getsampwidth(), w.getnchannels(), w.getframerate()
+        remaining = (w.getnframes() if end_frame is None else end_frame) - start_frame
+        if start_frame:
+            w.setpos(start_frame)
+        while remaining > 0:
+            raw = w.readframes(min(block_frames, remaining))
+            if not raw:
+                return
+            samples = pcm_to_float(raw, sampwidth, nchannels)
+            remaining -= len(samples)
+            yield framerate, samples.mean(axis=1) if nchannels > 1 else samples[:, 0]
+
+
+def window_rms(path, window_seconds=0.02):
+    """RMS energy of consecutive ``window_seconds`` windows over the whole file, streamed."""
+    rms = []
+    carry = np.empty(0, dtype=np.float32)
+    window = None
+    for framerate, block in iter_mono_blocks(path):
+        window = window or max(1, int(framerate * window_seconds))
+        samples = np.concatenate([carry, block])
+        usable = len(samples) - len(samples) % window
+        if usable:
+            frames = samples[:usable].reshape(-1, window)
+            rms.append(np.sqrt(np.mean(frames * frames, axis=1)))
+        carry = samples[usable:]
+    return np.concatenate(rms) if rms else np.empty(0, dtype=np.float32)
+
+
+def write_wav_slice(path, start_seconds, end_seconds, out_path):
+    """Copy the frames between two timestamps into a new WAV with the same format."""
+    with wave.open(path, 'rb') as src:
+        framerate = src.getframerate()
+        start = int(start_seconds * framerate)
+        end = min(int(end_seconds * framerate), src.getnframes())
+        src.setpos(start)
+        with wave.open(out_path, 'wb') as dst:
+            dst.setparams(src.getparams())
+            remaining = end - start
+            while remaining > 0:
+                raw = src.readframes(min(65536, remaining))
+                if not raw:
+                    break
+                dst.writeframes(raw)
+                remaining -= len(raw) // (src.getsampwidth() * src.getnchannels())
+    return out_path
+
+
+class Resampler:
+    """
+    Streaming band-limited resampler for float mono blocks. Input is
+    low-passed below the lower of the two Nyquist frequencies with a
+    windowed-sinc filter (FFT overlap-save, so the cost per sample does not
+    grow with the filter), then sampled at the output times by linear
+    interpolation. Integer ratios such as 48 kHz -> 16 kHz land exactly on
+    filtered samples, which makes them plain decimation.
+
+    Feed blocks to ``process`` and call ``flush`` once at the end; together
+    they return the whole resampled signal, aligned with the input.
+    """
+    def __init__(self, src_rate, dst_rate, zero_crossings=8):
+        self.step = src_rate / dst_rate
+        if dst_rate < src_rate:
+            cutoff = 0.45 * dst_rate / src_rate  # cycles per input sample, a little under Nyquist
+            self.half = int(np.ceil(zero_crossings * self.step))
+            n = np.arange(-self.half, self.half + 1)
+            kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(len(n))
+            self.kernel = kernel / kernel.sum()
+        else:
+            self.half = 0
+            self.kernel = None
+        self._spectra = {}
+        self._history = np.zeros(2 * self.half)
+        self._pending = np.empty(0)
+        self._pending_start = -self.half  # input sample index of _pending[0]
+        self._emitted = 0
+        self._received = 0
+
+    def _filter(self, block):
+        if self.kernel is None:
+            return block
+        x = np.concatenate([self._history, block])
+        nfft = 1 << (len(x) - 1).bit_length()
+        spectrum = self._spectra.get(nfft)
+        if spectrum is None:
+            spectrum = self._spectra[nfft] = np.fft.rfft(self.kernel, nfft)
+        self._history = x[len(x) - 2 * self.half:]
+        return np.fft.irfft(np.fft.rfft(x, nfft) * spectrum, nfft)[2 * self.half:len(x)]
+
+    def _emit(self, last):
+        """Output samples whose time, and the next filtered sample, are at or before ``last``."""
+        stop = int(np.floor((last - 1) / self.step)) + 1
+        if stop <= self._emitted:
+            return np.empty(0, dtype=np.float32)
+        positions = np.arange(self._emitted, stop) * self.step - self._pending_start
+        index = positions.astype(np.int64)
+        frac = positions - index
+        out = self._pending[index] * (1 - frac) + self._pending[index + 1] * frac
+        self._emitted = stop
+        drop = min(int(stop * self.step) - self._pending_start, len(self._pending))
+        self._pending = self._pending[drop:]
+        self._pending_start += drop
+        return out.astype(np.float32)
+
+    def process(self, block):
+        self._received += len(block)
+        self._pending = np.concatenate([self._pending, self._filter(np.asarray(block, dtype=np.float64))])
+        return self._emit(self._pending_start + len(self._pending) - 1)
+
+    def flush(self):
+        # Push the filter's look-ahead through, then pad one sample so the last output can interpolate.
+        tail = self._filter(np.zeros(self.half)) if self.half else np.empty(0)
+        self._pending = np.concatenate([self._pending, tail, [0.0]])
+        return self._emit(self._received) if self._received else np.empty(0, dtype=np.float32)
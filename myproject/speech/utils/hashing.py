@@ -0,0 +1,61 @@
+"""
+Content hashing for uploads.
+
+Audio is hashed as a two-level tree: SHA-256 of each fixed-size leaf
+(``settings.UPLOAD_CHUNK_SIZE`` bytes, the last one may be shorter), then
+SHA-256 over the concatenated leaf digests. Chunked uploads can hash every
+part as it arrives, in any order and in any process, and still agree with a
+file that was hashed in one streaming pass.
+"""
+import hashlib
+
+from django.conf import settings
+
+
+def tree_hash(leaf_digests):
+    """Combine leaf digests (bytes, in order) into the content hash."""
+    digest = hashlib.sha256()
+    for leaf in leaf_digests:
+        digest.update(leaf)
+    return digest.hexdigest()
+
+
+class StreamingHasher:
+    """Compute the content hash of bytes fed in arbitrary-sized pieces."""
+    def __init__(self, leaf_size=None):
+        self.leaf_size = leaf_size or settings.UPLOAD_CHUNK_SIZE
+        self._leaf = hashlib.sha256()
+        self._leaf_len = 0
+        self._leaves = []
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.leaf_size - self._leaf_len)
+            self._leaf.update(view[:take])
+            self._leaf_len += take
+            view = view[take:]
+            if self._leaf_len == self.leaf_size:
+                self._leaves.append(self._leaf.digest())
+                self._leaf = hashlib.sha256()
+                self._leaf_len = 0
+
+    def hexdigest(self):
+        leaves = list(self._leaves)
+        if self._leaf_len or not leaves:
+            leaves.append(self._leaf.digest())
+        return tree_hash(leaves)
+
+
+def hash_chunks(chunks, leaf_size=None):
+    """Content hash of an iterable of byte chunks."""
+    hasher = StreamingHasher(leaf_size)
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """Content hash of a file, streamed."""
+    with open(path, 'rb') as f:
+        return hash_chunks(iter(lambda: f.read(block_size), b''))
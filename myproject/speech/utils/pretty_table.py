@@ -1,9 +1,13 @@
 from prettytable import PrettyTable
 import os
 
-def save_transcription_as_table(transcription, filename="transcription_table.txt"):
+from speech.utils.action_items import flag_sentences, get_matcher
+
+def save_transcription_as_table(transcription, filename="transcription_table.txt", keywords=None):
     """
     Saves transcription as a formatted PrettyTable and writes it to a .txt file.
+    Sentences mentioning one of ``keywords`` (default: the built-in action
+    keywords) are flagged as action items; see ``speech.utils.action_items``.
     """
     table = PrettyTable()
     table.field_names = ["Sentence", "Action Item"]
@@ -11,12 +15,8 @@ def save_transcription_as_table(transcription, filename="transcription_table.txt
     table.align["Sentence"] = "l"  # Left-align text
     table.align["Action Item"] = "c"  # Center-align action items
 
-    ACTION_KEYWORDS = ["email", "send", "call", "meeting", "urgent", "submit", "deadline"]
-    sentences = transcription.split(". ")  # Simple sentence split without NLTK
-
-    for sentence in sentences:
-        action_flag = "✅" if any(keyword in sentence.lower() for keyword in ACTION_KEYWORDS) else "❌"
-        table.add_row([sentence.strip(), action_flag])
+    for sentence, flagged in flag_sentences(transcription, get_matcher(keywords)):
+        table.add_row([sentence, "✅" if flagged else "❌"])
 
     # ✅ Ensure 'transcriptions/' folder exists
     save_folder = "transcriptions"
@@ -0,0 +1,201 @@
+"""
+Incremental reader for Deepgram responses.
+
+``iter_words`` walks a Deepgram JSON document from a file object and yields
+the word structs under ``results.channels[].alternatives[].words`` one at a
+time. Only the current word object (and a read buffer) is ever held in
+memory, so peak memory does not grow with the length of the recording.
+
+Jobs read their response this way (``pipeline.open_transcription``): a
+cached one straight from the transcription cache file, a fresh one from a
+scratch copy saved before the backend's decoded dict is dropped.
+``read_transcript`` pulls the ``transcript`` string out the same way.
+"""
+import codecs
+import gzip
+import json
+import re
+
+_WS = re.compile(r'[ \t\n\r]*')
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+_SCALAR = re.compile(r'-?[0-9][0-9.eE+-]*|true|false|null')
+_decoder = json.JSONDecoder()
+
+CHUNK_SIZE = 64 * 1024
+# Input cut short fails within this many characters of the buffer's end
+# (a partial number or literal); an error further back is a syntax error.
+TRUNCATION_MARGIN = 16
+
+
+class _Reader:
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        # Binary input: a character split across two reads is completed by the next one.
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def fill(self):
+        if self.eof:
+            return False
+        while True:
+            raw = self.fp.read(self.chunk_size)
+            data = self.decoder.decode(raw, final=not raw) if isinstance(raw, bytes) else raw
+            if data:
+                break
+            if not raw:
+                self.eof = True
+                return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def token(self, regex):
+        """Match ``regex`` at the cursor, reading more input while it may be truncated."""
+        self.peek()
+        while True:
+            m = regex.match(self.buf, self.pos)
+            if m and (m.end() < len(self.buf) or self.eof):
+                self.pos = m.end()
+                return m.group()
+            if not self.fill():
+                if m:
+                    self.pos = m.end()
+                    return m.group()
+                raise ValueError(f"Invalid JSON at offset {self.pos}")
+
+    def skip_string(self):
+        """Skip a string of any length without buffering all of it."""
+        self.expect('"')
+        while True:
+            end = _STRING_BODY.match(self.buf, self.pos).end()
+            if end < len(self.buf) and self.buf[end] == '"':
+                self.pos = end + 1
+                return
+            # Ran off the buffer, possibly just after a backslash: keep it and read on.
+            self.pos = end
+            if not self.fill():
+                raise ValueError("Unterminated string")
+
+    def value(self):
+        """Decode one complete JSON value at the cursor."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                truncated = e.msg.startswith('Unterminated string') or len(self.buf) - e.pos < TRUNCATION_MARGIN
+                if not truncated or not self.fill():
+                    raise
+                continue
+            self.pos = end
+            return obj
+
+
+def _matches(path, target):
+    return len(path) == len(target) and all(t is None or p == t for p, t in zip(path, target))
+
+
+def _is_prefix(path, target):
+    return len(path) < len(target) and all(t is None or p == t for p, t in zip(path, target))
+
+
+def _walk(reader, path, target):
+    """Yield decoded values at ``target`` below the value at the cursor; skip the rest."""
+    if _matches(path, target):
+        yield reader.value()
+        return
+    wanted = _is_prefix(path, target)
+    c = reader.peek()
+    if c == '{':
+        reader.pos += 1
+        if reader.peek() == '}':
+            reader.pos += 1
+            return
+        while True:
+            if wanted:
+                key = json.loads(reader.token(_STRING))
+            else:
+                key = None
+                reader.skip_string()
+            reader.expect(':')
+            yield from _walk(reader, path + (key,), target if wanted else ())
+            if reader.peek() == '}':
+                reader.pos += 1
+                return
+            reader.expect(',')
+    elif c == '[':
+        reader.pos += 1
+        if reader.peek() == ']':
+            reader.pos += 1
+            return
+        if wanted and len(path) + 1 == len(target):
+            # Elements are the values we want; decode them without recursing.
+            while True:
+                yield reader.value()
+                if reader.peek() == ']':
+                    reader.pos += 1
+                    return
+                reader.expect(',')
+        index = 0
+        while True:
+            yield from _walk(reader, path + (index,), target if wanted else ())
+            index += 1
+            if reader.peek() == ']':
+                reader.pos += 1
+                return
+            reader.expect(',')
+    elif c == '"':
+        reader.skip_string()
+    elif c:
+        reader.token(_SCALAR)
+    else:
+        raise ValueError("Unexpected end of JSON input")
+
+
+def iter_words(fp, channel=0, alternative=0, chunk_size=CHUNK_SIZE):
+    """
+    Yield word structs from a Deepgram response read from ``fp`` (text or
+    binary). Pass ``channel=None`` / ``alternative=None`` to walk all of them.
+    """
+    target = ('results', 'channels', channel, 'alternatives', alternative, 'words', None)
+    yield from _walk(_Reader(fp, chunk_size), (), target)
+
+
+def read_transcript(fp, channel=0, alternative=0, default=None, chunk_size=CHUNK_SIZE):
+    """The ``transcript`` string of one alternative in a response read from ``fp``, or ``default``."""
+    target = ('results', 'channels', channel, 'alternatives', alternative, 'transcript')
+    for transcript in _walk(_Reader(fp, chunk_size), (), target):
+        return transcript
+    return default
+
+
+def open_response(path):
+    """Open a saved response, transparently handling ``.gz`` files."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def save_response(res, path):
+    """Save a response as minified JSON, gzip'd when ``path`` ends in ``.gz``."""
+    opener = gzip.open(path, 'wt', encoding='utf-8', compresslevel=5) if path.endswith('.gz') else open(path, 'w', encoding='utf-8')
+    with opener as f:
+        json.dump(res, f, separators=(',', ':'))
+    return path
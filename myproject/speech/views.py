@@ -1,17 +1,39 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from dotenv import load_dotenv
-import requests
+import asyncio
+import logging
 import os
 import json
-from deepgram import Deepgram
-from django.http import HttpResponse
-from django.views.decorators.http import require_POST
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-
-from speech.models import Meeting, MeetingTranscription, CustomUser
+import shutil
+from datetime import timedelta
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from speech.models import Meeting, MeetingTranscription, CustomUser, TranscriptionJob, ChunkedUpload
+from speech.backends import response_transcript, response_words
+from speech.jobs import aenqueue_job, enqueue_job
+from speech.pipeline import persist_words, transcribe_file, transcription_options
+from speech.trello import aenqueue_card, create_trello_task
+from speech.workspace import create_workspace
+from speech.cache import cache_key, get_cache
+from speech.utils.hashing import hash_chunks
+from speech.utils.audio import HEADER_BYTES, read_header
+from speech.llm import get_llm
+from speech.wordstore import open_words
+from speech.retrieval import relevant_turns
+from speech.search import search_transcripts
+from speech.actions import enqueue_action_items, item_dict, meeting_action_items
+from speech.analytics import GROUPS, aggregate_stats, stats_dict
+from speech.metrics import CONTENT_TYPE, registry, stage
+from speech.exports import FORMATS, cached_export, stream_export, transcript_version
+from speech.uploads import UploadError, create_upload, finalize_upload, received_parts, write_part
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -20,140 +42,506 @@ from .serializers import UserSerializer
 
 load_dotenv()
 
-#Deepgram API Key
-DEEPGRAM_API_KEY = os.environ.get('DEEPGRAM_API_KEY')
+logger = logging.getLogger(__name__)
 
-#Trello API Credentials
-TRELLO_API_KEY = os.environ.get('TRELLO_API_KEY')
-TRELLO_TOKEN = os.environ.get('TRELLO_TOKEN')
-TRELLO_LIST_ID = os.environ.get('TRELLO_LIST_ID')
 OPENAI_API_KEY="YOUR_OPENAI_API_KEY"
 
-def create_trello_task(task_name, task_description):
-    """Function to create a new task in Trello."""
-    if not all([TRELLO_API_KEY, TRELLO_TOKEN, TRELLO_LIST_ID]):
-        return {"error": "Trello API credentials are missing"}
-
-    url = "https://api.trello.com/1/cards"
-    params = {
-        "key": TRELLO_API_KEY,
-        "token": TRELLO_TOKEN,
-        "idList": TRELLO_LIST_ID,
-        "name": task_name,
-        "desc": task_description
-    }
+def _job_accepted(job, message):
+    return JsonResponse({
+        "message": message,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}/",
+    }, status=202)
+
+def _upload_header(audio_file):
+    audio_file.seek(0)
+    header = audio_file.read(HEADER_BYTES)
+    audio_file.seek(0)
+    return header
+
+def _save_upload(audio_file):
+    """Save an upload to its own scratch directory; returns (workspace, file_path)."""
+    with stage('save') as s:
+        workspace = create_workspace()
+        file_path = os.path.join(workspace, os.path.basename(audio_file.name))
+        with open(file_path, "wb") as f:
+            for chunk in audio_file.chunks():
+                f.write(chunk)
+                s.add_bytes(len(chunk))
+    return workspace, file_path
+
+def _cache_contains(key):
+    cache = get_cache()
+    return cache is not None and cache.contains(key)
 
+def _transcribe_upload(audio_file, mimetype, options):
+    """Run an upload through ``transcribe_file`` (cache, normalising, splitting) and drop its workspace."""
+    key = cache_key(hash_chunks(audio_file.chunks()), options)
+    workspace, file_path = _save_upload(audio_file)
     try:
-        response = requests.post(url, params=params)
-        response.raise_for_status()  # Raise an error if request fails
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {"error": f"Trello API request failed: {str(e)}"}
-
-TAG = 'SPEAKER '
-
-def create_transcript(output_json, output_transcript, meetingId):
-  lines = []
-  with open(output_json, "r") as file:
-    words = json.load(file)["results"]["channels"][0]["alternatives"][0]["words"]
-    curr_speaker = 0
-    curr_line = ''
-    for word_struct in words:
-      word_speaker = word_struct["speaker"]
-      word = word_struct["punctuated_word"]
-      if word_speaker == curr_speaker:
-        curr_line += ' ' + word
-      else:
-        tag = TAG + str(curr_speaker) + ':'
-        full_line = tag + curr_line + '\n'
-        curr_speaker = word_speaker
-        lines.append(full_line)
-        MeetingTranscription.objects.create(speaker=word_speaker,meeting=Meeting.objects.get(id=meetingId), text=curr_line)
-        curr_line = ' ' + word
-    lines.append(TAG + str(curr_speaker) + ':' + curr_line)
-    with open(output_transcript, 'w') as f:
-      for line in lines:
-        f.write(line)
-        f.write('\n')
-  return
-
-DIRECTORY = '.'
-
-def print_transcript(meetingId):
-    os.makedirs("transcriptions", exist_ok=True)
-    for filename in os.listdir(DIRECTORY):
-        if filename.endswith('.json'):
-            json_path = os.path.join(DIRECTORY, filename)
-            output_transcript = os.path.join("transcriptions", os.path.splitext(filename)[0] + '.txt')
-            create_transcript(json_path, output_transcript, meetingId)  # Process the file
-            os.remove(json_path)
+        return transcribe_file(file_path, mimetype, options, key, scratch_dir=workspace)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def _store_transcript(meeting, words):
+    turns = persist_words(meeting, words)
+    enqueue_action_items(meeting)
+    return turns
+
+async def _uploaded_file(request):
+    # Multipart parsing reads and spools the body; keep it off the event loop.
+    with stage('upload_spool') as s:
+        files = await sync_to_async(lambda: request.FILES)()
+        audio_file = files.get("file")
+        s.add_bytes(audio_file.size if audio_file is not None else 0)
+    return audio_file
 
 @csrf_exempt
-def upload_audio(request):
-    print("fafdsafdas",DEEPGRAM_API_KEY)
-    if request.method != "POST":
-        return JsonResponse({"error": "Invalid request method"}, status=405)
-
-    if "file" not in request.FILES:
+@require_POST
+async def upload_audio(request):
+    audio_file = await _uploaded_file(request)
+    if audio_file is None:
         return JsonResponse({"error": "No file uploaded"}, status=400)
 
-    audio_file = request.FILES["file"]
+    MIMETYPE, options = transcription_options(await asyncio.to_thread(_upload_header, audio_file), audio_file.name)
+    key = cache_key(await asyncio.to_thread(hash_chunks, audio_file.chunks()), options)
 
-    #Ensure 'uploads/' folder exists
-    upload_folder = "uploads"
-    os.makedirs(upload_folder, exist_ok=True)
+    #Same audio and options already transcribed: skip the disk write and the remote call
+    if await sync_to_async(_cache_contains)(key):
+        job = await aenqueue_job('', audio_file.name, MIMETYPE, options, cache_key=key)
+        return _job_accepted(job, "Transcription queued (cached)")
 
-    #Save file to 'uploads/' directory
-    file_path = os.path.join(upload_folder, audio_file.name)
     try:
-        with open(file_path, "wb") as f:
-            for chunk in audio_file.chunks():
-                f.write(chunk)
+        workspace, file_path = await asyncio.to_thread(_save_upload, audio_file)
     except Exception as e:
         return JsonResponse({"error": f"File saving failed: {str(e)}"}, status=500)
-    
-
-    dg = Deepgram(DEEPGRAM_API_KEY)
-    MIMETYPE = 'mp3'
-    options = {
-        "punctuate": True,
-        "diarize": True,
-        "model": 'general',
-        "tier": 'nova'
-    }
-    #Send file to Deepgram API for transcription
+
+    #Queue the transcription; a worker picks it up (manage.py run_transcription_workers)
+    job = await aenqueue_job(file_path, audio_file.name, MIMETYPE, options, workspace=workspace, cache_key=key)
+    return _job_accepted(job, "Transcription queued")
+
+@csrf_exempt
+@require_POST
+async def transcribe_now(request):
+    """
+    Transcribe a short clip inside the request instead of queueing it.
+    The clip goes through ``transcribe_file`` in a thread, like a job's
+    audio (cache, normalising, splitting); the transcript is then stored
+    while the Trello card is queued in the outbox for the dispatcher.
+    """
+    audio_file = await _uploaded_file(request)
+    if audio_file is None:
+        return JsonResponse({"error": "No file uploaded"}, status=400)
+
+    MIMETYPE, options = transcription_options(await asyncio.to_thread(_upload_header, audio_file), audio_file.name)
     try:
-        with open(file_path, "rb") as f:
-            source = {"buffer": f, "mimetype":'audio/'+MIMETYPE}
-            res = dg.transcription.sync_prerecorded(source, options)
-            with open(f"./{audio_file.name[:-4]}.json", "w") as transcript:
-                  json.dump(res, transcript, indent=4)
+        res = await asyncio.to_thread(_transcribe_upload, audio_file, MIMETYPE, options)
+    except Exception as e:
+        return JsonResponse({"error": f"Failed to transcribe: {str(e)}"}, status=500)
+
+    transcription_text = response_transcript(res)
+    meeting = await Meeting.objects.acreate(userid=1, title="Project started")
+    turns, outbox = await asyncio.gather(
+        sync_to_async(_store_transcript)(meeting, response_words(res)),
+        aenqueue_card(f"Transcription: {audio_file.name}", transcription_text, group_key=f"meeting:{meeting.id}"),
+    )
+    return JsonResponse({
+        "message": "Transcription saved and task queued successfully",
+        "meeting_id": meeting.id,
+        "turns": turns,
+        "transcript": transcription_text,
+        "trello_outbox_id": outbox.id,
+    })
 
-        deepgram_result = res
-        transcription_text = deepgram_result.get("results", {}).get("channels", [{}])[0].get("alternatives", [{}])[0].get("transcript", "No transcription available")
+@csrf_exempt
+@require_POST
+def upload_init(request):
+    try:
+        data = json.loads(request.body)
+        upload = create_upload(data["file_name"], int(data["size"]))
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return JsonResponse({"error": "Provide 'file_name' and 'size' in the JSON body."}, status=400)
+    except UploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+
+    return JsonResponse({
+        "upload_id": str(upload.id),
+        "chunk_size": upload.chunk_size,
+        "chunk_count": upload.chunk_count,
+        "upload_url": f"/api/uploads/{upload.id}/",
+    }, status=201)
 
-        #Create Trello Task with transcription details
-        task_name = f"Transcription: {audio_file.name}"
-        trello_response = create_trello_task(task_name, transcription_text)
+@csrf_exempt
+@require_http_methods(["GET", "PUT"])
+def upload_chunk(request, upload_id):
+    try:
+        upload = ChunkedUpload.objects.get(id=upload_id)
+    except ChunkedUpload.DoesNotExist:
+        return JsonResponse({"error": "Upload not found"}, status=404)
 
-        meeting = Meeting.objects.create(userid=1, title="Project started")
-        
-        print_transcript(meeting.id)
+    if request.method == "PUT":
+        try:
+            offset = int(request.GET["offset"])
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+            #Stream the body straight to disk; never touch request.body
+            write_part(upload, offset, request, length)
+        except (KeyError, ValueError):
+            return JsonResponse({"error": "Provide an integer 'offset' query parameter."}, status=400)
+        except UploadError as e:
+            return JsonResponse({"error": str(e)}, status=e.status)
+
+    received = received_parts(upload)
+    return JsonResponse({
+        "upload_id": str(upload.id),
+        "status": upload.status,
+        "chunk_size": upload.chunk_size,
+        "chunk_count": upload.chunk_count,
+        "received": received,
+        "missing": sorted(set(range(upload.chunk_count)) - set(received)),
+    })
 
+@csrf_exempt
+@require_POST
+def upload_finalize(request, upload_id):
+    try:
+        upload = finalize_upload(ChunkedUpload.objects.get(id=upload_id))
+    except ChunkedUpload.DoesNotExist:
+        return JsonResponse({"error": "Upload not found"}, status=404)
+    except UploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+
+    # A retried or doubled finalize must not queue the file twice: check and enqueue under the row lock.
+    with transaction.atomic():
+        upload = ChunkedUpload.objects.select_for_update().select_related('job').get(pk=upload.pk)
+        if upload.job_id is None:
+            MIMETYPE, options = transcription_options(read_header(upload.file_path), upload.file_name)
+            key = cache_key(upload.content_hash, options)
+            upload.job = enqueue_job(upload.file_path, upload.file_name, MIMETYPE, options, cache_key=key)
+            upload.save(update_fields=["job"])
+    return _job_accepted(upload.job, "Transcription queued")
+
+@require_GET
+def job_status(request, job_id):
+    try:
+        job = TranscriptionJob.objects.get(id=job_id)
+    except TranscriptionJob.DoesNotExist:
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+    data = {
+        "job_id": job.id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "meeting_id": job.meeting_id,
+    }
+    if job.status == TranscriptionJob.SUCCEEDED:
+        data["result"] = job.result
+    elif job.error:
+        data["error"] = job.error.splitlines()[0]
+    if job.status == TranscriptionJob.QUEUED and job.attempts:
+        data["retry_at"] = job.run_after.isoformat()
+    return JsonResponse(data)
+
+def _int_param(request, name, default=None):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return default
+    return int(value)
+
+@require_GET
+def meeting_transcript(request, meeting_id):
+    """
+    Page through a meeting's transcript in ``seq`` order. Pass the returned
+    ``next_after`` as ``after`` to get the next page; ``start_ms``/``end_ms``
+    restrict it to turns overlapping that time range. Each page is one
+    index range scan on ``(meeting, seq)``, however deep it is.
+    """
+    try:
+        after = _int_param(request, 'after', -1)
+        limit = _int_param(request, 'limit', settings.TRANSCRIPT_PAGE_SIZE)
+        start_ms = _int_param(request, 'start_ms')
+        end_ms = _int_param(request, 'end_ms')
+    except ValueError:
+        return JsonResponse({"error": "'after', 'limit', 'start_ms' and 'end_ms' must be integers"}, status=400)
+    limit = max(1, min(limit, settings.TRANSCRIPT_MAX_PAGE_SIZE))
+
+    if not Meeting.objects.filter(id=meeting_id).exists():
+        return JsonResponse({"error": "Meeting not found"}, status=404)
+
+    rows = MeetingTranscription.objects.filter(meeting_id=meeting_id, seq__gt=after)
+    if start_ms is not None:
+        rows = rows.filter(end_ms__gte=start_ms)
+    if end_ms is not None:
+        rows = rows.filter(start_ms__lte=end_ms)
+    # Fetch one extra row to know whether there is another page.
+    rows = list(rows.order_by('seq').values('seq', 'speaker', 'start_ms', 'end_ms', 'text')[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return JsonResponse({
+        "meeting_id": meeting_id,
+        "turns": rows,
+        "next_after": rows[-1]["seq"] if more else None,
+    })
+
+def _float_param(request, name):
+    value = request.GET.get(name)
+    return None if value in (None, '') else float(value)
+
+@require_GET
+def meeting_words(request, meeting_id):
+    """
+    Word-level timings of a meeting, read from its memory-mapped word store.
+
+    ``?at=<ms>`` returns the word playing at that position (``index`` is null
+    between words) and ``seek``, the first word at or after it. Otherwise
+    returns words overlapping ``start_ms``..``end_ms``, optionally only those
+    with ``min_confidence <= confidence < max_confidence``, up to ``limit``
+    per page; pass ``next_after`` back as ``after`` for the next page.
+    """
+    try:
+        at = _int_param(request, 'at')
+        start_ms = _int_param(request, 'start_ms')
+        end_ms = _int_param(request, 'end_ms')
+        after = _int_param(request, 'after', -1)
+        limit = _int_param(request, 'limit', settings.WORD_PAGE_SIZE)
+        min_confidence = _float_param(request, 'min_confidence')
+        max_confidence = _float_param(request, 'max_confidence')
+    except ValueError:
+        return JsonResponse({"error": "Invalid query parameter"}, status=400)
+    limit = max(1, min(limit, settings.WORD_PAGE_SIZE))
+
+    meeting = Meeting.objects.filter(id=meeting_id).first()
+    if meeting is None:
+        return JsonResponse({"error": "Meeting not found"}, status=404)
+    words = open_words(meeting)
+    if words is None:
+        return JsonResponse({"error": "No word timings for this meeting"}, status=404)
+
+    if at is not None:
+        index = words.word_at(at)
         return JsonResponse({
-            "message": "Transcription saved and task created successfully",
-            "trello_response": trello_response
+            "meeting_id": meeting_id,
+            "index": index,
+            "seek": words.seek(at),
+            "word": words.word(index) if index is not None else None,
         })
 
-    except requests.exceptions.RequestException as e:
-        return JsonResponse({"error": f"Failed to transcribe: {str(e)}"}, status=500)
-
+    lo, hi = words.range(start_ms, end_ms)
+    lo = max(lo, after + 1)
+    # Scan the confidence column in slices so a sparse filter never reads more than it needs.
+    indices, more = [], False
+    while lo < hi and not more:
+        step = min(hi, lo + max(limit * 4, 4096))
+        confidence = words.confidence[lo:step]
+        mask = np.ones(len(confidence), dtype=bool)
+        if min_confidence is not None:
+            mask &= confidence >= min_confidence
+        if max_confidence is not None:
+            mask &= confidence < max_confidence
+        found = np.flatnonzero(mask) + lo
+        indices.extend(found[:limit + 1 - len(indices)].tolist())
+        more = len(indices) > limit
+        lo = step
+    page = indices[:limit]
+    return JsonResponse({
+        "meeting_id": meeting_id,
+        "word_count": len(words),
+        "words": words.words(page),
+        "next_after": page[-1] if more else None,
+    })
+
+@require_GET
+def meeting_actions(request, meeting_id):
+    """
+    Action items of a meeting: sentence, speaker, timestamps and the
+    keywords that matched. ``?keywords=a,b`` overrides the owner's keywords.
+    """
+    meeting = Meeting.objects.filter(id=meeting_id).first()
+    if meeting is None:
+        return JsonResponse({"error": "Meeting not found"}, status=404)
+    keywords = request.GET.get('keywords')
+    keywords = [k for k in keywords.split(',') if k.strip()] if keywords else None
+    items = meeting_action_items(meeting, keywords)
+    return JsonResponse({"meeting_id": meeting.id, "action_items": [item_dict(item) for item in items]})
+
+@require_GET
+def meeting_stats(request, meeting_id):
+    """
+    Per-speaker analytics of a meeting (``speech.analytics``): talk time and
+    share, turns, words per minute, longest turn and interruptions made
+    and suffered. Precomputed when the transcript was stored.
+    """
+    meeting = Meeting.objects.filter(id=meeting_id).first()
+    if meeting is None:
+        return JsonResponse({"error": "Meeting not found"}, status=404)
+    stats = list(meeting.stats.order_by('speaker'))
+    total = sum(s.talk_ms for s in stats)
+    return JsonResponse({
+        "meeting_id": meeting.id,
+        "talk_ms": total,
+        "speakers": [stats_dict(s, total) for s in stats],
+    })
+
+@require_GET
+def meeting_export(request, meeting_id, fmt):
+    """
+    The meeting's transcript as ``srt``, ``vtt``, ``json``, ``csv`` or
+    ``table``, streamed. Exports are cached per transcript version and
+    carry it in their ETag, so ``If-None-Match`` gets a 304 until the
+    transcript changes.
+    """
+    export = FORMATS.get(fmt)
+    if export is None:
+        return JsonResponse({"error": f"Unknown format; use one of {', '.join(FORMATS)}"}, status=400)
+    version = transcript_version(meeting_id)
+    if version is None:
+        return JsonResponse({"error": "Meeting not found"}, status=404)
+
+    etag = f'"{meeting_id}-{version}-{fmt}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        return HttpResponseNotModified(headers={"ETag": etag})
+    path = cached_export(meeting_id, fmt, version)
+    if path is not None:
+        response = FileResponse(open(path, 'rb'), content_type=export.content_type)
+    else:
+        response = StreamingHttpResponse(stream_export(meeting_id, fmt, version, transcript_version),
+                                         content_type=export.content_type)
+    response["ETag"] = etag
+    response["Content-Disposition"] = f'attachment; filename="meeting-{meeting_id}.{export.extension}"'
+    return response
+
+def _date_param(request, name):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(name)
+    return parsed
+
+@require_GET
+def search(request):
+    """
+    Full-text search across meeting transcripts (``speech.search``).
+
+    ``q`` is required; ``user``, ``speaker`` and ``meeting_id`` filter,
+    ``from``/``to`` (YYYY-MM-DD) bound the meeting date (``to`` inclusive).
+    Results are ranked best first and paged with ``limit``/``offset``.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({"error": "'q' is required"}, status=400)
+    try:
+        user_id = _int_param(request, 'user')
+        speaker = _int_param(request, 'speaker')
+        meeting_id = _int_param(request, 'meeting_id')
+        limit = _int_param(request, 'limit', settings.SEARCH_PAGE_SIZE)
+        offset = max(0, _int_param(request, 'offset', 0))
+        date_from = _date_param(request, 'from')
+        date_to = _date_param(request, 'to')
+    except ValueError:
+        return JsonResponse({"error": "Invalid query parameter"}, status=400)
+    limit = max(1, min(limit, settings.SEARCH_MAX_PAGE_SIZE))
+    if date_to is not None:
+        date_to += timedelta(days=1)
+
+    hits = search_transcripts(
+        query, user_id=user_id, date_from=date_from, date_to=date_to, speaker=speaker,
+        meeting_id=meeting_id, limit=limit + 1, offset=offset,
+    )
+    return JsonResponse({
+        "query": query,
+        "results": [{
+            "meeting_id": hit.meeting_id,
+            "meeting_title": hit.title,
+            "meeting_date": hit.createdat,
+            "turn_id": hit.id,
+            "seq": hit.seq,
+            "speaker": hit.speaker,
+            "start_ms": hit.start_ms,
+            "score": round(hit.score, 4),
+            "snippet": hit.snippet,
+        } for hit in hits[:limit]],
+        "next_offset": offset + limit if len(hits) > limit else None,
+    })
+
+@require_GET
+def speaker_stats(request):
+    """
+    Speaker analytics summed over many meetings, from the per-meeting
+    rollups rather than the transcripts. ``user`` and ``meeting_id`` filter,
+    ``from``/``to`` (YYYY-MM-DD, inclusive) bound the meeting date, and
+    ``group`` (speaker, meeting, day, week or month) adds one row per group.
+    """
+    group = request.GET.get('group') or None
+    if group is not None and group not in GROUPS:
+        return JsonResponse({"error": f"Unknown group; use one of {', '.join(GROUPS)}"}, status=400)
+    try:
+        user_id = _int_param(request, 'user')
+        meeting_id = _int_param(request, 'meeting_id')
+        date_from = _date_param(request, 'from')
+        date_to = _date_param(request, 'to')
+    except ValueError:
+        return JsonResponse({"error": "Invalid query parameter"}, status=400)
+
+    stats = aggregate_stats(user_id, date_from, date_to, [meeting_id] if meeting_id is not None else None, group)
+    return JsonResponse({
+        "user": user_id,
+        "from": date_from,
+        "to": date_to,
+        "group": group,
+        **stats,
+    })
+
+def _sources(turns):
+    return [{"id": t["id"], "speaker": t["speaker"], "score": t["score"]} for t in turns]
+
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _answer_events(llm, question, context, sources, max_tokens):
+    """
+    SSE stream for ``ask_question``: a ``sources`` event, one ``data`` event
+    per token and a final ``done`` (or ``error``) event. If the client
+    disconnects, Django cancels this generator and closing the model stream
+    aborts the upstream request.
+    """
+    yield _sse(_sources(sources), event="sources")
+    count = 0
+    outcome = {}
+    stream = llm.astream(question, context, max_tokens, outcome)
+    try:
+        with stage('llm') as s:
+            async for token in stream:
+                if count >= max_tokens:
+                    outcome["finish_reason"] = "length"  # the model went past the budget
+                    break
+                count += 1
+                s.add_bytes(len(token.encode('utf-8')))
+                yield _sse({"token": token})
     except Exception as e:
-        return JsonResponse({"error": f"Unexpected error: {str(e)}"}, status=500)
+        logger.exception("Error during Langchain processing")
+        yield _sse({"error": str(e)}, event="error")
+        return
+    finally:
+        await stream.aclose()
+    # An answer of exactly max_tokens may have ended on its own; only the model can say.
+    reason = outcome.get("finish_reason")
+    truncated = reason == "length" if reason else count >= max_tokens
+    yield _sse({"tokens": count, "truncated": truncated}, event="done")
 
 @csrf_exempt
 @require_POST
-def ask_question(request):
+async def ask_question(request):
+    """
+    Answer a question with the LLM. With a ``meeting_id`` the answer is
+    grounded in the ``top_k`` transcript turns most relevant to the question.
+    With ``"stream": true`` (or ``Accept: text/event-stream``) the answer is
+    sent as Server-Sent Events as the model produces it, capped at
+    ``max_tokens``.
+    """
     try:
         data = json.loads(request.body)
         question = data.get('question')
@@ -161,34 +549,55 @@ def ask_question(request):
         if not question:
             return JsonResponse({"error": "Please provide a 'question' in the JSON body."}, status=400)
 
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-
-        if not openai_api_key:
-            print("Error: OpenAI API key not found in environment variables.")
-            return JsonResponse({"error": "OpenAI API key not configured."}, status=500)
+        meeting_id = data.get('meeting_id')
+        context = []
+        sources = []
+        if meeting_id is not None:
+            try:
+                meeting_id = int(meeting_id)
+            except (TypeError, ValueError):
+                return JsonResponse({"error": "'meeting_id' must be an integer"}, status=400)
+            if not await Meeting.objects.filter(id=meeting_id).aexists():
+                return JsonResponse({"error": "Meeting not found"}, status=404)
+            # Only the most relevant turns go into the prompt, not the whole transcript.
+            try:
+                top_k = int(data.get('top_k') or settings.RETRIEVAL_TOP_K)
+            except (TypeError, ValueError):
+                return JsonResponse({"error": "'top_k' must be an integer"}, status=400)
+            sources = await sync_to_async(relevant_turns)(meeting_id, question, max(1, top_k))
+            context = [f"Speaker {turn['speaker']}: {turn['text']}" for turn in sources]
 
         try:
-            llm = ChatOpenAI(
-                openai_api_key=openai_api_key,
-                model="gpt-4o-mini",  # Update model name
-                temperature=0.7
-            )
+            llm = get_llm()
+        except ImproperlyConfigured as e:
+            logger.error("ask-gpt is not configured: %s", e)
+            return JsonResponse({"error": str(e)}, status=500)
 
-            prompt_template = PromptTemplate(
-                input_variables=["question"],
-                template="Answer the following question: {question}"
+        if data.get('stream') or 'text/event-stream' in request.headers.get('Accept', ''):
+            try:
+                max_tokens = min(int(data.get('max_tokens') or settings.ASK_LLM_MAX_TOKENS), settings.ASK_LLM_MAX_TOKENS)
+            except (TypeError, ValueError):
+                return JsonResponse({"error": "'max_tokens' must be an integer"}, status=400)
+            response = StreamingHttpResponse(
+                _answer_events(llm, question, context, sources, max(1, max_tokens)),
+                content_type='text/event-stream',
             )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
 
-            chain = LLMChain(llm=llm, prompt=prompt_template)
-            answer = chain.run(question=question)
-
-            print(f"Question: {question}")
-            print(f"Answer: {answer}")
+        try:
+            with stage('llm') as s:
+                answer = await llm.agenerate(question, context)
+                s.add_bytes(len(answer.encode('utf-8')))
 
-            return JsonResponse({"answer": answer})
+            return JsonResponse({
+                "answer": answer,
+                "sources": _sources(sources),
+            })
 
         except Exception as e:
-            print(f"Error during Langchain processing: {e}")
+            logger.exception("Error during Langchain processing")
             return JsonResponse({"error": str(e)}, status=500)
 
     except json.JSONDecodeError:
@@ -197,6 +606,11 @@ def ask_question(request):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
+@require_GET
+def metrics(request):
+    """This process's metrics in the Prometheus text format (see ``speech.metrics``)."""
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+
 class UserCreateView(APIView):
     def post(self, request):
         serializer =UserSerializer(data=request.data)
@@ -0,0 +1,339 @@
+"""
+Word-level timing store.
+
+Deepgram returns ``start``, ``end``, ``confidence`` and ``speaker`` for every
+word; ``MeetingTranscription`` keeps only the turn text. The words of a
+meeting are kept in one file under ``settings.WORD_STORE_DIR/<meeting id>/``
+(``Meeting.words_path``) as a struct of packed arrays:
+
+    start_ms     word start (int32), ascending
+    end_ms       word end (int32)
+    confidence   (float16)
+    speaker      (uint16)
+    turn         ``MeetingTranscription.seq`` of the word's turn (uint32)
+    text_offsets word i is text[text_offsets[i]:text_offsets[i + 1]] (uint32)
+    text         punctuated words, UTF-8 (uint8)
+
+The file is an 8-byte magic, a little-endian uint32 header length, a JSON
+header giving each column's dtype, offset and length, then the columns,
+each aligned to 64 bytes (offsets count from the first 64-byte boundary
+after the header). ``WordTimings`` maps the file read-only, so
+seeking, highlighting and confidence filtering only touch the pages of the
+columns (and the slice of the text) they need; nothing is read up front
+and no per-word Python objects are built except for the words returned.
+
+Files are never modified in place: appending words writes a new file, and
+the meeting row is pointed at it in the caller's transaction, so open
+readers keep a consistent view and code later in that transaction (stats,
+action items) already reads the new words. A rolled-back transaction leaves
+the row on the old file, untouched; the files it no longer refers to are
+removed once the transaction commits. Writers of one meeting take turns on
+its row lock.
+"""
+import json
+import os
+import struct
+import tempfile
+import uuid
+from array import array
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from speech.models import Meeting
+
+MAGIC = b'MTWORDS1'
+ALIGN = 64
+
+COLUMNS = (
+    ('start_ms', np.int32),
+    ('end_ms', np.int32),
+    ('confidence', np.float16),
+    ('speaker', np.uint16),
+    ('turn', np.uint32),
+    ('text_offsets', np.uint32),
+    ('text', np.uint8),
+)
+
+
+def _ms(seconds):
+    return int(round((seconds or 0) * 1000))
+
+
+class WordStoreWriter:
+    """
+    Accumulates words into compact ``array`` buffers (a few bytes per word
+    rather than a dict each) until ``store_words`` writes them.
+    """
+    def __init__(self):
+        self.start_ms = array('i')
+        self.end_ms = array('i')
+        self.confidence = array('f')
+        self.speaker = array('H')
+        self.turn = array('I')
+        self.text_offsets = array('I', [0])
+        self.text = bytearray()
+        self.turns = 0
+
+    def __len__(self):
+        return len(self.start_ms)
+
+    def add(self, word, turn):
+        """Add one Deepgram word struct belonging to local turn number ``turn``."""
+        self.start_ms.append(_ms(word.get("start")))
+        self.end_ms.append(_ms(word.get("end")))
+        self.confidence.append(word.get("confidence", 1.0))
+        self.speaker.append(word.get("speaker", 0))
+        self.turn.append(turn)
+        self.text += (word.get("punctuated_word") or word["word"]).encode('utf-8')
+        self.text_offsets.append(len(self.text))
+
+    def add_turns(self, words, first_turn=None):
+        """
+        Add a run of words, starting a new turn whenever the speaker changes
+        (as ``iter_speaker_turns`` does). Returns the number of turns.
+        """
+        start = turn = self.turns if first_turn is None else first_turn
+        speaker = None
+        count = 0
+        for word in words:
+            word_speaker = word.get("speaker", 0)
+            if count and word_speaker != speaker:
+                turn += 1
+            speaker = word_speaker
+            self.add(word, turn)
+            count += 1
+        if not count:
+            return 0
+        self.turns = turn + 1
+        return turn - start + 1
+
+    def tap(self, words):
+        """Pass ``words`` through unchanged, recording each one on the way."""
+        speaker = None
+        for word in words:
+            word_speaker = word.get("speaker", 0)
+            if len(self) and word_speaker != speaker:
+                self.turns += 1
+            speaker = word_speaker
+            self.add(word, self.turns)
+            yield word
+
+    def columns(self, first_turn=0, turn_seqs=None):
+        """
+        The buffers as store columns, local turn ``n`` becoming turn
+        ``first_turn + n``, or ``turn_seqs[n]`` when the turns are not numbered
+        consecutively.
+        """
+        turn = np.frombuffer(self.turn, dtype=np.uint32)
+        if turn_seqs is not None:
+            turn, first_turn = np.asarray(turn_seqs, dtype=np.uint32)[turn], 0
+        return {
+            'start_ms': np.frombuffer(self.start_ms, dtype=np.int32),
+            'end_ms': np.frombuffer(self.end_ms, dtype=np.int32),
+            'confidence': np.frombuffer(self.confidence, dtype=np.float32).astype(np.float16),
+            'speaker': np.frombuffer(self.speaker, dtype=np.uint16),
+            'turn': turn + np.uint32(first_turn) if first_turn else turn,
+            'text_offsets': np.frombuffer(self.text_offsets, dtype=np.uint32),
+            'text': np.frombuffer(bytes(self.text), dtype=np.uint8),
+        }
+
+
+def _data_start(header_length):
+    return -(-(len(MAGIC) + 4 + header_length) // ALIGN) * ALIGN
+
+
+def write_columns(path, columns):
+    """Write columns to ``path`` atomically in the word store format. Returns the word count."""
+    layout, end, meta = [], 0, {}
+    for name, dtype in COLUMNS:
+        data = np.ascontiguousarray(columns[name], dtype=dtype)
+        offset = -(-end // ALIGN) * ALIGN
+        layout.append((data, offset))
+        meta[name] = [data.dtype.str, offset, int(data.size)]
+        end = offset + data.nbytes
+    count = int(len(columns['start_ms']))
+    header = json.dumps({"count": count, "columns": meta}).encode('utf-8')
+    base = _data_start(len(header))
+
+    # A temporary file of its own, so concurrent writers of one path never share it.
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+            for data, offset in layout:
+                f.seek(base + offset)
+                f.write(data.tobytes())
+            f.truncate(base + end)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return count
+
+
+class WordTimings:
+    """Read-only, memory-mapped view of a word store file."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a word store file")
+            (length,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(length))
+        self.count = header["count"]
+        base = _data_start(length)
+        raw = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) > base else np.zeros(0, np.uint8)
+        for name, (dtype, offset, size) in header["columns"].items():
+            dtype = np.dtype(dtype)
+            setattr(self, name, np.asarray(raw[base + offset:base + offset + size * dtype.itemsize]).view(dtype))
+
+    def __len__(self):
+        return self.count
+
+    def _last_started(self, ms):
+        # A key of the column's dtype keeps searchsorted from converting the whole column.
+        ms = np.int32(min(max(ms, -2 ** 31), 2 ** 31 - 1))
+        return int(np.searchsorted(self.start_ms, ms, side='right')) - 1
+
+    def seek(self, ms):
+        """Index of the word playing at ``ms``, else of the next word (``len(self)`` past the end)."""
+        i = self._last_started(ms)
+        if i >= 0 and self.end_ms[i] >= ms:
+            return i
+        return i + 1
+
+    def word_at(self, ms):
+        """Index of the word to highlight at playback position ``ms``, or None between words."""
+        i = self._last_started(ms)
+        return i if i >= 0 and self.end_ms[i] >= ms else None
+
+    def range(self, start_ms=None, end_ms=None):
+        """``(lo, hi)`` index bounds of the words overlapping ``[start_ms, end_ms]``."""
+        lo = 0 if start_ms is None else self.seek(start_ms)
+        hi = self.count if end_ms is None else self._last_started(end_ms) + 1
+        return lo, max(lo, hi)
+
+    def low_confidence(self, threshold, lo=0, hi=None):
+        """Indices in ``[lo, hi)`` of words with confidence below ``threshold``."""
+        return np.flatnonzero(self.confidence[lo:hi] < threshold) + lo
+
+    def text_of(self, i):
+        return bytes(self.text[self.text_offsets[i]:self.text_offsets[i + 1]]).decode('utf-8')
+
+    def word(self, i):
+        return {
+            "index": int(i),
+            "text": self.text_of(i),
+            "start_ms": int(self.start_ms[i]),
+            "end_ms": int(self.end_ms[i]),
+            "confidence": round(float(self.confidence[i]), 3),
+            "speaker": int(self.speaker[i]),
+            "turn": int(self.turn[i]),
+        }
+
+    def words(self, indices):
+        return [self.word(i) for i in indices]
+
+    def columns(self):
+        return {name: getattr(self, name) for name, _ in COLUMNS}
+
+
+def word_store_dir(meeting_id):
+    return os.path.join(settings.WORD_STORE_DIR, str(meeting_id))
+
+
+def discard_stale_stores(meeting_id, *paths):
+    """
+    Remove the meeting's store files other than the one its committed row
+    points at (superseded ones, and ones written by rolled-back transactions),
+    plus any of ``paths``. Holds the row lock, so no writer is in between
+    writing a file and committing it.
+    """
+    with transaction.atomic():
+        keep = Meeting.objects.select_for_update().filter(pk=meeting_id).values_list('words_path', flat=True).first()
+        directory = word_store_dir(meeting_id)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            names = []
+        for path in {os.path.join(directory, name) for name in names} | set(paths):
+            if path and path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def append_columns(existing, new):
+    """Concatenate two sets of columns, rebasing the text offsets of ``new``."""
+    columns = {name: np.concatenate([existing[name], new[name]]) for name, _ in COLUMNS
+               if name != 'text_offsets'}
+    columns['text_offsets'] = np.concatenate([
+        existing['text_offsets'], new['text_offsets'][1:] + existing['text_offsets'][-1],
+    ])
+    # Appended words (e.g. a live session resumed later) may overlap in time; keep start_ms sorted.
+    if len(columns['start_ms']) > 1 and (np.diff(columns['start_ms']) < 0).any():
+        columns = _sorted(columns)
+    return columns
+
+
+def _sorted(columns):
+    order = np.argsort(columns['start_ms'], kind='stable')
+    offsets = columns['text_offsets']
+    starts, ends = offsets[:-1][order], offsets[1:][order]
+    lengths = (ends - starts).astype(np.int64)
+    # Gather each word's bytes in the new order with one fancy index.
+    positions = np.repeat(starts.astype(np.int64) - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    result = {name: columns[name][order] for name in ('start_ms', 'end_ms', 'confidence', 'speaker', 'turn')}
+    result['text'] = columns['text'][positions]
+    result['text_offsets'] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.uint32)
+    return result
+
+
+def store_words(meeting, writer, first_turn=0, turn_seqs=None):
+    """
+    Write (or append) the writer's words to the meeting's store and point
+    ``meeting.words_path`` at it, numbering turns as ``writer.columns`` does.
+    Returns the meeting's total word count.
+
+    The read-merge-write runs under the meeting's row lock, so two writers
+    appending to one meeting (a live session and a job) do not drop each
+    other's words. The merged store is a new file; the one it replaces is
+    removed when the outermost transaction commits.
+    """
+    if not len(writer):
+        return meeting.word_count
+    columns = writer.columns(first_turn, turn_seqs)
+    with transaction.atomic():
+        # Another writer may have created or grown the store since ``meeting`` was loaded.
+        current = Meeting.objects.select_for_update().only('words_path').get(pk=meeting.pk)
+        if current.words_path and os.path.exists(current.words_path):
+            columns = append_columns(WordTimings(current.words_path).columns(), columns)
+        elif len(columns['start_ms']) > 1 and (np.diff(columns['start_ms']) < 0).any():
+            columns = _sorted(columns)
+
+        path = os.path.join(word_store_dir(meeting.id), f"{uuid.uuid4().hex}.words")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meeting.word_count = write_columns(path, columns)
+        meeting.words_path = path
+        meeting.save(update_fields=['words_path', 'word_count'])
+        previous = current.words_path
+        transaction.on_commit(lambda: discard_stale_stores(meeting.pk, previous))
+    return meeting.word_count
+
+
+def open_words(meeting):
+    """The meeting's ``WordTimings``, or None if it has no word store."""
+    for _ in range(2):
+        if not meeting.words_path:
+            return None
+        try:
+            return WordTimings(meeting.words_path)
+        except FileNotFoundError:
+            # Replaced by a writer since ``meeting`` was loaded; follow the row once.
+            meeting.words_path = Meeting.objects.filter(pk=meeting.pk).values_list('words_path', flat=True).first()
+    return None
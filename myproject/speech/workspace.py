@@ -0,0 +1,48 @@
+"""
+Per-job scratch directories.
+
+Every upload gets its own directory under ``settings.SCRATCH_ROOT`` so
+concurrent jobs never see each other's files. Directories are removed by
+``cleanup_workspaces`` once they are older than ``settings.SCRATCH_TTL`` and
+no queued or running job still points at them; workers call it every
+``settings.SCRATCH_CLEANUP_INTERVAL`` seconds and ``manage.py cleanup_scratch``
+can run it from cron.
+"""
+import os
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+
+from speech.models import TranscriptionJob
+
+
+def create_workspace():
+    path = os.path.join(settings.SCRATCH_ROOT, uuid.uuid4().hex)
+    os.makedirs(path)
+    return path
+
+
+def cleanup_workspaces(max_age=None, now=None):
+    """Delete expired workspaces. Returns the number removed."""
+    max_age = settings.SCRATCH_TTL if max_age is None else max_age
+    now = time.time() if now is None else now
+    root = settings.SCRATCH_ROOT
+    if not os.path.isdir(root):
+        return 0
+
+    active = set(TranscriptionJob.objects.filter(
+        status__in=[TranscriptionJob.QUEUED, TranscriptionJob.RUNNING],
+    ).values_list('workspace', flat=True))
+
+    removed = 0
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False) or entry.path in active:
+                continue
+            if now - entry.stat().st_mtime < max_age:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed